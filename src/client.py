@@ -92,7 +92,9 @@ try:
         import pkg.client.bootenv as bootenv
         import pkg.client.client_api as client_api
         import pkg.client.progress as progress
+        import pkg.client.profiler as profiler
         import pkg.client.linkedimage as li
+        import pkg.client.manifestcache as manifestcache
         import pkg.client.publisher as publisher
         import pkg.client.transport.transport as transport
         import pkg.client.options as options
@@ -120,7 +122,7 @@ except KeyboardInterrupt:
         import sys
         sys.exit(1)
 
-CLIENT_API_VERSION = 83
+CLIENT_API_VERSION = 85
 PKG_CLIENT_NAME = "pkg"
 
 JUST_UNKNOWN = 0
@@ -325,12 +327,15 @@ def usage(usage_error=None, cmd=None, retcode=EXIT_BADOPT, full=False,
         adv_usage["search"] = _(
             "[-HIaflpr] [-o attribute ...] [-s repo_uri] query")
 
-        adv_usage["verify"] = _("[-Hqv] [-p path]... [--parsable version]\n"
-            "            [--unpackaged] [--unpackaged-only] [pkg_fmri_pattern ...]")
+        adv_usage["verify"] = _(
+            "[-Hqv] [-j jobs] [-p path]... [--parsable version]\n"
+            "            [--deep] [--unpackaged] [--unpackaged-only]\n"
+            "            [pkg_fmri_pattern ...]")
         adv_usage["fix"] = _(
-            "[-Hnvq]\n"
+            "[-Hnvq] [-j jobs]\n"
             + beopts +
-            "            [--accept] [--licenses] [--parsable version] [--unpackaged]\n"
+            "            [--accept] [--deep] [--licenses]\n"
+            "            [--parsable version] [--unpackaged]\n"
             "            [pkg_fmri_pattern ...]")
         adv_usage["revert"] = _(
             "[-nv]\n"
@@ -2711,13 +2716,13 @@ def clean_image(api_inst, args):
                 return __api_plan_exception("clean", False, 0, api_inst)
 
 def verify(op, api_inst, pargs, omit_headers, parsable_version, quiet, verbose,
-    unpackaged, unpackaged_only, verify_paths):
+    unpackaged, unpackaged_only, verify_paths, deep):
         """Determine if installed packages match manifests."""
 
         out_json = client_api._verify(op, api_inst, pargs, omit_headers,
             parsable_version, quiet, verbose, unpackaged, unpackaged_only,
             display_plan_cb=display_plan_cb, logger=logger,
-            verify_paths=verify_paths)
+            verify_paths=verify_paths, deep=deep)
 
         # Print error messages.
         if "errors" in out_json:
@@ -2756,13 +2761,13 @@ def rehydrate(op, api_inst, pargs, noexecute, publishers, quiet, verbose):
 
 def fix(op, api_inst, pargs, accept, backup_be, backup_be_name, be_activate,
     be_name, new_be, noexecute, omit_headers, parsable_version, quiet,
-    show_licenses, verbose, unpackaged):
+    show_licenses, verbose, unpackaged, deep):
         """Fix packaging errors found in the image."""
 
         out_json = client_api._fix(op, api_inst, pargs, accept, backup_be,
             backup_be_name, be_activate, be_name, new_be, noexecute,
             omit_headers, parsable_version, quiet, show_licenses, verbose,
-            unpackaged, display_plan_cb=display_plan_cb, logger=logger)
+            unpackaged, deep, display_plan_cb=display_plan_cb, logger=logger)
 
         # Print error messages.
         if "errors" in out_json:
@@ -5728,6 +5733,8 @@ opts_mapping = {
 
     "unpackaged_only" :        ("",  "unpackaged-only"),
 
+    "deep" :              ("",  "deep"),
+
     "refresh_catalogs" :  ("",  "no-refresh"),
 
     "reject_pats" :       ("",  "reject"),
@@ -5815,7 +5822,8 @@ opts_mapping = {
     "info_remote":            ("r", ""),
     "display_license":        ("", "license"),
     "publisher_a":            ("a", ""),
-    "verify_paths":           ("p", "")
+    "verify_paths":           ("p", ""),
+    "workers":                ("j", "")
 }
 
 #
@@ -6430,7 +6438,12 @@ if __name__ == "__main__":
         if DebugValues["timings"]:
                 def __display_timings():
                         msg(str(pkg_timer))
+                        msg(str(manifestcache.cache))
                 handle_errors(__display_timings)
+        if DebugValues["profile"]:
+                def __save_profile():
+                        profiler.save(DebugValues["profile"])
+                handle_errors(__save_profile)
         try:
                 logging.shutdown()
         except IOError:
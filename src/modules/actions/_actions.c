@@ -33,6 +33,7 @@
 static PyObject *MalformedActionError;
 static PyObject *InvalidActionError;
 static PyObject *UnknownActionError;
+static PyObject *ActionError;
 static PyObject *aclass_attribute;
 static PyObject *aclass_depend;
 static PyObject *aclass_directory;
@@ -47,6 +48,16 @@ static PyObject *aclass_signature;
 static PyObject *aclass_unknown;
 static PyObject *aclass_user;
 
+/*
+ * The action classes whose __init__ only passes its arguments on to one of
+ * the initialization functions of pkg.actions._common, and those functions.
+ */
+#define	MAX_FAST_INIT	16
+static PyObject *fast_init_class[MAX_FAST_INIT];
+static PyObject *fast_init_func[MAX_FAST_INIT];
+static int nfast_init;
+static PyObject *empty_tuple;
+
 static const char *notident = "hash attribute not identical to positional hash";
 static const char *nohash = "action type doesn't allow payload";
 
@@ -132,22 +143,68 @@ set_invaliderr(const char *str, const char *msg)
 }
 
 /*
- * Note that action parsing does not support line-continuation ('\'); that
- * support is provided by the Manifest class.
+ * Construct an action of class 'act_class' with the data 'act_data' and the
+ * attributes 'attrs', as act_class(act_data, **attrs) would.  For the classes
+ * which use the initialization functions of pkg.actions._common as they are,
+ * those are called directly; this avoids a Python frame and copying 'attrs'
+ * twice for each action.
  */
+static PyObject *
+new_action(PyObject *act_class, PyObject *act_data, PyObject *attrs)
+{
+	PyObject *action, *args, *rv;
+	PyObject *init = NULL;
+	int i;
 
-/*ARGSUSED*/
+	for (i = 0; i < nfast_init; i++) {
+		if (fast_init_class[i] == act_class) {
+			init = fast_init_func[i];
+			break;
+		}
+	}
+
+	if (init == NULL) {
+		if ((args = PyTuple_Pack(1, act_data)) == NULL)
+			return (NULL);
+		action = PyObject_Call(act_class, args, attrs);
+		Py_DECREF(args);
+		return (action);
+	}
 
+	action = ((PyTypeObject *)act_class)->tp_new(
+	    (PyTypeObject *)act_class, empty_tuple, NULL);
+	if (action == NULL)
+		return (NULL);
+	if ((args = PyTuple_Pack(2, action, act_data)) == NULL) {
+		Py_DECREF(action);
+		return (NULL);
+	}
+	rv = PyObject_Call(init, args, attrs);
+	Py_DECREF(args);
+	if (rv == NULL) {
+		Py_DECREF(action);
+		return (NULL);
+	}
+	Py_DECREF(rv);
+	return (action);
+}
+
+/*
+ * Note that action parsing does not support line-continuation ('\'); that
+ * support is provided by fromstrs() and the Manifest class.
+ *
+ * Parse the NUL-terminated action string 'str' of length 'strl' and return
+ * the resulting action, with 'act_data' as its data.
+ */
 static PyObject *
 __attribute__((hot))
-fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
+parse_action(char *str, Py_ssize_t strl, PyObject *act_data)
 {
 	char *s = NULL;
-	char *str = NULL;
 	char *hashstr = NULL;
 	char *keystr = NULL;
 	int *slashmap = NULL;
-	Py_ssize_t i, strl, typestrl;
+	Py_ssize_t i, typestrl;
 	int ks, vs, keysize;
 	int smlen = 0, smpos = 0;
 	int hash_allowed;
@@ -155,7 +212,6 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 	char quote = '\0';
 	PyObject *act_args = NULL;
 	PyObject *act_class = NULL;
-	PyObject *act_data = NULL;
 	PyObject *action = NULL;
 	PyObject *hash = NULL;
 	PyObject *attrs = NULL;
@@ -170,47 +226,23 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 
 	/*
 	 * If malformed() or invalid() are used, CLEANUP_REFS can only be used
-	 * after.  Likewise, PyMem_Free(str) should not be called before using
-	 * malformed() or invalid().  Failure to order this properly will cause
-	 * corruption of the exception messages.
+	 * after.  Failure to order this properly will cause corruption of the
+	 * exception messages.
 	 */
 #define	malformed(msg) set_malformederr(str, i, (msg))
 #define	invalid(msg) set_invaliderr(str, (msg))
 #define	CLEANUP_REFS \
-	PyMem_Free(str);\
 	Py_XDECREF(key);\
 	Py_XDECREF(attr);\
 	Py_XDECREF(attrs);\
 	Py_XDECREF(hash);\
 	free(hashstr);
 
-	/*
-	 * Positional arguments must be included in the keyword argument list in
-	 * the order you want them to be assigned.  (A subtle point missing from
-	 * the Python documentation.)
-	 */
-	static char *kwlist[] = { "string", "data", NULL };
-
-	/* Assume data=None by default. */
-	act_data = Py_None;
-
-	/*
-	 * The action string is currently assumed to be a stream of bytes that
-	 * are valid UTF-8.  This method works regardless of whether the string
-	 * object provided is a Unicode object, string object, or a character
-	 * buffer.
-	 */
-	if (PyArg_ParseTupleAndKeywords(args, kwdict, "et#|O:fromstr", kwlist,
-	    "utf-8", &str, &strl, &act_data) == 0) {
-		return (NULL);
-	}
-
 	s = strpbrk(str, " \t\n");
 
 	i = strl;
 	if (s == NULL) {
 		malformed("no attributes");
-		PyMem_Free(str);
 		return (NULL);
 	}
 
@@ -266,7 +298,6 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 		    str, typestrl)) != NULL) {
 			PyErr_SetObject(UnknownActionError, act_args);
 			Py_DECREF(act_args);
-			PyMem_Free(str);
 			return (NULL);
 		}
 
@@ -275,14 +306,12 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 		 * general type exception instead.
 		 */
 		PyErr_SetString(PyExc_TypeError, "unknown action type");
-		PyMem_Free(str);
 		return (NULL);
 	}
 
 	ks = vs = typestrl;
 	prevstate = state = WS;
 	if ((attrs = PyDict_New()) == NULL) {
-		PyMem_Free(str);
 		return (NULL);
 	}
 	for (i = s - str; str[i]; i++) {
@@ -382,7 +411,6 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 					smlen = 16;
 					slashmap = calloc(smlen, sizeof (int));
 					if (slashmap == NULL) {
-						PyMem_Free(str);
 						return (PyErr_NoMemory());
 					}
 					smpos = 0;
@@ -397,7 +425,6 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 					slashmap = realloc(slashmap,
 					    smlen * sizeof (int));
 					if (slashmap == NULL) {
-						PyMem_Free(str);
 						return (PyErr_NoMemory());
 					}
 				}
@@ -421,7 +448,6 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 					attrlen = i - vs;
 					sattr = calloc(1, attrlen + 1);
 					if (sattr == NULL) {
-						PyMem_Free(str);
 						free(slashmap);
 						return (PyErr_NoMemory());
 					}
@@ -564,28 +590,16 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 		return (NULL);
 	}
 
-	PyMem_Free(str);
 	Py_XDECREF(key);
 	Py_XDECREF(attr);
+	free(hashstr);
 
 	/*
-	 * Action parsing is done; now build the list of arguments to construct
-	 * the object for it.
-	 */
-	if ((act_args = Py_BuildValue("(O)", act_data)) == NULL) {
-		if (hash != NULL && hash != Py_None)
-			Py_DECREF(hash);
-		Py_DECREF(attrs);
-		return (NULL);
-	}
-
-	/*
-	 * Using the cached action class assigned earlier based on the type,
-	 * call the action constructor, set the hash attribute, and then return
-	 * the new action object.
+	 * Action parsing is done; using the cached action class assigned
+	 * earlier based on the type, construct the action, set the hash
+	 * attribute, and then return the new action object.
 	 */
-	action = PyObject_Call(act_class, act_args, attrs);
-	Py_DECREF(act_args);
+	action = new_action(act_class, act_data, attrs);
 	Py_DECREF(attrs);
 	if (action == NULL) {
 		if (hash != NULL && hash != Py_None)
@@ -605,8 +619,290 @@ fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
 	return (action);
 }
 
+/*ARGSUSED*/
+static PyObject *
+fromstr(PyObject *self, PyObject *args, PyObject *kwdict)
+{
+	char *str = NULL;
+	Py_ssize_t strl;
+	PyObject *act_data = Py_None;
+	PyObject *action;
+
+	/*
+	 * Positional arguments must be included in the keyword argument list in
+	 * the order you want them to be assigned.  (A subtle point missing from
+	 * the Python documentation.)
+	 */
+	static char *kwlist[] = { "string", "data", NULL };
+
+	/*
+	 * The action string is currently assumed to be a stream of bytes that
+	 * are valid UTF-8.  This method works regardless of whether the string
+	 * object provided is a Unicode object, string object, or a character
+	 * buffer.
+	 */
+	if (PyArg_ParseTupleAndKeywords(args, kwdict, "et#|O:fromstr", kwlist,
+	    "utf-8", &str, &strl, &act_data) == 0) {
+		return (NULL);
+	}
+
+	action = parse_action(str, strl, act_data);
+	PyMem_Free(str);
+	return (action);
+}
+
+/*
+ * Apply the transformations needed for actions written by older releases,
+ * as Manifest.add_action() does.
+ */
+static int
+fixup_action(PyObject *action, PyObject *act_class)
+{
+	PyObject *attrs;
+	PyObject *val;
+	int ret = 0;
+
+	if ((attrs = PyObject_GetAttrString(action, "attrs")) == NULL)
+		return (-1);
+	if (!PyDict_Check(attrs)) {
+		Py_DECREF(attrs);
+		return (0);
+	}
+
+	if ((val = PyDict_GetItemString(attrs, "opensolaris.zone")) != NULL &&
+	    PyDict_GetItemString(attrs, "variant.opensolaris.zone") == NULL)
+		ret = PyDict_SetItemString(attrs, "variant.opensolaris.zone",
+		    val);
+
+	if (ret == 0 && act_class == aclass_attribute &&
+	    (val = PyDict_GetItemString(attrs, "name")) != NULL &&
+	    PyUnicode_Check(val) &&
+	    PyUnicode_CompareWithASCIIString(val, "authority") == 0) {
+		/* Translate old action to new. */
+		if ((val = PyUnicode_FromString("publisher")) == NULL) {
+			ret = -1;
+		} else {
+			ret = PyDict_SetItemString(attrs, "name", val);
+			Py_DECREF(val);
+		}
+	}
+
+	Py_DECREF(attrs);
+	return (ret);
+}
+
+/*
+ * Return 1 if each of the callables in 'excludes' accepts 'action', 0 if any
+ * doesn't, or -1 on error; this is Action.include_this() for a fixed
+ * publisher.
+ */
+static int
+include_action(PyObject *action, PyObject *excludes, PyObject *publisher,
+    PyObject *kwnames)
+{
+	Py_ssize_t i, n = PySequence_Fast_GET_SIZE(excludes);
+	PyObject *cargs[2] = { action, publisher };
+	PyObject *rv;
+	int ok;
+
+	for (i = 0; i < n; i++) {
+		rv = PyObject_Vectorcall(PySequence_Fast_GET_ITEM(excludes, i),
+		    cargs, 1, kwnames);
+		if (rv == NULL)
+			return (-1);
+		ok = PyObject_IsTrue(rv);
+		Py_DECREF(rv);
+		if (ok != 1)
+			return (ok);
+	}
+	return (1);
+}
+
+/*
+ * Append 'len' bytes at 's' to the buffer 'buf' of 'len' bytes and 'size'
+ * bytes allocated, keeping it NUL-terminated.
+ */
+static int
+buf_append(char **buf, Py_ssize_t *blen, Py_ssize_t *bsize, const char *s,
+    Py_ssize_t len)
+{
+	if (*blen + len + 1 > *bsize) {
+		Py_ssize_t nsize = (*blen + len + 1) * 2;
+		char *nbuf;
+
+		if ((nbuf = PyMem_Realloc(*buf, nsize)) == NULL) {
+			PyErr_NoMemory();
+			return (-1);
+		}
+		*buf = nbuf;
+		*bsize = nsize;
+	}
+	memcpy(*buf + *blen, s, len);
+	*blen += len;
+	(*buf)[*blen] = '\0';
+	return (0);
+}
+
+/*
+ * Parse all of the actions in 'content', the text of a manifest as a str or
+ * any object supporting the buffer protocol (such as bytes or an mmap), and
+ * return a tuple of:
+ *
+ *   - a list of the actions accepted by all of the callables in 'excludes'
+ *     (each called as c(action, publisher=publisher)), in manifest order
+ *   - a dict mapping each action type to the list of those actions
+ *   - a list of (line number, exception) tuples for the actions which
+ *     couldn't be parsed
+ *
+ * Blank lines and comments are skipped, and lines ending in a backslash are
+ * joined with the line which follows them, as Manifest.set_content() does.
+ */
+/*ARGSUSED*/
+static PyObject *
+__attribute__((hot))
+fromstrs(PyObject *self, PyObject *args, PyObject *kwdict)
+{
+	Py_buffer content;
+	PyObject *excludes = NULL;
+	PyObject *publisher = Py_None;
+	PyObject *kwnames = NULL;
+	PyObject *acts = NULL;
+	PyObject *bytype = NULL;
+	PyObject *errors = NULL;
+	PyObject *action, *act_class, *name, *tlist, *rv = NULL;
+	const char *p, *end, *eol, *ls;
+	char *line = NULL;
+	Py_ssize_t llen = 0, lsize = 0, lineno = 0;
+	int ok;
+
+	static char *kwlist[] = { "content", "excludes", "publisher", NULL };
+
+	if (PyArg_ParseTupleAndKeywords(args, kwdict, "s*|OO:fromstrs", kwlist,
+	    &content, &excludes, &publisher) == 0) {
+		return (NULL);
+	}
+
+	if (excludes == NULL || excludes == Py_None)
+		excludes = PyTuple_New(0);
+	else
+		excludes = PySequence_Fast(excludes,
+		    "excludes must be a sequence");
+	if (excludes == NULL)
+		goto out;
+	if ((kwnames = Py_BuildValue("(s)", "publisher")) == NULL ||
+	    (acts = PyList_New(0)) == NULL ||
+	    (bytype = PyDict_New()) == NULL ||
+	    (errors = PyList_New(0)) == NULL)
+		goto out;
+
+	p = content.buf;
+	end = p + content.len;
+	while (p < end) {
+		for (eol = p; eol < end && *eol != '\n' && *eol != '\r'; eol++)
+			;
+		ls = p;
+		if (eol < end && *eol == '\r' && eol + 1 < end &&
+		    eol[1] == '\n')
+			p = eol + 2;
+		else
+			p = eol + 1;
+		lineno++;
+
+		while (ls < eol && (*ls == ' ' || *ls == '\t' || *ls == '\v' ||
+		    *ls == '\f'))
+			ls++;
+		if (ls < eol && eol[-1] == '\\') {
+			/* Elide the backslash and join with the next line. */
+			if (buf_append(&line, &llen, &lsize, ls,
+			    eol - ls - 1) != 0)
+				goto out;
+			continue;
+		}
+		if (buf_append(&line, &llen, &lsize, ls, eol - ls) != 0)
+			goto out;
+		if (llen == 0 || line[0] == '#') {
+			/* Ignore blank lines and comments. */
+			llen = 0;
+			continue;
+		}
+
+		action = parse_action(line, llen, Py_None);
+		llen = 0;
+		if (action == NULL) {
+			PyObject *etype, *evalue, *etb, *err;
+
+			if (!PyErr_ExceptionMatches(ActionError))
+				goto out;
+			/*
+			 * Record the error and continue so that as much of the
+			 * action data as possible can be parsed.
+			 */
+			PyErr_Fetch(&etype, &evalue, &etb);
+			PyErr_NormalizeException(&etype, &evalue, &etb);
+			err = Py_BuildValue("(nO)", lineno, evalue);
+			Py_XDECREF(etype);
+			Py_XDECREF(evalue);
+			Py_XDECREF(etb);
+			if (err == NULL)
+				goto out;
+			ok = PyList_Append(errors, err);
+			Py_DECREF(err);
+			if (ok != 0)
+				goto out;
+			continue;
+		}
+
+		act_class = (PyObject *)Py_TYPE(action);
+		if (fixup_action(action, act_class) != 0 ||
+		    (ok = include_action(action, excludes, publisher,
+		    kwnames)) < 0) {
+			Py_DECREF(action);
+			goto out;
+		}
+		if (ok == 0) {
+			Py_DECREF(action);
+			continue;
+		}
+
+		if ((name = PyObject_GetAttrString(action, "name")) == NULL) {
+			Py_DECREF(action);
+			goto out;
+		}
+		if ((tlist = PyDict_GetItem(bytype, name)) == NULL) {
+			if ((tlist = PyList_New(0)) == NULL ||
+			    PyDict_SetItem(bytype, name, tlist) != 0) {
+				Py_XDECREF(tlist);
+				Py_DECREF(name);
+				Py_DECREF(action);
+				goto out;
+			}
+			/* The dict holds the reference. */
+			Py_DECREF(tlist);
+		}
+		Py_DECREF(name);
+		ok = PyList_Append(acts, action) == 0 &&
+		    PyList_Append(tlist, action) == 0;
+		Py_DECREF(action);
+		if (!ok)
+			goto out;
+	}
+
+	rv = PyTuple_Pack(3, acts, bytype, errors);
+
+out:
+	PyBuffer_Release(&content);
+	PyMem_Free(line);
+	Py_XDECREF(excludes);
+	Py_XDECREF(kwnames);
+	Py_XDECREF(acts);
+	Py_XDECREF(bytype);
+	Py_XDECREF(errors);
+	return (rv);
+}
+
 static PyMethodDef methods[] = {
 	{ "fromstr", (PyCFunction)fromstr, METH_VARARGS | METH_KEYWORDS },
+	{ "fromstrs", (PyCFunction)fromstrs, METH_VARARGS | METH_KEYWORDS },
 	{ NULL, NULL, 0, NULL }
 };
 
@@ -625,6 +921,18 @@ moduleinit(void)
 	PyObject *pkg_actions = NULL;
 	PyObject *sys = NULL;
 	PyObject *sys_modules = NULL;
+	PyObject *common = NULL;
+	PyObject *generic = NULL;
+	PyObject *file = NULL;
+	PyObject *inits[2][2] = { { NULL, NULL }, { NULL, NULL } };
+	PyObject **aclasses[] = {
+		&aclass_attribute, &aclass_depend, &aclass_directory,
+		&aclass_driver, &aclass_file, &aclass_group, &aclass_hardlink,
+		&aclass_legacy, &aclass_license, &aclass_link, &aclass_signature,
+		&aclass_unknown, &aclass_user
+	};
+	size_t j;
+	int i;
 	PyObject *m;
 
 	if ((m = PyModule_Create(&actionmodule)) == NULL)
@@ -669,6 +977,8 @@ moduleinit(void)
 	UnknownActionError = \
 	    PyObject_GetAttrString(pkg_actions, "UnknownActionError");
 	Py_DECREF(UnknownActionError);
+	ActionError = PyObject_GetAttrString(pkg_actions, "ActionError");
+	Py_DECREF(ActionError);
 
 	/*
 	 * Retrieve the list of action types and then store a reference to each
@@ -710,6 +1020,59 @@ moduleinit(void)
 
 	Py_DECREF(action_types);
 
+	if ((empty_tuple = PyTuple_New(0)) == NULL)
+		return (NULL);
+
+	/*
+	 * Find the action classes which can be initialized directly; see
+	 * new_action().  If any of the modules or functions can't be found,
+	 * actions are simply constructed through their classes.
+	 */
+	if ((common = PyImport_ImportModule("pkg.actions._common")) == NULL ||
+	    (generic = PyImport_ImportModule("pkg.actions.generic")) == NULL ||
+	    (file = PyImport_ImportModule("pkg.actions.file")) == NULL) {
+		PyErr_Clear();
+		goto done;
+	}
+	inits[0][0] = PyObject_GetAttrString(generic, "Action");
+	inits[0][1] = PyObject_GetAttrString(common, "_generic_init");
+	inits[1][0] = PyObject_GetAttrString(file, "FileAction");
+	inits[1][1] = PyObject_GetAttrString(common, "_file_init");
+	for (i = 0; i < 2; i++) {
+		PyObject *base_init;
+
+		if (inits[i][0] == NULL || inits[i][1] == NULL ||
+		    (base_init = PyObject_GetAttrString(inits[i][0],
+		    "__init__")) == NULL) {
+			PyErr_Clear();
+			continue;
+		}
+		for (j = 0; j < sizeof (aclasses) / sizeof (aclasses[0]); j++) {
+			PyObject *cinit;
+
+			if ((cinit = PyObject_GetAttrString(*aclasses[j],
+			    "__init__")) == NULL) {
+				PyErr_Clear();
+				continue;
+			}
+			if (cinit == base_init && nfast_init < MAX_FAST_INIT) {
+				Py_INCREF(inits[i][1]);
+				fast_init_class[nfast_init] = *aclasses[j];
+				fast_init_func[nfast_init++] = inits[i][1];
+			}
+			Py_DECREF(cinit);
+		}
+		Py_DECREF(base_init);
+	}
+	for (i = 0; i < 2; i++) {
+		Py_XDECREF(inits[i][0]);
+		Py_XDECREF(inits[i][1]);
+	}
+
+done:
+	Py_XDECREF(common);
+	Py_XDECREF(generic);
+	Py_XDECREF(file);
 	return (m);
 }
 
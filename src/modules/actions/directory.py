@@ -54,6 +54,9 @@ class DirectoryAction(generic.Action):
                 return (self.attrs["path"] > other.attrs["path"]) - \
                     (self.attrs["path"] < other.attrs["path"])
 
+        def sort_key(self):
+                return self.ordinality, self.attrs["path"]
+
         def differences(self, other):
                 """Returns a list of attributes that have different values
                 between 'other' and 'self'.  This differs from the generic
@@ -105,6 +105,10 @@ class DriverAction(generic.Action):
                         return 1
                 return ret
 
+        def sort_key(self):
+                name = self.attrs["name"]
+                return self.ordinality, name != "clone", name
+
         @staticmethod
         def __usr_sbin_init():
                 """Initialize paths to device management commands that we will
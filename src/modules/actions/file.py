@@ -35,6 +35,7 @@ import os
 import six
 import stat
 import tempfile
+import threading
 import types
 import zlib
 import time
@@ -51,6 +52,10 @@ from pkg.client.pkgdefs import MSG_WARNING
 from pkg.client.api_errors import ActionExecutionError
 from pkg.client.debugvalues import DebugValues
 
+# Serialises one-off payload retrievals, which use the image's transport, when
+# file actions are installed by more than one thread.
+_retrieval_lock = threading.Lock()
+
 try:
         import pkg.elf as elf
         haveelf = True
@@ -216,6 +221,7 @@ class FileAction(generic.Action):
                                         raise
 
                 # XXX This needs to be modularized.
+                installed_hash = None
                 if do_content and self.needsdata(orig, pkgplan):
                         tfilefd, temp = tempfile.mkstemp(dir=os.path.dirname(
                             final_path))
@@ -223,7 +229,8 @@ class FileAction(generic.Action):
                                 # The state of the filesystem changed after the
                                 # plan was prepared; attempt a one-off
                                 # retrieval of the data.
-                                self.data = self.__set_data(pkgplan)
+                                with _retrieval_lock:
+                                        self.data = self.__set_data(pkgplan)
                         stream = self.data()
                         tfile = os.fdopen(tfilefd, "wb")
                         try:
@@ -251,6 +258,7 @@ class FileAction(generic.Action):
                                         actual=shasum,
                                         action=self
                                    ))
+                        installed_hash = hash_val
 
                 else:
                         temp = final_path
@@ -340,6 +348,12 @@ class FileAction(generic.Action):
                                     misc.time_to_timestamp(time.time()),
                                     MSG_WARNING, warn)
 
+                # The content was verified as it was written, so there's no
+                # need for pkg verify to hash it again.
+                if installed_hash and pres_type != "renamenew":
+                        pkgplan.image.verify_cache.add(self.attrs["path"],
+                            os.lstat(final_path), installed_hash)
+
         def verify(self, img, **args):
                 """Returns a tuple of lists of the form (errors, warnings,
                 info).  The error list will be empty if the action has been
@@ -347,7 +361,11 @@ class FileAction(generic.Action):
 
                 In detail, this verifies that the file is present, and if
                 the preserve attribute is not present, that the hashes
-                and other attributes of the file match."""
+                and other attributes of the file match.
+
+                Hashing the file's content is skipped if the image's
+                verification cache shows that it matched before and the file
+                hasn't changed since, unless 'deep' is True."""
 
                 if self.attrs.get("preserve") == "abandon":
                         return [], [], []
@@ -409,13 +427,19 @@ class FileAction(generic.Action):
                         # on the canonical path, foiling the standard verify
                         # checks.
                         is_mtpt = self.attrs.get("mountpoint", "").lower() == "true"
+                        hash_attr, hash_val, hash_func = \
+                            digest.get_preferred_hash(self)
+                        vcache = img.verify_cache
+                        cached = not is_mtpt and not args.get("deep") and \
+                            vcache.lookup(self.attrs["path"], lstat, hash_val)
                         elfhash = None
                         elferror = None
                         elf_hash_attr, elf_hash_val, \
                             elf_hash_func = \
                             digest.get_preferred_hash(self,
                                 hash_type=pkg.digest.HASH_GELF)
-                        if elf_hash_attr and haveelf and not is_mtpt:
+                        if elf_hash_attr and haveelf and not is_mtpt and \
+                            not cached:
                                 #
                                 # It's possible for the elf module to
                                 # throw while computing the hash,
@@ -461,12 +485,13 @@ class FileAction(generic.Action):
                         # Always check on the file hash because the ELF hash
                         # check only checks on the ELF parts and does not
                         # check for some other file integrity issues.
-                        if not is_mtpt:
-                                hash_attr, hash_val, hash_func = \
-                                    digest.get_preferred_hash(self)
+                        if not is_mtpt and not cached:
                                 sha_hash, data = misc.get_data_digest(path,
                                     hash_func=hash_func)
-                                if sha_hash != hash_val:
+                                if sha_hash == hash_val:
+                                        vcache.add(self.attrs["path"], lstat,
+                                            hash_val)
+                                else:
                                         # Prefer the ELF content hash error message.
                                         if preserve is not None:
                                                 info.append(_(
@@ -800,6 +825,8 @@ class FileAction(generic.Action):
                                         return
                                 raise
 
+                pkgplan.image.verify_cache.discard(self.attrs["path"])
+
                 # Attempt to remove the file.
                 rm_exc = None
                 try:
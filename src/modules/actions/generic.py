@@ -411,6 +411,13 @@ class Action(object):
         def compare(self, other):
                 return (id(self) > id(other)) - (id(self) < id(other))
 
+        def sort_key(self):
+                """Returns a key which orders actions as the comparison
+                operators do, for use when sorting large numbers of actions.
+                Subclasses which override compare() must override this too."""
+
+                return self.ordinality, id(self)
+
         def __lt__(self, other):
                 if self.ordinality == other.ordinality:
                         if self.compare(other) < 0: # often subclassed
@@ -521,10 +528,10 @@ class Action(object):
                                             self.name, other.name))
 
                 if self.has_payload and cmp_policy != CMP_ALL:
-                        sset = frozenset(
-                            a for a in sattrs if not digest.is_hash_attr(a))
-                        oset = frozenset(
-                            a for a in oattrs if not digest.is_hash_attr(a))
+                        sset = frozenset(sattrs).difference(
+                            digest.ALL_HASH_ATTRS)
+                        oset = frozenset(oattrs).difference(
+                            digest.ALL_HASH_ATTRS)
                 else:
                         sset = frozenset(sattrs)
                         oset = frozenset(oattrs)
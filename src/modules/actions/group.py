@@ -255,5 +255,8 @@ class GroupAction(generic.Action):
                 b = int(other.attrs.get("gid", 1024))
                 return (a > b) - (a < b)
 
+        def sort_key(self):
+                return self.ordinality, int(self.attrs.get("gid", 1024))
+
 # Vim hints
 # vim:ts=8:sw=8:et:fdm=marker
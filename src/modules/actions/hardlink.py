@@ -49,6 +49,9 @@ class HardLinkAction(link.LinkAction):
                 return ((self.attrs["path"] > other.attrs["path"]) -
                     (self.attrs["path"] < other.attrs["path"]))
 
+        def sort_key(self):
+                return self.ordinality, self.attrs["path"]
+
         def get_target_path(self):
                 """ return a path for target that is relative to image"""
 
@@ -373,5 +373,8 @@ class UserAction(generic.Action):
                 b = int(other.attrs.get("uid", 1024))
                 return (a > b) - (a < b)
 
+        def sort_key(self):
+                return self.ordinality, int(self.attrs.get("uid", 1024))
+
 # Vim hints
 # vim:ts=8:sw=8:et:fdm=marker
@@ -40,7 +40,6 @@ import threading
 import types
 
 from collections import OrderedDict
-from operator import itemgetter
 
 import pkg.actions
 import pkg.client.api_errors as api_errors
@@ -556,7 +555,8 @@ class CatalogPart(CatalogPartBase):
                                 entries.setdefault(sver, [])
                                 entries[sver].append((pfmri, entry))
 
-                for key, ver in sorted(six.iteritems(versions), key=itemgetter(1)):
+                for key, ver in sorted(six.iteritems(versions),
+                    key=lambda t: t[1].sort_key()):
                         yield ver, entries[key]
 
         def fmris(self, last=False, objects=True, ordered=False, pubs=EmptyI):
@@ -623,7 +623,8 @@ class CatalogPart(CatalogPartBase):
                                 entries.setdefault(sver, [])
                                 entries[sver].append(pfmri)
 
-                for key, ver in sorted(six.iteritems(versions), key=itemgetter(1)):
+                for key, ver in sorted(six.iteritems(versions),
+                    key=lambda t: t[1].sort_key()):
                         yield ver, entries[key]
 
         def get_entry(self, pfmri=None, pub=None, stem=None, ver=None):
@@ -827,7 +828,7 @@ class CatalogPart(CatalogPartBase):
                 sorted."""
 
                 def key_func(item):
-                        return pkg.version.Version(item["version"])
+                        return pkg.version.Version(item["version"]).sort_key()
 
                 self.load()
                 if pfmris is not None:
@@ -96,6 +96,16 @@ class GlobalSettings(object):
                 except ValueError:
                         pass
 
+                # number of worker processes used to parallelise CPU-bound
+                # parts of client operations; 1 disables them.
+                self.client_workers_default = min(os.cpu_count() or 1, 8)
+                try:
+                        self.client_workers = int(os.environ.get(
+                            "PKG_CLIENT_WORKERS",
+                            self.client_workers_default))
+                except ValueError:
+                        self.client_workers = self.client_workers_default
+
                 self.client_name = None
                 self.client_args = sys.argv[:]
                 # Default maximum number of redirects received before
@@ -114,6 +124,15 @@ class GlobalSettings(object):
                 # Maximum number of transient errors before we abort an
                 # endpoint.
                 self.pkg_client_max_consecutive_error_default = 4
+                # Minimum number of milliseconds to wait for a manifest from
+                # one origin before also requesting it from another; 0
+                # disables these hedged requests.
+                self.pkg_client_hedge_delay_default = 500
+                # Default limits, in megabytes and days, on the size of the
+                # content cache shared by the images on a host and the age of
+                # the files in it.
+                self.pkg_shared_cache_maxsize_default = 4096
+                self.pkg_shared_cache_maxage_default = 30
 
                 # The location within the image of the cache for pkg.sysrepo(8)
                 self.sysrepo_pub_cache_path = \
@@ -163,6 +182,33 @@ class GlobalSettings(object):
                 except ValueError:
                         self.PKG_CLIENT_MAX_REDIRECT = \
                             self.pkg_client_max_redirect_default
+                try:
+                        # Number of milliseconds before a request for
+                        # metadata is also made to another origin.
+                        self.PKG_CLIENT_HEDGE_DELAY = int(
+                            os.environ.get("PKG_CLIENT_HEDGE_DELAY",
+                            self.pkg_client_hedge_delay_default))
+                except ValueError:
+                        self.PKG_CLIENT_HEDGE_DELAY = \
+                            self.pkg_client_hedge_delay_default
+                # The directory of the content cache shared by the images on
+                # a host, if any.
+                self.PKG_SHARED_CACHEDIR = \
+                    os.environ.get("PKG_SHARED_CACHEDIR") or None
+                try:
+                        self.PKG_SHARED_CACHE_MAXSIZE = int(
+                            os.environ.get("PKG_SHARED_CACHE_MAXSIZE",
+                            self.pkg_shared_cache_maxsize_default))
+                except ValueError:
+                        self.PKG_SHARED_CACHE_MAXSIZE = \
+                            self.pkg_shared_cache_maxsize_default
+                try:
+                        self.PKG_SHARED_CACHE_MAXAGE = int(
+                            os.environ.get("PKG_SHARED_CACHE_MAXAGE",
+                            self.pkg_shared_cache_maxage_default))
+                except ValueError:
+                        self.PKG_SHARED_CACHE_MAXAGE = \
+                            self.pkg_shared_cache_maxage_default
                 self.reset_logging()
 
         def __get_error_log_handler(self):
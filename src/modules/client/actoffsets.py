@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Binary index of the image's stripped actions file.
+
+The actions.offsets file maps an action name and key attribute value to the
+offset of the first matching line in actions.stripped and the number of lines
+for that pair.  It consists of two text header lines (the version and the
+timestamp coordinating it with actions.stripped), followed by:
+
+    - the number of records, as an unsigned 64-bit integer
+
+    - that many fixed-width records, sorted by their lookup key, each holding
+      the location of the lookup key in the string table, the offset into
+      actions.stripped and the line count
+
+    - the string table, where each lookup key is the UTF-8 encoded action
+      name and key attribute value separated by a NUL byte
+
+All integers are little-endian.  Since the records are fixed-width and sorted,
+the file can be memory-mapped and binary searched without parsing it."""
+
+import mmap
+import struct
+
+import pkg.misc as misc
+
+VERSION = "VERSION 3"
+
+# Record count.
+_HDR = struct.Struct("<Q")
+# String table offset and length, stripped file offset, line count.
+_REC = struct.Struct("<QIQI")
+
+
+def _lookup_key(name, key):
+        return "{0}\0{1}".format(name, key).encode("utf-8")
+
+
+def write(fobj, timestamp, entries):
+        """Write an index to the binary file object 'fobj'.  'timestamp' is
+        the timestamp of the corresponding stripped actions file and 'entries'
+        is an iterable of (action name, key, offset, count) tuples."""
+
+        recs = sorted(
+            (_lookup_key(name, key), offset, cnt)
+            for name, key, offset, cnt in entries
+        )
+
+        fobj.write("{0}\n{1}\n".format(VERSION, timestamp).encode("utf-8"))
+        fobj.write(_HDR.pack(len(recs)))
+        soff = 0
+        for lkey, offset, cnt in recs:
+                fobj.write(_REC.pack(soff, len(lkey), offset, cnt))
+                soff += len(lkey)
+        for lkey, offset, cnt in recs:
+                fobj.write(lkey)
+
+
+class ActionOffsets(object):
+        """A read-only, memory-mapped view of an actions.offsets file that can
+        be used in place of a dictionary mapping (action name, key) tuples to
+        (offset, count) tuples."""
+
+        def __init__(self, path):
+                with open(path, "rb") as fh:
+                        self.version = misc.force_str(fh.readline().rstrip())
+                        self.timestamp = misc.force_str(
+                            fh.readline().rstrip())
+                        start = fh.tell()
+                        self.__map = None
+                        self.__count = 0
+                        if self.version != VERSION:
+                                return
+                        self.__map = mmap.mmap(fh.fileno(), 0,
+                            access=mmap.ACCESS_READ)
+
+                self.__recs = self.__strs = start + _HDR.size
+                if self.__recs <= len(self.__map):
+                        self.__count = _HDR.unpack_from(self.__map, start)[0]
+                        self.__strs = self.__recs + self.__count * _REC.size
+                if not self.__valid():
+                        # The file was truncated, as by a crash or a full
+                        # disk; treat it as being of an unknown version so
+                        # that it is recreated.
+                        self.version = None
+                        self.close()
+
+        def __valid(self):
+                """Return whether the records and the string table fit
+                exactly in the mapped file."""
+
+                size = len(self.__map)
+                if self.__recs > size or self.__strs > size:
+                        return False
+                if not self.__count:
+                        return self.__strs == size
+                # The strings are stored in record order.
+                soff, slen, offset, cnt = self.__record(self.__count - 1)
+                return soff + slen == size
+
+        def __len__(self):
+                return self.__count
+
+        def __record(self, i):
+                soff, slen, offset, cnt = _REC.unpack_from(self.__map,
+                    self.__recs + i * _REC.size)
+                soff += self.__strs
+                return soff, slen, offset, cnt
+
+        def __iter__(self):
+                """Yields (action name, key, offset, count) tuples in
+                lookup key order."""
+
+                for i in range(self.__count):
+                        soff, slen, offset, cnt = self.__record(i)
+                        name, key = misc.force_str(
+                            self.__map[soff:soff + slen]).split("\0", 1)
+                        yield name, key, offset, cnt
+
+        def get(self, key, default=None):
+                """Return the (offset, count) tuple for the (action name, key)
+                tuple 'key', or 'default' if it isn't present."""
+
+                lkey = _lookup_key(*key)
+                lo, hi = 0, self.__count
+                while lo < hi:
+                        mid = (lo + hi) // 2
+                        soff, slen, offset, cnt = self.__record(mid)
+                        cur = self.__map[soff:soff + slen]
+                        if cur < lkey:
+                                lo = mid + 1
+                        elif cur > lkey:
+                                hi = mid
+                        else:
+                                return offset, cnt
+                return default
+
+        def __contains__(self, key):
+                return self.get(key) is not None
+
+        def __getitem__(self, key):
+                res = self.get(key)
+                if res is None:
+                        raise KeyError(key)
+                return res
+
+        def close(self):
+                if self.__map is not None:
+                        self.__map.close()
+                        self.__map = None
+                        self.__count = 0
@@ -78,6 +78,7 @@ import pkg.catalog as catalog
 import pkg.client.api_errors as apx
 import pkg.client.bootenv as bootenv
 import pkg.client.history as history
+import pkg.client.historylog as historylog
 import pkg.client.image as image
 import pkg.client.imageconfig as imgcfg
 import pkg.client.imageplan as imageplan
@@ -110,9 +111,9 @@ from pkg.smf import NonzeroExitException
 # things like help(pkg.client.api.PlanDescription)
 from pkg.client.plandesc import PlanDescription # pylint: disable=W0611
 
-CURRENT_API_VERSION = 84
+CURRENT_API_VERSION = 85
 COMPATIBLE_API_VERSIONS = frozenset([72, 73, 74, 75, 76, 77, 78, 79, 80, 81,
-    82, 83, CURRENT_API_VERSION])
+    82, 83, 84, CURRENT_API_VERSION])
 CURRENT_P5I_VERSION = 1
 
 # Image type constants.
@@ -2419,7 +2420,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     publishers=publishers)
 
         def gen_plan_verify(self, args, noexecute=True, unpackaged=False,
-            unpackaged_only=False, verify_paths=misc.EmptyI):
+            unpackaged_only=False, verify_paths=misc.EmptyI, deep=False):
                 """This is a generator function that yields a PlanDescription
                 object.
 
@@ -2435,11 +2436,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 return self.__plan_op(op, args=args, _noexecute=noexecute,
                     _refresh_catalogs=False, _update_index=False, _new_be=None,
                     unpackaged=unpackaged, unpackaged_only=unpackaged_only,
-                    verify_paths=verify_paths)
+                    verify_paths=verify_paths, deep=deep)
 
         def gen_plan_fix(self, args, backup_be=None, backup_be_name=None,
             be_activate=True, be_name=None, new_be=None, noexecute=True,
-            unpackaged=False):
+            unpackaged=False, deep=False):
                 """This is a generator function that yields a PlanDescription
                 object.
 
@@ -2456,7 +2457,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     _backup_be=backup_be, _backup_be_name=backup_be_name,
                     _be_name=be_name, _new_be=new_be, _noexecute=noexecute,
                     _refresh_catalogs=False, _update_index=False,
-                    unpackaged=unpackaged)
+                    unpackaged=unpackaged, deep=deep)
 
         def attach_linked_child(self, lin, li_path, li_props=None,
             accept=False, allow_relink=False, force=False, li_md_only=False,
@@ -2771,17 +2772,26 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 except apx.ApiException as e:
                         uuid_be_dic = {}
 
-                for entry in entries:
-                        # Yield each history entry object as it is loaded.
-                        try:
-                                yield history.History(
-                                    root_dir=self._img.history.root_dir,
-                                    filename=entry, uuid_be_dic=uuid_be_dic)
-                        except apx.HistoryLoadException as e:
-                                if e.parse_failure:
-                                        # Ignore corrupt entries.
-                                        continue
-                                raise
+                # Entries are loaded from the log where possible, and the
+                # ones which aren't in it yet are added to it as they're
+                # parsed.
+                log = historylog.HistoryLog(self._img.history.root_dir)
+                try:
+                        for entry in entries:
+                                # Yield each history entry object as it is
+                                # loaded.
+                                try:
+                                        yield history.History(
+                                            root_dir=self._img.history.root_dir,
+                                            filename=entry,
+                                            uuid_be_dic=uuid_be_dic, log=log)
+                                except apx.HistoryLoadException as e:
+                                        if e.parse_failure:
+                                                # Ignore corrupt entries.
+                                                continue
+                                        raise
+                finally:
+                        log.close()
 
         def get_linked_name(self):
                 """If the current image is a child image, this function
@@ -4789,6 +4799,8 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 self.__alt_sources = {}
 
                 self._img.cleanup_downloads()
+                if self._img.imageplan:
+                        self._img.imageplan.stop_prefetch()
                 # Cache transport statistics about problematic repo sources
                 repo_status = self._img.transport.repo_status
                 self._img.transport.shutdown()
@@ -71,7 +71,7 @@ from pkg.client.debugvalues import DebugValues
 from pkg.client.pkgdefs import *
 from pkg.misc import EmptyI, msg, emsg, PipeError
 
-CLIENT_API_VERSION = 83
+CLIENT_API_VERSION = 85
 PKG_CLIENT_NAME = "pkg"
 pkg_timer = pkg.misc.Timer("pkg client")
 SYSREPO_HIDDEN_URI = "<system-repository>"
@@ -2519,7 +2519,8 @@ examining the catalogs:\n""")
         return __prepare_json(err, errors=errors_json, data=data)
 
 def _verify(op, api_inst, pargs, omit_headers, parsable_version, quiet, verbose,
-    unpackaged, unpackaged_only, verify_paths, display_plan_cb=None, logger=None):
+    unpackaged, unpackaged_only, verify_paths, deep, display_plan_cb=None,
+    logger=None):
         """Determine if installed packages match manifests."""
 
         errors_json = []
@@ -2534,11 +2535,12 @@ def _verify(op, api_inst, pargs, omit_headers, parsable_version, quiet, verbose,
             _verbose=verbose, _parsable_version=parsable_version,
             _unpackaged=unpackaged, _unpackaged_only=unpackaged_only,
             _verify_paths=verify_paths, display_plan_cb=display_plan_cb,
-            logger=logger)
+            logger=logger, deep=deep)
 
 def _fix(op, api_inst, pargs, accept, backup_be, backup_be_name, be_activate,
     be_name, new_be, noexecute, omit_headers, parsable_version, quiet,
-    show_licenses, verbose, unpackaged, display_plan_cb=None, logger=None):
+    show_licenses, verbose, unpackaged, deep, display_plan_cb=None,
+    logger=None):
         """Fix packaging errors found in the image."""
 
         return __api_op(op, api_inst, args=pargs, _accept=accept,
@@ -2547,7 +2549,7 @@ def _fix(op, api_inst, pargs, accept, backup_be, backup_be_name, be_activate,
             backup_be_name=backup_be_name, be_activate=be_activate,
             be_name=be_name, new_be=new_be, _parsable_version=parsable_version,
             _unpackaged=unpackaged, display_plan_cb=display_plan_cb,
-            logger=logger)
+            logger=logger, deep=deep)
 
 def __refresh(api_inst, pubs, full_refresh=False):
         """Private helper method for refreshing publisher data."""
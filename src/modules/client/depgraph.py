@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Pre-parsed dependency information for the image's known catalog.
+
+The solver needs the depend and set actions from the dependency part of the
+catalog, and the variants they declare, for every package it considers.
+Rather than parse the action strings stored in the catalog on every solve,
+the image writes the parsed attributes of those actions to a file next to the
+known catalog whenever the catalog is rebuilt.  The file records the
+last-modified time of the catalog part it was built from, and is ignored if
+the catalog has changed since.
+
+The file is a JSON object of the form:
+
+    {
+        "version": 1,
+        "generation": <last-modified time of the dependency part>,
+        "packages": {
+            <publisher>: {
+                <stem>: {
+                    <version>: [
+                        <dict of variant name to values>,
+                        [[<action name>, <attrs>, <tagged>], ...]
+                    ]
+                }
+            }
+        }
+    }
+
+where 'tagged' is true for actions that have variant or facet attributes and
+so need to be checked against the image's excludes."""
+
+import datetime
+import errno
+import json
+import os
+import tempfile
+
+import pkg.actions
+import pkg.catalog
+import pkg.client.pkgdefs as pkgdefs
+import pkg.portable as portable
+
+FILENAME = "depgraph"
+VERSION = 1
+
+_BASE_PART = "catalog.base.C"
+_DEPS_PART = "catalog.dependency.C"
+
+
+def _generation(cat):
+        """Return the last-modified time of the dependency part of 'cat' as
+        a string, or None if it doesn't have one."""
+
+        lm = cat.parts.get(_DEPS_PART, {}).get("last-modified")
+        if isinstance(lm, datetime.datetime):
+                lm = pkg.catalog.datetime_to_basic_ts(lm)
+        return lm
+
+
+def _tagged(attrs):
+        for k in attrs:
+                if k.startswith("variant.") or k.startswith("facet."):
+                        return True
+        return False
+
+
+def build(cat, path):
+        """Write the dependency graph for the catalog 'cat' to 'path'.
+        Packages with action data that can't be parsed are omitted so that
+        the solver reports them as it would otherwise, as are those without
+        action data whose manifests the image would retrieve instead.
+        Failures to write the file due to lack of privileges or a read-only
+        file system are ignored."""
+
+        gen = _generation(cat)
+        base = cat.get_part(_BASE_PART, must_exist=True)
+        dp = cat.get_part(_DEPS_PART, must_exist=True)
+        if gen is None or base is None or dp is None:
+                return
+
+        # Packages from version 1 sources have all of their dependency
+        # information in the catalog, so those that don't have any entry in
+        # the dependency part have no dependency actions at all.
+        packages = {}
+        for (pub, stem, ver), entry in base.tuple_entries():
+                states = entry.get("metadata", {}).get("states", ())
+                if pkgdefs.PKG_STATE_V1 in states:
+                        packages.setdefault(pub, {}).setdefault(stem, {})[
+                            ver] = ({}, [])
+
+        for (pub, stem, ver), entry in dp.tuple_entries():
+                try:
+                        acts = [
+                            pkg.actions.fromstr(a)
+                            for a in entry["actions"]
+                        ]
+                except KeyError:
+                        # No action data; the catalog lazy-loads it.
+                        continue
+                except pkg.actions.ActionError:
+                        continue
+
+                variants = {}
+                deps = []
+                for a in acts:
+                        if a.name == "set" and \
+                            a.attrs["name"].startswith("variant"):
+                                variants[a.attrs["name"]] = a.attrs["value"]
+                        deps.append((a.name, a.attrs, _tagged(a.attrs)))
+                packages.setdefault(pub, {}).setdefault(stem, {})[ver] = \
+                    (variants, deps)
+
+        dirname = os.path.dirname(path)
+        try:
+                fd, tmp = tempfile.mkstemp(dir=dirname,
+                    prefix=os.path.basename(path) + ".")
+        except EnvironmentError as e:
+                if e.errno in (errno.EACCES, errno.EPERM, errno.EROFS):
+                        return
+                raise
+
+        try:
+                with os.fdopen(fd, "w") as fh:
+                        json.dump({
+                            "version": VERSION,
+                            "generation": gen,
+                            "packages": packages,
+                        }, fh)
+                os.chmod(tmp, 0o644)
+                portable.rename(tmp, path)
+        except:
+                try:
+                        os.unlink(tmp)
+                except EnvironmentError:
+                        pass
+                raise
+
+
+def load(cat, path):
+        """Return the DependencyGraph stored at 'path' for the catalog 'cat',
+        or None if it doesn't exist, can't be read, or is out of date."""
+
+        try:
+                with open(path) as fh:
+                        data = json.load(fh)
+        except (EnvironmentError, ValueError):
+                return None
+
+        if not isinstance(data, dict) or \
+            data.get("version") != VERSION or \
+            data.get("generation") != _generation(cat):
+                return None
+        return DependencyGraph(data["packages"])
+
+
+class DependencyGraph(object):
+        """The dependency information for the packages in a catalog, as
+        written by build()."""
+
+        def __init__(self, packages):
+                self.__packages = packages
+
+        def __entry(self, pfmri):
+                try:
+                        return self.__packages[pfmri.publisher][
+                            pfmri.pkg_name][str(pfmri.version)]
+                except KeyError:
+                        return None
+
+        def get_actions(self, pfmri, excludes):
+                """Return a list of the depend and set actions in the
+                dependency part of the catalog entry for 'pfmri' which are
+                allowed by 'excludes', or None if the graph doesn't have them.
+                As for the catalog, set actions for variants and facets are
+                never excluded."""
+
+                entry = self.__entry(pfmri)
+                if entry is None:
+                        return None
+
+                deps = entry[1]
+                if deps and len(deps[0]) == 3:
+                        # Actions are only created from their attributes the
+                        # first time they're needed.
+                        deps = entry[1] = [
+                            (pkg.actions.types[name](**attrs), tagged)
+                            for name, attrs, tagged in deps
+                        ]
+
+                pub = pfmri.publisher
+                return [
+                    a
+                    for a, tagged in deps
+                    if not tagged or
+                        (a.name == "set" and
+                        (a.attrs["name"].startswith("facet") or
+                        a.attrs["name"].startswith("variant"))) or
+                        a.include_this(excludes, publisher=pub)
+                ]
+
+        def get_variants(self, pfmri):
+                """Return a dict of the variants declared by 'pfmri', or None
+                if the graph doesn't have them."""
+
+                entry = self.__entry(pfmri)
+                if entry is None:
+                        return None
+                return entry[0]
@@ -36,6 +36,7 @@ import xml.dom.minidom as xmini
 import pkg
 import pkg.client.api_errors as apx
 import pkg.client.bootenv as bootenv
+import pkg.client.historylog as historylog
 import pkg.fmri as fmri
 import pkg.misc as misc
 import pkg.portable as portable
@@ -390,7 +391,8 @@ class History(object):
                         # Discard it now that it is no longer needed.
                         del ops[-1]
 
-        def __init__(self, root_dir=".", filename=None, uuid_be_dic=None):
+        def __init__(self, root_dir=".", filename=None, uuid_be_dic=None,
+            log=None):
                 """'root_dir' should be the path of the directory where the
                 history directory can be found (or created if it doesn't
                 exist).  'filename' should be the name of an XML file
@@ -399,6 +401,9 @@ class History(object):
                 information, as produced by
                 pkg.client.bootenv.BootEnv.get_uuid_be_dic(), otherwise that
                 method is called each time a History object is created.
+                'log', if supplied, should be the
+                pkg.client.historylog.HistoryLog of the image, to load the
+                history information from.
                 """
                 # Since this is a read-only attribute normally, we have to
                 # bypass our setattr override by calling object.
@@ -410,7 +415,8 @@ class History(object):
 
                 self.root_dir = root_dir
                 if filename:
-                        self.__load(filename, uuid_be_dic=uuid_be_dic)
+                        self.__load(filename, uuid_be_dic=uuid_be_dic,
+                            log=log)
 
         def __str__(self):
                 ops = self.__operations
@@ -465,19 +471,20 @@ class History(object):
                 object.__setattr__(self, "client_args", [])
                 self.__operations = []
 
-        def __load_client_data(self, node):
-                """Internal function to load the client data from the given XML
-                'node' object.
+        @staticmethod
+        def __client_record(node, client):
+                """Internal function to add the client data from the given XML
+                'node' object to the 'client' dictionary of a record.
                 """
-                self.client_name = node.getAttribute("name")
-                self.client_version = node.getAttribute("version")
+                client["name"] = node.getAttribute("name")
+                client["version"] = node.getAttribute("version")
                 try:
                         args = node.getElementsByTagName("args")[0]
                 except IndexError:
                         # There might not be any.
                         pass
                 else:
-                        ca = object.__getattribute__(self, "client_args")
+                        ca = client.setdefault("args", [])
                         for cnode in args.getElementsByTagName("arg"):
                                 try:
                                         ca.append(cnode.childNodes[0].wholeText)
@@ -487,42 +494,10 @@ class History(object):
                                         pass
 
         @staticmethod
-        def __load_operation_data(node, uuid_be_dic):
-                """Internal function to load the operation data from the given
-                XML 'node' object and return a _HistoryOperation object.
+        def __operation_record(node):
+                """Internal function to return the record of the operation data
+                from the given XML 'node' object.
                 """
-                op = _HistoryOperation()
-                op.name = node.getAttribute("name")
-                op.start_time = node.getAttribute("start_time")
-                op.end_time = node.getAttribute("end_time")
-                op.username = node.getAttribute("username")
-                op.userid = node.getAttribute("userid")
-                op.result = node.getAttribute("result").split(", ")
-
-                if len(op.result) == 1:
-                        op.result.append("None")
-
-                # older clients simply wrote "Nothing to do" instead of
-                # "Ignored, Nothing to do", so work around that
-                if op.result[0] == "Nothing to do":
-                        op.result = RESULT_NOTHING_TO_DO
-
-                if node.hasAttribute("be_uuid"):
-                        op.be_uuid = node.getAttribute("be_uuid")
-                if node.hasAttribute("new_be_uuid"):
-                        op.new_be_uuid = node.getAttribute("new_be_uuid")
-                if node.hasAttribute("be"):
-                        op.be = node.getAttribute("be")
-                        if op.be_uuid:
-                                op.current_be = uuid_be_dic.get(op.be_uuid,
-                                    op.be)
-                if node.hasAttribute("new_be"):
-                        op.new_be = node.getAttribute("new_be")
-                        if op.new_be_uuid:
-                                op.current_new_be = uuid_be_dic.get(
-                                    op.new_be_uuid, op.new_be)
-                if node.hasAttribute("release-notes"):
-                        op.release_notes = node.getAttribute("release-notes")
 
                 def get_node_values(parent_name, child_name=None):
                         try:
@@ -542,16 +517,81 @@ class History(object):
                                 return []
                         return
 
-                op.start_state = get_node_values("start_state")
-                op.end_state = get_node_values("end_state")
-                op.errors.extend(get_node_values("errors", child_name="error"))
+                return {
+                    "attrs": dict(node.attributes.items()),
+                    "start_state": get_node_values("start_state"),
+                    "end_state": get_node_values("end_state"),
+                    "errors": get_node_values("errors", child_name="error"),
+                }
+
+        @classmethod
+        def _xml_record(cls, root):
+                """Returns the history information in the given XML document
+                element 'root' as a dictionary which can be stored in a
+                pkg.client.historylog.HistoryLog.
+                """
+
+                client = {}
+                ops = []
+                for cnode in root.childNodes:
+                        if cnode.nodeName == "client":
+                                cls.__client_record(cnode, client)
+                        elif cnode.nodeName == "operation":
+                                ops.append(cls.__operation_record(cnode))
+                return { "client": client, "operations": ops }
+
+        @staticmethod
+        def __load_operation_data(rec, uuid_be_dic):
+                """Internal function to load the operation data from the given
+                operation record and return a _HistoryOperation object.
+                """
+                attrs = rec["attrs"]
+                op = _HistoryOperation()
+                op.name = attrs.get("name", "")
+                op.start_time = attrs.get("start_time", "")
+                op.end_time = attrs.get("end_time", "")
+                op.username = attrs.get("username", "")
+                op.userid = attrs.get("userid", "")
+                op.result = attrs.get("result", "").split(", ")
+
+                if len(op.result) == 1:
+                        op.result.append("None")
+
+                # older clients simply wrote "Nothing to do" instead of
+                # "Ignored, Nothing to do", so work around that
+                if op.result[0] == "Nothing to do":
+                        op.result = RESULT_NOTHING_TO_DO
+
+                if "be_uuid" in attrs:
+                        op.be_uuid = attrs["be_uuid"]
+                if "new_be_uuid" in attrs:
+                        op.new_be_uuid = attrs["new_be_uuid"]
+                if "be" in attrs:
+                        op.be = attrs["be"]
+                        if op.be_uuid:
+                                op.current_be = uuid_be_dic.get(op.be_uuid,
+                                    op.be)
+                if "new_be" in attrs:
+                        op.new_be = attrs["new_be"]
+                        if op.new_be_uuid:
+                                op.current_new_be = uuid_be_dic.get(
+                                    op.new_be_uuid, op.new_be)
+                if "release-notes" in attrs:
+                        op.release_notes = attrs["release-notes"]
+
+                op.start_state = rec["start_state"]
+                op.end_state = rec["end_state"]
+                op.errors.extend(rec["errors"])
 
                 return op
 
-        def __load(self, filename, uuid_be_dic=None):
+        def __load(self, filename, uuid_be_dic=None, log=None):
                 """Loads the history from a file located in self.path/history/
                 {filename}.  The file should contain a serialized history
-                object in XML format.
+                object in XML format.  If 'log' is a
+                pkg.client.historylog.HistoryLog, the history is loaded from
+                it instead if it holds the file's entry, and added to it if
+                not.
                 """
 
                 # Ensure all previous information is discarded.
@@ -565,20 +605,31 @@ class History(object):
 
                 try:
                         pathname = os.path.join(self.path, filename)
-                        d = xmini.parse(pathname)
-                        root = d.documentElement
-                        for cnode in root.childNodes:
-                                if cnode.nodeName == "client":
-                                        self.__load_client_data(cnode)
-                                elif cnode.nodeName == "operation":
-                                        # Operations load differently due to
-                                        # the stack.
-                                        self.__operations.append({
-                                            "pathname": pathname,
-                                            "operation":
-                                                self.__load_operation_data(
-                                                cnode, uuid_be_dic)
-                                            })
+                        name = os.path.basename(filename)
+                        record = None
+                        if log is not None:
+                                record = log.get(name)
+                        if record is None:
+                                d = xmini.parse(pathname)
+                                record = self._xml_record(d.documentElement)
+                                if log is not None:
+                                        log.add(name, record)
+
+                        client = record["client"]
+                        if client:
+                                self.client_name = client["name"]
+                                self.client_version = client["version"]
+                                object.__getattribute__(self,
+                                    "client_args").extend(
+                                    client.get("args", []))
+                        for rec in record["operations"]:
+                                # Operations load differently due to the
+                                # stack.
+                                self.__operations.append({
+                                    "pathname": pathname,
+                                    "operation": self.__load_operation_data(
+                                        rec, uuid_be_dic)
+                                    })
                 except KeyboardInterrupt:
                         raise
                 except Exception as e:
@@ -715,6 +766,12 @@ class History(object):
                                 d.writexml(f,
                                     encoding=sys.getdefaultencoding())
                                 f.close()
+                                # Record the entry as it will be read back
+                                # from the file.
+                                historylog.HistoryLog(self.root_dir).add(
+                                    os.path.basename(pathname),
+                                    self._xml_record(xmini.parseString(
+                                    d.toxml()).documentElement))
                                 return
                         except EnvironmentError as e:
                                 if e.errno == errno.EEXIST:
@@ -744,14 +801,16 @@ class History(object):
 
         def purge(self, be_name=None, be_uuid=None):
                 """Removes all history information by deleting the directory
-                indicated by the value self.path and then creates a new history
-                entry to record that this purge occurred.
+                indicated by the value self.path and the log of its entries,
+                and then creates a new history entry to record that this purge
+                occurred.
                 """
                 self.operation_name = "purge-history"
                 self.operation_be = be_name
                 self.operation_be_uuid = be_uuid
 
                 try:
+                        historylog.HistoryLog(self.root_dir).remove()
                         shutil.rmtree(self.path)
                 except KeyboardInterrupt:
                         raise
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""An append-only log of the history entries of an image.
+
+Each operation recorded by pkg.client.history is written to its own XML file
+in the history directory; those files remain the canonical, compatible form
+of the history, but parsing them is slow once there are thousands.  The log
+holds the same information in a form which is quick to load, so that only
+the XML files which aren't in it yet need to be parsed.  It is stored next
+to the history directory, which is left to the XML files:
+
+    history.log         the JSON record of each entry, one after the other
+    history.log.idx     the name of the XML file of each entry and the
+                        offset and length of its record in history.log
+
+Both files are only ever appended to, with the index locked, so they can be
+read without locking; records which are incomplete, or which were written
+after the index was read, are ignored.  As the XML file names sort by the
+start time of their operations, the names in the history directory still
+give the order of the entries and select them for time and limit queries,
+and only the selected entries are read from the log."""
+
+import errno
+import fcntl
+import json
+import os
+import struct
+
+import pkg.misc as misc
+
+LOG_NAME = "history.log"
+INDEX_NAME = LOG_NAME + ".idx"
+
+# The name of the XML file of an entry, which is the start time of its
+# operation and a sequence number ("20260101T000000Z-01.xml"), and the
+# offset and length of its record.
+_NAME_LEN = 32
+_ENTRY = struct.Struct("<{0:d}sQI".format(_NAME_LEN))
+
+
+class HistoryLog(object):
+        """The log of the history entries of an image, stored in 'root_dir',
+        the directory which contains its history directory."""
+
+        def __init__(self, root_dir):
+                self.root_dir = root_dir
+                self.__log_path = os.path.join(root_dir, LOG_NAME)
+                self.__idx_path = os.path.join(root_dir, INDEX_NAME)
+                self.__entries = None
+                self.__fh = None
+
+        def __load_index(self):
+                entries = {}
+                try:
+                        with open(self.__idx_path, "rb") as f:
+                                data = f.read()
+                except EnvironmentError:
+                        # The XML files will be read instead.
+                        data = b""
+                # Ignore any incomplete entry at the end of the index.
+                data = data[:len(data) - len(data) % _ENTRY.size]
+                for name, off, length in _ENTRY.iter_unpack(data):
+                        entries[name.rstrip(b"\0").decode("utf-8")] = \
+                            (off, length)
+                self.__entries = entries
+
+        def __contains__(self, name):
+                if self.__entries is None:
+                        self.__load_index()
+                return name in self.__entries
+
+        def get(self, name):
+                """Return the record of the entry whose XML file is 'name', or
+                None if it isn't in the log."""
+
+                if self.__entries is None:
+                        self.__load_index()
+                try:
+                        off, length = self.__entries[name]
+                except KeyError:
+                        return None
+
+                try:
+                        if not self.__fh:
+                                self.__fh = open(self.__log_path, "rb")
+                        self.__fh.seek(off)
+                        data = self.__fh.read(length)
+                except EnvironmentError:
+                        return None
+                if len(data) != length:
+                        return None
+                try:
+                        return json.loads(data.decode("utf-8"))
+                except ValueError:
+                        return None
+
+        def add(self, name, record):
+                """Append 'record' to the log as the entry whose XML file is
+                'name'.  Since the XML file holds the same information, nothing
+                is written if the log can't be written to."""
+
+                bname = name.encode("utf-8")
+                if len(bname) > _NAME_LEN:
+                        # Not the name of an XML file written by History.
+                        return
+                data = json.dumps(record).encode("utf-8")
+                try:
+                        entry = self.__append(bname, data)
+                except EnvironmentError:
+                        return
+                if self.__entries is not None:
+                        self.__entries[name] = entry
+
+        def __append(self, name, data):
+                fd = os.open(self.__idx_path,
+                    os.O_RDWR|os.O_APPEND|os.O_CREAT, misc.PKG_FILE_MODE)
+                try:
+                        fcntl.lockf(fd, fcntl.LOCK_EX)
+                        # Discard any incomplete entry left by a writer which
+                        # was interrupted.
+                        size = os.fstat(fd).st_size
+                        if size % _ENTRY.size:
+                                os.ftruncate(fd, size - size % _ENTRY.size)
+
+                        lfd = os.open(self.__log_path,
+                            os.O_WRONLY|os.O_CREAT, misc.PKG_FILE_MODE)
+                        try:
+                                off = os.lseek(lfd, 0, os.SEEK_END)
+                                written = 0
+                                while written < len(data):
+                                        written += os.write(lfd,
+                                            data[written:])
+                        finally:
+                                os.close(lfd)
+                        os.write(fd, _ENTRY.pack(name, off, len(data)))
+                finally:
+                        os.close(fd)
+                return off, len(data)
+
+        def remove(self):
+                """Remove the log, as when the history is purged."""
+
+                self.close()
+                self.__entries = None
+                for path in (self.__idx_path, self.__log_path):
+                        try:
+                                os.unlink(path)
+                        except EnvironmentError as e:
+                                if e.errno != errno.ENOENT:
+                                        raise
+
+        def close(self):
+                if self.__fh:
+                        self.__fh.close()
+                        self.__fh = None
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -32,6 +32,9 @@ import copy
 import datetime
 import errno
 import hashlib
+import heapq
+import multiprocessing
+import operator
 import os
 import platform
 import shutil
@@ -43,24 +46,29 @@ import time
 import re as relib
 
 from contextlib import contextmanager
+from multiprocessing.pool import AsyncResult
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from six.moves.urllib.parse import quote, unquote
 
 import pkg.actions
 import pkg.catalog
+import pkg.client.actoffsets            as actoffsets
 import pkg.client.api_errors            as apx
 import pkg.client.bootenv               as bootenv
+import pkg.client.depgraph              as depgraph
 import pkg.client.history               as history
 import pkg.client.imageconfig           as imageconfig
 import pkg.client.imageplan             as imageplan
 import pkg.client.linkedimage           as li
+import pkg.client.manifestcache         as manifestcache
 import pkg.client.pkgdefs               as pkgdefs
 import pkg.client.pkgplan               as pkgplan
 import pkg.client.plandesc              as plandesc
 import pkg.client.progress              as progress
 import pkg.client.publisher             as publisher
 import pkg.client.sigpolicy             as sigpolicy
+import pkg.client.verifycache           as verifycache
 import pkg.client.transport.transport   as transport
 import pkg.config                       as cfg
 import pkg.file_layout.layout           as fl
@@ -68,6 +76,7 @@ import pkg.fmri
 import pkg.json                         as json
 import pkg.lockfile                     as lockfile
 import pkg.manifest                     as manifest
+import pkg.manifestpack                 as manifestpack
 import pkg.mediator                     as med
 import pkg.misc                         as misc
 import pkg.nrlock
@@ -90,6 +99,11 @@ img_root_prefix = "var/pkg"
 
 IMG_PUB_DIR = "publisher"
 
+# The state shared with the worker processes used to verify file contents; see
+# Image.verify_pkgs().  It's set before the workers are forked so that it
+# doesn't need to be sent to them.
+_verify_state = None
+
 class Image(object):
         """An Image object is a directory tree containing the laid-down contents
         of a self-consistent graph of Packages.
@@ -196,9 +210,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 self.__lock = pkg.nrlock.NRLock()
                 self.__lockfile = None
+                self.__manifest_packs = {}
                 self.__sig_policy = None
                 self.__trust_anchors = None
                 self.__bad_trust_anchors = []
+                self.__verify_cache = None
 
                 # cache for presence of boot-archive
                 self.__boot_archive = None
@@ -379,6 +395,17 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                     for p, e in self.__bad_trust_anchors
                 ]
 
+        @property
+        def verify_cache(self):
+                """The VerifyCache holding the results of previous content
+                verification of the image's files."""
+
+                if self.__verify_cache is None:
+                        self.__verify_cache = verifycache.VerifyCache(
+                            os.path.join(self.__action_cache_dir,
+                            "verify.cache"))
+                return self.__verify_cache
+
         @property
         def write_cache_path(self):
                 """The path to the filesystem that holds the write cache--used
@@ -923,6 +950,8 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 self.cfg.set_property("image", "version", self.version)
 
                 # Remaining dirs may now be set.
+                self.__manifest_packs = {}
+                self.__discard_manifests()
                 if self.version == self.CURRENT_VERSION:
                         self.__tmpdir = os.path.join(self.imgdir, "cache",
                             "tmp")
@@ -2303,6 +2332,16 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 'kwargs' is a dict of additional keyword arguments to be passed
                 to each action verification routine."""
 
+                return self.__verify(fmri, progresstracker, verifypaths,
+                    overlaypaths, single_act, None, **kwargs)
+
+        def __verify(self, fmri, progresstracker, verifypaths, overlaypaths,
+            single_act, pool, **kwargs):
+                """Implements verify().  If 'pool' is not None, the contents
+                of file actions are verified by it and the errors element of
+                the tuples returned for them is the pending AsyncResult of
+                _verify_action() instead; see verify_pkgs()."""
+
                 path_only = bool(verifypaths or overlaypaths)
                 # pkg verify only looks at actions that have not been dehydrated.
                 excludes = self.list_excludes()
@@ -2418,6 +2457,14 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                                 # mediation, so shouldn't be verified.
                                 continue
 
+                        if pool is not None and act.name == "file" and \
+                            act.include_this(excludes,
+                            publisher=fmri.publisher):
+                                yield act, pool.apply_async(
+                                    Image._verify_action,
+                                    ((str(act), str(fmri)),)), None, None, None
+                                continue
+
                         errors, warnings, info, ignore = self.__process_verify(
                             act, path, path_only, fmri, excludes,
                             vardrate_excludes, progresstracker,
@@ -2426,6 +2473,94 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         if (errors or warnings or info) and not ignore:
                                 yield act, errors, warnings, info, None
 
+        @staticmethod
+        def _verify_action(task):
+                """Verify a file action in a worker process.  'task' is a
+                tuple of the action and package FMRI strings.  Returns a tuple
+                of the errors, warnings and info lists, whether the action
+                needs to be replaced and the resulting changes to the
+                verification cache."""
+
+                img, kwargs = _verify_state
+                actstr, fmristr = task
+                act = pkg.actions.fromstr(actstr)
+                errors, warnings, info = act.verify(img,
+                    pfmri=pkg.fmri.PkgFmri(fmristr), **kwargs)
+                return errors, warnings, info, act.replace_required, \
+                    img.verify_cache.pop_updates()
+
+        def __collect_verify(self, entries):
+                """Wait for the pending results in the list of verify()
+                tuples 'entries' and return the list of tuples with messages."""
+
+                res = []
+                for act, errors, warnings, info, overlay in entries:
+                        if isinstance(errors, AsyncResult):
+                                errors, warnings, info, replace, updates = \
+                                    errors.get()
+                                if replace:
+                                        act.replace_required = True
+                                self.verify_cache.merge(updates)
+                                if not (errors or warnings or info):
+                                        continue
+                        res.append((act, errors, warnings, info, overlay))
+                return res
+
+        def verify_pkgs(self, fmris, progresstracker, verifypaths=None,
+            overlaypaths=None, **kwargs):
+                """Generator that returns a tuple of the form (fmri, entries)
+                for each of the packages in 'fmris' in order, where 'entries'
+                is an iterable of the tuples verify() returns for the package.
+                The arguments are otherwise the same as for verify().
+
+                If global_settings.client_workers allows it, the contents of
+                the packages' files are verified by a pool of worker processes
+                a limited number of packages ahead of the caller.  Otherwise,
+                and when verifying paths, each package is only verified as
+                its entries are consumed."""
+
+                workers = global_settings.client_workers
+                if verifypaths or overlaypaths or workers < 2 or \
+                    "fork" not in multiprocessing.get_all_start_methods():
+                        for pfmri in fmris:
+                                yield pfmri, self.verify(pfmri,
+                                    progresstracker, verifypaths=verifypaths,
+                                    overlaypaths=overlaypaths, **kwargs)
+                        return
+
+                def ready(entries):
+                        return all(
+                            e[1].ready()
+                            for e in entries
+                            if isinstance(e[1], AsyncResult)
+                        )
+
+                # Load the verification cache now so that the workers don't
+                # each have to.
+                self.verify_cache.load()
+
+                global _verify_state
+                _verify_state = (self, kwargs)
+                pool = multiprocessing.get_context("fork").Pool(workers)
+                pending = collections.deque()
+                try:
+                        for pfmri in fmris:
+                                pending.append((pfmri, list(self.__verify(
+                                    pfmri, progresstracker, verifypaths,
+                                    overlaypaths, None, pool, **kwargs))))
+                                while pending and (len(pending) > 2 * workers
+                                    or ready(pending[0][1])):
+                                        pfmri, entries = pending.popleft()
+                                        yield pfmri, \
+                                            self.__collect_verify(entries)
+                        while pending:
+                                pfmri, entries = pending.popleft()
+                                yield pfmri, self.__collect_verify(entries)
+                finally:
+                        _verify_state = None
+                        pool.terminate()
+                        pool.join()
+
         def image_config_update(self, new_variants, new_facets, new_mediators):
                 """update variants in image config"""
 
@@ -2498,6 +2633,24 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         root = self.imgdir
                 return os.path.join(root, "pkg", pfmri.get_dir_path())
 
+        def get_manifest_pack(self, pfmri):
+                """Return the pkg.manifestpack.ManifestPack which holds the
+                on-disk manifest caches of the publisher of 'pfmri', or None
+                if the image stores them in the manifest cache directory."""
+
+                if self.version != self.CURRENT_VERSION:
+                        return None
+                prefix = pfmri.publisher
+                if not prefix:
+                        prefix = self.__get_installed_pkg_publisher(pfmri)
+                assert prefix
+                pack = self.__manifest_packs.get(prefix)
+                if not pack:
+                        pack = manifestpack.ManifestPack(
+                            self._get_publisher_cache_root(prefix))
+                        self.__manifest_packs[prefix] = pack
+                return pack
+
         def get_manifest_path(self, pfmri):
                 """Return path to on-disk manifest file."""
                 if not pfmri.publisher:
@@ -2525,7 +2678,8 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         ret = manifest.FactoredManifest(fmri,
                             self.get_manifest_dir(fmri),
                             excludes=excludes,
-                            pathname=self.get_manifest_path(fmri))
+                            pathname=self.get_manifest_path(fmri),
+                            pack=self.get_manifest_pack(fmri))
 
                         # if we have a intent string, let depot
                         # know for what we're using the cached manifest
@@ -2562,13 +2716,21 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 if ignore_excludes:
                         excludes = EmptyI
+                        varcets = None
                 else:
                         excludes = [self.cfg.variants.allow_action,
                             self.cfg.facets.allow_action]
+                        # The variants and facets may be changed in place, so
+                        # the cache key needs their values.
+                        varcets = (frozenset(six.iteritems(self.cfg.variants)),
+                            tuple(self.cfg.facets.items()))
 
+                key = (self.imgdir, str(fmri), tuple(excludes), varcets,
+                    intent)
                 try:
-                        m = self.__get_manifest(fmri, excludes=excludes,
-                            intent=intent, alt_pub=alt_pub)
+                        m = manifestcache.cache.get(key, excludes,
+                            lambda: self.__get_manifest(fmri,
+                            excludes=excludes, intent=intent, alt_pub=alt_pub))
                 except apx.ActionExecutionError as e:
                         raise
                 except pkg.actions.ActionError as e:
@@ -2576,6 +2738,12 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 return m
 
+        def __discard_manifests(self):
+                """Discard the cached manifests of this image."""
+
+                imgdir = self.imgdir
+                manifestcache.cache.discard(lambda k: k[0] == imgdir)
+
         def __catalog_save(self, cats, pfmris, progtrack):
 
                 # Temporarily redirect the catalogs to a different location,
@@ -2818,9 +2986,14 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 # 'Updating package cache'
                 progtrack.job_start(progtrack.JOB_PKG_CACHE, goal=len(removed))
+                if removed:
+                        self.__discard_manifests()
                 for pfmri in removed:
                         mcdir = self.get_manifest_dir(pfmri)
                         manifest.FactoredManifest.clear_cache(mcdir)
+                        pack = self.get_manifest_pack(pfmri)
+                        if pack:
+                                pack.remove(pfmri)
 
                         # Remove package cache directory if possible; we don't
                         # care if it fails.
@@ -2881,6 +3054,20 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 return cat
 
+        def get_dependency_graph(self):
+                """Returns a DependencyGraph of the pre-parsed dependency
+                information for the packages in the known catalog, or None if
+                it isn't available or the catalog has changed since it was
+                written."""
+
+                kcat = self.get_catalog(self.IMG_CATALOG_KNOWN)
+                if self.__alt_pkg_sources_loaded or not kcat.meta_root:
+                        # Alternate package sources are only applied to the
+                        # catalog in memory.
+                        return None
+                return depgraph.load(kcat, os.path.join(kcat.meta_root,
+                    depgraph.FILENAME))
+
         def _manifest_cb(self, cat, f):
                 # Only allow lazy-load for packages from non-v1 sources.
                 # Assume entries for other sources have all data
@@ -3411,6 +3598,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         cat.finalize(pfmris=final_fmris)
                         cat.save()
 
+                # Save the dependency information the solver needs from the
+                # new known catalog in a form that's quicker to load.
+                depgraph.build(kcat, os.path.join(kcat.meta_root,
+                    depgraph.FILENAME))
+
                 # Next, preserve the old installed state dir, rename the
                 # new one into place, and then remove the old one.
                 orig_state_root = self.salvage(self._statedir, full_path=True)
@@ -3639,6 +3831,8 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                                 # Finally, dump any cache data for this
                                 # publisher if possible.
+                                self.__manifest_packs.pop(pub.prefix, None)
+                                self.__discard_manifests()
                                 shutil.rmtree(self._get_publisher_cache_root(
                                     pub.prefix), ignore_errors=True)
                         except EnvironmentError as e:
@@ -3708,12 +3902,6 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 self.__actdict = None
                 self.__actdict_timestamp = None
-                stripped_path = os.path.join(self.__action_cache_dir,
-                    "actions.stripped")
-                offsets_path = os.path.join(self.__action_cache_dir,
-                    "actions.offsets")
-                conflicting_keys_path = os.path.join(self.__action_cache_dir,
-                    "keys.conflicting")
 
                 excludes = self.list_excludes()
                 heap = []
@@ -3747,74 +3935,277 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
                 progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
 
+                bad_keys = imageplan.ImagePlan._check_actions(nsd)
+                nsd = None
+
+                progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
+
+                def gen_groups():
+                        last_name, last_key, lines = None, None, []
+                        while heap:
+                                # This is a tight loop, so try to avoid burning
+                                # CPU calling into the progress tracker
+                                # excessively.
+                                if len(heap) % 100 == 0:
+                                        progtrack.job_add_progress(
+                                            progtrack.JOB_FAST_LOOKUP)
+                                name, key, fmri, act = heappop(heap)
+                                if lines and (name != last_name or
+                                    key != last_key):
+                                        yield last_name, last_key, lines
+                                        lines = []
+                                last_name, last_key = name, key
+                                lines.append("{0} {1}\n".format(fmri,
+                                    act).encode("utf-8"))
+                        if lines:
+                                yield last_name, last_key, lines
+
+                actdict, timestamp = self.__write_fast_lookups(gen_groups(),
+                    bad_keys, progtrack)
+                self.__remove_prev_fast_lookups()
+                progtrack.job_done(progtrack.JOB_FAST_LOOKUP)
+                return actdict, timestamp
+
+        def _update_fast_lookups(self, removed, added, progtrack=None):
+                """Update the on-disk database described in
+                _create_fast_lookups() to reflect the removal of the packages
+                in 'removed' and the installation of the packages in 'added'.
+
+                The database set aside by _remove_fast_lookups() is used as the
+                basis for the update, so only the manifests of the packages in
+                'added' need to be loaded and only the keys touched by the
+                operation (or previously conflicting) are checked again for
+                conflicts.  If no previous database is available, or its files
+                aren't coordinated, the database is rebuilt from scratch
+                instead."""
+
+                if not progtrack:
+                        progtrack = progress.NullProgressTracker()
+
+                prev = self.__load_prev_fast_lookups()
+                if prev is None:
+                        return self._create_fast_lookups(
+                            progtrack=progtrack)
+
+                self.__actdict = None
+                self.__actdict_timestamp = None
+
+                old_groups, old_lines, old_bad_keys = prev
+                prev = None
+                excludes = self.list_excludes()
+
+                progtrack.job_start(progtrack.JOB_FAST_LOOKUP)
+
+                # Gather the stripped actions delivered by the new packages,
+                # grouped by action name and key.
+                new = {}
+                for pfmri in added:
+                        progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
+                        m = self.get_manifest(pfmri, ignore_excludes=True)
+                        for act in m.gen_actions(excludes=excludes):
+                                if not act.globally_identical:
+                                        continue
+                                act.strip()
+                                new.setdefault((act.name,
+                                    act.attrs[act.key_attr]), []).append(
+                                    (pfmri, "{0} {1}\n".format(pfmri,
+                                    act).encode("utf-8")))
+
+                progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
+
+                # Merge the previous groups, minus the actions delivered by the
+                # packages being removed, with the new ones.  Both are ordered
+                # by action name and key, just as _create_fast_lookups orders
+                # them.
+                removed = frozenset(
+                    str(f).encode("utf-8") for f in removed
+                )
+                fmri_dict = {}
+                def get_fmri(fmristr):
+                        try:
+                                return fmri_dict[fmristr]
+                        except KeyError:
+                                pfmri = pkg.fmri.PkgFmri(
+                                    misc.force_str(fmristr))
+                                fmri_dict[fmristr] = pfmri
+                                return pfmri
+
+                affected = set(old_bad_keys)
+                groups = []
+                for name, key, first, cnt in heapq.merge(old_groups,
+                    ((n, k, None, 0) for n, k in sorted(new)),
+                    key=operator.itemgetter(0, 1)):
+                        if len(groups) % 100 == 0:
+                                progtrack.job_add_progress(
+                                    progtrack.JOB_FAST_LOOKUP)
+                        if first is None:
+                                if (name, key) not in new:
+                                        # Already merged with the previous
+                                        # contents of the group.
+                                        continue
+                                lines = []
+                        else:
+                                lines = old_lines[first:first + cnt]
+                                if removed:
+                                        lines = [
+                                            l for l in lines
+                                            if l.split(None, 1)[0] not in
+                                                removed
+                                        ]
+                                        if len(lines) != cnt:
+                                                affected.add(key)
+
+                        entries = new.pop((name, key), None)
+                        if entries:
+                                affected.add(key)
+                                entries.extend(
+                                    (get_fmri(l.split(None, 1)[0]), l)
+                                    for l in lines
+                                )
+                                entries.sort()
+                                lines = [l for f, l in entries]
+                        if lines:
+                                groups.append((name, key, lines))
+                old_groups = old_lines = None
+
+                progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
+
+                # Only the keys which were conflicting before or whose actions
+                # changed can have changed their conflict state.
+                nsd = {}
+                for name, key, lines in groups:
+                        if key not in affected:
+                                continue
+                        for l in lines:
+                                fmristr, actstr = l.split(None, 1)
+                                act = pkg.actions.fromstr(
+                                    misc.force_str(actstr).rstrip())
+                                nsd.setdefault(act.namespace_group,
+                                    {}).setdefault(key, []).append(
+                                    (act, get_fmri(fmristr)))
+                bad_keys = imageplan.ImagePlan._check_actions(nsd)
+                nsd = fmri_dict = None
+
+                progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
+
+                actdict, timestamp = self.__write_fast_lookups(groups,
+                    bad_keys, progtrack)
+                self.__remove_prev_fast_lookups()
+                progtrack.job_done(progtrack.JOB_FAST_LOOKUP)
+                return actdict, timestamp
+
+        def __load_prev_fast_lookups(self):
+                """Load the fast lookups database set aside by
+                _remove_fast_lookups().  Returns a tuple of (groups, lines,
+                bad_keys) where 'groups' is a list of (action name, key, index,
+                count) tuples, ordered by action name and key, describing the
+                slice of 'lines' (the raw lines of the stripped actions file)
+                which holds each group, and 'bad_keys' is the set of keys which
+                were conflicting.  If the database doesn't exist or its files
+                aren't coordinated, None is returned."""
+
+                def prev_path(fname):
+                        return os.path.join(self.__action_cache_dir,
+                            fname + ".prev")
+
+                try:
+                        actdict = actoffsets.ActionOffsets(
+                            prev_path("actions.offsets"))
+                        oversion = actdict.version
+                        otimestamp = actdict.timestamp
+                        # The index is ordered by lookup key; the groups are
+                        # needed in the order they're stored.
+                        offsets = sorted(actdict, key=operator.itemgetter(2))
+                        actdict.close()
+                        with open(prev_path("actions.stripped"), "rb") as sf:
+                                sversion = misc.force_str(
+                                    sf.readline().rstrip())
+                                stimestamp = misc.force_str(
+                                    sf.readline().rstrip())
+                                start = sf.tell()
+                                lines = sf.readlines()
+                        with open(prev_path("keys.conflicting"), "r") as bf:
+                                bversion = bf.readline().rstrip()
+                                bad_keys = set(l.rstrip() for l in bf)
+                except EnvironmentError as e:
+                        if e.errno == errno.ENOENT:
+                                return None
+                        raise apx._convert_error(e)
+
+                if oversion != actoffsets.VERSION or \
+                    sversion != "VERSION 1" or bversion != "VERSION 1" or \
+                    stimestamp != otimestamp:
+                        return None
+
+                # The groups are stored contiguously and in order, so the
+                # offsets can be translated into line indices; verify that as
+                # we go rather than trusting it.
+                groups = []
+                idx = 0
+                offset = start
+                for actname, key, off, cnt in offsets:
+                        if off != offset or idx + cnt > len(lines):
+                                return None
+                        groups.append((actname, key, idx, cnt))
+                        offset += sum(len(l) for l in lines[idx:idx + cnt])
+                        idx += cnt
+                if idx != len(lines):
+                        return None
+                return groups, lines, bad_keys
+
+        def __write_fast_lookups(self, groups, bad_keys, progtrack):
+                """Write the files comprising the database described in
+                _create_fast_lookups() and move them into place.  'groups' is
+                an iterable of (action name, key, lines) tuples, ordered by
+                action name and key, where 'lines' is a list of encoded lines
+                of the stripped actions file.  'bad_keys' is the set of keys
+                with conflicting actions.  Returns a tuple of the
+                ActionOffsets index of the stripped actions and the timestamp
+                coordinating the files."""
+
+                stripped_path = os.path.join(self.__action_cache_dir,
+                    "actions.stripped")
+                offsets_path = os.path.join(self.__action_cache_dir,
+                    "actions.offsets")
+                conflicting_keys_path = os.path.join(self.__action_cache_dir,
+                    "keys.conflicting")
+
                 # If we can't write the temporary files, then there's no point
                 # in producing actdict because it depends on a synchronized
                 # stripped actions file.
                 try:
-                        actdict = {}
+                        entries = []
                         sf, sp = self.temporary_file(close=False)
                         of, op = self.temporary_file(close=False)
                         bf, bp = self.temporary_file(close=False)
 
-                        sf = os.fdopen(sf, "w")
-                        of = os.fdopen(of, "w")
+                        sf = os.fdopen(sf, "wb")
+                        of = os.fdopen(of, "wb")
                         bf = os.fdopen(bf, "w")
 
                         # We need to make sure the files are coordinated.
-                        timestamp = int(time.time())
-                        sf.write("VERSION 1\n{0}\n".format(timestamp))
-                        of.write("VERSION 2\n{0}\n".format(timestamp))
+                        timestamp = str(int(time.time()))
+                        sf.write("VERSION 1\n{0}\n".format(
+                            timestamp).encode("utf-8"))
                         # The conflicting keys file doesn't need a timestamp
                         # because it's not coordinated with the stripped or
                         # offsets files and the result of loading it isn't
                         # reused by this class.
                         bf.write("VERSION 1\n")
 
-                        cnt, offset_update_bytes = 0, 0
-                        last_name, last_key, last_offset = None, None, sf.tell()
-                        while heap:
-                                # This is a tight loop, so try to avoid burning
-                                # CPU calling into the progress tracker
-                                # excessively.
-                                if len(heap) % 100 == 0:
-                                        progtrack.job_add_progress(
-                                            progtrack.JOB_FAST_LOOKUP)
-                                item = heappop(heap)
-                                fmri, act = item[2:]
-                                key = act.attrs[act.key_attr]
-                                if act.name != last_name or key != last_key:
-                                        if last_name is None:
-                                                assert last_key is None
-                                                cnt += 1
-                                                last_name = act.name
-                                                last_key = key
-                                        else:
-                                                assert cnt > 0
-                                                of.write("{0} {1} {2} {3}\n".format(
-                                                    last_name, last_offset,
-                                                    cnt, last_key))
-                                                actdict[(last_name, last_key)] = last_offset, cnt
-                                                last_name, last_key = act.name, key
-                                                last_offset += offset_update_bytes
-                                                offset_update_bytes = 0
-                                                cnt = 1
-                                else:
-                                        cnt += 1
-                                sf_line = f"{fmri} {act}\n"
-                                sf.write(sf_line)
-                                offset_update_bytes += len(sf_line.encode('utf-8'))
-                        if last_name is not None:
-                                assert last_key is not None
-                                assert last_offset is not None
+                        offset = sf.tell()
+                        for name, key, lines in groups:
+                                cnt = len(lines)
                                 assert cnt > 0
-                                of.write("{0} {1} {2} {3}\n".format(
-                                    last_name, last_offset, cnt, last_key))
-                                actdict[(last_name, last_key)] = \
-                                    last_offset, cnt
+                                entries.append((name, key, offset, cnt))
+                                sf.writelines(lines)
+                                offset += sum(len(l) for l in lines)
 
                         progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
 
-                        bad_keys = imageplan.ImagePlan._check_actions(nsd)
+                        actoffsets.write(of, timestamp, entries)
+                        entries = None
+
                         for k in sorted(bad_keys):
                                 bf.write("{0}\n".format(k))
 
@@ -3868,33 +4259,54 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                                 six.reraise(exc_info[0], exc_info[1], exc_info[2])
 
                 progtrack.job_add_progress(progtrack.JOB_FAST_LOOKUP)
-                progtrack.job_done(progtrack.JOB_FAST_LOOKUP)
-                return actdict, timestamp
+                return actoffsets.ActionOffsets(offsets_path), timestamp
 
-        def _remove_fast_lookups(self):
+        def _remove_fast_lookups(self, keep=False):
                 """Remove on-disk database created by _create_fast_lookups.
                 Should be called before updating image state to prevent the
                 client from seeing stale state if _create_fast_lookups is
-                interrupted."""
+                interrupted.
+
+                If 'keep' is True, the database is set aside instead of being
+                removed so that _update_fast_lookups() can use it as the basis
+                for an incremental update once the image state has been
+                updated."""
+
+                self.__remove_prev_fast_lookups()
+                for fname in ("actions.stripped", "actions.offsets",
+                    "keys.conflicting"):
+                        pth = os.path.join(self.__action_cache_dir, fname)
+                        try:
+                                if keep:
+                                        portable.rename(pth, pth + ".prev")
+                                else:
+                                        portable.remove(pth)
+                        except EnvironmentError as e:
+                                if e.errno == errno.ENOENT:
+                                        continue
+                                raise apx._convert_error(e)
+
+        def __remove_prev_fast_lookups(self):
+                """Remove the database set aside by _remove_fast_lookups()."""
 
                 for fname in ("actions.stripped", "actions.offsets",
                     "keys.conflicting"):
                         try:
                                 portable.remove(os.path.join(
-                                    self.__action_cache_dir, fname))
+                                    self.__action_cache_dir, fname + ".prev"))
                         except EnvironmentError as e:
                                 if e.errno == errno.ENOENT:
                                         continue
                                 raise apx._convert_error(e)
 
         def _load_actdict(self, progtrack):
-                """Read the file of offsets created in _create_fast_lookups()
-                and return the dictionary mapping action name and key value to
+                """Open the index of offsets created in _create_fast_lookups()
+                and return the object mapping action name and key value to
                 offset."""
 
                 try:
-                        of = open(os.path.join(self.__action_cache_dir,
-                            "actions.offsets"), "r")
+                        actdict = actoffsets.ActionOffsets(os.path.join(
+                            self.__action_cache_dir, "actions.offsets"))
                 except IOError as e:
                         if e.errno != errno.ENOENT:
                                 raise
@@ -3904,24 +4316,23 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         self.__actdict_timestamp = otimestamp
                         return actdict
 
-                # Make sure the files are paired, and try to create them if not.
-                oversion = of.readline().rstrip()
-                otimestamp = of.readline().rstrip()
-
                 # The original action.offsets file existed and had the same
                 # timestamp as the stored actdict, so that actdict can be
                 # reused.
-                if self.__actdict and otimestamp == self.__actdict_timestamp:
+                if self.__actdict is not None and \
+                    actdict.timestamp == self.__actdict_timestamp:
+                        actdict.close()
                         return self.__actdict
 
+                # Make sure the files are paired, and try to create them if not.
                 sversion, stimestamp = self._get_stripped_actions_file(
                     internal=True)
 
                 # If we recognize neither file's version or their timestamps
                 # don't match, then we blow them away and try again.
-                if oversion != "VERSION 2" or sversion != "VERSION 1" or \
-                    stimestamp != otimestamp:
-                        of.close()
+                if actdict.version != actoffsets.VERSION or \
+                    sversion != "VERSION 1" or stimestamp != actdict.timestamp:
+                        actdict.close()
                         actdict, otimestamp = self._create_fast_lookups()
                         assert actdict is not None
                         self.__actdict = actdict
@@ -3931,27 +4342,11 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 # At this point, the original actions.offsets file existed, no
                 # actdict was saved in the image, the versions matched what was
                 # expected, and the timestamps of the actions.offsets and
-                # actions.stripped files matched, so the actions.offsets file is
-                # parsed to generate actdict.
-                actdict = {}
-
-                for line in of:
-                        actname, offset, cnt, key_attr = \
-                            line.rstrip().split(None, 3)
-                        off = int(offset)
-                        actdict[(actname, key_attr)] = (off, int(cnt))
-
-                        # This is a tight loop, so try to avoid burning
-                        # CPU calling into the progress tracker excessively.
-                        # Since we are already using the offset, we use that
-                        # to damp calls back into the progress tracker.
-                        if off % 500 == 0:
-                                progtrack.plan_add_progress(
-                                    progtrack.PLAN_ACTION_CONFLICT)
-
-                of.close()
+                # actions.stripped files matched, so the memory-mapped index
+                # can be used as is.
+                progtrack.plan_add_progress(progtrack.PLAN_ACTION_CONFLICT)
                 self.__actdict = actdict
-                self.__actdict_timestamp = otimestamp
+                self.__actdict_timestamp = actdict.timestamp
                 return actdict
 
         def _get_stripped_actions_file(self, internal=False):
@@ -4073,9 +4468,12 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
 
         def cleanup_downloads(self):
                 """Clean up any downloads that were in progress but that
-                did not successfully finish."""
+                did not successfully finish, and write out the indexes of
+                the manifest caches stored since."""
 
                 shutil.rmtree(self._incoming_cache_dir, True)
+                for pack in self.__manifest_packs.values():
+                        pack.flush()
 
         def cleanup_cached_content(self, progtrack=None, force=False,
             verbose=False):
@@ -4623,6 +5021,7 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                         except pkg.actions.ActionError as e:
                                 raise apx.InvalidPackageErrors([e])
                 finally:
+                        ip.stop_prefetch()
                         self.__cleanup_alt_pkg_certs()
 
         def make_install_plan(self, op, progtrack, check_cancel,
@@ -4799,14 +5198,16 @@ in the environment or by setting simulate_cmdpath in DebugValues.""")
                 progtrack.plan_all_done()
 
         def make_fix_plan(self, op, progtrack, check_cancel, noexecute, args,
-            unpackaged=False, unpackaged_only=False, verify_paths=EmptyI):
+            unpackaged=False, unpackaged_only=False, verify_paths=EmptyI,
+            deep=False):
                 """Create an image plan to fix the image. Note: verify shares
                 the same routine."""
 
                 progtrack.plan_all_start()
                 self.__make_plan_common(op, progtrack, check_cancel, noexecute,
                     args=args, unpackaged=unpackaged,
-                    unpackaged_only=unpackaged_only, verify_paths=verify_paths)
+                    unpackaged_only=unpackaged_only, verify_paths=verify_paths,
+                    deep=deep)
                 progtrack.plan_all_done()
 
         def make_noop_plan(self, op, progtrack, check_cancel,
@@ -70,6 +70,7 @@ KEY_FILES = "key-files"
 DEFAULT_RECURSE = "default-recurse"
 DEFAULT_CONCURRENCY = "recursion-concurrency"
 AUTO_BE_NAME = "auto-be-name"
+PARALLEL_EXECUTE = "parallel-execute"
 
 default_policies = {
     BE_POLICY: "default",
@@ -83,6 +84,7 @@ default_policies = {
     DEFAULT_RECURSE: False,
     TEMP_BE_ACTIVATION: False,
     EXCLUDE_POLICY: "warn",
+    PARALLEL_EXECUTE: True,
 }
 
 default_policy_map = {
@@ -221,6 +223,8 @@ class ImageConfig(cfg.FileConfig):
                         value_map=_val_map_none),
                     cfg.PropBool(TEMP_BE_ACTIVATION,
                         default=default_policies[TEMP_BE_ACTIVATION]),
+                    cfg.PropBool(PARALLEL_EXECUTE,
+                        default=default_policies[PARALLEL_EXECUTE]),
                 ]),
                 cfg.PropertySection("facet", properties=[
                     cfg.PropertyTemplate(r"^facet\..*", prop_type=cfg.PropBool),
@@ -26,13 +26,15 @@
 #
 
 from __future__ import print_function
-from collections import defaultdict, namedtuple
+from collections import defaultdict, deque, namedtuple
+import concurrent.futures
 import contextlib
 import errno
 import fnmatch
 import io
 import itertools
 import mmap
+import multiprocessing
 import operator
 import os
 import shutil
@@ -40,9 +42,11 @@ import six
 import stat
 import sys
 import tempfile
+import threading
 import time
 import traceback
 import weakref
+import zlib
 import re as relib
 
 from functools import cmp_to_key, reduce
@@ -61,6 +65,7 @@ import pkg.client.pkg_solver as pkg_solver
 import pkg.client.pkgdefs as pkgdefs
 import pkg.client.pkgplan as pkgplan
 import pkg.client.plandesc as plandesc
+import pkg.client.profiler as profiler
 import pkg.client.imageconfig as imageconfig
 import pkg.digest as digest
 import pkg.fmri
@@ -78,6 +83,12 @@ from pkg.client.pkgdefs import (PKG_OP_DEHYDRATE, PKG_OP_REHYDRATE, MSG_ERROR,
     MSG_WARNING, MSG_INFO, MSG_GENERAL, MSG_UNPACKAGED, PKG_OP_VERIFY)
 
 
+# The state shared with the worker processes used to check for conflicting
+# actions; see ImagePlan.__find_all_conflicts().  It's set before the workers
+# are forked so that it doesn't need to be sent to them.
+_conflict_state = None
+
+
 def _reorder_hardlinks(hardlinks):
         """Re-order the list of hardlinks to handle hard links whose
         target is another hard link."""
@@ -127,6 +138,18 @@ class ImagePlan(object):
         MATCH_INST_STEMS    = 2
         MATCH_UNINSTALLED   = 3
 
+        # The number of keys to check for conflicting actions above which the
+        # checks are spread across worker processes.
+        PARALLEL_CONFLICT_KEYS = 20000
+
+        # The number of consecutive file actions to install or update above
+        # which they are executed by a pool of threads.
+        PARALLEL_EXECUTE_ACTIONS = 64
+
+        # The number of manifests retrieved at a time by the background
+        # prefetch started while the solver runs; it stops between batches.
+        PREFETCH_BATCH = 20
+
         def __init__(self, image, op, progtrack, check_cancel, noexecute=False,
             pd=None):
 
@@ -170,6 +193,17 @@ class ImagePlan(object):
                 self.__pkg_actuators = set()
                 self._retrieved = set()
 
+                # The background retrieval of the manifests the solver expects
+                # to be needed, the event which stops it, and the intent sent
+                # with each of those manifests.
+                self.__prefetch_thread = None
+                self.__prefetch_stop = None
+                self.__prefetch_intents = {}
+
+                # hash all file content when verifying, ignoring the image's
+                # verification cache
+                self.__verify_deep = False
+
                 self.pd = None
                 if pd is None:
                         pd = plandesc.PlanDescription(op)
@@ -471,9 +505,14 @@ class ImagePlan(object):
                 if prlimit < 3000:
                         sys.setrecursionlimit(3000)
 
+                solved = False
                 try:
-                        return solver_cb(ignore_inst_parent_deps)
+                        res = solver_cb(ignore_inst_parent_deps)
+                        solved = True
+                        return res
                 except api_errors.PlanCreationException as e:
+                        # The manifests the solver expected to need won't be.
+                        self.stop_prefetch()
                         # if we're currently in sync don't retry the
                         # operation
                         if self.image.linked.insync(latest_md=False):
@@ -495,11 +534,77 @@ class ImagePlan(object):
                         # user won't be able to take the image further
                         # out of sync.
                         ignore_inst_parent_deps = True
-                        return solver_cb(ignore_inst_parent_deps)
+                        res = solver_cb(ignore_inst_parent_deps)
+                        solved = True
+                        return res
                 finally:
+                        if not solved:
+                                # Whatever stopped the solver, such as a
+                                # cancellation, applies to the prefetch too.
+                                self.stop_prefetch()
                         # restore original recursion limit
                         sys.setrecursionlimit(prlimit)
 
+        def __start_prefetch(self, changes):
+                """Start retrieving the manifests of the packages which the
+                solver expects the plan to change, given as a list of tuples
+                of (installed FMRI or None, FMRI) in 'changes', in the
+                background while it searches for a solution.  The plan
+                retrieves any that are missing once it is known which are
+                needed."""
+
+                self.stop_prefetch()
+                enabled_publishers = set(
+                    p.prefix
+                    for p in self.image.gen_publishers()
+                )
+                fetchlist = []
+                for oldfmri, newfmri in changes:
+                        if self.image.has_manifest(newfmri):
+                                continue
+                        new_in = self.__create_intent(oldfmri, newfmri,
+                            enabled_publishers)[1]
+                        self.__prefetch_intents[newfmri] = new_in
+                        fetchlist.append((newfmri, new_in))
+                if not fetchlist:
+                        return
+
+                stop = self.__prefetch_stop = threading.Event()
+                transport = self.image.transport
+                check_cancel = self.__check_cancel
+                batch = self.PREFETCH_BATCH
+
+                def prefetch():
+                        for i in range(0, len(fetchlist), batch):
+                                try:
+                                        transport.prefetch_manifests(
+                                            fetchlist[i:i + batch],
+                                            ccancel=check_cancel)
+                                except Exception:
+                                        # Any failure will be met again, and
+                                        # reported, if the manifests are
+                                        # needed.
+                                        return
+                                if stop.is_set():
+                                        return
+
+                self.__prefetch_thread = threading.Thread(target=prefetch,
+                    name="manifest-prefetch")
+                self.__prefetch_thread.daemon = True
+                self.__prefetch_thread.start()
+
+        def stop_prefetch(self):
+                """Stop the background retrieval of manifests started by
+                __start_prefetch(), once the batch in progress is done.  It
+                must be stopped however planning ends, as it would otherwise
+                continue to use the transport."""
+
+                if self.__prefetch_thread:
+                        self.__prefetch_stop.set()
+                        self.__prefetch_thread.join()
+                        self.__prefetch_thread = None
+                        self.__prefetch_stop = None
+
         def __add_actuator(self, trigger_fmri, trigger_op, exec_op, values,
             solver_inst, installed_dict):
                 """Add a single actuator to the solver 'solver_inst' and update
@@ -706,7 +811,9 @@ class ImagePlan(object):
                             variants,
                             avoid_set,
                             self.image.linked.parent_fmris(),
-                            self.__progtrack)
+                            self.__progtrack,
+                            depgraph=self.image.get_dependency_graph(),
+                            prefetch_cb=self.__start_prefetch)
 
                         if reject_list:
                                 # use reject_list, not reject_set, to preserve
@@ -1295,7 +1402,8 @@ class ImagePlan(object):
                             self.image.get_variants(),
                             self.image.avoid_set_get(),
                             self.image.linked.parent_fmris(),
-                            self.__progtrack)
+                            self.__progtrack,
+                            depgraph=self.image.get_dependency_graph())
 
                         # check for triggered ops
                         self.__set_pkg_actuators(pkgs_to_uninstall,
@@ -1371,7 +1479,9 @@ class ImagePlan(object):
                             self.image.get_variants(),
                             self.image.avoid_set_get(),
                             self.image.linked.parent_fmris(),
-                            self.__progtrack)
+                            self.__progtrack,
+                            depgraph=self.image.get_dependency_graph(),
+                            prefetch_cb=self.__start_prefetch)
 
                         if reject_list:
                                 # use reject_list, not reject_set, to preserve
@@ -1703,14 +1813,15 @@ class ImagePlan(object):
                             self.image.verify(pfmri, pt,
                             verifypaths=verifypaths, overlaypaths=overlaypaths,
                             single_act=ovlying_act, verbose=True,
-                            forever=True):
+                            forever=True, deep=self.__verify_deep):
                                 return oing_act, errors, warnings, pinfo, \
                                     ovlying_fmri
                 else:
                         for olaid_act, errors, warnings, pinfo, is_overlaid \
                             in self.image.verify(pfmri, pt,
                             verifypaths=verifypaths, overlaypaths=overlaypaths,
-                            single_act=act, verbose=True, forever=True):
+                            single_act=act, verbose=True, forever=True,
+                            deep=self.__verify_deep):
                                 return olaid_act, errors, warnings, pinfo, \
                                     None
                 return act, [], [], [], None
@@ -2064,7 +2175,9 @@ class ImagePlan(object):
                 overlay_entries = {}
                 def_pkgs = {}  # deferred packages
                 def_acts = {}  # deferred actions
-                for pfmri in proposed_fmris:
+                for pfmri, verified in self.image.verify_pkgs(proposed_fmris,
+                    pt, verifypaths=verifypaths, overlaypaths=overlaypaths,
+                    verbose=True, forever=True, deep=self.__verify_deep):
                         entries = []
                         needs_fix = []
                         result = "OK"
@@ -2078,11 +2191,7 @@ class ImagePlan(object):
                         # related messages output for it.
                         verify_path_count = len(verifypaths)
                         overlay_path_count = len(overlaypaths)
-                        for act, errors, warnings, pinfo, overlay in \
-                            self.image.verify(pfmri, pt,
-                            verifypaths=verifypaths,
-                            overlaypaths=overlaypaths, verbose=True,
-                            forever=True):
+                        for act, errors, warnings, pinfo, overlay in verified:
                                 if not path_only and overlay:
                                         path = act.attrs.get("path")
                                         if path not in overlay_entries:
@@ -2184,11 +2293,14 @@ class ImagePlan(object):
                                     overlaid, overlaying)
 
         def plan_fix(self, args, unpackaged=False, unpackaged_only=False,
-                verify_paths=misc.EmptyI):
-                """Determine the changes needed to fix the image."""
+                verify_paths=misc.EmptyI, deep=False):
+                """Determine the changes needed to fix the image.  If 'deep'
+                is True, the content of every file is hashed even if the
+                image's verification cache shows it to be unchanged."""
 
                 self.__plan_op()
                 self.__evaluate_excludes()
+                self.__verify_deep = deep
 
                 pt = self.__progtrack
                 pt.plan_all_start()
@@ -2265,6 +2377,7 @@ class ImagePlan(object):
                                     set(), overlaypaths)
 
                 pt.plan_done(pt.PLAN_PKG_VERIFY)
+                self.image.verify_cache.save()
                 # If no repairs, finish the plan.
                 if not repairs:
                         self.__finish_plan(plandesc.EVALUATED_PKGS)
@@ -2804,14 +2917,15 @@ class ImagePlan(object):
                 # Don't process this particular set of fixups again.
                 self.__fixups = {}
 
-        def __process_conflicts(self, key, func, actions, oactions, errclass, errs):
-                """The conflicting action checking functions all need to be
-                dealt with in a similar fashion, so we do that work in one
-                place."""
+        @staticmethod
+        def __conflict_verdict(func, actions, oactions, errclass):
+                """Run the conflicting action checking function 'func' and
+                return the resulting (msg, actions, errclass) tuple, or None
+                if 'func' had nothing to say about the actions."""
 
                 ret = func(actions, oactions)
                 if ret is None:
-                        return False
+                        return None
 
                 if len(ret) == 3:
                         # Allow checking functions to override default errclass.
@@ -2820,8 +2934,16 @@ class ImagePlan(object):
                         msg, actions = ret
 
                 if not isinstance(msg, six.string_types):
-                        return False
+                        return None
+                return msg, actions, errclass
 
+        def __process_conflicts(self, key, verdict, errs):
+                """The conflicting action checking functions all need to be
+                dealt with in a similar fashion, so we do that work in one
+                place.  'verdict' is the tuple returned by
+                __conflict_verdict()."""
+
+                msg, actions, errclass = verdict
                 if msg == "nothing":
                         for i, ap in enumerate(self.pd.removal_actions):
                                 if ap and ap.src.attrs.get(ap.src.key_attr,
@@ -2916,11 +3038,9 @@ class ImagePlan(object):
                 elif msg == "error":
                         errs.append(errclass(actions))
                 else:
-                        assert False, "{0}() returned something other than " \
-                            "'nothing', 'overlay', 'error', or 'fixup': '{1}'".format(
-                            func.__name__, msg)
-
-                return True
+                        assert False, "conflict check returned something " \
+                            "other than 'nothing', 'overlay', 'error', or " \
+                            "'fixup': '{0}'".format(msg)
 
         def __seed(self, gen_func, action_classes, excludes):
                 """Build a mapping from action keys to action, pfmri tuples for
@@ -2981,7 +3101,8 @@ class ImagePlan(object):
                                 return True
                 return False
 
-        def __update_act(self, keys, tgt, skip_dups, offset_dict,
+        @staticmethod
+        def __update_act(keys, tgt, skip_dups, offset_dict,
             action_classes, sf, skip_fmris, fmri_dict):
                 """Update 'tgt' with action/fmri pairs from the stripped
                 action cache that are associated with the specified action
@@ -3055,8 +3176,9 @@ class ImagePlan(object):
                                                 pfmri = pkg.fmri.PkgFmri(
                                                     fmristr)
                                                 fmri_dict[fmristr] = pfmri
-                                        if skip_dups and self.__act_dup_check(
-                                            tgt, key, actstr, fmristr):
+                                        if skip_dups and \
+                                            ImagePlan.__act_dup_check(tgt, key,
+                                            actstr, fmristr):
                                                 continue
                                         tgt.setdefault(key, []).append(
                                             (act, pfmri))
@@ -3168,29 +3290,35 @@ class ImagePlan(object):
                         if key not in new:
                                 del old[key]
 
-        def __check_conflicts(self, new, old, action_classes, ns,
-            errs):
+        @staticmethod
+        def _gen_conflict_verdicts(new, old, ns):
                 """Check all the newly installed actions for conflicts with
-                existing actions."""
+                existing actions.  For each key in 'new', and then each key only
+                in 'old', a tuple of (key, verdict) is generated, where
+                'verdict' is None if there's nothing to be done for the key or
+                the tuple returned by __conflict_verdict() otherwise.
 
+                This doesn't depend on the state of the plan, so it can be run
+                by worker processes."""
+
+                verdict = ImagePlan.__conflict_verdict
                 for key, actions in six.iteritems(new):
                         oactions = old.get(key, [])
 
-                        self.__progtrack.plan_add_progress(
-                            self.__progtrack.PLAN_ACTION_CONFLICT)
-
                         if len(actions) == 1 and len(oactions) < 2:
+                                yield key, None
                                 continue
 
                         # Actions delivering to the same point in a
                         # namespace group's namespace should have the
                         # same type.
                         if type(ns) != int:
-                                if self.__process_conflicts(key,
-                                    self.__check_inconsistent_types,
+                                ret = verdict(
+                                    ImagePlan.__check_inconsistent_types,
                                     actions, oactions,
-                                    api_errors.InconsistentActionTypeError,
-                                    errs):
+                                    api_errors.InconsistentActionTypeError)
+                                if ret is not None:
+                                        yield key, ret
                                         continue
 
                         # By virtue of the above check, all actions at
@@ -3200,51 +3328,137 @@ class ImagePlan(object):
 
                         # Multiple non-refcountable actions delivered to
                         # the same name is an error.
+                        ret = None
                         entry = actions[0][0]
                         if not entry.refcountable and entry.globally_identical:
-                                if self.__process_conflicts(key,
-                                    self.__check_duplicate_actions,
+                                ret = verdict(
+                                    ImagePlan.__check_duplicate_actions,
                                     actions, oactions,
-                                    api_errors.DuplicateActionError,
-                                    errs):
-                                        continue
+                                    api_errors.DuplicateActionError)
 
                         # Multiple refcountable but globally unique
                         # actions delivered to the same name must be
                         # identical.
                         elif entry.globally_identical:
-                                if self.__process_conflicts(key,
-                                    self.__check_inconsistent_attrs,
+                                ret = verdict(
+                                    ImagePlan.__check_inconsistent_attrs,
                                     actions, oactions,
-                                    api_errors.InconsistentActionAttributeError,
-                                    errs):
-                                        continue
+                                    api_errors.InconsistentActionAttributeError)
+                        yield key, ret
 
                 # Ensure that overlay and preserve file semantics are handled
                 # as expected when conflicts only exist in packages that are
                 # being removed.
                 for key, oactions in six.iteritems(old):
-                        self.__progtrack.plan_add_progress(
-                            self.__progtrack.PLAN_ACTION_CONFLICT)
-
-                        if len(oactions) < 2:
-                                continue
-
                         if key in new:
                                 # Already processed.
                                 continue
 
-                        if any(a[0].name != "file" for a in oactions):
+                        if len(oactions) < 2 or \
+                            any(a[0].name != "file" for a in oactions):
+                                yield key, None
                                 continue
 
+                        ret = None
                         entry = oactions[0][0]
                         if not entry.refcountable and entry.globally_identical:
-                                if self.__process_conflicts(key,
-                                    self.__check_duplicate_actions,
+                                ret = verdict(
+                                    ImagePlan.__check_duplicate_actions,
                                     [], oactions,
-                                    api_errors.DuplicateActionError,
-                                    errs):
-                                        continue
+                                    api_errors.DuplicateActionError)
+                        yield key, ret
+
+        def __check_conflicts(self, new, old, action_classes, ns,
+            errs):
+                """Check all the newly installed actions for conflicts with
+                existing actions."""
+
+                for key, verdict in self._gen_conflict_verdicts(new, old, ns):
+                        self.__progtrack.plan_add_progress(
+                            self.__progtrack.PLAN_ACTION_CONFLICT)
+                        if verdict is not None:
+                                self.__process_conflicts(key, verdict, errs)
+
+        @staticmethod
+        def _check_conflict_partition(task):
+                """Check one partition of the keys of one namespace group for
+                conflicts.  'task' is a tuple of (index of the namespace group
+                in _conflict_state, partition, number of partitions).
+
+                The actions from the stripped action cache which could conflict
+                with those keys are loaded, and a list of (order, rank, key,
+                msg, actions, errclass) tuples is returned for every key which
+                needs something done, where 'order' and 'rank' sort the keys the
+                way _gen_conflict_verdicts() generates them when all the keys of
+                the group are checked at once, and the actions and fmris are
+                returned as strings so that they can be sent back from a worker
+                process."""
+
+                idx, part, nparts = task
+                groups, ranks, offset_dict, msf, gone_fmris, changing_fmris = \
+                    _conflict_state
+                ns, action_classes, new, old = groups[idx]
+                rank = ranks[idx]
+
+                def ours(d):
+                        return dict(
+                            (k, list(v))
+                            for k, v in six.iteritems(d)
+                            if zlib.crc32(k.encode("utf-8")) % nparts == part
+                        )
+                new = ours(new)
+                old = ours(old)
+
+                # See __find_all_conflicts() for how 'old' and 'new' are
+                # updated from the stripped action cache.
+                fmri_dict = {}
+                keys = ImagePlan.__conflict_keys(new, old)
+                ImagePlan.__update_act(keys, old, False, offset_dict,
+                    action_classes, msf, gone_fmris, fmri_dict)
+                keys = list(old)
+                ImagePlan.__update_act(keys, new, True, offset_dict,
+                    action_classes, msf, gone_fmris | changing_fmris,
+                    fmri_dict)
+
+                res = []
+                for key, verdict in ImagePlan._gen_conflict_verdicts(new, old,
+                    ns):
+                        if verdict is None:
+                                continue
+                        msg, actions, errclass = verdict
+                        if msg == "fixup":
+                                actions = (str(actions[0]), str(actions[1]))
+                        elif msg == "error":
+                                actions = [(str(a), str(f)) for a, f in actions]
+                        else:
+                                actions = None
+                        res.append((int(key not in new), rank[key], key, msg,
+                            actions, errclass))
+                return res
+
+        @staticmethod
+        def __conflict_keys(new, old):
+                """Return the keys of 'new' followed by those only in 'old', in
+                the order they were added.  The keys are checked in this order,
+                rather than that of a set, so that the order in which conflicts
+                are reported doesn't depend on how the keys are partitioned
+                between worker processes."""
+
+                return list(dict.fromkeys(itertools.chain(new, old)))
+
+        def __conflict_workers(self, nkeys):
+                """Return the number of worker processes to use to check
+                'nkeys' keys for conflicts; 1 means the keys should be checked
+                by this process."""
+
+                workers = global_settings.client_workers
+                if workers < 2 or \
+                    "fork" not in multiprocessing.get_all_start_methods():
+                        return 1
+                if nkeys < self.PARALLEL_CONFLICT_KEYS and \
+                    not DebugValues["parallel-conflict-check"]:
+                        return 1
+                return workers
 
         @staticmethod
         def _check_actions(nsd):
@@ -3287,6 +3501,108 @@ class ImagePlan(object):
                         p.clear_dest_manifest()
                         p.clear_origin_manifest()
 
+        def __check_all_conflicts(self, groups, offset_dict, msf, gone_fmris,
+            changing_fmris, errs):
+                """Check the actions being installed and removed, as seeded by
+                __find_all_conflicts() in 'groups', for conflicts, one namespace
+                group at a time."""
+
+                pt = self.__progtrack
+                fmri_dict = weakref.WeakValueDictionary()
+                for ns, action_classes, new, old in groups:
+                        pt.plan_add_progress(pt.PLAN_ACTION_CONFLICT)
+
+                        # Update 'old' with all actions from the action cache
+                        # which could conflict with the new actions being
+                        # installed, or with actions already installed, but not
+                        # getting removed.
+                        keys = self.__conflict_keys(new, old)
+                        self.__update_act(keys, old, False, offset_dict,
+                            action_classes, msf, gone_fmris, fmri_dict)
+
+                        # Now update 'new' with all actions from the action
+                        # cache which are staying on the system, and could
+                        # conflict with the actions being installed.
+                        keys = list(old)
+                        self.__update_act(keys, new, True, offset_dict,
+                            action_classes, msf, gone_fmris | changing_fmris,
+                            fmri_dict)
+
+                        self.__check_conflicts(new, old, action_classes, ns,
+                            errs)
+
+        def __check_all_conflicts_parallel(self, groups, workers, offset_dict,
+            msf, gone_fmris, changing_fmris, errs):
+                """Check the actions seeded by __find_all_conflicts() in
+                'groups' for conflicts like __check_all_conflicts(), but using
+                'workers' processes, each of which checks a partition of the
+                keys of a namespace group.  The results are applied in namespace
+                group and key order, the same order __check_all_conflicts()
+                applies them in, so they don't depend on how the work was
+                scheduled."""
+
+                global _conflict_state
+
+                pt = self.__progtrack
+                tasks = [
+                    (idx, part, workers)
+                    for idx in range(len(groups))
+                    for part in range(workers)
+                ]
+                results = []
+                # The position of each key in the order in which
+                # __check_all_conflicts() checks the keys of its group.
+                ranks = [
+                    dict((k, i) for i, k in enumerate(
+                        self.__conflict_keys(new, old)))
+                    for ns, action_classes, new, old in groups
+                ]
+                _conflict_state = (groups, ranks, offset_dict, msf, gone_fmris,
+                    changing_fmris)
+                try:
+                        pool = multiprocessing.get_context("fork").Pool(
+                            workers)
+                        try:
+                                for res in pool.imap(
+                                    ImagePlan._check_conflict_partition, tasks):
+                                        pt.plan_add_progress(
+                                            pt.PLAN_ACTION_CONFLICT)
+                                        results.append(res)
+                        finally:
+                                pool.terminate()
+                                pool.join()
+                finally:
+                        _conflict_state = None
+
+                fmri_dict = {}
+                def get_fmri(fmristr):
+                        try:
+                                return fmri_dict[fmristr]
+                        except KeyError:
+                                pfmri = pkg.fmri.PkgFmri(fmristr)
+                                fmri_dict[fmristr] = pfmri
+                                return pfmri
+
+                for idx in range(len(groups)):
+                        verdicts = sorted(itertools.chain.from_iterable(
+                            results[idx * workers:(idx + 1) * workers]),
+                            key=operator.itemgetter(0, 1))
+                        for order, rank, key, msg, actions, errclass in \
+                            verdicts:
+                                if msg == "fixup":
+                                        actions = (
+                                            pkg.actions.fromstr(actions[0]),
+                                            get_fmri(actions[1]))
+                                elif msg == "error":
+                                        actions = [
+                                            (pkg.actions.fromstr(a),
+                                            get_fmri(f))
+                                            for a, f in actions
+                                        ]
+                                self.__process_conflicts(key,
+                                    (msg, actions, errclass), errs)
+
+        @profiler.traced()
         def __find_all_conflicts(self):
                 """Find all instances of conflicting actions.
 
@@ -3369,9 +3685,9 @@ class ImagePlan(object):
                 conflict_clean_image = \
                     self.image._load_conflicting_keys() == set()
 
-                fmri_dict = weakref.WeakValueDictionary()
-                # Iterate over action types in namespace groups first; our first
-                # check should be for action type consistency.
+                # Seed the actions being installed and removed for each
+                # namespace group.
+                groups = []
                 for ns, action_classes in six.iteritems(namespace_dict):
                         pt.plan_add_progress(pt.PLAN_ACTION_CONFLICT)
                         # There's no sense in checking actions which have no
@@ -3396,35 +3712,30 @@ class ImagePlan(object):
                         if conflict_clean_image:
                                 self.__fast_check(new, old, ns)
 
-                        with contextlib.closing(mmap.mmap(sf.fileno(), 0,
-                            access=mmap.ACCESS_READ)) as msf:
-                                # Skip file header.
-                                msf.readline()
-                                msf.readline()
-
-                                # Update 'old' with all actions from the action
-                                # cache which could conflict with the new
-                                # actions being installed, or with actions
-                                # already installed, but not getting removed.
-                                keys = set(itertools.chain(six.iterkeys(new),
-                                    six.iterkeys(old)))
-                                self.__update_act(keys, old, False,
-                                    offset_dict, action_classes, msf,
-                                    gone_fmris, fmri_dict)
-
-                                # Now update 'new' with all actions from the
-                                # action cache which are staying on the system,
-                                # and could conflict with the actions being
-                                # installed.
-                                keys = set(six.iterkeys(old))
-                                self.__update_act(keys, new, True,
-                                    offset_dict, action_classes, msf,
-                                    gone_fmris | changing_fmris, fmri_dict)
+                        groups.append((ns, action_classes, new, old))
 
-                        self.__check_conflicts(new, old, action_classes, ns,
-                            errs)
+                with contextlib.closing(mmap.mmap(sf.fileno(), 0,
+                    access=mmap.ACCESS_READ)) as msf:
+                        # Skip file header.
+                        msf.readline()
+                        msf.readline()
+
+                        nkeys = sum(
+                            len(new) + len(old)
+                            for ns, action_classes, new, old in groups
+                        )
+                        profiler.count("keys compared", nkeys)
+                        workers = self.__conflict_workers(nkeys)
+                        profiler.count("workers", workers)
+                        if workers > 1:
+                                self.__check_all_conflicts_parallel(groups,
+                                    workers, offset_dict, msf, gone_fmris,
+                                    changing_fmris, errs)
+                        else:
+                                self.__check_all_conflicts(groups, offset_dict,
+                                    msf, gone_fmris, changing_fmris, errs)
+                groups = None
 
-                del fmri_dict
                 self.__clear_pkg_plans()
                 sf.close()
                 self.__evaluate_fixups()
@@ -3877,6 +4188,7 @@ class ImagePlan(object):
                                     _("Root filesystem"))
 
 
+        @profiler.traced()
         def evaluate(self):
                 """Given already determined fmri changes,
                 build pkg plans and figure out exact impact of
@@ -4027,10 +4339,15 @@ class ImagePlan(object):
                         tmpfile.close()
                         self.pd.release_notes_name = os.path.basename(path)
 
+        @profiler.traced()
         def __evaluate_pkg_plans(self):
                 """Internal helper function that does the work of converting
                 fmri changes into pkg plans."""
 
+                # Now that it's known which manifests are needed, stop
+                # retrieving those the solver expected to be.
+                self.stop_prefetch()
+
                 pt = self.__progtrack
                 # prefetch manifests
                 prefetch_mfsts = [] # manifest, intents to be prefetched
@@ -4059,12 +4376,18 @@ class ImagePlan(object):
                                 if not self.image.has_manifest(newfmri):
                                         prefetch_mfsts.append((newfmri, new_in))
                                         new_in = None
+                                elif self.__prefetch_intents.get(newfmri) == \
+                                    new_in:
+                                        # Retrieved in the background, and
+                                        # the repository already knows why.
+                                        new_in = None
                         eval_list.append((oldfmri, old_in, newfmri, new_in))
                         old_in = new_in = None
                 pt.plan_done(pt.PLAN_FIND_MFST)
 
                 # No longer needed.
                 del enabled_publishers
+                self.__prefetch_intents = {}
                 self.__match_rm = {}
                 self.__match_update = {}
 
@@ -4583,6 +4906,7 @@ image (there are configured exclusions):""") + \
                         print("Checking exclude:", path)
                 return self.__exclude_re.search(path)
 
+        @profiler.traced()
         def __merge_actions(self):
                 """Given a set of fmri changes and their associated pkg plan,
                 merge all the resultant actions for the packages being
@@ -5187,6 +5511,12 @@ image (there are configured exclusions):""") + \
 
                 self.pd.pkg_plans.sort(key=key_func)
 
+                profiler.count("packages", len(self.pd.pkg_plans))
+                profiler.count("actions removed", len(self.pd.removal_actions))
+                profiler.count("actions installed",
+                    len(self.pd.install_actions))
+                profiler.count("actions updated", len(self.pd.update_actions))
+
                 pt.plan_done(pt.PLAN_ACTION_FINALIZE)
 
                 if self.pd._need_boot_archive is None:
@@ -5212,6 +5542,7 @@ image (there are configured exclusions):""") + \
                 assert 0, "Shouldn't call nothingtodo() for state = {0:d}".format(
                     self.pd.state)
 
+        @profiler.traced()
         def preexecute(self):
                 """Invoke the evaluated image plan
                 preexecute, execute and postexecute
@@ -5381,6 +5712,134 @@ image (there are configured exclusions):""") + \
                             pd_json1, pd_json2, pd_json1, pd_json2)
                         del pd_json1, pd_json2
 
+        def __execute_actions(self, actions, phase, execute):
+                """Execute the _ActionPlan tuples in 'actions' in order by
+                calling the PkgPlan method 'execute' for each of them, then
+                retry those that raised ActionRetry.  'phase' is the progress
+                tracker action phase to report progress for.
+
+                File actions are independent of each other once the
+                directories, users and groups they need exist, which the sort
+                order of 'actions' ensures, so long runs of them may be
+                executed by a pool of threads instead."""
+
+                pt = self.__progtrack
+                retries = []
+                for is_file, group in itertools.groupby(actions,
+                    lambda ap: ap.dst.name == "file"):
+                        group = list(group)
+                        if is_file and self.__execute_workers(len(group)) > 1:
+                                retries.extend(self.__execute_files(group,
+                                    phase, execute))
+                                continue
+
+                        for p, src, dest in group:
+                                try:
+                                        execute(p, src, dest)
+                                        pt.actions_add_progress(phase)
+                                except pkg.actions.ActionRetry:
+                                        retries.append((p, src, dest))
+
+                for p, src, dest in retries:
+                        p.execute_retry(src, dest)
+                        pt.actions_add_progress(phase)
+
+        def __execute_workers(self, nactions):
+                """Return the number of threads to use to execute a run of
+                'nactions' file actions; 1 means they should be executed by
+                the calling thread."""
+
+                workers = global_settings.client_workers
+                if workers < 2 or not self.image.cfg.get_policy(
+                    imageconfig.PARALLEL_EXECUTE):
+                        return 1
+                if nactions < self.PARALLEL_EXECUTE_ACTIONS and \
+                    not DebugValues["parallel-execute"]:
+                        return 1
+                return workers
+
+        @profiler.traced()
+        def __execute_files(self, actions, phase, execute):
+                """Execute the file _ActionPlan tuples in 'actions' using a
+                pool of threads, reporting progress in order, and return the
+                list of those that raised ActionRetry.  If any action fails,
+                no further actions are started and the first error is raised
+                once those already running have finished."""
+
+                pt = self.__progtrack
+                workers = self.__execute_workers(len(actions))
+
+                # Missing parent directories are created and owner and group
+                # names resolved here first so that the threads don't race to
+                # do so or to load the image's password, group and verification
+                # caches.  Actions that move files between packages are left to
+                # this thread as they share state.
+                self.image.verify_cache.load()
+                root = self.image.get_root()
+                serial = []
+                seen = set()
+                for ap in actions:
+                        p, src, dest = ap
+                        if "save_file" in dest.attrs:
+                                serial.append(ap)
+                                continue
+                        owner = (dest.attrs.get("owner"),
+                            dest.attrs.get("group"))
+                        if owner not in seen:
+                                seen.add(owner)
+                                dest.get_fsobj_uid_gid(p, p.destination_fmri)
+                        final_path = dest.get_installed_path(root)
+                        dirname = os.path.dirname(final_path)
+                        if dirname not in seen:
+                                seen.add(dirname)
+                                dest.fsobj_checkpath(p, final_path)
+                                if not os.path.exists(dirname):
+                                        dest.makedirs(dirname,
+                                            mode=misc.PKG_DIR_MODE,
+                                            fmri=p.destination_fmri)
+
+                def run(ap):
+                        try:
+                                execute(*ap)
+                        except pkg.actions.ActionRetry:
+                                return ap
+                        return None
+
+                retries = []
+                pending = deque()
+                with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                        try:
+                                for ap in actions:
+                                        if "save_file" in ap.dst.attrs:
+                                                continue
+                                        pending.append(pool.submit(run, ap))
+                                        while len(pending) > workers * 16:
+                                                ap = pending.popleft().result()
+                                                if ap:
+                                                        retries.append(ap)
+                                                else:
+                                                        pt.actions_add_progress(
+                                                            phase)
+                                while pending:
+                                        ap = pending.popleft().result()
+                                        if ap:
+                                                retries.append(ap)
+                                        else:
+                                                pt.actions_add_progress(phase)
+                        except:
+                                for f in pending:
+                                        f.cancel()
+                                raise
+
+                for ap in serial:
+                        ap = run(ap)
+                        if ap:
+                                retries.append(ap)
+                        else:
+                                pt.actions_add_progress(phase)
+                return retries
+
+        @profiler.traced()
         def execute(self):
                 """Invoke the evaluated image plan
                 preexecute, execute and postexecute
@@ -5471,10 +5930,11 @@ image (there are configured exclusions):""") + \
                 empty_image = self.__is_image_empty()
 
                 if not empty_image:
-                        # Before proceeding, remove fast lookups database so
-                        # that if _create_fast_lookups is interrupted later the
-                        # client isn't left with invalid state.
-                        self.image._remove_fast_lookups()
+                        # Before proceeding, set aside fast lookups database so
+                        # that if execution or _update_fast_lookups is
+                        # interrupted later the client isn't left with invalid
+                        # state.
+                        self.image._remove_fast_lookups(keep=True)
 
                 if not self.image.is_liveroot():
                         # Check if the child is a running zone. If so run the
@@ -5530,19 +5990,9 @@ image (there are configured exclusions):""") + \
 
                                 # execute installs; if action throws a retry
                                 # exception try it again afterwards.
-                                retries = []
-                                for p, src, dest in self.pd.install_actions:
-                                        try:
-                                                p.execute_install(src, dest)
-                                                pt.actions_add_progress(
-                                                    pt.ACTION_INSTALL)
-                                        except pkg.actions.ActionRetry:
-                                                retries.append((p, src, dest))
-                                for p, src, dest in retries:
-                                        p.execute_retry(src, dest)
-                                        pt.actions_add_progress(
-                                            pt.ACTION_INSTALL)
-                                retries = []
+                                self.__execute_actions(self.pd.install_actions,
+                                    pt.ACTION_INSTALL,
+                                    pkgplan.PkgPlan.execute_install)
                                 pt.actions_done(pt.ACTION_INSTALL)
 
                                 # Done with installs, so discard them so memory
@@ -5556,20 +6006,9 @@ image (there are configured exclusions):""") + \
                                 # the retryable exception).
                                 # An example is a user action that depends
                                 # upon a file existing (ie ftpusers).
-                                retries = []
-                                for p, src, dest in self.pd.update_actions:
-                                        try:
-                                            p.execute_update(src, dest)
-                                            pt.actions_add_progress(
-                                                pt.ACTION_UPDATE)
-                                        except pkg.actions.ActionRetry:
-                                            retries.append((p, src, dest))
-
-                                for p, src, dest in retries:
-                                    p.execute_retry(src, dest)
-                                    pt.actions_add_progress(pt.ACTION_UPDATE)
-                                retries = []
-
+                                self.__execute_actions(self.pd.update_actions,
+                                    pt.ACTION_UPDATE,
+                                    pkgplan.PkgPlan.execute_update)
                                 pt.actions_done(pt.ACTION_UPDATE)
                                 pt.actions_all_done()
                                 pt.set_major_phase(pt.PHASE_FINALIZE)
@@ -5675,7 +6114,17 @@ image (there are configured exclusions):""") + \
                 else:
                         self.pd._actuators.exec_post_actuators(self.image)
 
-                self.image._create_fast_lookups(progtrack=self.__progtrack)
+                if empty_image or self.pd._varcets_change:
+                        # The set of actions included from every installed
+                        # package may have changed, so start afresh.
+                        self.image._create_fast_lookups(
+                            progtrack=self.__progtrack)
+                else:
+                        self.image._update_fast_lookups(
+                            [o for d, o in executed_pp if o],
+                            [d for d, o in executed_pp if d],
+                            progtrack=self.__progtrack)
+                self.image.verify_cache.save()
                 self.__save_release_notes()
 
                 # success
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+
+"""Process-wide cache of the manifests loaded by images.
+
+A single operation asks for the same manifest many times: planning, conflict
+checking, verification and search each call Image.get_manifest() for the
+packages they look at.  The manifests returned are kept in a least recently
+used cache, bounded by the total size of the manifest files they were loaded
+from, so that those callers share a single parsed copy.
+
+Manifests are cached under a key chosen by the image, which must identify the
+image, the package, the variants and facets applied and the intent (if any)
+the manifest was retrieved with; the content of a package version never
+changes, so entries are only discarded when the image removes the caches they
+may be reading from.  A manifest whose exclusions have been changed by its
+consumer since it was cached is loaded again.
+
+If loading a manifest runs out of memory, the cache is emptied and the load is
+retried once before the MemoryError is passed on to the caller."""
+
+import collections
+import os
+import threading
+
+import pkg.client.profiler as profiler
+
+# The default bound on the total size of the manifest files of the cached
+# manifests.
+MAX_SIZE = 16 * 1024 * 1024
+
+
+class ManifestCache(object):
+        """A least recently used cache of manifests holding at most
+        'max_size' bytes worth of manifest files."""
+
+        def __init__(self, max_size=MAX_SIZE):
+                self.max_size = max_size
+                self.__lock = threading.Lock()
+                # A dictionary of key to the manifest and its size, least
+                # recently used first.
+                self.__entries = collections.OrderedDict()
+                self.__size = 0
+                self.hits = 0
+                self.misses = 0
+                self.evictions = 0
+
+        def __len__(self):
+                return len(self.__entries)
+
+        @property
+        def size(self):
+                """The total size of the cached manifests."""
+
+                return self.__size
+
+        def get(self, key, excludes, load):
+                """Return the manifest cached under 'key', or if there is none,
+                the one returned by 'load', which must be a function taking no
+                arguments, after caching it.  'excludes' are the exclusions
+                the manifest is expected to have been loaded with."""
+
+                with self.__lock:
+                        entry = self.__entries.get(key)
+                        if entry and entry[0].excludes == excludes:
+                                self.__entries.move_to_end(key)
+                                self.hits += 1
+                                profiler.count("manifest cache hits")
+                                return entry[0]
+                        if entry:
+                                self.__discard(key)
+                        self.misses += 1
+                profiler.count("manifest cache misses")
+
+                try:
+                        m = load()
+                except MemoryError:
+                        # Make room and try once more; the caller will report
+                        # misc.out_of_memory() if that fails too.
+                        self.clear()
+                        m = load()
+
+                size = _size(m)
+                if size > self.max_size:
+                        return m
+                with self.__lock:
+                        if key in self.__entries:
+                                self.__discard(key)
+                        self.__entries[key] = (m, size)
+                        self.__size += size
+                        while self.__size > self.max_size:
+                                self.__discard(next(iter(self.__entries)))
+                                self.evictions += 1
+                                profiler.count("manifest cache evictions")
+                return m
+
+        def __discard(self, key):
+                self.__size -= self.__entries.pop(key)[1]
+
+        def discard(self, match):
+                """Discard the cached manifests whose keys 'match', a function
+                taking a key and returning a boolean, accepts."""
+
+                with self.__lock:
+                        for key in [k for k in self.__entries if match(k)]:
+                                self.__discard(key)
+
+        def clear(self):
+                """Discard all of the cached manifests."""
+
+                with self.__lock:
+                        self.evictions += len(self.__entries)
+                        profiler.count("manifest cache evictions",
+                            len(self.__entries))
+                        self.__entries.clear()
+                        self.__size = 0
+
+        def __str__(self):
+                return "manifest cache: {0:d} manifests, {1:d} bytes; " \
+                    "hits: {2:d}; misses: {3:d}; evictions: {4:d}".format(
+                    len(self.__entries), self.__size, self.hits, self.misses,
+                    self.evictions)
+
+
+def _size(m):
+        try:
+                return os.stat(m.pathname).st_size
+        except (AttributeError, EnvironmentError):
+                # Not loaded from a file; assume a typical size.
+                return 16 * 1024
+
+
+# The cache shared by all of the images of the process.
+cache = ManifestCache()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -47,6 +47,7 @@ BE_ACTIVATE           = "be_activate"
 BE_TEMP_ACTIVATE      = "be_temp_activate"
 BE_NAME               = "be_name"
 CONCURRENCY           = "concurrency"
+DEEP                  = "deep"
 DENY_NEW_BE           = "deny_new_be"
 FORCE                 = "force"
 IGNORE_MISSING        = "ignore_missing"
@@ -96,6 +97,7 @@ UNPACKAGED            = "unpackaged"
 UNPACKAGED_ONLY       = "unpackaged_only"
 VERIFY_PATHS          = "verify_paths"
 VERBOSE               = "verbose"
+WORKERS               = "workers"
 SYNC_ACT              = "sync_act"
 ACT_TIMEOUT           = "act_timeout"
 PUBLISHERS            = "publishers"
@@ -892,6 +894,21 @@ def opts_table_cb_concurrency(op, api_inst, opts, opts_new):
         # remove concurrency from parameters dict
         del opts_new[CONCURRENCY]
 
+def opts_table_cb_workers(op, api_inst, opts, opts_new):
+        if opts[WORKERS] is None:
+                # keep the default or the value set by the environment
+                del opts_new[WORKERS]
+                return
+
+        # make sure we have a positive integer
+        opts_cb_int(WORKERS, api_inst, opts, opts_new, minimum=1)
+
+        # update global worker process setting
+        global_settings.client_workers = opts_new[WORKERS]
+
+        # remove workers from parameters dict
+        del opts_new[WORKERS]
+
 def opts_table_cb_actuators(op, api_inst, opts, opts_new):
 
         del opts_new[ACT_TIMEOUT]
@@ -1024,6 +1041,12 @@ opts_table_concurrency = [
         "minimum": 0}),
 ]
 
+opts_table_workers = [
+    opts_table_cb_workers,
+    (WORKERS,            None, [], {"type": ["null", "integer"],
+        "minimum": 1}),
+]
+
 opts_table_force = [
     (FORCE,                False, [], {"type": "boolean"}),
 ]
@@ -1163,6 +1186,10 @@ opts_table_publishers = [
 opts_table_unpackaged = [
     (UNPACKAGED,       False, [], {"type": "boolean"}),
 ]
+
+opts_table_deep = [
+    (DEEP,             False, [], {"type": "boolean"}),
+]
 #
 # Options for pkg(1) subcommands.  Built by combining the option tables above,
 # with some optional subcommand unique options defined below.
@@ -1339,6 +1366,8 @@ opts_fix = \
     opts_table_no_headers + \
     opts_table_parsable + \
     opts_table_unpackaged + \
+    opts_table_deep + \
+    opts_table_workers + \
     []
 
 opts_verify = \
@@ -1347,6 +1376,8 @@ opts_verify = \
     opts_table_no_headers + \
     opts_table_parsable + \
     opts_table_unpackaged + \
+    opts_table_deep + \
+    opts_table_workers + \
     [
     opts_table_cb_nqv,
     opts_table_cb_unpackaged,
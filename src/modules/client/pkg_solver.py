@@ -44,6 +44,7 @@ import pkg.actions
 import pkg.catalog as catalog
 import pkg.client.api_errors as api_errors
 import pkg.client.image
+import pkg.client.profiler as profiler
 import pkg.fmri
 import pkg.misc as misc
 import pkg.solver
@@ -125,14 +126,21 @@ class PkgSolver(object):
         operation."""
 
         def __init__(self, cat, installed_dict, pub_ranks, variants, avoids,
-            parent_pkgs, progtrack):
+            parent_pkgs, progtrack, depgraph=None, prefetch_cb=None):
                 """Create a PkgSolver instance; catalog should contain all
                 known pkgs, installed fmris should be a dict of fmris indexed
                 by name that define pkgs current installed in the image.
                 Pub_ranks dict contains (rank, stickiness, enabled) for each
                 publisher.  variants are the current image variants; avoids is
                 the set of pkg stems being avoided in the image due to
-                administrator action (e.g. --reject, uninstall)."""
+                administrator action (e.g. --reject, uninstall).  depgraph is
+                an optional DependencyGraph for the catalog, used in preference
+                to parsing the catalog's dependency actions.  prefetch_cb is an
+                optional callable which is passed a list of the FMRIs that the
+                solution is most likely to contain once trimming is done, as
+                tuples of (installed FMRI or None, FMRI), so that their
+                manifests can be retrieved while a solution is searched
+                for."""
 
                 # Value 'DebugValues' is unsubscriptable;
                 # pylint: disable=E1136
@@ -141,6 +149,8 @@ class PkgSolver(object):
                         raise RuntimeError("no_solver set, but solver invoked")
 
                 self.__catalog = cat
+                self.__depgraph = depgraph
+                self.__prefetch_cb = prefetch_cb
                 self.__known_incs = set()       # stems with incorporate deps
                 self.__publisher = {}           # indexed by stem
                 self.__possible_dict = defaultdict(list) # indexed by stem
@@ -173,6 +183,7 @@ class PkgSolver(object):
                 self.__fmri2id = {}             # and reverse
 
                 self.__solver = pkg.solver.msat_solver()
+                self.__added_clauses = set()    # clauses given to solver
 
                 self.__progtrack = progtrack    # progress tracker
                 self.__progitem = None          # progress tracker plan item
@@ -196,6 +207,7 @@ class PkgSolver(object):
                 self.__subphasename = None
                 self.__timings = []
                 self.__start_time = 0
+                self.__start_counts = (0, 0)
                 self.__inc_list = []
                 self.__dependents = None
                 # set of fmris installed in root image; used for origin
@@ -279,6 +291,8 @@ class PkgSolver(object):
                 be performed after a solution is successfully returned."""
 
                 self.__catalog = None
+                self.__depgraph = None
+                self.__prefetch_cb = None
                 self.__installed_dict = {}
                 self.__installed_pkgs = frozenset()
                 self.__installed_fmris = frozenset()
@@ -290,6 +304,7 @@ class PkgSolver(object):
                 self.__id2fmri = None
                 self.__fmri2id = None
                 self.__solver = None
+                self.__added_clauses = None
                 self.__progtrack = None
                 self.__addclause_failure = False
                 self.__variant_dict = None
@@ -328,6 +343,7 @@ class PkgSolver(object):
                 if self.__subphasename is not None:
                         self.__end_subphase()
                 self.__start_time = time.time()
+                self.__start_counts = (self.__clauses, len(self.__trim_dict))
                 self.__subphasename = "phase {0:d}".format(subphase)
                 self.__progress()
 
@@ -336,6 +352,14 @@ class PkgSolver(object):
                 now = time.time()
                 self.__timings.append((self.__subphasename,
                     now - self.__start_time))
+                if profiler.enabled():
+                        clauses, trimmed = self.__start_counts
+                        profiler.add_event("solver " + self.__subphasename,
+                            self.__start_time, now, {
+                                "clauses generated": self.__clauses - clauses,
+                                "fmris trimmed":
+                                    len(self.__trim_dict) - trimmed,
+                            })
                 self.__start_time = None
                 self.__subphasename = None
 
@@ -865,6 +889,7 @@ class PkgSolver(object):
 
                 self.__triggered_ops[trigger_op][exec_op] |= fmris
 
+        @profiler.traced()
         def solve_install(self, existing_freezes, proposed_dict,
             new_variants=None, excludes=EmptyI,
             reject_set=frozenset(), trim_proposed_installed=True,
@@ -1205,6 +1230,7 @@ class PkgSolver(object):
                         self.__raise_install_error(exp, inc_list, proposed_dict,
                             possible_set, excludes)
 
+                self.__prefetch(proposed_dict)
                 pt.plan_done(pt.PLAN_SOLVE_SETUP)
 
                 self.__progitem = pt.PLAN_SOLVE_SOLVER
@@ -1262,6 +1288,7 @@ class PkgSolver(object):
 
                 return self.__end_solve(solution, excludes)
 
+        @profiler.traced()
         def solve_update_all(self, existing_freezes, excludes=EmptyI,
             reject_set=frozenset()):
                 """Logic to update all packages within an image to the latest
@@ -1379,6 +1406,8 @@ class PkgSolver(object):
                         self.__assert_trim_errors(possible_set, excludes)
                         raise
 
+                self.__prefetch(f.pkg_name
+                    for f in self.__installed_fmris - self.__removal_fmris)
                 pt.plan_done(pt.PLAN_SOLVE_SETUP)
 
                 self.__progitem = pt.PLAN_SOLVE_SOLVER
@@ -1453,6 +1482,7 @@ class PkgSolver(object):
 
                 self.__raise_solution_error(no_solution=info)
 
+        @profiler.traced()
         def solve_uninstall(self, existing_freezes, uninstall_list, excludes,
             ignore_inst_parent_deps=False):
                 """Compute changes needed for uninstall"""
@@ -1574,21 +1604,33 @@ class PkgSolver(object):
         def __save_solver(self):
                 """Duplicate current current solver state and return it."""
                 return (self.__addclause_failure,
-                    pkg.solver.msat_solver(self.__solver))
+                    pkg.solver.msat_solver(self.__solver),
+                    set(self.__added_clauses))
 
         def __restore_solver(self, solver):
                 """Set the current solver state to the previously saved one"""
-                self.__addclause_failure, self.__solver = solver
+                self.__addclause_failure, self.__solver, \
+                    self.__added_clauses = solver
                 self.__iterations = 0
 
+        @profiler.traced()
         def __solve(self, older=False, max_iterations=2000):
                 """Perform iterative solution; try for newest pkgs unless
                 older=True"""
                 solution_vector = []
                 self.__state = SOLVER_FAIL
+                # Packages excluded from subsequent solutions are passed to
+                # the solver as assumptions rather than added as clauses, so
+                # each is only given once and the solver isn't left needing
+                # a reset when no further solution can be found.
                 eliminated = set()
-                while not self.__addclause_failure and self.__solver.solve([]):
-                        self.__progress()
+                assumptions = []
+                start = time.time()
+                while not self.__addclause_failure and \
+                    self.__solver.solve(assumptions):
+                        now = time.time()
+                        self.__progtrack.plan_solver_iteration(now - start)
+                        profiler.count("solver iterations")
                         self.__iterations += 1
 
                         if self.__iterations > max_iterations:
@@ -1613,15 +1655,15 @@ class PkgSolver(object):
                                         remove = remaining - \
                                             self.__allowed_downgrades
                                 else:
-                                        remove = matching - set([pfmri]) - \
-                                            eliminated
-                                for f in remove:
-                                        self.__addclauses([[-self.__getid(f)]])
-
+                                        remove = matching - set([pfmri])
+                                for f in remove - eliminated:
+                                        eliminated.add(f)
+                                        assumptions.append(-self.__getid(f))
 
                         # prevent the selection of this exact combo;
                         # permit [] solution
                         self.__addclauses([[-i for i in solution_vector]])
+                        start = time.time()
 
                 if not self.__iterations:
                         self.__raise_solution_error(no_solution=True)
@@ -1634,10 +1676,7 @@ class PkgSolver(object):
 
         def __get_solution_vector(self):
                 """Return solution vector from solver"""
-                return frozenset([
-                    (i + 1) for i in range(self.__solver.get_variables())
-                    if self.__solver.dereference(i)
-                ])
+                return frozenset(self.__solver.get_true_variables())
 
         def __assign_possible(self, possible_set):
                 """Assign __possible_dict of possible package FMRIs by pkg stem
@@ -1649,9 +1688,26 @@ class PkgSolver(object):
                 for f in possible_set:
                         self.__possible_dict[f.pkg_name].append(f)
                 for name in self.__possible_dict:
-                        self.__possible_dict[name].sort()
+                        self.__possible_dict[name].sort(
+                            key=pkg.fmri.PkgFmri.sort_key)
                 self.__trimdone = True
 
+        def __prefetch(self, pkg_names):
+                """Pass the newest possible version of each of the packages
+                named in 'pkg_names', unless it's already installed, to the
+                prefetch callback."""
+
+                if not self.__prefetch_cb:
+                        return
+                changes = []
+                for name in pkg_names:
+                        flist = self.__possible_dict.get(name)
+                        installed = self.__installed_dict.get(name)
+                        if flist and flist[-1] != installed:
+                                changes.append((installed, flist[-1]))
+                if changes:
+                        self.__prefetch_cb(changes)
+
         def __assign_fmri_ids(self, possible_set):
                 """ give a set of possible fmris, assign ids"""
 
@@ -1769,8 +1825,8 @@ class PkgSolver(object):
                 try:
                         relevant = dict([
                                 (a.attrs["name"], a.attrs["value"])
-                                for a in self.__catalog.get_entry_actions(fmri,
-                                [catalog.Catalog.DEPENDENCY], excludes=excludes)
+                                for a in self.__get_entry_actions(fmri,
+                                    excludes)
                                 if a.name == "set" and \
                                     a.attrs["name"] in ["pkg.renamed",
                                     "pkg.obsolete"]
@@ -1798,6 +1854,18 @@ class PkgSolver(object):
                         self.__fmri_loadstate(fmri, excludes)
                 return self.__fmri_state[fmri][1]
 
+        def __get_entry_actions(self, fmri, excludes):
+                """Return the actions in the Catalog.DEPENDENCY section for
+                'fmri' allowed by 'excludes', from the dependency graph if
+                it has them."""
+
+                if self.__depgraph is not None:
+                        acts = self.__depgraph.get_actions(fmri, excludes)
+                        if acts is not None:
+                                return acts
+                return self.__catalog.get_entry_actions(fmri,
+                    [catalog.Catalog.DEPENDENCY], excludes=excludes)
+
         def __get_actions(self, fmri, name, excludes=EmptyI,
             trim_invalid=True):
                 """Return list of actions of type 'name' for this 'fmri' in
@@ -1811,8 +1879,7 @@ class PkgSolver(object):
                 try:
                         acts = [
                             a
-                            for a in self.__catalog.get_entry_actions(fmri,
-                            [catalog.Catalog.DEPENDENCY], excludes=excludes)
+                            for a in self.__get_entry_actions(fmri, excludes)
                             if a.name == name
                         ]
 
@@ -1855,8 +1922,13 @@ class PkgSolver(object):
                 """Return dictionary of variants suppported by fmri"""
                 try:
                         if fmri not in self.__variant_dict:
-                                self.__variant_dict[fmri] = dict(
-                                    self.__catalog.get_entry_all_variants(fmri))
+                                vd = None
+                                if self.__depgraph is not None:
+                                        vd = self.__depgraph.get_variants(fmri)
+                                if vd is None:
+                                        vd = dict(self.__catalog.
+                                            get_entry_all_variants(fmri))
+                                self.__variant_dict[fmri] = vd
                 except api_errors.InvalidPackageErrors:
                         # Trim package entries that have unparseable action data
                         # so that they can be filtered out later.
@@ -1908,6 +1980,7 @@ class PkgSolver(object):
                         will_filter = False
                 return will_filter
 
+        @profiler.traced()
         def __generate_dependency_closure(self, fmri_set, excludes=EmptyI,
             dotrim=True, full_trim=False, filter_explicit=True,
             proposed_dict=None):
@@ -2865,10 +2938,16 @@ class PkgSolver(object):
                 return [[self.__getid(fmri) for fmri in fmri_list]]
 
         def __addclauses(self, clauses):
-                """add list of clause lists to solver"""
+                """add list of clause lists to solver; clauses which have
+                already been added are skipped, as the dependencies of
+                different packages often generate the same ones"""
 
                 for c in clauses:
                         try:
+                                key = frozenset(c)
+                                if key in self.__added_clauses:
+                                        continue
+                                self.__added_clauses.add(key)
                                 if not self.__solver.add_clause(c):
                                         self.__addclause_failure = True
                                 self.__clauses += 1
@@ -2949,8 +3028,7 @@ class PkgSolver(object):
 
                 installed_incs = []
                 for f in self.__installed_fmris - self.__removal_fmris:
-                        for d in self.__catalog.get_entry_actions(f,
-                            [catalog.Catalog.DEPENDENCY], excludes=excludes):
+                        for d in self.__get_entry_actions(f, excludes):
                                 if (d.name == "set" and d.attrs["name"] ==
                                     "pkg.depend.install-hold"):
                                         installed_incs.append(f)
@@ -2978,9 +3056,7 @@ class PkgSolver(object):
                 # dependencies, those packages that are depended on by explict
                 # version, and those that have pkg.depend.install-hold values.
                 for f in self.__installed_fmris - self.__removal_fmris:
-                        for d in self.__catalog.get_entry_actions(f,
-                            [catalog.Catalog.DEPENDENCY],
-                            excludes=excludes):
+                        for d in self.__get_entry_actions(f, excludes):
                                 if d.name == "depend":
                                         fmris = []
                                         for fl in d.attrlist("fmri"):
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Hierarchical timing of client operations.
+
+When the 'profile' debug value is set (pkg -D profile=<path>), the phases of
+planning and executing an operation are recorded as nested spans, each of
+which can carry counters such as the number of clauses given to the solver or
+the number of manifests retrieved.  save() writes the recorded spans to a file
+in the Chrome trace event format, which can be loaded into chrome://tracing,
+Perfetto and similar tools.
+
+Spans are kept per thread; counters are added to the innermost open span of
+the calling thread, and the counters of a span are added to those of the span
+enclosing it when it ends, so each span reports the totals for everything done
+within it.  When profiling isn't enabled, span() and traced() only cost a
+dictionary lookup and count() does nothing."""
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+from pkg.client.debugvalues import DebugValues
+
+_epoch = time.time()
+_lock = threading.Lock()
+_events = []
+_local = threading.local()
+
+
+def enabled():
+        """Return True if spans are being recorded."""
+
+        return bool(DebugValues["profile"])
+
+
+class Span(object):
+        """An open span; 'counters' is a dict of counter name to value."""
+
+        __slots__ = ["name", "counters"]
+
+        def __init__(self, name, counters):
+                self.name = name
+                self.counters = counters
+
+        def count(self, counter, n=1):
+                """Add 'n' to 'counter'."""
+
+                self.counters[counter] = self.counters.get(counter, 0) + n
+
+
+def add_event(name, start, end, counters=None):
+        """Record a complete span named 'name' for the calling thread which
+        started at 'start' and ended at 'end', as returned by time.time().
+        This is intended for code which already measures its own phases."""
+
+        ev = {
+            "name": name,
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": threading.current_thread().ident,
+            "ts": int((start - _epoch) * 1000000),
+            "dur": int((end - start) * 1000000),
+        }
+        if counters:
+                ev["args"] = dict(counters)
+        with _lock:
+                _events.append(ev)
+
+
+@contextlib.contextmanager
+def span(name, **counters):
+        """Context manager which records the enclosed code as a span named
+        'name' with the initial 'counters'.  The Span is the target of the
+        'with' statement, or None if profiling isn't enabled."""
+
+        if not enabled():
+                yield None
+                return
+
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+                stack = _local.stack = []
+        s = Span(name, counters)
+        stack.append(s)
+        start = time.time()
+        try:
+                yield s
+        finally:
+                end = time.time()
+                stack.pop()
+                if stack:
+                        for c, n in s.counters.items():
+                                stack[-1].count(c, n)
+                add_event(name, start, end, s.counters)
+
+
+def traced(name=None):
+        """Decorator which records each call of the decorated function as a
+        span named 'name', or the qualified name of the function if that
+        isn't given."""
+
+        def decorator(f):
+                label = name or f.__qualname__
+
+                @functools.wraps(f)
+                def wrapper(*args, **kwargs):
+                        if not enabled():
+                                return f(*args, **kwargs)
+                        with span(label):
+                                return f(*args, **kwargs)
+                return wrapper
+        return decorator
+
+
+def count(counter, n=1):
+        """Add 'n' to 'counter' of the innermost open span of the calling
+        thread, if any."""
+
+        stack = getattr(_local, "stack", None)
+        if stack:
+                stack[-1].count(counter, n)
+
+
+def save(path):
+        """Write the spans recorded so far to 'path' as a Chrome trace."""
+
+        with _lock:
+                events = list(_events)
+        pid = os.getpid()
+        meta = [{
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": { "name": " ".join(sys.argv) },
+        }]
+        tids = set(ev["tid"] for ev in events)
+        for t in threading.enumerate():
+                if t.ident in tids:
+                        meta.append({
+                            "name": "thread_name",
+                            "ph": "M",
+                            "pid": pid,
+                            "tid": t.ident,
+                            "args": { "name": t.name },
+                        })
+
+        with open(path, "w") as fh:
+                json.dump({
+                    "traceEvents": meta + events,
+                    "displayTimeUnit": "ms",
+                }, fh)
+
+
+def reset():
+        """Discard the spans recorded so far."""
+
+        with _lock:
+                del _events[:]
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
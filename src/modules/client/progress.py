@@ -818,6 +818,9 @@ class ProgressTrackerFrontend(object):
         @pt_abstract
         def plan_add_progress(self, planid, nitems=1): pass
 
+        @pt_abstract
+        def plan_solver_iteration(self, elapsed): pass
+
         @pt_abstract
         def plan_done(self, planid): pass
 
@@ -1082,6 +1085,9 @@ class ProgressTracker(ProgressTrackerFrontend, ProgressTrackerBackend):
                 # Used to measure elapsed time of entire planning; not otherwise
                 # rendered to the user.
                 self.plan_generic = TrackerItem("")
+                # The time taken by each iteration of the solver during the
+                # current PLAN_SOLVE_SOLVER phase.
+                self.solver_iterations = []
 
                 self._planitems = {
                         self.PLAN_SOLVE_SETUP:
@@ -1261,6 +1267,8 @@ class ProgressTracker(ProgressTrackerFrontend, ProgressTrackerBackend):
         def plan_start(self, planid, goal=None):
                 planitem = self._planitems[planid]
                 planitem.reset()
+                if planid == self.PLAN_SOLVE_SOLVER:
+                        self.solver_iterations = []
                 if goal:
                         if not isinstance(planitem, GoalTrackerItem):
                                 raise RuntimeError(
@@ -1275,6 +1283,13 @@ class ProgressTracker(ProgressTrackerFrontend, ProgressTrackerBackend):
                 self._plan_output(outspec, planitem)
                 planitem.printed = True
 
+        def plan_solver_iteration(self, elapsed):
+                """Record that the solver found a solution, taking 'elapsed'
+                seconds since the previous one or since it started."""
+
+                self.solver_iterations.append(elapsed)
+                self.plan_add_progress(self.PLAN_SOLVE_SOLVER)
+
         def plan_done(self, planid):
                 planitem = self._planitems[planid]
                 planitem.done()
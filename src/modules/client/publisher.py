@@ -2229,7 +2229,8 @@ pkg unset-publisher {0}
                 # origin so create one from our current publisher.
                 test_pub = copy.copy(self)
                 test_pub.repository = repo
-                self.transport.version_check(test_pub)
+                self.transport.version_check(test_pub,
+                    saved=not full_refresh)
 
                 # Ensure that the temporary directory gets removed regardless
                 # of success or failure.
@@ -89,13 +89,29 @@ class CurlTransportEngine(TransportEngine):
                 self.__user_agent = None
                 self.__common_header = {}
                 self.__last_stall_check = 0
+                # Requests being raced by race(), keyed by the uuid of their
+                # StreamingFileObj.  The value is None until the request
+                # completes, and then whether it succeeded.
+                self.__raced = {}
 
                 # Set options on multi-handle
                 self.__mhandle.setopt(pycurl.M_PIPELINING, 0)
 
+                # The easy handles share the multi-handle's connections, but
+                # each would otherwise keep its own cache of TLS sessions and
+                # perform a full handshake for every new connection it makes
+                # to a server.  Share the sessions, and resolved names, among
+                # them so that a connection made by one handle warms up the
+                # rest.  The handles remain attached across resets.
+                self.__share = pycurl.CurlShare()
+                self.__share.setopt(pycurl.SH_SHARE,
+                    pycurl.LOCK_DATA_SSL_SESSION)
+                self.__share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+
                 # initialize easy handles
                 for i in range(self.__max_handles):
                         eh = pycurl.Curl()
+                        eh.setopt(pycurl.SHARE, self.__share)
                         eh.url = None
                         eh.repourl = None
                         eh.fobj = None
@@ -195,6 +211,8 @@ class CurlTransportEngine(TransportEngine):
                                 urlstem = h.repourl
                                 ex = tx.TransportStallError(url,
                                     repourl=urlstem, uuid=uuid)
+                                if uuid in self.__raced:
+                                        self.__raced[uuid] = False
 
                                 self.__mhandle.remove_handle(h)
                                 self.__teardown_handle(h)
@@ -386,6 +404,8 @@ class CurlTransportEngine(TransportEngine):
                             respcode == http_client.OK:
                                 h.success = True
                                 repostats.clear_consecutive_errors()
+                                repostats.record_response(
+                                    h.getinfo(pycurl.STARTTRANSFER_TIME))
                                 success.append(url)
                         else:
                                 proto_reason = None
@@ -431,6 +451,8 @@ class CurlTransportEngine(TransportEngine):
 
                 # Call to remove_handle must be separate from info_read()
                 for h in done_handles:
+                        if h.uuid in self.__raced:
+                                self.__raced[h.uuid] = h.success
                         self.__mhandle.remove_handle(h)
                         self.__teardown_handle(h)
                         self.__freehandles.append(h)
@@ -599,16 +621,71 @@ class CurlTransportEngine(TransportEngine):
 
                 return bool(self.__req_q) or self.__active_handles > 0
 
-        def run(self):
+        def race(self, fobjs, timeout=None):
+                """Run the transport engine until the request of one of the
+                StreamingFileObjs in 'fobjs', as returned by get_url(), has
+                completed successfully, or until 'timeout' seconds have
+                passed.  Returns the file object whose request completed, or
+                None if the timeout passed first.  If all of the requests
+                fail, one of their file objects is returned, so that reading
+                from it raises its error.
+
+                This allows a request which is taking too long to be repeated
+                to another repository, using whichever response arrives
+                first.  The caller should close() the other file objects to
+                cancel their requests."""
+
+                raced = self.__raced
+                for f in fobjs:
+                        raced.setdefault(f.uuid, None)
+                if timeout is not None:
+                        deadline = time.time() + timeout
+
+                try:
+                        while True:
+                                done = [
+                                    f for f in fobjs
+                                    if raced.get(f.uuid) is not None
+                                ]
+                                for f in done:
+                                        if raced[f.uuid]:
+                                                return f
+                                if len(done) == len(fobjs):
+                                        return done[0]
+                                if not self.pending:
+                                        return fobjs[0]
+
+                                wait = None
+                                if timeout is not None:
+                                        wait = deadline - time.time()
+                                        if wait <= 0:
+                                                return None
+                                try:
+                                        self.run(max_wait=wait)
+                                except tx.ExcessiveTransientFailure as ex:
+                                        ex.failures = self.check_status(
+                                            [f.url for f in fobjs])
+                                        raise
+                finally:
+                        for f in fobjs:
+                                raced.pop(f.uuid, None)
+
+        def run(self, max_wait=None):
                 """Run the transport engine.  This polls the underlying
                 framework to complete any asynchronous I/O.  Synchronous
                 operations should have completed when startRequest
-                was invoked."""
+                was invoked.
+
+                'max_wait' is an optional limit, in seconds, on how long to
+                wait for I/O."""
 
                 if not self.pending:
                         return
 
-                if self.__active_handles > 0:
+                # Don't wait for I/O if there are requests that can be started
+                # now.
+                if self.__active_handles > 0 and not (self.__freehandles and
+                    self.__req_q):
                         # timeout returned in milliseconds
                         timeout = self.__mhandle.timeout()
                         if timeout == -1:
@@ -620,6 +697,8 @@ class CurlTransportEngine(TransportEngine):
                                 #
                                 # Convert from milliseconds to seconds.
                                 timeout = timeout / 1000.0
+                        if max_wait is not None:
+                                timeout = min(timeout, max_wait)
 
                         if timeout:
                                 self.__mhandle.select(timeout)
@@ -717,6 +796,7 @@ class CurlTransportEngine(TransportEngine):
                 self.__failures = []
                 self.__success = []
                 self.__orphans = set()
+                self.__raced = {}
 
         def send_data(self, url, data=None, header=None, sslcert=None,
             sslkey=None, repourl=None, ccancel=None,
@@ -1008,6 +1088,8 @@ class CurlTransportEngine(TransportEngine):
                 self.__freehandles = None
                 self.__mhandle.close()
                 self.__mhandle = None
+                self.__share.close()
+                self.__share = None
                 self.__req_q = None
                 self.__failures = None
                 self.__success = None
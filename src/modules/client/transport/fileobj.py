@@ -234,6 +234,10 @@ class StreamingFileObj(object):
         def set_lock(self, lock):
                 self.__lock = lock
 
+        @property
+        def url(self):
+                return self.__url
+
         @property
         def uuid(self):
                 return self.__uuid
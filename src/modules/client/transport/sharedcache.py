@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""A cache of file content shared by all of the images on a host.
+
+Each image keeps the files it downloads in a cache of its own, so a host
+with many images, such as the zones of a system, would otherwise retrieve
+and store the same content once for each of them.  The transport of each
+image adds the content it downloads to the shared cache, and looks for
+content there before retrieving it from a repository.
+
+Files are named by their hash and stored according to the V1 layout, as in
+the caches of images.  They are always copied into and out of the shared
+cache rather than linked, so that no image shares a file with another, and
+the content is verified again by the image which uses it.  Files are copied
+into an incoming directory and then renamed into place, so any number of
+processes may add content at the same time.
+
+Using a file updates its modification time.  Files which haven't been used
+for longer than the age limit are removed, as are the least recently used
+files while the cache is larger than its size limit.  Only one process
+removes files at a time, as arranged by a lock on the cache."""
+
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+import time
+
+import pkg.client.api_errors as apx
+import pkg.file_layout.file_manager as fm
+import pkg.file_layout.layout as fl
+import pkg.misc as misc
+import pkg.portable as portable
+
+INCOMING_DIR = "incoming"
+LOCK_NAME = ".lock"
+
+# The number of seconds after which a file left in the incoming directory,
+# by a process which was interrupted while adding it, is removed.
+INCOMING_MAX_AGE = 24 * 60 * 60
+
+
+class SharedCache(fm.FileManager):
+        """The shared cache stored in the directory 'root'.  'max_size' is
+        the number of bytes and 'max_age' the number of seconds beyond which
+        files are removed by evict(); either may be None for no limit."""
+
+        def __init__(self, root, max_size=None, max_age=None):
+                fm.FileManager.__init__(self, root, False,
+                    layouts=fl.V1Layout())
+                self.max_size = max_size
+                self.max_age = max_age
+                self.__incoming = os.path.join(root, INCOMING_DIR)
+
+        def get(self, hashval, dest):
+                """Copy the file named 'hashval' to the path 'dest'.  Returns
+                False if the cache doesn't contain the file or it couldn't be
+                copied."""
+
+                path = self.lookup(hashval)
+                if not path:
+                        return False
+                try:
+                        with open(path, "rb") as src:
+                                with open(dest, "wb") as dst:
+                                        shutil.copyfileobj(src, dst)
+                except EnvironmentError:
+                        # The file may have been evicted by another process.
+                        try:
+                                portable.remove(dest)
+                        except EnvironmentError:
+                                pass
+                        return False
+
+                try:
+                        os.utime(path, None)
+                except EnvironmentError:
+                        pass
+                return True
+
+        def add(self, hashval, src_path):
+                """Add a copy of the file at 'src_path', whose content has been
+                verified to be that named by 'hashval', unless the cache
+                already contains it.  The cache is only advisory, so failures
+                to add the file are ignored.  Returns True if it was added."""
+
+                if self.lookup(hashval):
+                        return False
+
+                tmp = None
+                try:
+                        try:
+                                os.makedirs(self.__incoming,
+                                    misc.PKG_DIR_MODE)
+                        except EnvironmentError as e:
+                                if e.errno != errno.EEXIST:
+                                        raise
+                        fd, tmp = tempfile.mkstemp(dir=self.__incoming,
+                            prefix=hashval + ".")
+                        with os.fdopen(fd, "wb") as dst:
+                                with open(src_path, "rb") as src:
+                                        shutil.copyfileobj(src, dst)
+                        os.chmod(tmp, misc.PKG_FILE_MODE)
+                        self.insert(hashval, tmp)
+                except (EnvironmentError, apx.ApiException):
+                        if tmp:
+                                try:
+                                        portable.remove(tmp)
+                                except EnvironmentError:
+                                        pass
+                        return False
+                return True
+
+        def evict(self):
+                """Remove the files which haven't been used for longer than
+                the age limit, and then the least recently used files until
+                the cache is no larger than the size limit.  Nothing is done
+                if another process is already removing files.  Returns the
+                number of files removed."""
+
+                if self.max_size is None and self.max_age is None:
+                        return 0
+
+                try:
+                        fd = os.open(os.path.join(self.root, LOCK_NAME),
+                            os.O_RDWR|os.O_CREAT, misc.PKG_FILE_MODE)
+                except EnvironmentError:
+                        return 0
+                try:
+                        try:
+                                fcntl.lockf(fd, fcntl.LOCK_EX|fcntl.LOCK_NB)
+                        except EnvironmentError:
+                                return 0
+                        return self.__evict()
+                finally:
+                        os.close(fd)
+
+        def __evict(self):
+                now = time.time()
+                removed = 0
+                files = []
+                for dirpath, dirnames, filenames in os.walk(self.root):
+                        incoming = dirpath == self.__incoming
+                        for fn in filenames:
+                                if fn == LOCK_NAME:
+                                        continue
+                                path = os.path.join(dirpath, fn)
+                                try:
+                                        st = os.stat(path)
+                                except EnvironmentError:
+                                        continue
+                                age = now - st.st_mtime
+                                if incoming:
+                                        if age > INCOMING_MAX_AGE and \
+                                            self.__remove(path):
+                                                removed += 1
+                                        continue
+                                if self.max_age is not None and \
+                                    age > self.max_age:
+                                        if self.__remove(path):
+                                                removed += 1
+                                        continue
+                                files.append((st.st_mtime, st.st_size, path))
+
+                if self.max_size is None:
+                        return removed
+
+                size = sum(f[1] for f in files)
+                files.sort()
+                for mtime, fsize, path in files:
+                        if size <= self.max_size:
+                                break
+                        if self.__remove(path):
+                                removed += 1
+                        size -= fsize
+                return removed
+
+        @staticmethod
+        def __remove(path):
+                try:
+                        portable.remove(path)
+                except EnvironmentError:
+                        return False
+                try:
+                        os.rmdir(os.path.dirname(path))
+                except EnvironmentError:
+                        pass
+                return True
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
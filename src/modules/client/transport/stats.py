@@ -26,11 +26,31 @@
 
 from __future__ import division
 
+import errno
+import json
 import os
 import datetime
 import random
+import tempfile
+import time
 from six.moves.urllib.parse import urlsplit
 import pkg.misc as misc
+import pkg.portable as portable
+
+# The weight given to each new sample by the moving averages of the transfer
+# speed, latency and error rate of a repository.
+EWMA_WEIGHT = 0.25
+
+# The number of seconds after which the error rate of a repository that was
+# saved by an earlier process has halved.
+ERROR_HALF_LIFE = 60 * 60
+
+# The number of seconds after which saved statistics are discarded.
+SAVED_STATS_MAX_AGE = 7 * 24 * 60 * 60
+
+# The number of seconds for which the versions of operations supported by a
+# repository are trusted without asking it again.
+VERSIONS_TTL = 60 * 60
 
 
 class RepoChooser(object):
@@ -46,6 +66,8 @@ class RepoChooser(object):
                 # A dictionary containing the RepoStats objects. The dictionary
                 # uses TransportRepoURI.key() values as its key.
                 self.__rsobj = {}
+                # The statistics saved by earlier processes, keyed by URL.
+                self.__saved = {}
 
         def __getitem__(self, key):
                 return self.__rsobj[key]
@@ -105,12 +127,23 @@ class RepoChooser(object):
                         if key in self.__rsobj:
                                 rs = self.__rsobj[key]
                         else:
-                                rs = RepoStats(ruri)
-                                self.__rsobj[key] = rs
+                                rs = self.__new_repostats(ruri)
                         found_rs.append((rs, ruri))
 
                 return len([x for x in found_rs if x[0].used])
 
+        def __new_repostats(self, ruri):
+                """Create the RepoStats object for the TransportRepoURI 'ruri',
+                starting from any statistics saved for it by an earlier
+                process."""
+
+                rs = RepoStats(ruri)
+                state = self.__saved.get(rs.url)
+                if state:
+                        rs.set_state(state)
+                self.__rsobj[ruri.key()] = rs
+                return rs
+
         def get_repostats(self, repouri_list, origin_list=misc.EmptyI):
                 """Walk a list of TransportRepoURIs and return a sorted list of
                 status objects.  The better choices should be at the
@@ -120,33 +153,28 @@ class RepoChooser(object):
                 origin_speed = 0
                 origin_count = 0
                 origin_avg_speed = 0
-                origin_cspeed = 0
-                origin_ccount = 0
-                origin_avg_cspeed = 0
+                origin_min_latency = 0
 
                 for ouri in origin_list:
                         key = ouri.key()
                         if key in self.__rsobj:
                                 rs = self.__rsobj[key]
-                                if rs.bytes_xfr > 0:
+                                if rs.speed > 0:
                                         # Exclude sources that don't
                                         # contribute to transfer speed.
-                                        origin_speed += rs.transfer_speed
+                                        origin_speed += rs.speed
                                         origin_count += 1
-                                if rs.connect_time > 0:
+                                if rs.latency > 0 and (
+                                    not origin_min_latency or
+                                    rs.latency < origin_min_latency):
                                         # Exclude sources that don't
-                                        # contribute to connection
-                                        # time.
-                                        origin_cspeed += rs.connect_time
-                                        origin_ccount += 1
+                                        # contribute to latency.
+                                        origin_min_latency = rs.latency
                         else:
-                                rs = RepoStats(ouri)
-                                self.__rsobj[key] = rs
+                                rs = self.__new_repostats(ouri)
 
                 if origin_count > 0:
                         origin_avg_speed = origin_speed // origin_count
-                if origin_ccount > 0:
-                        origin_avg_cspeed = origin_cspeed // origin_ccount
 
                 # Walk the list of repouris that we were provided.
                 # If they're already in the dictionary, copy a reference
@@ -161,8 +189,7 @@ class RepoChooser(object):
                         if key in self.__rsobj:
                                 rs = self.__rsobj[key]
                         else:
-                                rs = RepoStats(ruri)
-                                self.__rsobj[key] = rs
+                                rs = self.__new_repostats(ruri)
                         found_rs.append((rs, ruri))
                         if ruri in origin_list:
                                 n = num_origins - o_idx
@@ -177,8 +204,8 @@ class RepoChooser(object):
                         if origin_count > 0:
                                 rs.origin_speed = origin_avg_speed
                                 rs.origin_count = origin_count
-                        if origin_ccount > 0:
-                                rs.origin_cspeed = origin_avg_cspeed
+                        if origin_min_latency > 0:
+                                rs.origin_cspeed = origin_min_latency
 
                         # Decay error rate for transient errors.
                         # Reduce the error penalty by .1% each iteration.
@@ -198,6 +225,71 @@ class RepoChooser(object):
 
                 self.__rsobj = {}
 
+        def load(self, path):
+                """Load the statistics saved by an earlier process in the file
+                at 'path', so that the repositories which performed well then
+                are preferred from the start.  Missing or invalid files are
+                ignored."""
+
+                try:
+                        with open(path) as f:
+                                saved = json.load(f)
+                        repos = saved["repos"]
+                        now = time.time()
+                        self.__saved = dict(
+                            (url, state)
+                            for url, state in repos.items()
+                            if 0 <= now - state["time"] < SAVED_STATS_MAX_AGE
+                        )
+                except (EnvironmentError, ValueError, KeyError, TypeError):
+                        return
+
+                for rs in self.__rsobj.values():
+                        state = self.__saved.get(rs.url)
+                        if state and not rs.used:
+                                rs.set_state(state)
+
+        def save(self, path):
+                """Save the statistics of the repositories that have been used
+                to the file at 'path', along with those saved earlier for other
+                repositories.  The statistics are only advisory, so failures to
+                write them are ignored."""
+
+                now = time.time()
+                repos = self.__saved.copy()
+                for rs in self.__rsobj.values():
+                        if rs.used:
+                                repos[rs.url] = rs.get_state(now)
+                if not repos:
+                        return
+
+                dirname = os.path.dirname(path)
+                try:
+                        # Only the right-most directory is created, as for
+                        # the image's history.
+                        os.mkdir(dirname, misc.PKG_DIR_MODE)
+                except EnvironmentError as e:
+                        if e.errno != errno.EEXIST:
+                                return
+
+                try:
+                        fd, tmp = tempfile.mkstemp(dir=dirname,
+                            prefix=".{0}.".format(os.path.basename(path)))
+                except EnvironmentError:
+                        return
+                try:
+                        with os.fdopen(fd, "w") as f:
+                                json.dump({ "version": 1, "repos": repos }, f)
+                        os.chmod(tmp, misc.PKG_FILE_MODE)
+                        portable.rename(tmp, path)
+                except EnvironmentError:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        return
+                self.__saved = repos
+
         def reset(self):
                 """reset each stats object"""
 
@@ -247,6 +339,21 @@ class RepoStats(object):
                 self.origin_factor = 1
                 self.origin_decay = 1
 
+                # Exponentially weighted moving averages of the size and
+                # duration of transfers, the latency of requests, and their
+                # error rate.  Unlike the counters above, these are kept
+                # across operations and saved for later processes, and
+                # reflect how the repository has performed recently.
+                self.__ewma_bytes = 0.0
+                self.__ewma_seconds = 0.0
+                self.__ewma_latency = None
+                self.__error_rate = 0.0
+
+                # The response of the repository to a versions/0 request,
+                # and when it was received.
+                self.__versions = None
+                self.__versions_time = 0
+
         def clear_consecutive_errors(self):
                 """Set the count of consecutive errors to zero.  This is
                 done once we know a transaction has been successfully
@@ -277,6 +384,7 @@ class RepoStats(object):
                         self.__used = True
 
                 self.__consecutive_errors += 1
+                self.__error_rate += EWMA_WEIGHT * (1 - self.__error_rate)
                 if decayable:
                         self.__decayable_err += 1
                         self._err_decay += 1
@@ -303,6 +411,34 @@ class RepoStats(object):
                 self.__bytes_xfr += bytes
                 self.__seconds_xfr += seconds
 
+                if seconds > 0:
+                        self.__ewma_bytes += EWMA_WEIGHT * (bytes -
+                            self.__ewma_bytes)
+                        self.__ewma_seconds += EWMA_WEIGHT * (seconds -
+                            self.__ewma_seconds)
+
+        def record_response(self, seconds):
+                """Record that a request to the TransportRepoURI represented
+                by this RepoStats object completed successfully, and that the
+                first byte of its response arrived after 'seconds'."""
+
+                self.record_latency(seconds)
+                self.__error_rate -= EWMA_WEIGHT * self.__error_rate
+
+        def record_latency(self, seconds):
+                """Record that a response from the TransportRepoURI
+                represented by this RepoStats object took 'seconds' to start
+                arriving, or at least that long if the request was canceled
+                before it did."""
+
+                if not self.__used:
+                        self.__used = True
+                if self.__ewma_latency is None:
+                        self.__ewma_latency = seconds
+                else:
+                        self.__ewma_latency += EWMA_WEIGHT * (seconds -
+                            self.__ewma_latency)
+
         def record_tx(self):
                 """Record that an operation to the URI represented
                 by this RepoStats object was initiated."""
@@ -329,6 +465,69 @@ class RepoStats(object):
                 self.__consecutive_errors = 0
                 self.origin_speed = 0.0
 
+        def record_versions(self, versions):
+                """Record the dictionary of operation names and versions that
+                the repository returned for a versions/0 request, so that
+                later processes needn't ask again for a while."""
+
+                self.__versions = dict(versions)
+                self.__versions_time = time.time()
+
+        def get_state(self, now):
+                """Return the moving averages of this repository's statistics
+                as a dictionary which can be saved and passed to set_state()
+                by a later process.  'now' is the current time."""
+
+                state = {
+                    "bytes": self.__ewma_bytes,
+                    "seconds": self.__ewma_seconds,
+                    "latency": self.__ewma_latency,
+                    "errors": self.__error_rate,
+                    "time": now,
+                }
+                if self.__versions:
+                        state["versions"] = self.__versions
+                        state["versions_time"] = self.__versions_time
+                return state
+
+        def set_state(self, state):
+                """Start from the moving averages in the dictionary 'state'
+                returned by get_state().  As the errors a repository had may
+                have been transient, its error rate decays with the time since
+                the state was saved."""
+
+                try:
+                        age = max(time.time() - state["time"], 0)
+                        self.__ewma_bytes = float(state["bytes"])
+                        self.__ewma_seconds = float(state["seconds"])
+                        latency = state["latency"]
+                        if latency is not None:
+                                latency = float(latency)
+                        self.__ewma_latency = latency
+                        self.__error_rate = float(state["errors"]) * \
+                            0.5 ** (age / ERROR_HALF_LIFE)
+                        versions = state.get("versions")
+                        if versions:
+                                self.__versions = dict(
+                                    (str(k), str(v))
+                                    for k, v in versions.items()
+                                )
+                                self.__versions_time = \
+                                    float(state["versions_time"])
+                except (AttributeError, KeyError, TypeError, ValueError):
+                        pass
+
+        @property
+        def versions(self):
+                """The dictionary of operation names and versions that the
+                repository returned for a versions/0 request, if it was
+                received recently enough to be trusted, or None."""
+
+                age = time.time() - self.__versions_time
+                if not self.__versions or not 0 <= age < VERSIONS_TTL:
+                        return None
+                return dict(self.__versions)
+
         @property
         def bytes_xfr(self):
                 """Return the number of bytes transferred."""
@@ -348,6 +547,23 @@ class RepoStats(object):
                 # old-division; pylint: disable=W1619
                 return self.__connect_time / self.__connections
 
+        @property
+        def error_rate(self):
+                """The recent rate of failed requests to this host, between
+                zero and one."""
+
+                return self.__error_rate
+
+        @property
+        def latency(self):
+                """The recent average time taken for a response from this
+                host to start arriving.  The average connection time is
+                returned until a response has been received."""
+
+                if self.__ewma_latency is None:
+                        return self.connect_time
+                return self.__ewma_latency
+
         @property
         def consecutive_errors(self):
                 """Return the number of successive errors this endpoint
@@ -409,6 +625,7 @@ class RepoStats(object):
                 Cspeed = 100
                 Cconn_speed = 66
                 Cerror = 500
+                Cerror_rate = 2000
                 Ccontent_err = 1000
                 Crand_max = 20
                 Cospeed_none = 100000
@@ -461,10 +678,19 @@ class RepoStats(object):
                 # The equation is currently defined as:
                 #
                 # Q = Origin_order_bonus() + Unused_bonus() + Cspeed *
-                # ((bytes/.001+seconds) / origin_speed)^2 + random_bonus(
-                # Crand_max) - Cconn_speed * (connect_speed /
-                # origin_connect_speed)^2 - Ccontent_error * (content_errors)^2
+                # (recent_speed / origin_speed)^2 + random_bonus(
+                # Crand_max) - Cconn_speed * (recent_latency /
+                # lowest_origin_latency)^2 - Ccontent_error * (content_errors)^2
                 # - Cerror * (non_decayable_errors + value_of_decayed_errors)^2
+                # - Cerror_rate * recent_error_rate
+                #
+                # The recent speed, latency and error rate are exponentially
+                # weighted moving averages, which outlive a single operation,
+                # so that a host which has slowed down or started failing
+                # loses its place, and one which recovers regains it.  Latency
+                # is compared with that of the quickest origin, so that a
+                # host which is much slower than the others is penalized
+                # however many of them there are.
                 #
                 # Unused_bonus = Cused * (MaxUsed - total tx)^2 if total_tx
                 # is less than MaxUsed, otherwise return 0.
@@ -479,12 +705,12 @@ class RepoStats(object):
                 #
                 # old-division; pylint: disable=W1619
                 q = origin_order_bonus(self) + unused_bonus(self) + \
-                    (Cspeed * ((self.__bytes_xfr / (.001 + self.__seconds_xfr))
-                    / ospeed)**2) + \
+                    (Cspeed * (self.speed / ospeed)**2) + \
                     int(random.gauss(0, Crand_max)) - \
-                    (Cconn_speed * (self.connect_time / ocspeed)**2) - \
+                    (Cconn_speed * (self.latency / ocspeed)**2) - \
                     (Ccontent_err * (self.__content_err)**2) - \
-                    (Cerror * (self.__failed_tx + self._err_decay)**2)
+                    (Cerror * (self.__failed_tx + self._err_decay)**2) - \
+                    (Cerror_rate * self.__error_rate)
                 return int(q)
 
         @property
@@ -503,6 +729,17 @@ class RepoStats(object):
                     self.__content_err +  self.__decayable_err)
 
 
+        @property
+        def speed(self):
+                """Return the recent transfer speed in bytes/sec for
+                   operations against this uri."""
+
+                if self.__ewma_seconds == 0:
+                        return 0.0
+
+                # old-division; pylint: disable=W1619
+                return self.__ewma_bytes / self.__ewma_seconds
+
         @property
         def transfer_speed(self):
                 """Return the average transfer speed in bytes/sec for
@@ -26,12 +26,15 @@
 #
 
 from __future__ import  print_function
+import atexit
 import copy
 import datetime as dt
 import errno
 import os
 import six
 import tempfile
+import time
+import weakref
 import zlib
 from collections import defaultdict
 from functools import cmp_to_key
@@ -45,11 +48,14 @@ from six.moves.urllib.parse import quote, urlsplit, urlparse, urlunparse, \
 import pkg.catalog as catalog
 import pkg.client.api_errors as apx
 import pkg.client.imageconfig as imageconfig
+import pkg.client.profiler as profiler
 import pkg.client.publisher as publisher
 import pkg.client.transport.engine as engine
 import pkg.client.transport.exception as tx
+import pkg.client.transport.fileobj as fileobj
 import pkg.client.transport.mdetect as mdetect
 import pkg.client.transport.repo as trepo
+import pkg.client.transport.sharedcache as sharedcache
 import pkg.client.transport.stats as tstats
 import pkg.client.progress as progress
 import pkg.digest as digest
@@ -217,6 +223,13 @@ class TransportCfg(object):
                 """
                 raise NotImplementedError
 
+        def get_pkg_pack(self, pfmri):
+                """Returns the pkg.manifestpack.ManifestPack that the manifest
+                caches should be stored in, or None if they should be stored
+                in the directory returned by get_pkg_dir().
+                """
+                raise NotImplementedError
+
         def get_pkg_sigs(self, fmri, pub):
                 """Returns a dictionary of the signature data found in the
                 catalog for the given package FMRI and Publisher object or None
@@ -344,6 +357,14 @@ class TransportCfg(object):
         pkg_root = property(doc="The absolute pathname of the directory "
             "where manifest files should be stored to and loaded from.")
 
+        stats_path = property(lambda self: None, doc="The absolute pathname "
+            "of the file where the statistics of the repositories used are "
+            "saved for later processes, or None if they aren't saved.")
+
+        shared_cache_dir = property(lambda self: None, doc="The absolute "
+            "pathname of the directory of the content cache shared by the "
+            "images on the host, or None if it isn't used.")
+
         user_agent = property(doc="A string that identifies the user agent for "
             "the transport.")
 
@@ -378,6 +399,13 @@ class ImageTransportCfg(TransportCfg):
 
                 return self.__img.get_manifest_path(pfmri)
 
+        def get_pkg_pack(self, pfmri):
+                """Returns the pkg.manifestpack.ManifestPack that the manifest
+                caches should be stored in, or None if they should be stored
+                in the directory returned by get_pkg_dir()."""
+
+                return self.__img.get_manifest_pack(pfmri)
+
         def get_pkg_sigs(self, fmri, pub):
                 """Returns a dictionary of the signature data found in the
                 catalog for the given package FMRI and Publisher object or None
@@ -444,10 +472,25 @@ class ImageTransportCfg(TransportCfg):
                 return misc.user_agent_str(self.__img,
                     global_settings.client_name)
 
+        def __get_stats_path(self):
+                if not self.__img.imgdir:
+                        return None
+                return os.path.join(self.__img.imgdir, "cache",
+                    "transport-stats.json")
+
         incoming_root = property(lambda self: self.__img._incoming_cache_dir,
             doc="The absolute pathname of the directory where in-progress "
             "downloads should be stored.")
 
+        stats_path = property(__get_stats_path, doc="The absolute pathname "
+            "of the file where the statistics of the repositories used are "
+            "saved for later processes.")
+
+        shared_cache_dir = property(
+            lambda self: global_settings.PKG_SHARED_CACHEDIR,
+            doc="The absolute pathname of the directory of the content cache "
+            "shared by the images on the host, or None if it isn't used.")
+
         user_agent = property(__get_user_agent, doc="A string that identifies "
             "the user agent for the transport.")
 
@@ -488,6 +531,13 @@ class GenericTransportCfg(TransportCfg):
 
                 return os.path.join(self.get_pkg_dir(pfmri), "manifest")
 
+        def get_pkg_pack(self, pfmri):
+                """Returns the pkg.manifestpack.ManifestPack that the manifest
+                caches should be stored in, or None if they should be stored
+                in the directory returned by get_pkg_dir()."""
+
+                return None
+
         def get_policy(self, policy_name):
                 return self.__policy_map.get(policy_name, False)
 
@@ -544,6 +594,15 @@ class LockedTransport(object):
                                 lock.release()
                 return wrapper
 
+# The transports whose repository statistics are saved when the process exits.
+_stats_transports = weakref.WeakSet()
+
+def _save_stats():
+        for t in list(_stats_transports):
+                t.save_stats()
+
+atexit.register(_save_stats)
+
 def _convert_repouris(repolist):
         """Given a list of RepositoryURI objects, expand them into a list of
         TransportRepoURI objects, each representing a different transport path
@@ -575,6 +634,9 @@ class Transport(object):
                 self._lock = nrlock.NRLock()
                 self.cfg = tcfg
                 self.stats = tstats.RepoChooser()
+                self.__stats_loaded = False
+                self.__shared_cache = None
+                self.__shared_added = False
                 self.repo_status = {}
                 self.__tmp_crls = {}
                 # Used to record those actions that will have their payload
@@ -587,6 +649,13 @@ class Transport(object):
         def __setup(self):
                 self.__engine = engine.CurlTransportEngine(self)
 
+                # Start from the repository statistics of earlier processes,
+                # and save them for later ones.
+                if not self.__stats_loaded and self.cfg.stats_path:
+                        self.stats.load(self.cfg.stats_path)
+                        self.__stats_loaded = True
+                        _stats_transports.add(self)
+
                 # Configure engine's user agent
                 self.__engine.set_user_agent(self.cfg.user_agent)
 
@@ -635,6 +704,10 @@ class Transport(object):
 
                 self._lock.acquire()
                 try:
+                        self.save_stats()
+                        if self.__shared_added:
+                                self.__shared_added = False
+                                self.__get_shared_cache().evict()
                         self.__engine.shutdown()
                         self.__engine = None
                         if self.__repo_cache:
@@ -644,6 +717,28 @@ class Transport(object):
                 finally:
                         self._lock.release()
 
+        def __get_shared_cache(self):
+                """Return the SharedCache object for the content cache shared
+                by the images on the host, or None if it isn't used."""
+
+                if not self.__shared_cache and self.cfg.shared_cache_dir:
+                        max_size = global_settings.PKG_SHARED_CACHE_MAXSIZE
+                        max_age = global_settings.PKG_SHARED_CACHE_MAXAGE
+                        self.__shared_cache = sharedcache.SharedCache(
+                            self.cfg.shared_cache_dir,
+                            max_size=max_size * 1024 * 1024
+                            if max_size > 0 else None,
+                            max_age=max_age * 24 * 60 * 60
+                            if max_age > 0 else None)
+                return self.__shared_cache
+
+        def save_stats(self):
+                """Save the statistics of the repositories used, so that
+                later processes can choose between them from the start."""
+
+                if self.__stats_loaded and self.cfg.stats_path:
+                        self.stats.save(self.cfg.stats_path)
+
         @LockedTransport()
         def do_search(self, pub, data, ccancel=None, alt_repo=None):
                 """Perform a search request.  Returns a file-like object or an
@@ -1193,6 +1288,21 @@ class Transport(object):
                 a license or release-note, all other cases should use 'strict'
                 """
 
+                shared = self.__get_shared_cache()
+                spath = shared and shared.lookup(fhash)
+                if spath:
+                        s = BytesIO()
+                        try:
+                                with open(spath, "rb") as f:
+                                        hash_val = misc.gunzip_from_stream(f,
+                                            s, hash_func=hash_func)
+                        except (EnvironmentError, zlib.error):
+                                hash_val = None
+                        if hash_val == fhash:
+                                profiler.count("shared cache hits")
+                                return misc.force_str(s.getvalue(),
+                                    errors=errors)
+
                 retry_count = global_settings.PKG_CLIENT_MAX_TIMEOUT
                 failures = tx.TransportFailures()
                 header = self.__build_header(uuid=self.__get_uuid(pub),
@@ -1395,6 +1505,7 @@ class Transport(object):
                             pub=pub, trans_id=trans_id, hashes=hashes)
 
         @LockedTransport()
+        @profiler.traced()
         def get_manifest(self, fmri, excludes=misc.EmptyI, intent=None,
             ccancel=None, pub=None, content_only=False, alt_repo=None):
                 """Given a fmri, and optional excludes, return a manifest
@@ -1444,13 +1555,18 @@ class Transport(object):
                         header = Transport.__get_request_header(header,
                             repostats, retries, d)
                         try:
-                                resp = d.get_manifest(fmri, header,
-                                    ccancel=ccancel, pub=pub)
+                                d, resp = self.__hedged_fetch(pub, d,
+                                    lambda r: r.get_manifest(fmri, header,
+                                    ccancel=ccancel, pub=pub),
+                                    alt_repo=alt_repo)
+                                repouri_key = d.get_repouri_key()
+                                repostats = self.stats[repouri_key]
                                 # If resp is a StreamingFileObj obj, its read()
                                 # methods will return bytes. We need str for
                                 # manifest and here's the earliest point that
                                 # we can convert it to str.
                                 mcontent = misc.force_str(resp.read())
+                                profiler.count("manifests fetched")
 
                                 verified = self._verify_manifest(fmri,
                                     content=mcontent, pub=pub)
@@ -1458,10 +1574,12 @@ class Transport(object):
                                 if content_only:
                                         return mcontent
 
+                                mpath = self.cfg.get_pkg_pathname(fmri)
                                 m = manifest.FactoredManifest(fmri,
                                     self.cfg.get_pkg_dir(fmri),
                                     contents=mcontent, excludes=excludes,
-                                    pathname=self.cfg.get_pkg_pathname(fmri))
+                                    pathname=mpath,
+                                    pack=self.cfg.get_pkg_pack(fmri))
 
                                 return m
 
@@ -1499,6 +1617,7 @@ class Transport(object):
                 raise failures
 
         @LockedTransport()
+        @profiler.traced()
         def prefetch_manifests(self, fetchlist, excludes=misc.EmptyI,
             progtrack=None, ccancel=None, alt_repo=None):
                 """Given a list of tuples [(fmri, intent), ...], prefetch
@@ -1709,10 +1828,13 @@ class Transport(object):
                                         mf = open(dl_path)
                                         mcontent = mf.read()
                                         mf.close()
+                                        mpath = self.cfg.get_pkg_pathname(
+                                            fmri)
                                         manifest.FactoredManifest(fmri,
                                             self.cfg.get_pkg_dir(fmri),
-                                            contents=mcontent, excludes=excludes,
-                                            pathname=self.cfg.get_pkg_pathname(fmri))
+                                            contents=mcontent,
+                                            excludes=excludes, pathname=mpath,
+                                            pack=self.cfg.get_pkg_pack(fmri))
                                 except (apx.InvalidPackageErrors,
                                     ActionError) as e:
                                         if verified:
@@ -1730,6 +1852,7 @@ class Transport(object):
 
                                 portable.remove(dl_path)
                                 progtrack.manifest_commit()
+                                profiler.count("manifests fetched")
                                 mxfr.del_hash(s)
 
                         # If there were failures, re-generate list for just
@@ -1880,6 +2003,7 @@ class Transport(object):
                                 raise tx.TransportOperationError("Unable to "
                                     "make directory: {0}".format(e))
 
+        @profiler.traced()
         def _get_files_list(self, mfile, flist):
                 """Download the files given in argument 'flist'.  This
                 allows us to break up download operations into multiple
@@ -1908,6 +2032,7 @@ class Transport(object):
                         cache = cache[0]
                 else:
                         cache = None
+                shared = self.__get_shared_cache()
 
                 for d, retries, v in self.__gen_repo(pub, retry_count,
                     operation="file", versions=[0, 1],
@@ -1986,10 +2111,11 @@ class Transport(object):
                                         continue
 
                                 if cache:
-                                        cpath = cache.insert(s, dl_path)
-                                        mfile.file_done(s, cpath)
-                                else:
-                                        mfile.file_done(s, dl_path)
+                                        dl_path = cache.insert(s, dl_path)
+                                if shared and shared.add(s, dl_path):
+                                        self.__shared_added = True
+                                mfile.file_done(s, dl_path)
+                                profiler.count("files fetched")
 
                         # Return if everything was successful
                         if not filelist and not errlist:
@@ -2238,8 +2364,11 @@ class Transport(object):
 
                 return v
 
-        def _get_versions(self, pub, ccancel=None, alt_repo=None):
-                """Implementation of get_versions"""
+        def _get_versions(self, pub, ccancel=None, alt_repo=None,
+            saved=False):
+                """Implementation of get_versions.  If 'saved' is True, the
+                versions which a remote origin returned recently, possibly to
+                an earlier process, are used instead of asking it again."""
 
                 retry_count = global_settings.PKG_CLIENT_MAX_TIMEOUT
                 failures = tx.TransportFailures()
@@ -2265,8 +2394,12 @@ class Transport(object):
                         # save it if it's retryable, otherwise
                         # raise the error to a higher-level handler.
                         try:
-                                vers = self.__get_version(d, header,
-                                    ccancel=ccancel)
+                                vers = saved and repostats.versions
+                                if not vers:
+                                        vers = self.__get_version(d, header,
+                                            ccancel=ccancel)
+                                        self.__record_versions(repostats,
+                                            vers)
                                 # Save this information for later use, too.
                                 self.__fill_repo_vers(d, vers)
                                 return vers
@@ -2308,14 +2441,24 @@ class Transport(object):
                 except ValueError as e:
                         raise tx.InvalidContentException(e)
 
+        @staticmethod
+        def __record_versions(repostats, vers):
+                """Remember the versions returned by a remote origin, so that
+                they can be saved with its statistics for later processes."""
+
+                if repostats.scheme in ("http", "https"):
+                        repostats.record_versions(vers)
+
         def __fill_repo_vers(self, repo, vers=None, ccancel=None):
                 """Download versions information for the transport
                 repository object and store that information inside
                 of it."""
 
-                # Call __get_version to get the version dictionary
-                # from the repo.
-
+                # Use the versions the repo returned recently, if any, or
+                # call __get_version to get the version dictionary from it.
+                repostats = self.stats[repo.get_repouri_key()]
+                if not vers:
+                        vers = repostats.versions
                 if not vers:
                         try:
                                 vers = self.__get_version(repo, ccancel=ccancel)
@@ -2324,6 +2467,7 @@ class Transport(object):
                                     "versions", 0,
                                     "InvalidContentException while parsing "
                                     "response")
+                        self.__record_versions(repostats, vers)
 
                 for key, val in vers.items():
                         # Don't turn this line into a list of versions.
@@ -2507,6 +2651,75 @@ class Transport(object):
                                 raise apx.UnsupportedRepositoryOperation(pub,
                                     "{0}/{1:d}".format(operation, versions[-1]))
 
+        def __hedged_fetch(self, pub, d, fetch, alt_repo=None):
+                """Make a request for metadata by calling 'fetch' with the
+                Repo object 'd', and return a tuple of the Repo and the
+                response.  If no response has arrived from 'd' by the time it
+                usually would have, the request is also made to the best of
+                the other origins of 'pub' or 'alt_repo', and the Repo and
+                response which arrive first are returned; the other request
+                is canceled.  This keeps a slow but working origin from
+                holding up an operation."""
+
+                resp = fetch(d)
+                min_delay = global_settings.PKG_CLIENT_HEDGE_DELAY
+                if min_delay <= 0 or \
+                    not isinstance(resp, fileobj.StreamingFileObj):
+                        return d, resp
+
+                if alt_repo:
+                        origins = alt_repo.origins
+                elif isinstance(pub, publisher.Publisher) and pub.repository:
+                        origins = pub.repository.origins
+                else:
+                        return d, resp
+                if len(origins) < 2:
+                        return d, resp
+
+                # The other origin most likely to respond quickly.
+                key = d.get_repouri_key()
+                best = None
+                for ruri in _convert_repouris(origins):
+                        rkey = ruri.key()
+                        if rkey == key or rkey not in self.stats:
+                                continue
+                        rs = self.stats[rkey]
+                        if rs.scheme not in ("http", "https") or \
+                            rs.consecutive_errors:
+                                continue
+                        if not best or rs.quality > best[0].quality:
+                                best = (rs, ruri)
+                if not best:
+                        return d, resp
+
+                # Wait for a few times as long as the origin's responses
+                # have recently taken to start arriving.
+                delay = max(min_delay / 1000.0, 3 * self.stats[key].latency)
+                start = time.time()
+                hresp = None
+                try:
+                        if self.__engine.race([resp], timeout=delay):
+                                return d, resp
+
+                        profiler.count("hedged requests")
+                        hd = self.__repo_cache.new_repo(*best)
+                        hresp = fetch(hd)
+                        if self.__engine.race([resp, hresp]) is hresp:
+                                # The response from 'd' would have taken at
+                                # least this long; without recording it, 'd'
+                                # would remain the first choice.
+                                self.stats[key].record_latency(
+                                    time.time() - start)
+                                resp.close()
+                                return hd, hresp
+                        hresp.close()
+                        return d, resp
+                except:
+                        for f in (resp, hresp):
+                                if f:
+                                        f.close()
+                        raise
+
         def __chunk_size(self, pub, alt_repo=None, origin_only=False):
                 """Determine the chunk size based upon how many of the known
                 mirrors have been visited.  If not all mirrors have been
@@ -2605,17 +2818,19 @@ class Transport(object):
                                         # get recorded in self.repo_status. 
                                         pass
 
-        def version_check(self, pub, ccancel=None):
+        def version_check(self, pub, ccancel=None, saved=True):
                 """Retrieve version info from publisher and fill internal
                 version caches. If we encounter problems contacting the repo,
-                store that information for later."""
+                store that information for later.  If 'saved' is False, the
+                versions are retrieved even if the publisher's origins
+                returned them recently."""
                 self._lock.acquire()
                 try:
-                        self._version_check(pub, ccancel=ccancel)
+                        self._version_check(pub, ccancel=ccancel, saved=saved)
                 finally:
                         self._lock.release()
 
-        def _version_check(self, pub, ccancel=None):
+        def _version_check(self, pub, ccancel=None, saved=True):
                 """Implementation of version check."""
 
                 fail = tx.TransportFailures()
@@ -2627,7 +2842,8 @@ class Transport(object):
                         self.repo_status[pub.prefix]["total"] = 1
 
                 try:
-                        vd = self._get_versions(pub, ccancel=ccancel)
+                        vd = self._get_versions(pub, ccancel=ccancel,
+                            saved=saved)
                 except tx.TransportException as ex:
                         if isinstance(ex, tx.TransportFailures):
                                 fail.extend(ex.exceptions)
@@ -2777,7 +2993,38 @@ class Transport(object):
                                 # hash of the action, verify will have already
                                 # purged the item from the cache.
                                 pass
-                return None
+                return self.__shared_cached(action, pub, hash_val)
+
+        def __shared_cached(self, action, pub, hash_val):
+                """If the content cache shared by the images on the host has
+                the file named hash_val, copy it into the image's cache and
+                return the path to the copy once it has been verified.
+                Otherwise, return None."""
+
+                shared = self.__get_shared_cache()
+                if not shared:
+                        return None
+                cache = self.cfg.get_caches(pub, readonly=False)
+                if not cache:
+                        return None
+
+                download_dir = self.cfg.incoming_root
+                self._makedirs(download_dir)
+                dl_path = os.path.join(download_dir, hash_val)
+                if not shared.get(hash_val, dl_path):
+                        return None
+                try:
+                        self._verify_content(action, dl_path)
+                except tx.InvalidContentException:
+                        # Verification has removed the copy; remove the
+                        # original too, so that it is downloaded again.
+                        try:
+                                shared.remove(hash_val)
+                        except (EnvironmentError, apx.ApiException):
+                                pass
+                        return None
+                profiler.count("shared cache hits")
+                return cache[0].insert(hash_val, dl_path)
 
         @staticmethod
         def _make_opener(cache_path):
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Cache of the results of verifying the content of installed files.
+
+When the content of an installed file has been found to match the hash its
+action delivers, the file's size, modification and change times and inode
+number are recorded along with that hash.  As long as all of those are
+unchanged, the file can be assumed to still match and the cost of hashing it
+again can be avoided.
+
+The cache file consists of a version line followed by one line per path of
+the form:
+
+    <hash> <size> <mtime in ns> <ctime in ns> <inode> <path>
+
+The cache is purely advisory; if it can't be read, it's treated as empty and
+if it can't be written, the results are simply discarded."""
+
+import errno
+import os
+import tempfile
+
+import pkg.portable as portable
+
+VERSION = "VERSION 1"
+
+
+def _stat_key(lstat):
+        return (lstat.st_size, lstat.st_mtime_ns, lstat.st_ctime_ns,
+            lstat.st_ino)
+
+
+class VerifyCache(object):
+        """A verification cache stored at 'path'.  The file is only read when
+        the cache is first used, and only written by save() if the cache has
+        been changed."""
+
+        def __init__(self, path):
+                self.__path = path
+                self.__entries = None
+                # Changes since the cache was loaded, where None marks a
+                # discarded path.
+                self.__updates = {}
+
+        def __load(self):
+                self.__entries = {}
+                try:
+                        fh = open(self.__path, "r", encoding="utf-8")
+                except EnvironmentError:
+                        return
+                with fh:
+                        if fh.readline().rstrip("\n") != VERSION:
+                                return
+                        for l in fh:
+                                try:
+                                        hval, size, mtime, ctime, ino, path = \
+                                            l.rstrip("\n").split(" ", 5)
+                                        self.__entries[path] = ((int(size),
+                                            int(mtime), int(ctime), int(ino)),
+                                            hval)
+                                except ValueError:
+                                        # Ignore damaged entries.
+                                        continue
+
+        def load(self):
+                """Read the cache file if that hasn't happened yet."""
+
+                if self.__entries is None:
+                        self.__load()
+
+        def lookup(self, path, lstat, hashval):
+                """Return True if the content of the installed file at 'path'
+                with the stat result 'lstat' is known to match 'hashval'."""
+
+                self.load()
+                ent = self.__entries.get(path)
+                return ent is not None and ent[1] == hashval and \
+                    ent[0] == _stat_key(lstat)
+
+        def add(self, path, lstat, hashval):
+                """Record that the content of the installed file at 'path',
+                which had the stat result 'lstat', matched 'hashval'."""
+
+                self.load()
+                ent = (_stat_key(lstat), hashval)
+                self.__entries[path] = ent
+                self.__updates[path] = ent
+
+        def discard(self, path):
+                """Forget any result recorded for 'path'."""
+
+                self.load()
+                if self.__entries.pop(path, None) is not None:
+                        self.__updates[path] = None
+
+        def pop_updates(self):
+                """Return the changes made to the cache since it was loaded or
+                this was last called, so that they can be passed to merge() on
+                another instance of the cache."""
+
+                updates = self.__updates
+                self.__updates = {}
+                return updates
+
+        def merge(self, updates):
+                """Apply changes returned by pop_updates()."""
+
+                self.load()
+                for path, ent in updates.items():
+                        if ent is None:
+                                self.__entries.pop(path, None)
+                        else:
+                                self.__entries[path] = ent
+                        self.__updates[path] = ent
+
+        def save(self):
+                """Write the cache if it has changed.  Failures to do so due to
+                lack of privileges or a read-only file system are ignored."""
+
+                if not self.__updates:
+                        return
+
+                dirname = os.path.dirname(self.__path)
+                try:
+                        if not os.path.exists(dirname):
+                                os.makedirs(dirname)
+                        fd, tmp = tempfile.mkstemp(dir=dirname,
+                            prefix=os.path.basename(self.__path) + ".")
+                except EnvironmentError as e:
+                        if e.errno in (errno.EACCES, errno.EPERM, errno.EROFS):
+                                return
+                        raise
+
+                try:
+                        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                                fh.write(VERSION + "\n")
+                                for path, ((size, mtime, ctime, ino), hval) in \
+                                    sorted(self.__entries.items()):
+                                        fh.write("{0} {1:d} {2:d} {3:d} {4:d} "
+                                            "{5}\n".format(hval, size, mtime,
+                                            ctime, ino, path))
+                        os.chmod(tmp, 0o644)
+                        portable.rename(tmp, self.__path)
+                except:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        raise
+                self.__updates = {}
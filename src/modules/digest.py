@@ -382,8 +382,8 @@ def get_common_preferred_hash(action, old_action, hash_type=HASH,
                 raise ValueError("Unknown hash_type {0} passed to "
                     "get_preferred_common_hash".format(hash_type))
 
-        new_hashes = frozenset(a for a in action.attrs if a in hash_attrs)
-        old_hashes = frozenset(a for a in old_action.attrs if a in hash_attrs)
+        new_hashes = frozenset(action.attrs).intersection(hash_attrs)
+        old_hashes = frozenset(old_action.attrs).intersection(hash_attrs)
 
         all_hashes = new_hashes | old_hashes
 
@@ -32,8 +32,21 @@ import pkg.variant as variant
 
 from pkg.portable import PD_DEFAULT_RUNPATH
 
+def _restore_error(cls, args, state):
+        e = cls.__new__(cls, *args)
+        e.__dict__.update(state)
+        return e
+
+
 class DependencyAnalysisError(Exception):
-        pass
+
+        def __reduce__(self):
+                # Subclasses take differing arguments which aren't kept in
+                # self.args, so restore them from their attributes instead.
+                # This allows errors to be returned by analysis performed in
+                # other processes.
+                return (_restore_error, (type(self), self.args,
+                    self.__dict__))
 
 
 class MissingFile(DependencyAnalysisError):
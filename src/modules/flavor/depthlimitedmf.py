@@ -389,26 +389,54 @@ if __name__ == "__main__":
         """Usage:
               depthlimitedmf.py <install_path> <script>
                   [ run_path run_path ... ]
+              depthlimitedmf.py --server
+
+           In the second form, each line read from stdin is the repr() of a
+           tuple of (install_path, script, [run_path, ...]), and the results
+           of analyzing that script are written to stdout followed by a line
+           containing END.
         """
-        run_paths = sys.argv[3:]
-        try:
-                mf = DepthLimitedModuleFinder(sys.argv[1], run_paths=run_paths)
-                loaded_modules = mf.run_script(sys.argv[2])
-                for res in set([
-                    (tuple(m.get_file_names()), tuple(m.dirs))
-                    for m in loaded_modules
-                ]):
-                        sys.stdout.write("DEP {0}\n".format(res))
-                missing, maybe =  mf.any_missing_maybe()
-                sys.stdout.writelines(("ERR MISSING {0}\n"\
-                                      .format(name) for name in missing))
-        except SyntaxError as e:
-                sys.stdout.writelines(("ERR SYNTAX [{0}:{1}] {2}\n"\
-                                      .format(e.lineno, e.offset, e)))
-        except ValueError as e:
-                sys.stdout.write("ERR {0}\n".format(e))
-        except MultipleDefaultRunPaths as e:
-                sys.stdout.write("{0}\n".format(e))
+
+        def analyze(install_dir, script, run_paths):
+                try:
+                        mf = DepthLimitedModuleFinder(install_dir,
+                            run_paths=run_paths)
+                        loaded_modules = mf.run_script(script)
+                        for res in set([
+                            (tuple(m.get_file_names()), tuple(m.dirs))
+                            for m in loaded_modules
+                        ]):
+                                sys.stdout.write("DEP {0}\n".format(res))
+                        missing, maybe =  mf.any_missing_maybe()
+                        sys.stdout.writelines(("ERR MISSING {0}\n"\
+                                              .format(name) for name in missing))
+                except SyntaxError as e:
+                        sys.stdout.writelines(("ERR SYNTAX [{0}:{1}] {2}\n"\
+                                              .format(e.lineno, e.offset, e)))
+                except ValueError as e:
+                        sys.stdout.write("ERR {0}\n".format(e))
+                except MultipleDefaultRunPaths as e:
+                        sys.stdout.write("{0}\n".format(e))
+
+        if sys.argv[1:] == ["--server"]:
+                import ast
+                import traceback
+
+                while True:
+                        l = sys.stdin.readline()
+                        if not l:
+                                break
+                        try:
+                                analyze(*ast.literal_eval(l))
+                        except Exception:
+                                # Report what would otherwise have caused a
+                                # one-off analysis to exit with an error.
+                                sys.stdout.write("EXC {0!r}\n".format(
+                                    traceback.format_exc()))
+                        sys.stdout.write("END\n")
+                        sys.stdout.flush()
+        else:
+                analyze(sys.argv[1], sys.argv[2], sys.argv[3:])
 
 # Vim hints
 # vim:ts=8:sw=8:et:fdm=marker
@@ -24,15 +24,18 @@
 # Copyright (c) 2009, 2022, Oracle and/or its affiliates.
 #
 
+import ast
+import atexit
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import threading
 
 import pkg.flavor.base as base
 import pkg.flavor.depthlimitedmf as modulefinder
 
-from pkg.misc import force_str
 from pkg.portable import PD_LOCAL_PATH, PD_PROTO_DIR
 
 class PythonModuleMissingPath(base.DependencyAnalysisError):
@@ -288,32 +291,21 @@ def process_python_dependencies(action, pkg_vars, script_path, run_paths):
                 return deps, errs, {}
 
         # If the version implied by the directory hierarchy does not match the
-        # version of python running, it's necessary to fork and run the
-        # appropriate version of python.
-        root_dir = os.path.dirname(__file__)
-        exec_file = os.path.join(root_dir, "depthlimitedmf.py")
-        cmd = ["python{0}.{1}".format(analysis_major, analysis_minor), exec_file,
-            os.path.dirname(action.attrs["path"]), local_file]
-        newenv = os.environ.copy()
-        # Tell Python to not create .pyc, .pyo, etc. cache files for any Python
-        # modules our script imports.
-        newenv["PYTHONDONTWRITEBYTECODE"] = "1"
-
-        if run_paths:
-                cmd.extend(run_paths)
+        # version of python running, it's necessary to have the appropriate
+        # version of python analyze the file.
+        analyzer = _get_analyzer(analysis_major, analysis_minor)
+        install_dir = os.path.dirname(action.attrs["path"])
+        cmd = " ".join(analyzer.get_command(install_dir, local_file,
+            run_paths))
         try:
-                sp = subprocess.Popen(cmd, env=newenv, stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE, encoding="utf-8")
+                out = analyzer.analyze(install_dir, local_file, run_paths)
+        except PythonSubprocessError as e:
+                return [], [e], {}
         except Exception as e:
-                return [], [PythonSubprocessError(None, " ".join(cmd),\
-                    str(e))], {}
-        out, err = sp.communicate()
-        out = force_str(out)
-        if sp.returncode:
-                errs.append(PythonSubprocessError(sp.returncode, " ".join(cmd),
-                    err))
+                return [], [PythonSubprocessError(None, cmd, str(e))], {}
+
         bad_lines = []
-        for l in out.splitlines():
+        for l in out:
                 l = l.strip()
                 if l.startswith("DEP "):
                         try:
@@ -334,11 +326,160 @@ def process_python_dependencies(action, pkg_vars, script_path, run_paths):
                         # Generic error which is assigned as a missing path
                         errs.append(PythonModuleMissingPath(l[4:],
                             action.attrs[PD_LOCAL_PATH]))
+                elif l.startswith("EXC "):
+                        # The analysis failed in a way that would have caused
+                        # a one-off analyzer to exit with an error.
+                        try:
+                                err = ast.literal_eval(l[4:])
+                        except Exception:
+                                bad_lines.append(l)
+                        else:
+                                errs.append(PythonSubprocessError(1, cmd, err))
                 else:
                         bad_lines.append(l)
         if bad_lines:
-                errs.append(PythonSubprocessBadLine(" ".join(cmd), bad_lines))
+                errs.append(PythonSubprocessBadLine(cmd, bad_lines))
         return deps, errs, {}
 
+
+class PythonAnalyzer(object):
+        """A depthlimitedmf.py process running a particular version of python
+        which analyzes files on request, so that the cost of starting the
+        interpreter is only paid once for all the files analyzed with that
+        version.  The process is started when first needed, and again if it
+        exits unexpectedly."""
+
+        def __init__(self, major, minor):
+                self.__python = "python{0}.{1}".format(major, minor)
+                self.__exec_file = os.path.join(os.path.dirname(__file__),
+                    "depthlimitedmf.py")
+                self.__lock = threading.Lock()
+                self.__proc = None
+                self.__stderr = None
+
+        def get_command(self, install_dir, local_file, run_paths):
+                """Return the command which analyzes 'local_file' on its own,
+                for use in error messages."""
+
+                cmd = [self.__python, self.__exec_file, install_dir, local_file]
+                if run_paths:
+                        cmd.extend(run_paths)
+                return cmd
+
+        def __start(self):
+                newenv = os.environ.copy()
+                # Tell Python to not create .pyc, .pyo, etc. cache files for any
+                # Python modules our script imports.
+                newenv["PYTHONDONTWRITEBYTECODE"] = "1"
+
+                # Standard error is only read if the process exits, so it's
+                # written to a file rather than a pipe which could fill up.
+                self.__stderr = tempfile.TemporaryFile(mode="w+",
+                    encoding="utf-8")
+                try:
+                        self.__proc = subprocess.Popen([self.__python,
+                            self.__exec_file, "--server"], env=newenv,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=self.__stderr, encoding="utf-8")
+                except:
+                        self.__stderr.close()
+                        self.__stderr = None
+                        raise
+
+        def __failed(self, cmd):
+                """Clean up after the process has exited unexpectedly and
+                return the PythonSubprocessError to raise for 'cmd'."""
+
+                proc = self.__proc
+                self.__proc = None
+                for f in (proc.stdin, proc.stdout):
+                        try:
+                                f.close()
+                        except EnvironmentError:
+                                pass
+                rc = proc.wait()
+                self.__stderr.seek(0)
+                err = self.__stderr.read()
+                self.__stderr.close()
+                self.__stderr = None
+                return PythonSubprocessError(rc, " ".join(cmd), err)
+
+        def analyze(self, install_dir, local_file, run_paths):
+                """Return the lines of output from analyzing 'local_file',
+                which will be installed into 'install_dir', using 'run_paths'
+                to find modules."""
+
+                with self.__lock:
+                        if self.__proc is None:
+                                self.__start()
+                        proc = self.__proc
+                        try:
+                                proc.stdin.write("{0!r}\n".format(
+                                    (install_dir, local_file,
+                                    list(run_paths or []))))
+                                proc.stdin.flush()
+                                out = []
+                                for l in iter(proc.stdout.readline, ""):
+                                        if l == "END\n":
+                                                return out
+                                        out.append(l)
+                        except EnvironmentError:
+                                pass
+                        raise self.__failed(self.get_command(install_dir,
+                            local_file, run_paths))
+
+        def close(self):
+                """Stop the process, if it's running."""
+
+                with self.__lock:
+                        proc = self.__proc
+                        if proc is None:
+                                return
+                        self.__proc = None
+                        try:
+                                proc.stdin.close()
+                        except EnvironmentError:
+                                pass
+                        proc.wait()
+                        proc.stdout.close()
+                        self.__stderr.close()
+                        self.__stderr = None
+
+
+# The PythonAnalyzer for each version of python, and the process they belong
+# to, so that a child process doesn't share its parent's analyzers.
+_analyzers = {}
+_analyzers_pid = None
+_analyzers_lock = threading.Lock()
+
+
+def _get_analyzer(major, minor):
+        global _analyzers, _analyzers_pid
+
+        with _analyzers_lock:
+                if _analyzers_pid != os.getpid():
+                        _analyzers = {}
+                        _analyzers_pid = os.getpid()
+                try:
+                        return _analyzers[(major, minor)]
+                except KeyError:
+                        analyzer = _analyzers[(major, minor)] = \
+                            PythonAnalyzer(major, minor)
+                        return analyzer
+
+
+def close_analyzers():
+        """Stop the analyzer processes started by this process."""
+
+        with _analyzers_lock:
+                if _analyzers_pid != os.getpid():
+                        return
+                analyzers = list(_analyzers.values())
+                _analyzers.clear()
+        for analyzer in analyzers:
+                analyzer.close()
+
+atexit.register(close_analyzers)
+
 # Vim hints
 # vim:ts=8:sw=8:et:fdm=marker
@@ -26,6 +26,7 @@
 
 import fnmatch
 import re
+import sys
 from six.moves.urllib.parse import quote
 
 from pkg.version import Version, VersionError
@@ -120,10 +121,14 @@ class PkgFmri(object):
                                 # Always use publisher information provided in
                                 # FMRI string.  (It could be ""; pkg:///name is
                                 # valid.)
-                                publisher = fmri[pubidx:nameidx - 1]
+                                publisher = sys.intern(
+                                    fmri[pubidx:nameidx - 1])
 
+                        # Stems are interned, as they're repeated for each
+                        # version of a package.
                         if veridx != None:
-                                self.pkg_name = fmri[nameidx:veridx]
+                                self.pkg_name = sys.intern(
+                                    fmri[nameidx:veridx])
                                 try:
                                         self.version = Version(
                                             fmri[veridx + 1:], build_release)
@@ -132,7 +137,7 @@ class PkgFmri(object):
                                             IllegalFmri.BAD_VERSION,
                                             nested_exc=iv)
                         else:
-                                self.pkg_name = fmri[nameidx:]
+                                self.pkg_name = sys.intern(fmri[nameidx:])
                                 self.version = None
                 else:
                         # pkg_name and version must be explicitly set.
@@ -485,6 +490,14 @@ class PkgFmri(object):
         def __le__(self, other):
                 return not self > other
 
+        def sort_key(self):
+                """Returns a key which orders FMRIs as the comparison operators
+                do, for sorting large numbers of them."""
+
+                v = self.version
+                return (self.publisher or "", self.pkg_name,
+                    v.sort_key() if v is not None else ())
+
         def get_link_path(self, stemonly = False):
                 """Return the escaped link (or file) path fragment for this
                 FMRI."""
@@ -60,6 +60,13 @@ class Checker(object):
         likely those outside this base module, should not override check(..)
         defined in ActionChecker or ManifestChecker.
 
+        Lint check methods which depend on manifests other than the one being
+        checked, either through state built up as each manifest is checked or
+        by looking other manifests up, must have a 'pkglint_cross_manifest'
+        attribute set to True.  The engine runs those checks on each manifest
+        in turn in its own process, while the rest may be run in worker
+        processes, and have their results cached, when linting in parallel.
+
         Attributes for each Checker subclass include:
 
         'name' is an abbreviated name used by the checker
@@ -231,11 +238,15 @@ class Checker(object):
 class ActionChecker(Checker):
         """A class to check individual actions."""
 
-        def check(self, action, manifest, engine):
+        def check(self, action, manifest, engine, checks=None):
                 """'action' is a pkg.actions.generic.Action subclass
-                'manifest' is a pkg.manifest.Manifest"""
+                'manifest' is a pkg.manifest.Manifest
+                'checks' is an optional list of (lint method, pkglint_id)
+                tuples to run instead of all of our included checks"""
 
-                for func, pkglint_id in self.included_checks:
+                if checks is None:
+                        checks = self.included_checks
+                for func, pkglint_id in checks:
                         engine.advise_loggers(action=action, manifest=manifest)
                         try:
                                 func(action, manifest, engine)
@@ -331,10 +342,13 @@ class ManifestChecker(Checker):
                             self.classification_path)
                 super(ManifestChecker, self).__init__(config)
 
-        def check(self, manifest, engine):
-                """'manifest' is a pkg.manifest.Manifest"""
+        def check(self, manifest, engine, checks=None):
+                """'manifest' is a pkg.manifest.Manifest
+                'checks' is as for ActionChecker.check(..)"""
 
-                for func, pkglint_id in self.included_checks:
+                if checks is None:
+                        checks = self.included_checks
+                for func, pkglint_id in checks:
                         engine.advise_loggers(manifest=manifest)
                         try:
                                 func(manifest, engine)
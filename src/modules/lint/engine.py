@@ -30,12 +30,16 @@ import pkg.client.progress as progress
 import pkg.client.publisher as publisher
 import pkg.lint.base as base
 import pkg.lint.config
+import pkg.lint.refindex as refindex
 import pkg.fmri
 from pkg.client.api_errors import ApiException
 from pkg.version import DotSequence, Version
 
+import hashlib
 import logging
+import multiprocessing
 import os
+import pickle
 import shutil
 import six
 import sys
@@ -46,6 +50,77 @@ PKG_CLIENT_NAME = "pkglint"
 CLIENT_API_VERSION = 82
 pkg.client.global_settings.client_name = PKG_CLIENT_NAME
 
+# The version of the format of the lint results stored in a ResultCache.
+RESULT_VERSION = 1
+
+# While manifests are linted by worker processes, a tuple of the engine, the
+# manifests, and the manifest checkers, action checkers and dictionary of the
+# checks to run, inherited by the workers when they're forked.
+_lint_state = None
+
+def _lint_manifest_task(idx):
+        """Run the checks in _lint_state on the manifest with index 'idx',
+        returning the pickled log events, or None if they can't be pickled."""
+
+        engine, manifests, manifest_checks, action_checks, checks = _lint_state
+        events = engine._record_manifest(manifests[idx], manifest_checks,
+            action_checks, checks)
+        return _dump_events(events)
+
+def _dump_events(events):
+        try:
+                return pickle.dumps(events, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+                return None
+
+def _load_events(data):
+        try:
+                return pickle.loads(data)
+        except Exception:
+                # A damaged cache entry; check the manifest again.
+                return None
+
+
+class _LogRecorder(object):
+        """Stands in for the engine's LogFormatters while 'manifest' is being
+        checked, recording the messages logged and the actions and manifests
+        advised so that they can be replayed to the LogFormatters later, in
+        another process if need be.  Actions in 'manifest' are recorded by
+        their position in it."""
+
+        def __init__(self, manifest):
+                self.manifest = manifest
+                self.events = []
+                self.__actions = dict(
+                    (id(a), i) for i, a in enumerate(manifest.gen_actions()))
+
+        def advise(self, action=None, manifest=None):
+                if action is not None:
+                        action = self.__actions.get(id(action), action)
+                if manifest is self.manifest:
+                        manifest = True
+                self.events.append(("advise", action, manifest))
+
+        def __record(self, level, message, msgid, ignore_linted):
+                self.events.append((level, str(message), msgid,
+                    ignore_linted))
+
+        def debug(self, message, msgid=None, ignore_linted=False):
+                self.__record("debug", message, msgid, ignore_linted)
+
+        def info(self, message, msgid=None, ignore_linted=False):
+                self.__record("info", message, msgid, ignore_linted)
+
+        def warning(self, message, msgid=None, ignore_linted=False):
+                self.__record("warning", message, msgid, ignore_linted)
+
+        def error(self, message, msgid=None, ignore_linted=False):
+                self.__record("error", message, msgid, ignore_linted)
+
+        def critical(self, message, msgid=None, ignore_linted=False):
+                self.__record("critical", message, msgid, ignore_linted)
+
+
 class LintEngineException(Exception):
         """An exception thrown when something fatal goes wrong with the engine,
         such that linting can no longer continue."""
@@ -149,7 +224,10 @@ class LintEngineCache():
                                             branch <= self.branch:
                                                 packages[key] = pfmri
 
-                # now get the manifests
+                # now get the manifests, retrieving those a reference index
+                # doesn't hold yet in bulk rather than one at a time
+                if isinstance(api_inst, refindex.ReferenceIndex):
+                        api_inst.prefetch_manifests(packages.values(), tracker)
                 tracker.manifest_fetch_start(len(packages))
                 for item in packages:
                         self.latest_cache[api_inst][item] = \
@@ -228,17 +306,20 @@ class LintEngine(object):
 
         User-supplied manifests for linting are read directly as files
         provided on the command line.  For cross-checking against a
-        reference repository, or linting the manifests in a repository, we
-        create a reference or lint user-images in a provided cache location,
-        used to obtain manifests from those repositories.
+        reference repository we create a reference index, and for linting
+        the manifests in a repository a lint user-image, in a provided cache
+        location, used to obtain manifests from those repositories.
 
         Multiple repositories can be provided, however each must
         use a different publisher.prefix (as they are added as publishers
-        to a single user image)
+        to a single index or user image)
 
-        Our reference image is stored in
+        Our reference index is stored in
 
-        <cache>/ref_image/
+        <cache>/ref_index/
+
+        (caches created by older versions of pkglint have a reference image
+        in <cache>/ref_image/ instead, which is still used if present.)
 
         The image for linting is stored in
 
@@ -284,7 +365,11 @@ class LintEngine(object):
         when comparing package FMRIs.
 
         The engine has support for a "/* LINTED */"-like functionality,
-        see the comment for <LintEngine>.execute()"""
+        see the comment for <LintEngine>.execute()
+
+        Manifests can be linted by several worker processes, and the results
+        of the checks which only look at the manifest being linted can be
+        cached; see <LintEngine>.execute() and base.Checker."""
 
         def __init__(self, formatter, verbose=False, config_file=None,
             use_tracker=None, extension_path=[]):
@@ -503,13 +588,13 @@ class LintEngine(object):
                 """Starts a pkglint session, creates our image, pulls manifests,
                 etc. from servers if necessary.
 
-                'cache' An area where we create images to access repos for both
-                reference and linting purposes
+                'cache' An area where we create the index and image used to
+                access repos for reference and linting purposes
 
                 'lint_manifests' An array of paths to manifests for linting
 
                 'ref_uris' A list of repositories which will be added to the
-                image used as a reference for linting
+                index used as a reference for linting
 
                 'lint_uris' A list of repositories which will be added to th
                 image we want to lint
@@ -582,7 +667,12 @@ class LintEngine(object):
                         try:
                                 self.ref_image = os.path.join(self.basedir,
                                     "ref_image")
+                                ref_index = os.path.join(self.basedir,
+                                    "ref_index")
                                 if os.path.exists(self.ref_image):
+                                        # caches created before reference
+                                        # indexes were introduced still use
+                                        # their image.
                                         self.ref_api_inst = self._get_image(
                                             self.ref_image)
                                         if self.ref_api_inst and ref_uris:
@@ -590,8 +680,17 @@ class LintEngine(object):
                                                 self.logger.info(
                                                     _("Ignoring -r option, "
                                                     "existing image found."))
+                                elif os.path.exists(ref_index):
+                                        self.ref_api_inst = \
+                                            self._get_ref_index(ref_index)
+                                        if ref_uris:
+                                                self.tracker.flush()
+                                                self.logger.info(
+                                                    _("Ignoring -r option, "
+                                                    "existing reference index "
+                                                    "found."))
 
-                                # only create a new image if we've not been
+                                # only create a new index if we've not been
                                 # able to load one, and we have been given a uri
                                 if not self.ref_api_inst and ref_uris:
                                         if not (self.lint_api_inst or \
@@ -599,8 +698,9 @@ class LintEngine(object):
                                                 raise LintEngineSetupException(
                                                     "No lint image or manifests"
                                                     " provided.")
-                                        self.ref_api_inst = self._create_image(
-                                            self.ref_image, self.ref_uris)
+                                        self.ref_api_inst = \
+                                            self._get_ref_index(ref_index,
+                                            self.ref_uris)
 
                                 if self.ref_api_inst:
                                         self.tracker_phase = \
@@ -626,12 +726,24 @@ class LintEngine(object):
                 self.get_tracker().lint_done()
                 self.in_setup = False
 
-        def execute(self):
+        def execute(self, jobs=1, cache=None):
                 """Run the checks that have been configured for this engine.
                 We run checks on all lint_manifests as well as all manifests
                 in a configured lint repository that match both our pattern
                 and release (if they have been configured).
 
+                If 'jobs' is greater than one, the checks which only look at
+                the manifest being linted are run by that many forked
+                processes, and the messages they log are passed back to our
+                loggers in manifest order; the checks which depend on other
+                manifests are then run on each manifest in this process.  If
+                'cache' is a pkg.resultcache.ResultCache, the messages logged
+                by the former checks are stored in it, and taken from it for
+                manifests which haven't changed since they were last linted
+                with the same checkers and configuration.  In either case, the
+                messages for a manifest may be logged in a different order
+                from a serial run.
+
                 We allow for pkg.linted=True and pkg.linted.<name>=True, where
                 <name> is a substring of a pkglint id to skip logging errors
                 for that action or manifest.
@@ -664,6 +776,12 @@ class LintEngine(object):
                 self.logger.debug(_("Total number of checks found: {0}").format(
                     count))
 
+                if jobs > 1 or cache is not None:
+                        self._execute_split(manifest_checks, action_checks,
+                            jobs, cache)
+                        self.tracker.flush()
+                        return
+
                 for mf in self.lint_manifests:
                         self._check_manifest(mf, manifest_checks,
                             action_checks)
@@ -674,6 +792,164 @@ class LintEngine(object):
                             action_checks)
                 self.tracker.flush()
 
+        def _execute_split(self, manifest_checks, action_checks, jobs, cache):
+                """Check each manifest, running the checks which only look at
+                that manifest in 'jobs' worker processes or taking their
+                results from 'cache', and the checks which depend on other
+                manifests in this process, one manifest at a time."""
+
+                global _lint_state
+
+                local_checks = {}
+                cross_checks = {}
+                for checker in manifest_checks + action_checks:
+                        local_checks[checker] = []
+                        cross_checks[checker] = []
+                        for check in checker.included_checks:
+                                if getattr(check[0], "pkglint_cross_manifest",
+                                    False):
+                                        cross_checks[checker].append(check)
+                                else:
+                                        local_checks[checker].append(check)
+
+                manifests = self.lint_manifests + list(self.gen_manifests(
+                    self.lint_api_inst, pattern=self.pattern,
+                    release=self.release))
+
+                keys = [None] * len(manifests)
+                cached = {}
+                if cache is not None:
+                        base_key = self._get_result_key_base(local_checks)
+                        for i, mf in enumerate(manifests):
+                                keys[i] = self._get_result_key(base_key, mf)
+                                data = cache.get(keys[i])
+                                if data is not None:
+                                        events = _load_events(data)
+                                        if events is not None:
+                                                cached[i] = events
+
+                todo = [i for i in range(len(manifests)) if i not in cached]
+                jobs = min(jobs, len(todo))
+                _lint_state = (self, manifests, manifest_checks,
+                    action_checks, local_checks)
+                pool = None
+                try:
+                        if jobs > 1:
+                                pool = multiprocessing.get_context(
+                                    "fork").Pool(jobs)
+                                recorded = pool.imap(_lint_manifest_task, todo,
+                                    max(1, len(todo) // (jobs * 8)))
+                        else:
+                                recorded = (None for i in todo)
+
+                        for i, mf in enumerate(manifests):
+                                self.debug(_("Checking {0}").format(mf.fmri),
+                                    "pkglint001.3")
+                                if i in cached:
+                                        events = cached[i]
+                                else:
+                                        data = next(recorded)
+                                        events = None
+                                        if data is not None:
+                                                events = _load_events(data)
+                                        if events is None:
+                                                events = self._record_manifest(
+                                                    mf, manifest_checks,
+                                                    action_checks,
+                                                    local_checks)
+                                                data = _dump_events(events)
+                                        if keys[i] is not None and \
+                                            data is not None:
+                                                cache.put(keys[i], data)
+
+                                self._replay_manifest(mf, events)
+                                self._check_manifest(mf, manifest_checks,
+                                    action_checks, checks=cross_checks)
+                finally:
+                        _lint_state = None
+                        if pool is not None:
+                                pool.terminate()
+                                pool.join()
+                if cache is not None:
+                        cache.prune()
+
+        def _get_result_key_base(self, checks):
+                """Return a hash of everything other than the manifest that
+                the results of running 'checks', a dictionary mapping checkers
+                to lists of their checks, depend on."""
+
+                h = hashlib.sha256()
+                modules = set(type(c).__module__ for c in checks)
+                modules.update([base.__name__, __name__])
+                for name in sorted(modules):
+                        try:
+                                with open(sys.modules[name].__file__,
+                                    "rb") as fh:
+                                        digest = hashlib.sha256(
+                                            fh.read()).hexdigest()
+                        except (AttributeError, KeyError, TypeError,
+                            EnvironmentError):
+                                digest = None
+                        h.update(repr((name, digest)).encode("utf-8"))
+
+                for part in (RESULT_VERSION, pkg.VERSION,
+                    sorted(pkglint_id for l in checks.values()
+                        for method, pkglint_id in l),
+                    [(section, sorted(self.conf.items(section)))
+                        for section in self.conf.sections()],
+                    self.do_pub_checks, self.ignore_pubs, self.release,
+                    self.version_pattern):
+                        h.update(repr(part).encode("utf-8"))
+                        h.update(b"\0")
+                return h.digest()
+
+        def _get_result_key(self, base_key, manifest):
+                """Return the key for the results of linting 'manifest'."""
+
+                h = hashlib.sha256(base_key)
+                h.update(str(manifest.fmri).encode("utf-8"))
+                for action in manifest.gen_actions():
+                        h.update(b"\n")
+                        h.update(str(action).encode("utf-8"))
+                return h.hexdigest()
+
+        def _record_manifest(self, manifest, manifest_checks, action_checks,
+            checks):
+                """Run 'checks' on 'manifest' as _check_manifest() does,
+                returning a list of the events logged rather than passing them
+                to our loggers."""
+
+                logs = self.logs
+                recorder = _LogRecorder(manifest)
+                self.logs = [recorder]
+                try:
+                        self._check_manifest(manifest, manifest_checks,
+                            action_checks, checks=checks)
+                finally:
+                        self.logs = logs
+                return recorder.events
+
+        def _replay_manifest(self, manifest, events):
+                """Pass the 'events' recorded while checking 'manifest' to our
+                loggers."""
+
+                actions = None
+                for event in events:
+                        if event[0] != "advise":
+                                level, message, msgid, ignore_linted = event
+                                getattr(self, level)(message, msgid=msgid,
+                                    ignore_linted=ignore_linted)
+                                continue
+
+                        action, mf = event[1:]
+                        if isinstance(action, int):
+                                if actions is None:
+                                        actions = list(manifest.gen_actions())
+                                action = actions[action]
+                        if mf is True:
+                                mf = manifest
+                        self.advise_loggers(action=action, manifest=mf)
+
         def gen_manifests(self, api_inst, pattern=None, release=None):
                 """A generator to return package manifests for a given image.
                 With a given pattern, it narrows the set of manifests
@@ -877,6 +1153,29 @@ class LintEngine(object):
                 os.chdir(cdir)
                 return api_inst
 
+        def _get_ref_index(self, index_dir, repo_uris=None):
+                """Return a pkg.lint.refindex.ReferenceIndex for the provided
+                index directory, creating it for the repositories at
+                'repo_uris' if those are given."""
+
+                self.tracker.flush()
+                if repo_uris:
+                        self.logger.debug(
+                            _("Creating reference index at {0}").format(
+                            index_dir))
+                        repo_uris = [_file_uri(uri) for uri in repo_uris]
+
+                try:
+                        return refindex.load(index_dir, repo_uris=repo_uris)
+                except (ApiException, EnvironmentError,
+                    refindex.InvalidReferenceIndex) as err:
+                        if repo_uris and os.path.isdir(index_dir):
+                                shutil.rmtree(index_dir, True)
+                        raise LintEngineSetupException(
+                            _("Unable to get reference index at {dir}: "
+                            "{reason}").format(dir=index_dir,
+                            reason=str(err)))
+
         def _create_image(self, image_dir, repo_uris):
                 """Create image in the given image directory. For now, only
                 a single publisher is supported per image."""
@@ -893,9 +1192,7 @@ class LintEngine(object):
                 # file:// URI, and get the absolute path.  Missing or invalid
                 # repositories will be caught by pkg.client.api.image_create.
                 for i, uri in enumerate(repo_uris):
-                        if not urlparse(uri).scheme:
-                                repo_uris[i] = "file://{0}".format(
-                                    quote(os.path.abspath(uri)))
+                        repo_uris[i] = _file_uri(uri)
 
                 try:
                         api_inst = pkg.client.api.image_create(
@@ -978,25 +1275,36 @@ class LintEngine(object):
                                         api_inst.add_publisher(pub,
                                             refresh_allowed=False)
 
-        def _check_manifest(self, manifest, manifest_checks, action_checks):
-                """Check a given manifest."""
+        def _check_manifest(self, manifest, manifest_checks, action_checks,
+            checks=None):
+                """Check a given manifest.  If 'checks' is given, it's a
+                dictionary mapping each checker to the list of its checks to
+                run."""
 
-                self.debug(_("Checking {0}").format(manifest.fmri),
-                    "pkglint001.3")
+                if checks is None:
+                        self.debug(_("Checking {0}").format(manifest.fmri),
+                            "pkglint001.3")
+                else:
+                        manifest_checks = [c for c in manifest_checks
+                            if checks[c]]
+                        action_checks = [c for c in action_checks
+                            if checks[c]]
 
                 for checker in manifest_checks:
-                        checker.check(manifest, self)
+                        checker.check(manifest, self,
+                            checks=checks[checker] if checks else None)
 
                 if action_checks:
                         for action in manifest.gen_actions():
                                 self._check_action(action, manifest,
-                                    action_checks)
+                                    action_checks, checks=checks)
 
-        def _check_action(self, action, manifest, action_checks):
+        def _check_action(self, action, manifest, action_checks, checks=None):
                 """Check a given action."""
 
                 for checker in action_checks:
-                        checker.check(action, manifest, self)
+                        checker.check(action, manifest, self,
+                            checks=checks[checker] if checks else None)
 
         def advise_loggers(self, action=None, manifest=None):
                 """Called to advise any loggers we have set that we're about
@@ -1075,6 +1383,9 @@ class LintEngine(object):
                         self.lint_api_inst.reset()
                 os.chdir(cwd)
                 self.lint_api_inst = None
+                if isinstance(self.ref_api_inst, refindex.ReferenceIndex):
+                        self.ref_api_inst.close()
+                        self.ref_api_inst = None
 
                 if clear_cache:
                         shutil.rmtree(self.basedir)
@@ -1311,6 +1622,13 @@ def lint_fmri_successor(new, old, ignore_pubs=True, ignore_timestamps=True):
         # everything is equal, or old has no version and we'll favour new
         return True
 
+def _file_uri(uri):
+        """Return 'uri', treating it as the path of a file:// repository if
+        it has no scheme."""
+        if not urlparse(uri).scheme:
+                return "file://{0}".format(quote(os.path.abspath(uri)))
+        return uri
+
 def _manifest_sort_key(mf):
         """The lint engine uses the FMRI of a package to deterine the order in
         which to iterate over manifests.  This is done using the 'key' attribute
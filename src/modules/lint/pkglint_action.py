@@ -245,6 +245,7 @@ class PkgDupActionChecker(base.ActionChecker):
 
         duplicate_paths.pkglint_desc = _(
             "Paths should be unique.")
+        duplicate_paths.pkglint_cross_manifest = True
 
         def duplicate_drivers(self, action, manifest, engine, pkglint_id="002"):
                 """Checks for duplicate driver names."""
@@ -254,6 +255,7 @@ class PkgDupActionChecker(base.ActionChecker):
                     manifest.get_all_variants(), msgid=pkglint_id)
 
         duplicate_drivers.pkglint_desc = _("Driver names should be unique.")
+        duplicate_drivers.pkglint_cross_manifest = True
 
         def duplicate_usernames(self, action, manifest, engine,
             pkglint_id="003"):
@@ -264,6 +266,7 @@ class PkgDupActionChecker(base.ActionChecker):
                     manifest.get_all_variants(), msgid=pkglint_id)
 
         duplicate_usernames.pkglint_desc = _("User names should be unique.")
+        duplicate_usernames.pkglint_cross_manifest = True
 
         def duplicate_uids(self, action, manifest, engine, pkglint_id="004"):
                 """Checks for duplicate uids."""
@@ -273,6 +276,7 @@ class PkgDupActionChecker(base.ActionChecker):
                     manifest.get_all_variants(), msgid=pkglint_id)
 
         duplicate_uids.pkglint_desc = _("UIDs should be unique.")
+        duplicate_uids.pkglint_cross_manifest = True
 
         def duplicate_groupnames(self, action, manifest, engine,
             pkglint_id="005"):
@@ -284,6 +288,7 @@ class PkgDupActionChecker(base.ActionChecker):
 
         duplicate_groupnames.pkglint_desc = _(
             "Group names should be unique.")
+        duplicate_groupnames.pkglint_cross_manifest = True
 
         def duplicate_gids(self, action, manifest, engine, pkglint_id="006"):
                 """Checks for duplicate gids."""
@@ -293,6 +298,7 @@ class PkgDupActionChecker(base.ActionChecker):
                     manifest.get_all_variants(), msgid=pkglint_id)
 
         duplicate_gids.pkglint_desc = _("GIDs should be unique.")
+        duplicate_gids.pkglint_cross_manifest = True
 
         def duplicate_legacy(self, action, manifest, engine, pkglint_id="015"):
                 """Checks for duplicate legacy package names."""
@@ -303,6 +309,7 @@ class PkgDupActionChecker(base.ActionChecker):
 
         duplicate_legacy.pkglint_desc = _(
             "Legacy package names should be unique.")
+        duplicate_legacy.pkglint_cross_manifest = True
 
         def duplicate_refcount_path_attrs(self, action, manifest, engine,
             pkglint_id="007"):
@@ -408,6 +415,7 @@ class PkgDupActionChecker(base.ActionChecker):
 
         duplicate_refcount_path_attrs.pkglint_desc = _(
             "Duplicated reference counted actions should have the same attrs.")
+        duplicate_refcount_path_attrs.pkglint_cross_manifest = True
 
         def dup_attr_check(self, action_names, attr_name, ref_dic,
             processed_dic, action, engine, pkg_vars, msgid="",
@@ -556,6 +564,7 @@ class PkgDupActionChecker(base.ActionChecker):
 
         duplicate_path_types.pkglint_desc = _(
             "Paths should be delivered by one action type only.")
+        duplicate_path_types.pkglint_cross_manifest = True
 
         def overlays(self, action, manifest, engine, pkglint_id="009"):
                 """Checks that any duplicate file actions which specify overlay
@@ -573,6 +582,7 @@ class PkgDupActionChecker(base.ActionChecker):
                     only_overlays=True)
 
         overlays.pkglint_desc = _("Overlaying actions should be valid.")
+        overlays.pkglint_cross_manifest = True
 
         def mediated_links(self, action, manifest, engine, pkglint_id="010"):
                 """Checks that groups of mediated-links are valid.  We perform
@@ -707,6 +717,7 @@ class PkgDupActionChecker(base.ActionChecker):
                 self.seen_mediated_links.append(p)
 
         mediated_links.pkglint_desc = _("Mediated-links should be valid.")
+        mediated_links.pkglint_cross_manifest = True
 
         def _merge_dict(self, src, target, ignore_pubs=True):
                 """Merges the given src dictionary into the target
@@ -985,6 +996,7 @@ class PkgDupActionChecker(base.ActionChecker):
                             "{0}{1}".format(self.name, pkglint_id))
 
         dir_parents.pkglint_desc = _("Parent paths should be directories.")
+        dir_parents.pkglint_cross_manifest = True
 
 
 class PkgActionChecker(base.ActionChecker):
@@ -1264,6 +1276,7 @@ class PkgActionChecker(base.ActionChecker):
 
         legacy.pkglint_desc = _(
             "'legacy' actions should have valid attributes.")
+        legacy.pkglint_cross_manifest = True
 
         def unknown(self, action, manifest, engine, pkglint_id="004"):
                 """We should never have actions called 'unknown'."""
@@ -1393,6 +1406,7 @@ class PkgActionChecker(base.ActionChecker):
 
         dep_obsolete.pkglint_desc = _(
             "Packages should not have dependencies on obsolete packages.")
+        dep_obsolete.pkglint_cross_manifest = True
 
         def valid_fmri(self, action, manifest, engine, pkglint_id="006"):
                 """We should be given a valid FMRI as a dependency, allowing
@@ -200,6 +200,7 @@ class PkgManifestChecker(base.ManifestChecker):
 
         obsoletion.pkglint_desc = _(
             "Obsolete packages should have valid contents.")
+        obsoletion.pkglint_cross_manifest = True
 
         def renames(self, manifest, engine, pkglint_id="002"):
                 """Checks for correct package renaming.
@@ -277,6 +278,7 @@ class PkgManifestChecker(base.ManifestChecker):
                             msgid="{0}{1}.4".format(self.name, pkglint_id))
 
         renames.pkglint_desc = _("Renamed packages should have valid contents.")
+        renames.pkglint_cross_manifest = True
 
         def variants(self, manifest, engine, pkglint_id="003"):
                 """Checks for correct use of variant tags.
@@ -388,6 +390,7 @@ class PkgManifestChecker(base.ManifestChecker):
 
         naming.pkglint_desc = _(
             "Packages are encouraged to use unique leaf names.")
+        naming.pkglint_cross_manifest = True
 
         def duplicate_deps(self, manifest, engine, pkglint_id="005"):
                 """Checks for repeated dependencies, including package version
@@ -565,6 +568,7 @@ class PkgManifestChecker(base.ManifestChecker):
 
         info_classification.pkglint_desc = _(
             "info.classification attribute should be valid.")
+        info_classification.pkglint_cross_manifest = True
 
         def _check_info_classification_value(self, engine, value, fmri, msgid):
 
@@ -0,0 +1,416 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Index of the packages in the reference repositories used by pkglint.
+
+pkglint only needs the catalogs of its reference repositories and the
+manifests of the packages it compares against, so rather than creating a
+user image for them, it keeps those directly in a directory of its cache:
+
+    config      a JSON object giving the VERSION of the index and the prefix
+                and origins of each publisher
+    publisher/  the catalog of each publisher, refreshed whenever the index
+                is loaded
+    manifests   the manifests fetched so far, as a MAGIC and VERSION header
+                followed by a record for each manifest: its FMRI and content
+                lengths, its FMRI and its content.  New manifests are
+                appended, and the file is rewritten without the manifests
+                of packages which have left the catalogs once those outnumber
+                the others.
+
+Manifests which aren't stored yet are retrieved in bulk when the newest
+packages are first looked at, so later runs only retrieve the manifests of
+packages which have been published since."""
+
+import errno
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import pkg.client.api_errors as apx
+import pkg.client.progress as progress
+import pkg.client.publisher as publisher
+import pkg.client.transport.transport as transport
+import pkg.fmri
+import pkg.manifest
+import pkg.misc as misc
+import pkg.portable as portable
+
+from pkg.client.api import ImageInterface
+
+MAGIC = b"pkglntmf"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sI")
+_RECORD = struct.Struct("<II")
+
+
+class InvalidReferenceIndex(Exception):
+        """The directory doesn't hold a reference index this version of
+        pkglint can use."""
+
+        def __init__(self, path):
+                Exception.__init__(self)
+                self.path = path
+
+        def __str__(self):
+                return _("{0} is not a valid reference index.").format(
+                    self.path)
+
+
+def _get_publishers(xport, repo_uris):
+        """Return the publishers of the repositories at 'repo_uris', merging
+        the origins of publishers offered by more than one of them."""
+
+        pubs = {}
+        for repo_uri in repo_uris:
+                repo = publisher.RepositoryURI(repo_uri)
+                found = xport.get_publisherdata(repo)
+                if not found:
+                        raise apx.RepoPubConfigUnavailable(location=repo_uri)
+
+                for pub in sorted(found):
+                        src_repo = pub.repository
+                        if pub.prefix in pubs:
+                                dest_repo = pubs[pub.prefix].repository
+                                add_origins = []
+                                if src_repo:
+                                        # Add unknown origins but avoid
+                                        # duplicates.
+                                        add_origins = [
+                                            u.uri
+                                            for u in src_repo.origins
+                                            if u.uri not in dest_repo.origins
+                                        ]
+                                if not dest_repo.has_origin(repo_uri):
+                                        add_origins.append(repo_uri)
+                                for u in add_origins:
+                                        dest_repo.add_origin(u)
+                        elif not src_repo:
+                                # Repository configuration info was not
+                                # provided, assume origin is repo_uri.
+                                pub.repository = publisher.Repository(
+                                    origins=[repo_uri])
+                                pubs[pub.prefix] = pub
+                        else:
+                                if not src_repo.origins:
+                                        # No origin was provided in repository
+                                        # configuration, assume origin is
+                                        # repo_uri.
+                                        src_repo.add_origin(repo_uri)
+                                pubs[pub.prefix] = pub
+
+        return [pubs[p] for p in sorted(pubs)]
+
+
+def _write_config(root, pubs):
+        config = {
+            "version": VERSION,
+            "publishers": [
+                {
+                    "prefix": pub.prefix,
+                    "origins": [o.uri for o in pub.repository.origins],
+                }
+                for pub in pubs
+            ],
+        }
+        path = os.path.join(root, "config")
+        fd, tmp = tempfile.mkstemp(dir=root, prefix="config.")
+        try:
+                with os.fdopen(fd, "w") as fh:
+                        json.dump(config, fh, indent=2, sort_keys=True)
+                os.chmod(tmp, 0o644)
+                portable.rename(tmp, path)
+        except:
+                try:
+                        os.unlink(tmp)
+                except EnvironmentError:
+                        pass
+                raise
+
+
+def _read_config(root):
+        path = os.path.join(root, "config")
+        with open(path) as fh:
+                try:
+                        config = json.load(fh)
+                        if config["version"] != VERSION:
+                                raise InvalidReferenceIndex(root)
+                        return [
+                            publisher.Publisher(p["prefix"],
+                                repository=publisher.Repository(
+                                origins=p["origins"]))
+                            for p in config["publishers"]
+                        ]
+                except (ValueError, KeyError, TypeError,
+                    apx.ApiException):
+                        raise InvalidReferenceIndex(root)
+
+
+def load(root, repo_uris=None):
+        """Return the ReferenceIndex stored in the directory 'root', after
+        refreshing the catalogs of its publishers.  If 'repo_uris' is given,
+        an index of the publishers of the repositories at those URIs is
+        created there instead.
+
+        Errors accessing the repositories are raised as
+        pkg.client.api_errors.ApiException, and InvalidReferenceIndex is
+        raised if 'root' doesn't hold an index of the current version."""
+
+        xport, cfg = transport.setup_transport()
+        tmp = os.path.join(root, "tmp")
+        shutil.rmtree(tmp, True)
+        cfg.incoming_root = os.path.join(tmp, "incoming")
+        cfg.pkg_root = os.path.join(tmp, "pkg")
+
+        if repo_uris:
+                misc.makedirs(root)
+                pubs = _get_publishers(xport, repo_uris)
+        else:
+                pubs = _read_config(root)
+
+        for pub in pubs:
+                pub.meta_root = os.path.join(root, "publisher", pub.prefix)
+                pub.transport = xport
+                cfg.add_publisher(pub)
+                # given that pkglint is expected to be used during manifest
+                # development, we always want to refresh now, rather than
+                # waiting for some update interval
+                updated, err = pub.refresh(immediate=True)
+                if err:
+                        raise err
+
+        if repo_uris:
+                _write_config(root, pubs)
+        return ReferenceIndex(root, pubs, xport, cfg)
+
+
+class _ManifestStore(object):
+        """The manifests held by an index, keyed by FMRI string."""
+
+        def __init__(self, path):
+                self.__path = path
+                self.__offsets = {}
+                try:
+                        self.__fh = open(path, "r+b")
+                except EnvironmentError as e:
+                        if e.errno != errno.ENOENT:
+                                raise
+                        self.__fh = open(path, "w+b")
+
+                fh = self.__fh
+                size = os.fstat(fh.fileno()).st_size
+                hdr = fh.read(_HEADER.size)
+                if len(hdr) < _HEADER.size or \
+                    _HEADER.unpack(hdr) != (MAGIC, VERSION):
+                        # Stored manifests can always be retrieved again, so
+                        # a store that can't be used is simply started over.
+                        size = 0
+                        fh.seek(0)
+                        fh.write(_HEADER.pack(MAGIC, VERSION))
+
+                off = _HEADER.size
+                while off + _RECORD.size <= size:
+                        fh.seek(off)
+                        flen, mlen = _RECORD.unpack(fh.read(_RECORD.size))
+                        end = off + _RECORD.size + flen + mlen
+                        if end > size:
+                                break
+                        try:
+                                name = fh.read(flen).decode("utf-8")
+                        except UnicodeDecodeError:
+                                break
+                        self.__offsets[name] = (end - mlen, mlen)
+                        off = end
+
+                # Drop anything after the last complete record, such as the
+                # remains of a write that was interrupted.
+                fh.seek(off)
+                fh.truncate()
+
+        def __contains__(self, name):
+                return name in self.__offsets
+
+        def get(self, name):
+                """Return the content of the manifest stored for 'name', or
+                None if there isn't one."""
+
+                try:
+                        off, mlen = self.__offsets[name]
+                except KeyError:
+                        return None
+                self.__fh.seek(off)
+                return self.__fh.read(mlen).decode("utf-8")
+
+        def add(self, name, content):
+                bname = name.encode("utf-8")
+                bcontent = content.encode("utf-8")
+                fh = self.__fh
+                fh.seek(0, os.SEEK_END)
+                off = fh.tell() + _RECORD.size + len(bname)
+                fh.write(_RECORD.pack(len(bname), len(bcontent)))
+                fh.write(bname)
+                fh.write(bcontent)
+                self.__offsets[name] = (off, len(bcontent))
+
+        def close(self, live):
+                """Close the store, first rewriting it without the manifests
+                whose names aren't in 'live' if those are in the majority."""
+
+                keep = [n for n in self.__offsets if n in live]
+                if len(self.__offsets) - len(keep) > len(keep):
+                        self.__compact(keep)
+                self.__fh.close()
+
+        def __compact(self, keep):
+                dirname = os.path.dirname(self.__path)
+                fd, tmp = tempfile.mkstemp(dir=dirname, prefix="manifests.")
+                try:
+                        with os.fdopen(fd, "wb") as fh:
+                                fh.write(_HEADER.pack(MAGIC, VERSION))
+                                for name in sorted(keep):
+                                        bname = name.encode("utf-8")
+                                        off, mlen = self.__offsets[name]
+                                        self.__fh.seek(off)
+                                        fh.write(_RECORD.pack(len(bname),
+                                            mlen))
+                                        fh.write(bname)
+                                        fh.write(self.__fh.read(mlen))
+                        os.chmod(tmp, 0o644)
+                        portable.rename(tmp, self.__path)
+                except:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        raise
+
+
+class ReferenceIndex(object):
+        """A reference index, as returned by load().  It provides the subset
+        of the pkg.client.api.ImageInterface methods used by the LintEngine
+        to look up reference packages."""
+
+        def __init__(self, root, pubs, xport, cfg):
+                self.root = root
+                self.__pubs = dict((p.prefix, p) for p in pubs)
+                self.__xport = xport
+                self.__cfg = cfg
+                self.__store = _ManifestStore(os.path.join(root, "manifests"))
+
+        def get_publisher(self, prefix):
+                return self.__pubs[prefix]
+
+        def get_pkg_list(self, pkg_list, patterns=misc.EmptyI,
+            variants=False, return_fmris=False):
+                """Yield the packages in the catalogs of the index which match
+                'patterns', as pkg.client.api.ImageInterface.get_pkg_list()
+                does for a 'pkg_list' of LIST_ALL or LIST_NEWEST.  The
+                catalogs hold the packages for all variants, so 'variants'
+                is ignored."""
+
+                newest = pkg_list == ImageInterface.LIST_NEWEST
+                for prefix in sorted(self.__pubs):
+                        cat = self.__pubs[prefix].catalog
+                        seen = set()
+                        try:
+                                for t, states, attrs in cat.gen_packages(
+                                    patterns=patterns, pubs=[prefix],
+                                    return_fmris=return_fmris):
+                                        stem = t.pkg_name if return_fmris \
+                                            else t[1]
+                                        if newest:
+                                                # Results are sorted in
+                                                # descending version order.
+                                                if stem in seen:
+                                                        continue
+                                                seen.add(stem)
+                                        yield t, None, [], states, attrs
+                        except apx.PackageMatchErrors as e:
+                                raise apx.InventoryException(illegal=e.illegal)
+
+        def get_manifest(self, pfmri):
+                """Return the pkg.manifest.Manifest of 'pfmri', including the
+                actions for all variants."""
+
+                name = str(pfmri)
+                content = self.__store.get(name)
+                if content is None:
+                        content = self.__xport.get_manifest(pfmri,
+                            content_only=True)
+                        self.__store.add(name, content)
+                mf = pkg.manifest.Manifest(pfmri)
+                mf.set_content(content=content)
+                return mf
+
+        def prefetch_manifests(self, pfmris, progtrack=None):
+                """Retrieve the manifests of those of 'pfmris' which aren't
+                stored yet.  Any which can't be retrieved are left for
+                get_manifest() to try again."""
+
+                if not progtrack:
+                        progtrack = progress.NullProgressTracker()
+
+                missing = {}
+                for pfmri in pfmris:
+                        if str(pfmri) not in self.__store:
+                                missing.setdefault(pfmri.publisher,
+                                    []).append(pfmri)
+
+                for prefix in sorted(missing):
+                        # Manifests are stored by the transport under their
+                        # stem and version alone, so each publisher gets its
+                        # own directory.
+                        self.__cfg.pkg_root = os.path.join(self.root, "tmp",
+                            "pkg", prefix)
+                        self.__xport.prefetch_manifests(
+                            [(f, None) for f in missing[prefix]],
+                            progtrack=progtrack)
+                        for pfmri in missing[prefix]:
+                                path = self.__cfg.get_pkg_pathname(pfmri)
+                                try:
+                                        with open(path) as fh:
+                                                content = fh.read()
+                                except EnvironmentError as e:
+                                        if e.errno != errno.ENOENT:
+                                                raise
+                                        continue
+                                self.__store.add(str(pfmri), content)
+                        shutil.rmtree(self.__cfg.pkg_root, True)
+
+        def close(self):
+                """Write out any changes to the index and release it."""
+
+                live = set()
+                for pub in self.__pubs.values():
+                        live.update(str(f) for f in pub.catalog.fmris())
+                self.__store.close(live)
+                shutil.rmtree(os.path.join(self.root, "tmp"), True)
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -37,7 +37,6 @@ import re
 import six
 import tempfile
 from itertools import groupby, chain, product, repeat
-from operator import itemgetter
 from six.moves import zip
 
 import pkg.actions as actions
@@ -219,56 +218,66 @@ class Manifest(object):
                             [(None, a) for a in self.gen_actions(
                             excludes=self_exclude)], [], [])
 
-                def hashify(v):
-                        """handle key values that may be lists"""
-                        if type(v) is not list:
-                                return v
-                        return tuple(v)
-
                 def dictify(mf, excludes):
                         # Transform list of actions into a dictionary keyed by
                         # action key attribute, key attribute and mediator, or
                         # id if there is no key attribute.
+                        d = {}
                         for a in mf.gen_actions(excludes=excludes):
-                                if (a.name == "link" or
-                                    a.name == "hardlink") and \
-                                    a.attrs.get("mediator"):
-                                        akey = (a.name, tuple([
-                                            a.attrs[a.key_attr],
-                                            a.attrs.get("mediator-version"),
-                                            a.attrs.get("mediator-implementation")
-                                        ]))
+                                name = a.name
+                                attrs = a.attrs
+                                if (name == "link" or name == "hardlink") and \
+                                    attrs.get("mediator"):
+                                        akey = (name, (
+                                            attrs[a.key_attr],
+                                            attrs.get("mediator-version"),
+                                            attrs.get("mediator-implementation")
+                                        ))
                                 else:
-                                        akey = (a.name, hashify(a.attrs.get(
-                                            a.key_attr, id(a))))
-                                yield (akey, a)
-
-                sdict = dict(dictify(self, self_exclude))
-                odict = dict(dictify(origin, origin_exclude))
-
-                sset = set(six.iterkeys(sdict))
-                oset = set(six.iterkeys(odict))
-
-                added = [(None, sdict[i]) for i in sset - oset]
-                removed = [(odict[i], None) for i in oset - sset]
-                changed = [
-                    (odict[i], sdict[i])
-                    for i in oset & sset
-                    if odict[i].different(sdict[i], pkgplan=pkgplan,
-                        cmp_policy=cmp_policy)
+                                        v = attrs.get(a.key_attr)
+                                        if v is None:
+                                                v = id(a)
+                                        elif type(v) is list:
+                                                # handle key values that may be
+                                                # lists
+                                                v = tuple(v)
+                                        akey = (name, v)
+                                d[akey] = a
+                        return d
+
+                sdict = dictify(self, self_exclude)
+                odict = dictify(origin, origin_exclude)
+
+                added = [(None, sdict[i]) for i in sdict.keys() - odict.keys()]
+                removed = [
+                    (odict[i], None) for i in odict.keys() - sdict.keys()
                 ]
+                changed = []
+                for i in odict.keys() & sdict.keys():
+                        oa = odict[i]
+                        sa = sdict[i]
+                        # Most actions are unchanged, and are identical in both
+                        # manifests; check for that here before calling the
+                        # much more expensive different().
+                        if oa.has_payload == sa.has_payload and \
+                            oa.attrs == sa.attrs and (not oa.has_payload or
+                            oa.hash == sa.hash):
+                                continue
+                        if oa.different(sa, pkgplan=pkgplan,
+                            cmp_policy=cmp_policy):
+                                changed.append((oa, sa))
 
                 # XXX Do changed actions need to be sorted at all?  This is
                 # likely to be the largest list, so we might save significant
                 # time by not sorting.  Should we sort above?  Insert into a
                 # sorted list?
 
-                # singlesort = lambda x: x[0] or x[1]
-                addsort = itemgetter(1)
-                remsort = itemgetter(0)
-                removed.sort(key=remsort, reverse=True)
-                added.sort(key=addsort)
-                changed.sort(key=addsort)
+                # Sort by precomputed keys rather than by comparing actions,
+                # which would call Action.__lt__() and compare() for each of
+                # the n log n comparisons.
+                removed.sort(key=lambda x: x[0].sort_key(), reverse=True)
+                added.sort(key=lambda x: x[1].sort_key())
+                changed.sort(key=lambda x: x[1].sort_key())
 
                 return ManifestDifference(added, changed, removed)
 
@@ -1010,58 +1019,47 @@ class Manifest(object):
                                 alldups.append((k, dups))
                 return alldups
 
-        def __content_to_actions(self, content):
-                """Parse manifest content, stripping line-continuation
-                characters from the input as it is read; this results in actions
-                with values across multiple lines being passed to the
-                action parsing code whitespace-separated instead.
-                
+        def __parse_content(self, content, excludes):
+                """Parse manifest content and add the actions not excluded by
+                'excludes' to the manifest.  Line-continuation characters are
+                stripped from the input as it is read; this results in actions
+                with values across multiple lines being parsed as if they were
+                whitespace-separated instead.
+
                 For example:
-                        
+
                 set name=pkg.summary \
                     value="foo"
                 set name=pkg.description value="foo " \
                       "bar baz"
 
-                ...will each be passed to action parsing as:
+                ...will each be parsed as:
 
                 set name=pkg.summary value="foo"
                 set name=pkg.description value="foo " "bar baz"
-                """
 
-                accumulate = ""
-                lineno = 0
-                errors = []
+                'content' is a str or any object supporting the buffer protocol
+                (such as bytes or an mmap) containing UTF-8 text.  The whole
+                content is parsed, and exclusions applied, by a single call to
+                actions.fromstrs()."""
 
-                if isinstance(content, six.string_types):
-                        # Get an iterable for the string.
-                        content = content.splitlines()
+                acts, bytype, errors = actions.fromstrs(content,
+                    excludes=excludes, publisher=self.publisher)
 
-                for l in content:
-                        lineno += 1
-                        l = l.lstrip()
-                        if l.endswith("\\"):          # allow continuation chars
-                                accumulate += l[0:-1] # elide backslash
-                                continue
-                        elif accumulate:
-                                l = accumulate + l
-                                accumulate = ""
-
-                        if not l or l[0] == "#": # ignore blank lines & comments
-                                continue
+                self.actions.extend(acts)
+                for aname, alist in six.iteritems(bytype):
+                        self.actions_bytype.setdefault(aname, []).extend(alist)
+                for action in bytype.get("set", EmptyI):
+                        self.fill_attributes(action)
 
-                        try:
-                                yield actions.fromstr(l)
-                        except actions.ActionError as e:
-                                # Accumulate errors and continue so that as
-                                # much of the action data as possible can be
-                                # parsed.
+                if errors:
+                        # Errors are accumulated so that as much of the action
+                        # data as possible is parsed.
+                        for lineno, e in errors:
                                 e.fmri = self.fmri
                                 e.lineno = lineno
-                                errors.append(e)
-
-                if errors:
-                        raise apx.InvalidPackageErrors(errors)
+                        raise apx.InvalidPackageErrors(
+                            [e for lineno, e in errors])
 
         def set_content(self, content=None, excludes=EmptyI, pathname=None,
             signatures=False):
@@ -1099,17 +1097,24 @@ class Manifest(object):
                 # can't be in a manifest twice.  (The problem of having the same
                 # action more than once in packages that can be installed
                 # together has to be solved somewhere else, though.)
+                if six.PY3 and isinstance(content, bytes):
+                        raise TypeError("content must be str, not bytes")
+
                 if pathname:
                         try:
-                                with open(pathname, "r", encoding='UTF-8') as mfile:
-                                        content = mfile.read()
+                                if signatures:
+                                        with open(pathname, "r",
+                                            encoding="UTF-8") as mfile:
+                                                content = mfile.read()
+                                else:
+                                        # Parse the file as read, without
+                                        # decoding it to a str first.
+                                        with open(pathname, "rb") as mfile:
+                                                content = mfile.read()
                         except EnvironmentError as e:
                                 raise apx._convert_error(e)
 
-                if six.PY3 and isinstance(content, bytes):
-                        raise TypeError("content must be str, not bytes")
-
-                if isinstance(content, six.string_types):
+                if isinstance(content, (six.string_types, bytes)):
                         if signatures:
                                 # Generate manifest signature based upon
                                 # input content, but only if signatures
@@ -1118,10 +1123,10 @@ class Manifest(object):
                                 self.signatures = {
                                     "sha-1": self.hash_create(content)
                                 }
-                        content = self.__content_to_actions(content)
-
-                for action in content:
-                        self.add_action(action, excludes)
+                        self.__parse_content(content, excludes)
+                else:
+                        for action in content:
+                                self.add_action(action, excludes)
                 self.excludes = excludes
                 # Make sure that either no excludes were provided or that both
                 # variants and facet excludes were or that variant, facet and
@@ -1568,7 +1573,7 @@ class FactoredManifest(Manifest):
         the appropriate variants/facets."""
 
         def __init__(self, fmri, cache_root, contents=None, excludes=EmptyI,
-            pathname=None):
+            pathname=None, pack=None):
                 """Raises KeyError exception if factored manifest is not present
                 and contents are None; delays reading of manifest until required
                 if cache file is present.
@@ -1592,11 +1597,17 @@ class FactoredManifest(Manifest):
                 'cache_root'.  If provided, and contents is also provided, then
                 'contents' will be stored in 'pathname' if it does not already
                 exist.
+
+                'pack' is an optional pkg.manifestpack.ManifestPack object.  If
+                provided, the per-action type caches are stored in it instead
+                of in 'cache_root', and any found in 'cache_root' are moved
+                into it.
                 """
 
                 Manifest.__init__(self, fmri)
                 self.__cache_root = cache_root
                 self.__pathname = pathname
+                self.__pack = pack
                 # Make sure that either no excludes were provided or 2+ excludes
                 # were.
                 assert len(self.excludes) != 1
@@ -1619,9 +1630,11 @@ class FactoredManifest(Manifest):
 
                 # we have a cached copy of the manifest
                 mdpath = self.__cache_path("manifest.dircache")
+                if pack and not pack.has(fmri) and os.path.exists(mdpath):
+                        self.__migrate()
 
                 # have we computed the dircache?
-                if not os.path.exists(mdpath): # we're adding cache
+                if not self.__has_cache(): # we're adding cache
                         self.excludes = EmptyI # to existing manifest
                         self.__load()
                         if self.__storeback():
@@ -1635,6 +1648,58 @@ class FactoredManifest(Manifest):
         def __cache_path(self, name):
                 return os.path.join(self.__cache_root, name)
 
+        def __has_cache(self):
+                """Return whether the per-action type caches exist."""
+
+                if self.__pack:
+                        return self.__pack.has(self.fmri)
+                return os.path.exists(self.__cache_path("manifest.dircache"))
+
+        def __read_cache(self, name):
+                """Return a list of the lines of the named cache, or None if it
+                doesn't exist."""
+
+                if self.__pack:
+                        content = self.__pack.get(self.fmri, name)
+                        if content is None:
+                                return None
+                        # Only split on newlines, as readlines() does;
+                        # splitlines() would also split attribute values
+                        # containing other line boundaries.
+                        lines = content.split("\n")
+                        if not lines[-1]:
+                                lines.pop()
+                        return lines
+
+                try:
+                        with open(self.__cache_path(name), "r") as f:
+                                return f.readlines()
+                except EnvironmentError as e:
+                        if e.errno == errno.ENOENT:
+                                return None
+                        raise apx._convert_error(e)
+
+        def __clear_cache(self):
+                if self.__pack:
+                        self.__pack.remove(self.fmri)
+                else:
+                        self.clear_cache(self.__cache_root)
+
+        def __migrate(self):
+                """Move the per-action type caches stored in the cache root
+                into the pack."""
+
+                self.excludes = EmptyI
+                self.__load()
+                try:
+                        self.__storebytype()
+                except apx.PermissionsException:
+                        # Keep using the caches where they are.
+                        self.__pack = None
+                else:
+                        self.clear_cache(self.__cache_root)
+                self.__unload()
+
         def __load(self):
                 """Load all manifest contents from on-disk copy of manifest"""
                 self.set_content(excludes=self.excludes, pathname=self.pathname)
@@ -1667,69 +1732,54 @@ class FactoredManifest(Manifest):
                         return False
 
         def __storebytype(self):
-                """ create manifest.<typename> files to accelerate partial
+                """ create manifest.<typename> caches to accelerate partial
                 parsing of manifests.  Separate from __storeback code to
                 allow upgrade to reuse existing on disk manifests"""
 
                 assert self.loaded
 
+                # All action types are considered so that empty caches are
+                # created if no action of that type exists for the package
+                # (avoids full manifest loads later).
+                caches = []
+                for n, acts in six.iteritems(self.actions_bytype):
+                        lines = ["{0}\n".format(a) for a in acts]
+                        if n == "set":
+                                # Add supplemental action data; yes this
+                                # does mean the cache is not the same as
+                                # retrieved manifest, but that's ok.
+                                # Signature verification is done using
+                                # the raw manifest.
+                                lines.extend(self._gen_attrs_to_str())
+                        caches.append(("manifest.{0}".format(n),
+                            "".join(lines)))
+                caches.append(("manifest.dircache",
+                    "".join(self._gen_dirs_to_str())))
+                caches.append(("manifest.mediatorcache",
+                    "".join(self._gen_mediators_to_str())))
+
+                if self.__pack:
+                        self.__pack.put(self.fmri, caches)
+                        return
+
                 t_dir = self.__cache_root
 
                 # Ensure target cache directory and intermediates exist.
                 misc.makedirs(t_dir)
 
-                # create per-action type cache; use rename to avoid corrupt
-                # files if ^C'd in the middle.  All action types are considered
-                # so that empty cache files are created if no action of that
-                # type exists for the package (avoids full manifest loads
-                # later).
-                for n, acts in six.iteritems(self.actions_bytype):
-                        t_prefix = "manifest.{0}.".format(n)
-
-                        try:
-                                fd, fn = tempfile.mkstemp(dir=t_dir,
-                                    prefix=t_prefix)
-                        except EnvironmentError as e:
-                                raise apx._convert_error(e)
-
-                        f = os.fdopen(fd, "w")
-                        try:
-                                for a in acts:
-                                        f.write("{0}\n".format(a))
-                                if n == "set":
-                                        # Add supplemental action data; yes this
-                                        # does mean the cache is not the same as
-                                        # retrieved manifest, but that's ok.
-                                        # Signature verification is done using
-                                        # the raw manifest.
-                                        f.writelines(self._gen_attrs_to_str())
-                        except EnvironmentError as e:
-                                raise apx._convert_error(e)
-                        finally:
-                                f.close()
-
-                        try:
-                                os.chmod(fn, PKG_FILE_MODE)
-                                portable.rename(fn,
-                                    self.__cache_path("manifest.{0}".format(n)))
-                        except EnvironmentError as e:
-                                raise apx._convert_error(e)
-
-                def create_cache(name, refs):
+                # create cache files; use rename to avoid corrupt files if ^C'd
+                # in the middle.
+                for name, content in caches:
                         try:
                                 fd, fn = tempfile.mkstemp(dir=t_dir,
                                     prefix=name + ".")
                                 with os.fdopen(fd, "w") as f:
-                                        f.writelines(refs())
+                                        f.write(content)
                                 os.chmod(fn, PKG_FILE_MODE)
                                 portable.rename(fn, self.__cache_path(name))
                         except EnvironmentError as e:
                                 raise apx._convert_error(e)
 
-                create_cache("manifest.dircache", self._gen_dirs_to_str)
-                create_cache("manifest.mediatorcache",
-                    self._gen_mediators_to_str)
-
         @staticmethod
         def clear_cache(cache_root):
                 """Remove all manifest cache files found in the given directory
@@ -1765,31 +1815,28 @@ class FactoredManifest(Manifest):
                 data.
                 """
 
-                mpath = self.__cache_path(name)
-                if os.path.exists(mpath):
+                lines = self.__read_cache(name)
+                if lines is not None:
                         # we have cached copy on disk; use it
                         try:
-                                with open(mpath, "r") as f:
-                                        self._cache[name] = [
-                                            a for a in
-                                            (
-                                                actions.fromstr(s.rstrip())
-                                                for s in f
-                                            )
-                                            if not self.excludes or
-                                                a.include_this(self.excludes,
-                                                    publisher=self.publisher)
-                                        ]
+                                self._cache[name] = [
+                                    a for a in
+                                    (
+                                        actions.fromstr(s.rstrip())
+                                        for s in lines
+                                    )
+                                    if not self.excludes or
+                                        a.include_this(self.excludes,
+                                            publisher=self.publisher)
+                                ]
                                 return
-                        except EnvironmentError as e:
-                                raise apx._convert_error(e)
                         except actions.ActionError as e:
                                 # Cache file is malformed; hopefully due to bugs
                                 # that have been resolved (as opposed to actual
                                 # corruption).  Assume we should just ignore the
                                 # cache and load action data.
                                 try:
-                                        self.clear_cache(self.__cache_root)
+                                        self.__clear_cache()
                                 except Exception as e:
                                         # Ignore errors encountered during cache
                                         # dump for this specific case.
@@ -1823,9 +1870,7 @@ class FactoredManifest(Manifest):
                 # This checks if we've already written out the factored
                 # manifest files.  If so, we'll use it, and if not, then
                 # we'll load the full manifest.
-                mpath = self.__cache_path("manifest.dircache")
-
-                if not os.path.exists(mpath):
+                if not self.__has_cache():
                         # no cached copy :-(
                         if not self.loaded:
                                 # get manifest from disk
@@ -1848,31 +1893,25 @@ class FactoredManifest(Manifest):
 
                 # Assume a cached copy exists; if not, tag the action type to
                 # avoid pointless I/O later.
-                mpath = self.__cache_path("manifest.{0}".format(atype))
+                lines = self.__read_cache("manifest.{0}".format(atype))
+                if lines is None:
+                        self._absent_cache.append(atype)
+                        return # no such action in this manifest
 
                 if attr_match:
                         attr_match = _compile_fnpats(attr_match)
 
-                try:
-                        with open(mpath, "r") as f:
-                                for l in f:
-                                        a = actions.fromstr(l.rstrip())
-                                        if (excludes and
-                                            not a.include_this(excludes,
-                                                publisher=self.publisher)):
-                                                continue
-                                        # These conditions are split by
-                                        # performance.
-                                        if not attr_match:
-                                                yield a
-                                        elif _attr_matches(a, attr_match):
-                                                yield a
-
-                except EnvironmentError as e:
-                        if e.errno == errno.ENOENT:
-                                self._absent_cache.append(atype)
-                                return # no such action in this manifest
-                        raise apx._convert_error(e)
+                for l in lines:
+                        a = actions.fromstr(l.rstrip())
+                        if (excludes and
+                            not a.include_this(excludes,
+                                publisher=self.publisher)):
+                                continue
+                        # These conditions are split by performance.
+                        if not attr_match:
+                                yield a
+                        elif _attr_matches(a, attr_match):
+                                yield a
 
         def gen_facets(self, excludes=EmptyI, patterns=EmptyI):
                 """A generator function that returns the supported facet
@@ -1910,16 +1949,15 @@ class FactoredManifest(Manifest):
                 """Load attributes dictionary from cached set actions;
                 this speeds up pkg info a lot"""
 
-                mpath = self.__cache_path("manifest.set")
-                if not os.path.exists(mpath):
+                lines = self.__read_cache("manifest.set")
+                if lines is None:
                         return False
-                with open(mpath, "r") as f:
-                        for l in f:
-                                a = actions.fromstr(l.rstrip())
-                                if not self.excludes or \
-                                    a.include_this(self.excludes,
-                                        publisher=self.publisher):
-                                        self.fill_attributes(a)
+                for l in lines:
+                        a = actions.fromstr(l.rstrip())
+                        if not self.excludes or \
+                            a.include_this(self.excludes,
+                                publisher=self.publisher):
+                                self.fill_attributes(a)
 
                 return True
 
@@ -0,0 +1,393 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Packed storage for the per-action type caches of factored manifests.
+
+pkg.manifest.FactoredManifest caches the actions of each type in a manifest,
+and the directories and mediators it references, so that they can be loaded
+without parsing the whole manifest.  By default each cache is a file in a
+directory per package; a ManifestPack instead keeps the caches of all of the
+packages of a publisher in a single file, so that they can be read without
+opening and statting a dozen files per package:
+
+    manifest.pack       MAGIC, VERSION and a random identifier, followed by a
+                        record for each package: the lengths of its header
+                        and of its caches, a JSON header giving its escaped
+                        stem and version and the name and length of each
+                        cache (or null if the caches of the package were
+                        removed), and the caches
+    manifest.pack.idx   a JSON index of the records in manifest.pack,
+                        rewritten when the pack is flushed
+    manifest.pack.lock  the lock held while the pack is written
+
+Records are only ever appended, so the caches of a package are replaced by
+writing a new record for it.  Records which aren't in the index, because
+they were written by another process or the index wasn't flushed, are found
+by reading the records after the last one it covers; since the caches of a
+package never change, records replaced or removed by another process can be
+read until the pack is opened again.  The pack is rewritten
+without its replaced and removed records once those take up more space than
+the others."""
+
+import errno
+import json
+import os
+import struct
+import tempfile
+
+import pkg.client.api_errors as apx
+import pkg.fmri as fmri
+import pkg.lockfile as lockfile
+import pkg.portable as portable
+
+from pkg.misc import PKG_FILE_MODE
+
+MAGIC = b"pkgmpack"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sI16s")
+_RECORD = struct.Struct("<II")
+
+# Replaced and removed records aren't rewritten until they take up at least
+# this many bytes.
+COMPACT_MIN = 1024 * 1024
+
+# The index is rewritten once this many records aren't covered by it.
+INDEX_INTERVAL = 256
+
+
+def _key(pfmri):
+        # A pack only holds the packages of one publisher, so they're
+        # identified as in the directory layout.
+        if not isinstance(pfmri, fmri.PkgFmri):
+                pfmri = fmri.PkgFmri(pfmri)
+        return pfmri.get_dir_path()
+
+
+class ManifestPack(object):
+        """The packed manifest caches stored in the directory 'root'."""
+
+        def __init__(self, root):
+                self.root = root
+                self.__path = os.path.join(root, "manifest.pack")
+                self.__idx_path = self.__path + ".idx"
+                self.__lock = lockfile.LockFile(self.__path + ".lock")
+                self.__fh = None
+                self.__reset()
+
+        def __reset(self):
+                if self.__fh:
+                        self.__fh.close()
+                self.__fh = None
+                self.__ino = None
+                self.__ident = None
+                # A dictionary of package key to the offset and length of its
+                # record and a dictionary of the offset and length of each of
+                # its caches.
+                self.__entries = {}
+                self.__end = 0
+                self.__stale = 0
+                self.__unindexed = 0
+
+        def __open(self):
+                """Open the pack if it exists and hasn't been opened, or has
+                been replaced since, returning whether it's open."""
+
+                try:
+                        ino = os.stat(self.__path).st_ino
+                except EnvironmentError as e:
+                        if e.errno != errno.ENOENT:
+                                raise apx._convert_error(e)
+                        self.__reset()
+                        return False
+                if self.__fh and ino == self.__ino:
+                        return True
+
+                self.__reset()
+                try:
+                        fh = open(self.__path, "rb", buffering=0)
+                except EnvironmentError as e:
+                        raise apx._convert_error(e)
+                hdr = fh.read(_HEADER.size)
+                if len(hdr) < _HEADER.size:
+                        fh.close()
+                        return False
+                magic, ver, ident = _HEADER.unpack(hdr)
+                if magic != MAGIC or ver != VERSION:
+                        fh.close()
+                        return False
+
+                self.__fh = fh
+                self.__ino = os.fstat(fh.fileno()).st_ino
+                self.__ident = ident
+                self.__end = _HEADER.size
+                self.__load_index()
+                self.__scan()
+                return True
+
+        def __load_index(self):
+                try:
+                        with open(self.__idx_path, "r") as f:
+                                idx = json.load(f)
+                        if idx["version"] != VERSION or \
+                            idx["ident"] != self.__ident.hex():
+                                return
+                        entries = dict(
+                            (k, (rec_off, rec_len, dict(
+                                (n, tuple(v)) for n, v in caches.items())))
+                            for k, (rec_off, rec_len, caches) in
+                            idx["entries"].items())
+                        end = idx["end"]
+                        stale = idx["stale"]
+                        if end > os.fstat(self.__fh.fileno()).st_size:
+                                return
+                except (EnvironmentError, ValueError, KeyError, TypeError,
+                    AttributeError):
+                        # The index is missing or unusable; the records will
+                        # be read instead.
+                        return
+                self.__entries = entries
+                self.__end = end
+                self.__stale = stale
+
+        def __scan(self):
+                """Read the records after those already known."""
+
+                fh = self.__fh
+                size = os.fstat(fh.fileno()).st_size
+                off = self.__end
+                while off + _RECORD.size <= size:
+                        fh.seek(off)
+                        hlen, clen = _RECORD.unpack(fh.read(_RECORD.size))
+                        start = off + _RECORD.size + hlen
+                        end = start + clen
+                        if end > size:
+                                # Still being written.
+                                break
+                        try:
+                                hdr = json.loads(fh.read(hlen).decode("utf-8"))
+                                name = hdr["pkg"]
+                                caches = hdr["caches"]
+                        except (ValueError, KeyError, TypeError):
+                                break
+
+                        old = self.__entries.pop(name, None)
+                        if old:
+                                self.__stale += old[1]
+                        if caches is None:
+                                self.__stale += end - off
+                        else:
+                                entry = {}
+                                for cname, clen in caches:
+                                        entry[cname] = (start, clen)
+                                        start += clen
+                                self.__entries[name] = (off, end - off, entry)
+                        self.__unindexed += 1
+                        off = end
+                self.__end = off
+
+        def has(self, pfmri):
+                """Return whether the pack holds the caches of 'pfmri'."""
+
+                name = _key(pfmri)
+                if name not in self.__entries and self.__open():
+                        # They may have been added by another process since
+                        # the pack was read.
+                        self.__scan()
+                return name in self.__entries
+
+        def get(self, pfmri, cname):
+                """Return the contents of the cache 'cname' of 'pfmri', or None
+                if the package has no such cache."""
+
+                if not self.has(pfmri):
+                        return None
+                try:
+                        off, clen = self.__entries[_key(pfmri)][2][cname]
+                except KeyError:
+                        return None
+                self.__fh.seek(off)
+                return self.__fh.read(clen).decode("utf-8")
+
+        def put(self, pfmri, caches):
+                """Store 'caches', a list of (name, contents) tuples, as the
+                caches of 'pfmri', replacing any it had."""
+
+                hdr = {
+                    "pkg": _key(pfmri),
+                    "caches": [],
+                }
+                data = []
+                for cname, content in caches:
+                        content = content.encode("utf-8")
+                        hdr["caches"].append([cname, len(content)])
+                        data.append(content)
+                self.__append(hdr, data)
+
+        def remove(self, pfmri):
+                """Remove the caches of 'pfmri'."""
+
+                if self.has(pfmri):
+                        self.__append({ "pkg": _key(pfmri), "caches": None },
+                            [])
+
+        def __locked(self, func, *args):
+                try:
+                        self.__lock.lock()
+                except EnvironmentError as e:
+                        if e.errno == errno.ENOENT:
+                                # The directory doesn't exist yet.
+                                try:
+                                        os.makedirs(self.root)
+                                except EnvironmentError as e:
+                                        if e.errno != errno.EEXIST:
+                                                raise apx._convert_error(e)
+                                return self.__locked(func, *args)
+                        raise apx._convert_error(e)
+                try:
+                        return func(*args)
+                finally:
+                        self.__lock.unlock()
+
+        def __create(self):
+                fd, tmp = tempfile.mkstemp(dir=self.root,
+                    prefix="manifest.pack.")
+                try:
+                        with os.fdopen(fd, "wb") as f:
+                                f.write(_HEADER.pack(MAGIC, VERSION,
+                                    os.urandom(16)))
+                        os.chmod(tmp, PKG_FILE_MODE)
+                        portable.rename(tmp, self.__path)
+                except:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        raise
+
+        def __append(self, hdr, data):
+                def append():
+                        if not self.__open():
+                                self.__create()
+                                self.__open()
+                        else:
+                                self.__scan()
+
+                        hdr_data = json.dumps(hdr).encode("utf-8")
+                        record = [_RECORD.pack(len(hdr_data),
+                            sum(len(d) for d in data)), hdr_data]
+                        record.extend(data)
+                        with open(self.__path, "ab") as f:
+                                # The end of the pack may be the remains of a
+                                # write that was interrupted.
+                                f.truncate(self.__end)
+                                f.write(b"".join(record))
+                        self.__scan()
+                        if self.__unindexed >= INDEX_INTERVAL:
+                                self.__flush()
+
+                try:
+                        self.__locked(append)
+                except EnvironmentError as e:
+                        raise apx._convert_error(e)
+
+        def flush(self):
+                """Write the index of the pack, first rewriting the pack if
+                most of it is taken up by replaced or removed records."""
+
+                if not self.__unindexed and \
+                    (self.__stale < COMPACT_MIN or
+                    self.__stale <= self.__end - self.__stale):
+                        return
+                try:
+                        self.__locked(self.__flush)
+                except (apx.PermissionsException,
+                    apx.ReadOnlyFileSystemException):
+                        # The index is only needed to open the pack faster.
+                        pass
+                except EnvironmentError as e:
+                        raise apx._convert_error(e)
+
+        def __flush(self):
+                if not self.__open():
+                        return
+                self.__scan()
+                if self.__stale >= COMPACT_MIN and \
+                    self.__stale > self.__end - self.__stale:
+                        self.__compact()
+
+                idx = {
+                    "version": VERSION,
+                    "ident": self.__ident.hex(),
+                    "end": self.__end,
+                    "stale": self.__stale,
+                    "entries": self.__entries,
+                }
+                fd, tmp = tempfile.mkstemp(dir=self.root,
+                    prefix="manifest.pack.idx.")
+                try:
+                        with os.fdopen(fd, "w") as f:
+                                json.dump(idx, f)
+                        os.chmod(tmp, PKG_FILE_MODE)
+                        portable.rename(tmp, self.__idx_path)
+                except:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        raise
+                self.__unindexed = 0
+
+        def __compact(self):
+                fd, tmp = tempfile.mkstemp(dir=self.root,
+                    prefix="manifest.pack.")
+                try:
+                        with os.fdopen(fd, "wb") as f:
+                                f.write(_HEADER.pack(MAGIC, VERSION,
+                                    os.urandom(16)))
+                                for name in sorted(self.__entries):
+                                        off, rlen, caches = \
+                                            self.__entries[name]
+                                        self.__fh.seek(off)
+                                        f.write(self.__fh.read(rlen))
+                        os.chmod(tmp, PKG_FILE_MODE)
+                        portable.rename(tmp, self.__path)
+                except:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        raise
+                self.__open()
+
+        def close(self):
+                """Flush the pack and release the file it's read from."""
+
+                self.flush()
+                self.__reset()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
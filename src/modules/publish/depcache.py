@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Cache of the results of analyzing files for dependencies.
+
+The dependencies, errors and package attributes produced by analyzing a file
+are stored under a key derived from the hash of the file's content and
+everything else the analysis depends on: the analysis function, the
+attributes of the action delivering the file, the package's variants, the run
+paths, the dynamic token conversions and the version of pkg(7).  As long as
+those are unchanged, the stored results can be used instead of analyzing the
+file again.
+
+Analysis which looks at files other than the one being analyzed can't be
+cached this way, so callers only use the cache for analysis that depends on
+nothing but the content of the file.  In particular, python scripts aren't
+cached, as their analysis depends on the interpreters and modules installed
+on the host.
+
+The results are stored in a pkg.resultcache.ResultCache, which removes the
+least recently used entries once it grows beyond its size limit."""
+
+import hashlib
+import os
+
+import pkg
+import pkg.misc as misc
+import pkg.resultcache as resultcache
+
+from pkg.portable import PD_LOCAL_PATH
+
+# The version of the format of the entries.
+VERSION = 1
+
+
+class DependencyCache(resultcache.ResultCache):
+        """A dependency analysis cache stored in the directory 'root', whose
+        entries are limited to a total of 'max_size' bytes."""
+
+        def get_key(self, func, action, pkg_vars, dyn_tok_conv, run_paths):
+                """Return the key for the results of analyzing the file
+                delivered by 'action' using 'func', or None if the file can't
+                be read."""
+
+                try:
+                        fhash = misc.get_data_digest(
+                            action.attrs[PD_LOCAL_PATH],
+                            hash_func=hashlib.sha256)[0]
+                except EnvironmentError:
+                        return None
+
+                h = hashlib.sha256()
+                for part in (VERSION, pkg.VERSION, fhash,
+                    "{0}.{1}".format(func.__module__, func.__name__),
+                    sorted(action.attrs.items()),
+                    sorted((k, sorted(v)) for k, v in pkg_vars.items()),
+                    sorted(dyn_tok_conv.items()), run_paths,
+                    os.environ.get("PYTHONPATH")):
+                        h.update(repr(part).encode("utf-8"))
+                        h.update(b"\0")
+                return h.hexdigest()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -25,9 +25,12 @@
 #
 
 import copy
+import io
 import itertools
+import multiprocessing
 import operator
 import os
+import pickle
 import re
 import six
 
@@ -146,6 +149,20 @@ class UndeclaredVariantWarning(DependencyError):
                    )
 
 
+class ParallelAnalysisWarning(DependencyError):
+        """This exception is used when the result of analyzing a file in
+        another process couldn't be passed back, so the file was analyzed
+        again in the calling process."""
+
+        def __init__(self, pth):
+                self.path = pth
+
+        def __str__(self):
+                return _("WARNING: the result of analyzing {path} in a "
+                    "separate process couldn't be used; it was analyzed "
+                    "again.").format(path=self.path)
+
+
 class BadPackageFmri(DependencyError):
         """This exception is used when a manifest's fmri isn't a valid fmri."""
 
@@ -241,7 +258,8 @@ class __NotSubset(DependencyError):
 
 
 def list_implicit_deps(file_path, proto_dirs, dyn_tok_conv, run_paths,
-    remove_internal_deps=True, convert=True, ignore_bypass=False):
+    remove_internal_deps=True, convert=True, ignore_bypass=False, jobs=1,
+    cache=None):
         """Given the manifest provided in file_path, use the known dependency
         generators to produce a list of dependencies the files delivered by
         the manifest have.
@@ -263,13 +281,20 @@ def list_implicit_deps(file_path, proto_dirs, dyn_tok_conv, run_paths,
         'ignore_bypass' determines whether to bypass generation of dependencies
         against certain files or directories.  This is primarily an option to
         facilitate testing and debugging.
+
+        'jobs' is the number of processes to use to analyze the files
+        delivered by the manifest.
+
+        'cache' is an optional pkg.publish.depcache.DependencyCache holding
+        the results of previous analysis.
         """
 
         m, manifest_errs = __make_manifest(file_path, proto_dirs)
         pkg_vars = m.get_all_variants()
         deps, elist, warnings, missing, pkg_attrs = \
             list_implicit_deps_for_manifest(m, proto_dirs, pkg_vars,
-                dyn_tok_conv, run_paths, ignore_bypass=ignore_bypass)
+                dyn_tok_conv, run_paths, ignore_bypass=ignore_bypass,
+                jobs=jobs, cache=cache)
         rid_errs = []
         if remove_internal_deps:
                 deps, rid_errs = resolve_internal_deps(deps, m, proto_dirs,
@@ -369,7 +394,7 @@ dispatch_dict = {
 }
 
 def list_implicit_deps_for_manifest(mfst, proto_dirs, pkg_vars, dyn_tok_conv,
-    run_paths, ignore_bypass=False):
+    run_paths, ignore_bypass=False, jobs=1, cache=None):
         """For a manifest, produce the list of dependencies generated by the
         files it installs.
 
@@ -392,6 +417,12 @@ def list_implicit_deps_for_manifest(mfst, proto_dirs, pkg_vars, dyn_tok_conv,
         pkg.depend.bypass-generate attributes - this is primarily to aid
         debugging and testing.
 
+        'jobs' is the number of processes to use to analyze files.  The results
+        don't depend on it.
+
+        'cache' is an optional pkg.publish.depcache.DependencyCache used to
+        avoid analyzing files which have been analyzed before.
+
         Returns a tuple of four lists.
 
         'deps' is a list of dependencies found for the given Manifest.
@@ -439,54 +470,243 @@ def list_implicit_deps_for_manifest(mfst, proto_dirs, pkg_vars, dyn_tok_conv,
         if portable.PD_BYPASS_GENERATE in mfst:
                 mf_bypass = __makelist(mfst[portable.PD_BYPASS_GENERATE])
 
+        # Determine how each file should be handled before analyzing any of
+        # them, so that the analysis can be done in parallel.
+        files = []
+        run_path_errs = None
         for i, file_type in enumerate(file_types):
                 a = act_list[i]
 
                 a_run_paths = run_paths
                 if portable.PD_RUN_PATH in a.attrs:
                         a_run_path_str = a.attrs[portable.PD_RUN_PATH]
-                        es = __verify_run_path(a_run_path_str)
-                        if es:
-                                return (deps, elist + es, warnings, missing,
-                                    pkg_attrs)
+                        run_path_errs = __verify_run_path(a_run_path_str)
+                        if run_path_errs:
+                                break
                         a_run_paths = a_run_path_str.split(":")
 
                 bypass = __makelist(
                     a.attrs.get(portable.PD_BYPASS_GENERATE, mf_bypass))
                 # If we're bypassing all depdendency generation, we can avoid
                 # calling our dispatch_dict function altogether.
-                if (".*" in bypass or "^.*$" in bypass) and not ignore_bypass:
-                        pkg_attrs[bypassed_prefix] = "{0}:.*".format(
-                            a.attrs["path"])
-                        continue
-                try:
-                        func = dispatch_dict[file_type]
-                except KeyError:
-                        if file_type not in missing:
-                                missing[file_type] = \
-                                    a.attrs[portable.PD_LOCAL_PATH]
-                else:
+                bypass_all = (".*" in bypass or "^.*$" in bypass) and \
+                    not ignore_bypass
+                files.append((a, file_type, a_run_paths, bypass, bypass_all))
+
+        results = _analyze_files([
+            (dispatch_dict[file_type], a, a_run_paths)
+            for a, file_type, a_run_paths, bypass, bypass_all in files
+            if not bypass_all and file_type in dispatch_dict
+        ], pkg_vars, dyn_tok_conv, jobs, cache=cache, warnings=warnings)
+
+        try:
+                for a, file_type, a_run_paths, bypass, bypass_all in files:
+                        if bypass_all:
+                                pkg_attrs[bypassed_prefix] = "{0}:.*".format(
+                                    a.attrs["path"])
+                                continue
+                        if file_type not in dispatch_dict:
+                                if file_type not in missing:
+                                        missing[file_type] = \
+                                            a.attrs[portable.PD_LOCAL_PATH]
+                                continue
+
                         try:
-                                ds, errs, attrs = func(action=a,
-                                    pkg_vars=pkg_vars,
-                                    dyn_tok_conv=dyn_tok_conv,
-                                    run_paths=a_run_paths)
+                                res = next(results)
+                                if isinstance(res,
+                                    base.DependencyAnalysisError):
+                                        raise res
+                                ds, errs, attrs = res
 
                                 # prune out any dependencies on the files we've
                                 # been asked to avoid creating dependencies on
                                 if bypass and not ignore_bypass:
-                                        ds = \
-                                            __bypass_deps(ds, bypass, pkg_attrs)
+                                        ds = __bypass_deps(ds, bypass,
+                                            pkg_attrs)
 
                                 deps.extend(ds)
                                 elist.extend(errs)
                                 __update_pkg_attrs(pkg_attrs, attrs)
                         except base.DependencyAnalysisError as e:
                                 elist.append(e)
+        finally:
+                results.close()
+        if run_path_errs:
+                return deps, elist + run_path_errs, warnings, missing, \
+                    pkg_attrs
         for a in mfst.gen_actions_by_type("hardlink"):
                 deps.extend(hardlink.process_hardlink_deps(a, pkg_vars))
         return deps, elist, warnings, missing, pkg_attrs
 
+# The analysis functions whose results only depend on the content of the file
+# being analyzed and the information used to construct a DependencyCache key,
+# and so can be cached, except as determined by _cacheable().
+cached_analyzers = frozenset([
+    elf_dep.process_elf_dependencies,
+    script.process_script_deps,
+])
+
+def _cacheable(func, action):
+        """Return whether the results of analyzing the file delivered by
+        'action' using 'func', one of cached_analyzers, can be cached.  Python
+        scripts can't be, as their analysis depends on the python
+        interpreters and modules installed on the host."""
+
+        if func is not script.process_script_deps:
+                return True
+        try:
+                with open(action.attrs[portable.PD_LOCAL_PATH], "rb") as fh:
+                        return b"python" not in fh.readline()
+        except EnvironmentError:
+                return False
+
+# The state shared with the processes analyzing files for
+# _analyze_files(), as a tuple of the list of files to analyze, the package
+# variants and the dynamic token conversions.
+_analysis_state = None
+
+def _analyze_file(func, action, pkg_vars, dyn_tok_conv, run_paths):
+        """Analyze the file delivered by 'action' using 'func' and return
+        the dependencies, errors and package attributes, or the
+        DependencyAnalysisError raised by the analysis."""
+
+        try:
+                return func(action=action, pkg_vars=pkg_vars,
+                    dyn_tok_conv=dyn_tok_conv, run_paths=run_paths)
+        except base.DependencyAnalysisError as e:
+                return e
+
+class _ResultPickler(pickle.Pickler):
+        """Pickler for analysis results which stores references to the
+        action analyzed and the package variants rather than copies of them;
+        the action can't be pickled, and the results should refer to the
+        caller's objects anyway."""
+
+        def __init__(self, fh, action, pkg_vars):
+                pickle.Pickler.__init__(self, fh, pickle.HIGHEST_PROTOCOL)
+                self.__refs = { id(action): "action", id(pkg_vars): "vars" }
+
+        def persistent_id(self, obj):
+                return self.__refs.get(id(obj))
+
+
+class _ResultUnpickler(pickle.Unpickler):
+        """Unpickler for results pickled by _ResultPickler."""
+
+        def __init__(self, fh, action, pkg_vars):
+                pickle.Unpickler.__init__(self, fh)
+                self.__objs = { "action": action, "vars": pkg_vars }
+
+        def persistent_load(self, pid):
+                return self.__objs[pid]
+
+
+def _dump_result(res, action, pkg_vars):
+        """Return the analysis result 'res' for 'action' pickled, or None if
+        it can't be pickled."""
+
+        fh = io.BytesIO()
+        try:
+                _ResultPickler(fh, action, pkg_vars).dump(res)
+        except Exception:
+                return None
+        return fh.getvalue()
+
+def _load_result(data, action, pkg_vars):
+        """Return the analysis result for 'action' pickled in 'data', or
+        None if it can't be unpickled."""
+
+        try:
+                return _ResultUnpickler(io.BytesIO(data), action,
+                    pkg_vars).load()
+        except Exception:
+                return None
+
+def _analyze_file_task(idx):
+        """Analyze the file at index 'idx' of the files shared by
+        _analyze_files() and return the pickled result, or None if the result
+        can't be pickled."""
+
+        files, pkg_vars, dyn_tok_conv = _analysis_state
+        func, action, run_paths = files[idx]
+        return _dump_result(_analyze_file(func, action, pkg_vars,
+            dyn_tok_conv, run_paths), action, pkg_vars)
+
+def _analyze_files(files, pkg_vars, dyn_tok_conv, jobs, cache=None,
+    warnings=None):
+        """Generate the results of analyzing each of 'files', a list of tuples
+        of (function, action, run paths), in order, as returned by
+        _analyze_file().
+
+        If 'cache' is a DependencyCache, results for files analyzed by one of
+        the functions in cached_analyzers, other than python scripts, are
+        taken from it where possible, and stored in it otherwise.
+
+        If 'jobs' is greater than one, the remaining files are analyzed by
+        that many forked processes; any result which can't be passed back
+        from them is produced by analyzing the file again in this process,
+        and a ParallelAnalysisWarning for it is appended to 'warnings'."""
+
+        global _analysis_state
+
+        keys = [None] * len(files)
+        cached = {}
+        if cache is not None:
+                for i, (func, action, run_paths) in enumerate(files):
+                        if func not in cached_analyzers or \
+                            not _cacheable(func, action):
+                                continue
+                        keys[i] = cache.get_key(func, action, pkg_vars,
+                            dyn_tok_conv, run_paths)
+                        if keys[i] is None:
+                                continue
+                        data = cache.get(keys[i])
+                        if data is not None:
+                                res = _load_result(data, action, pkg_vars)
+                                if res is not None:
+                                        cached[i] = res
+
+        todo = [i for i in range(len(files)) if i not in cached]
+        jobs = min(jobs, len(todo))
+        _analysis_state = (files, pkg_vars, dyn_tok_conv)
+        pool = None
+        try:
+                if jobs > 1:
+                        pool = multiprocessing.get_context("fork").Pool(jobs)
+                        analyzed = pool.imap(_analyze_file_task, todo,
+                            max(1, len(todo) // (jobs * 8)))
+                else:
+                        analyzed = (None for i in todo)
+
+                for i, (func, action, run_paths) in enumerate(files):
+                        if i in cached:
+                                yield cached[i]
+                                continue
+
+                        data = next(analyzed)
+                        res = None
+                        if data is not None:
+                                res = _load_result(data, action, pkg_vars)
+                        if res is None:
+                                if pool is not None and warnings is not None:
+                                        warnings.append(
+                                            ParallelAnalysisWarning(
+                                            action.attrs["path"]))
+                                res = _analyze_file(func, action, pkg_vars,
+                                    dyn_tok_conv, run_paths)
+                                data = None
+                                if keys[i] is not None:
+                                        data = _dump_result(res, action,
+                                            pkg_vars)
+                        if keys[i] is not None and data is not None:
+                                cache.put(keys[i], data)
+                        yield res
+        finally:
+                _analysis_state = None
+                if pool is not None:
+                        pool.terminate()
+                        pool.join()
+
 def __update_pkg_attrs(pkg_attrs, new_attrs):
         """Update the pkg_attrs dictionary with the contents of new_attrs."""
         for key in new_attrs:
@@ -1671,7 +1891,89 @@ def __safe_fmri_parse(txt):
                 pass
         return dep_name
 
-def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
+class _IndexedPaths(object):
+        """The files and links delivered by the selected packages of a
+        PathIndex, with their variants moved into the same universe as the
+        packages being resolved.  Entries are only read from the index when
+        a path is first looked up.
+
+        'index' is the PathIndex.
+
+        'package_vars' is a dictionary mapping the index of each selected
+        package to the variants it was published against."""
+
+        def __init__(self, index, package_vars):
+                self.__index = index
+                self.__package_vars = package_vars
+                self.__fmris = {}
+                self.__paths = {}
+
+        def __lookup(self, path):
+                try:
+                        return self.__paths[path]
+                except KeyError:
+                        pass
+                files = []
+                links = []
+                for i, tmpl, target in self.__index.lookup(path):
+                        pkg_vct = self.__package_vars.get(i)
+                        if pkg_vct is None:
+                                continue
+                        tmpl.merge_unknown(pkg_vct)
+                        vc = variants.VariantCombinations(tmpl, satisfied=True)
+                        pfmri = self.__fmris.get(i)
+                        if pfmri is None:
+                                # Dependencies shouldn't name publishers.
+                                pfmri = self.__index.packages[i][0].copy()
+                                pfmri.publisher = None
+                                self.__fmris[i] = pfmri
+                        if target is None:
+                                files.append((pfmri, vc))
+                        else:
+                                links.append((pfmri, vc, target))
+                self.__paths[path] = files, links
+                return files, links
+
+        def files(self, path):
+                return self.__lookup(path)[0]
+
+        def links(self, path):
+                return self.__lookup(path)[1]
+
+
+class _IndexedFiles(object):
+        """A read-only mapping of paths to the files delivered at them, as
+        used for the installed files when resolving against a PathIndex."""
+
+        def __init__(self, paths):
+                self.__paths = paths
+
+        def __contains__(self, path):
+                return bool(self.__paths.files(path))
+
+        def __getitem__(self, path):
+                res = self.__paths.files(path)
+                if not res:
+                        raise KeyError(path)
+                return res
+
+
+class _IndexedLinks(dict):
+        """A mapping of paths to the links delivered at them by the packages
+        being resolved, which also returns the links delivered by the packages
+        of a PathIndex."""
+
+        def __init__(self, paths):
+                dict.__init__(self)
+                self.__paths = paths
+
+        def get(self, path, default=None):
+                res = self.__paths.links(path) + dict.get(self, path, [])
+                return res or default
+
+
+def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False,
+    index=None):
         """For each manifest given, resolve the file dependencies to package
         dependencies. It returns a mapping from manifest_path to a list of
         dependencies and a list of unresolved dependencies.
@@ -1684,7 +1986,11 @@ def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
         packages that are resolved against.
 
         'prune_attrs' is a boolean indicating whether debugging
-        attributes should be stripped from returned actions."""
+        attributes should be stripped from returned actions.
+
+        'index' is an optional PathIndex of the system packages; if provided,
+        the system packages are taken from it instead of from the image, and
+        'api_inst' isn't used."""
 
         # The variable 'manifests' is a list of 5-tuples. The first element
         # of the tuple is the path to the manifest. The second is the name of
@@ -1725,7 +2031,26 @@ def resolve_deps(manifest_paths, api_inst, system_patterns, prune_attrs=False):
 
         sys_fmris = set()
         unmatched_patterns = set()
-        if system_patterns:
+        if system_patterns and index is not None:
+                selected, unmatched = index.match(system_patterns)
+                package_vars = {}
+                for i in selected:
+                        pfmri, pkg_vct = index.packages[i]
+                        # If this package is being resolved, then that's the
+                        # information to use.
+                        if pfmri.pkg_name in resolving_pkgs:
+                                continue
+                        sys_fmris.add(pfmri.pkg_name)
+                        distro_vars.merge_values(pkg_vct)
+                        package_vars[i] = copy.copy(pkg_vct)
+                # Move all package variants into the same universe.
+                for pkg_vct in package_vars.values():
+                        pkg_vct.merge_unknown(distro_vars)
+                unmatched_patterns.update(p for p in unmatched if p != "*")
+                indexed = _IndexedPaths(index, package_vars)
+                files = Entries({}, _IndexedFiles(indexed))
+                links = _IndexedLinks(indexed)
+        elif system_patterns:
                 pkg_list = api_inst.get_pkg_list(
                         api.ImageInterface.LIST_INSTALLED,
                         patterns=system_patterns, raise_unmatched=True)
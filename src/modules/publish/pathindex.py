@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Index of the paths delivered by a set of packages.
+
+Resolving file dependencies against the packages installed in an image needs
+to know, for each path, which packages deliver a file or link there and under
+which variants.  Gathering that requires loading the manifest of every
+installed package.  A path index records it once, for the packages installed
+in an image or the newest packages in a repository, so that later runs of
+pkgdepend resolve only read the entries for the paths they look up.
+
+The index is a single file which is memory-mapped when used:
+
+    header      MAGIC, VERSION, the number of paths, and the offset and
+                length of the package table and the offset of the path table
+    packages    a JSON list of [<fmri>, <dict of variant name to values>] for
+                each package
+    paths       a fixed size record for each path, sorted by path, giving the
+                offset of the path and the lengths of the path and its entries
+    data        each path, UTF-8 encoded, followed by its entries as a JSON
+                list of [<package index>, <dict of variant name to values>,
+                <link target or null>]
+
+Paths are looked up by binary search of the path table, so the cost of a
+lookup doesn't depend on the size of the index."""
+
+import fnmatch
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+import pkg.fmri as fmri
+import pkg.portable as portable
+import pkg.variant as variant
+import pkg.version as version
+
+from pkg.publish.dependencies import DependencyError, add_fmri_path_mapping
+
+MAGIC = b"pkgdepix"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIIQQQ")
+_RECORD = struct.Struct("<QII")
+
+
+class InvalidPathIndex(DependencyError):
+        """The file isn't a path index this version of pkg(7) can use."""
+
+        def __init__(self, path):
+                DependencyError.__init__(self)
+                self.path = path
+
+        def __str__(self):
+                return _("{0} is not a valid path index.").format(self.path)
+
+
+def _dump_vars(vct):
+        return dict((k, sorted(v)) for k, v in vct.items())
+
+
+def build(path, packages):
+        """Write an index of the paths delivered by 'packages' to 'path'.
+        'packages' is an iterable of (fmri, manifest) tuples; the manifests
+        must include the actions for all variants."""
+
+        pkgs = []
+        files = {}
+        links = {}
+        for pfmri, mfst in packages:
+                pkgs.append([str(pfmri),
+                    _dump_vars(mfst.get_all_variants())])
+                add_fmri_path_mapping(files, links, len(pkgs) - 1, mfst,
+                    use_template=True)
+
+        entries = {}
+        for p, l in files.items():
+                entries[p] = [[i, _dump_vars(vct), None] for i, vct in l]
+        for p, l in links.items():
+                entries.setdefault(p, []).extend(
+                    [i, _dump_vars(vct), target] for i, vct, target in l)
+
+        pkgs = json.dumps(pkgs).encode("utf-8")
+        table_off = _HEADER.size + len(pkgs)
+        off = table_off + _RECORD.size * len(entries)
+        table = []
+        data = []
+        for p in sorted(entries, key=lambda p: p.encode("utf-8")):
+                bp = p.encode("utf-8")
+                be = json.dumps(entries[p]).encode("utf-8")
+                table.append(_RECORD.pack(off, len(bp), len(be)))
+                data.append(bp)
+                data.append(be)
+                off += len(bp) + len(be)
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname,
+            prefix=os.path.basename(path) + ".")
+        try:
+                with os.fdopen(fd, "wb") as fh:
+                        fh.write(_HEADER.pack(MAGIC, VERSION, len(table),
+                            _HEADER.size, len(pkgs), table_off))
+                        fh.write(pkgs)
+                        fh.writelines(table)
+                        fh.writelines(data)
+                os.chmod(tmp, 0o644)
+                portable.rename(tmp, path)
+        except:
+                try:
+                        os.unlink(tmp)
+                except EnvironmentError:
+                        pass
+                raise
+
+
+def load(path):
+        """Return the PathIndex stored at 'path'.  InvalidPathIndex is raised
+        if it isn't an index of the current version."""
+
+        with open(path, "rb") as fh:
+                try:
+                        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                        # The file is empty.
+                        raise InvalidPathIndex(path)
+        try:
+                return PathIndex(mm)
+        except (struct.error, ValueError, UnicodeDecodeError,
+            fmri.FmriError):
+                mm.close()
+                raise InvalidPathIndex(path)
+
+
+class PathIndex(object):
+        """A memory-mapped path index, as written by build()."""
+
+        def __init__(self, mm):
+                magic, ver, self.__count, pkgs_off, pkgs_len, \
+                    self.__table_off = _HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or ver != VERSION:
+                        raise ValueError(magic)
+                self.__mm = mm
+                self.packages = [
+                    (fmri.PkgFmri(f), variant.VariantCombinationTemplate(vs))
+                    for f, vs in json.loads(
+                        mm[pkgs_off:pkgs_off + pkgs_len].decode("utf-8"))
+                ]
+
+        def close(self):
+                self.__mm.close()
+
+        def __record(self, i):
+                return _RECORD.unpack_from(self.__mm,
+                    self.__table_off + i * _RECORD.size)
+
+        def lookup(self, path):
+                """Return a list of the files and links delivered at 'path' as
+                (package index, variant template, link target) tuples, where
+                the target is None for files."""
+
+                bp = path.encode("utf-8")
+                mm = self.__mm
+                lo = 0
+                hi = self.__count
+                while lo < hi:
+                        mid = (lo + hi) // 2
+                        off, plen, elen = self.__record(mid)
+                        cur = mm[off:off + plen]
+                        if cur < bp:
+                                lo = mid + 1
+                        elif cur > bp:
+                                hi = mid
+                        else:
+                                off += plen
+                                return [
+                                    (i, variant.VariantCombinationTemplate(vs),
+                                    target)
+                                    for i, vs, target in json.loads(
+                                        mm[off:off + elen].decode("utf-8"))
+                                ]
+                return []
+
+        def match(self, patterns):
+                """Return a list of the indices of the packages which match
+                any of 'patterns', using the matching rules of pkg list, and a
+                list of the patterns which didn't match any package, including
+                those which can't be parsed."""
+
+                illegal = []
+                pats = []
+                for pat in patterns:
+                        stem, ver = (pat.split("@", 1) + [None])[:2]
+                        try:
+                                if "*" in stem or "?" in stem:
+                                        npat = fmri.MatchingPkgFmri(stem)
+                                        matcher = fnmatch.fnmatchcase
+                                elif stem.startswith("pkg:/") or \
+                                    stem.startswith("/"):
+                                        npat = fmri.PkgFmri(stem)
+                                        matcher = lambda s, p: s == p
+                                else:
+                                        npat = fmri.PkgFmri(stem)
+                                        matcher = lambda s, p: \
+                                            ("/" + s).endswith("/" + p)
+                                if not ver or ver == "latest":
+                                        # Only one version of each package
+                                        # is indexed.
+                                        ver = None
+                                elif "*" in ver or "?" in ver:
+                                        ver = version.MatchingVersion(ver)
+                                else:
+                                        ver = version.Version(ver)
+                        except (fmri.FmriError, version.VersionError):
+                                illegal.append(pat)
+                                continue
+                        pats.append((pat, npat.publisher, npat.pkg_name, ver,
+                            matcher))
+
+                res = []
+                matched = set()
+                for i, (pfmri, vs) in enumerate(self.packages):
+                        found = False
+                        for pat, pub, stem, ver, matcher in pats:
+                                if pub and pub != pfmri.publisher:
+                                        continue
+                                if not matcher(pfmri.pkg_name, stem):
+                                        continue
+                                if isinstance(ver, version.MatchingVersion):
+                                        if pfmri.version != ver:
+                                                continue
+                                elif ver is not None and \
+                                    not pfmri.version.is_successor(ver,
+                                    version.CONSTRAINT_AUTO):
+                                        continue
+                                found = True
+                                matched.add(pat)
+                        if found:
+                                res.append(i)
+                return res, illegal + [
+                    t[0] for t in pats if t[0] not in matched
+                ]
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+"""Storage for cached results.
+
+A ResultCache maps keys, which callers derive by hashing everything a result
+depends on, to opaque byte strings.  Each result is stored in its own file,
+named by its key, in a subdirectory named by the first two characters of the
+key.  The modification time of an entry is updated whenever it's used, and
+once the cache grows beyond its size limit, the least recently used entries
+are removed.  The cache is purely advisory; entries which can't be read are
+treated as missing, and failures to write entries are ignored."""
+
+import errno
+import os
+import tempfile
+import time
+
+import pkg.portable as portable
+
+# The default limit on the total size of the entries, in bytes.
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# The minimum interval between checks of the size of the cache, in seconds.
+PRUNE_INTERVAL = 3600
+
+_PRUNE_STAMP = "pruned"
+
+
+class ResultCache(object):
+        """A cache stored in the directory 'root', whose entries are limited
+        to a total of 'max_size' bytes."""
+
+        def __init__(self, root, max_size=DEFAULT_MAX_SIZE):
+                self.__root = root
+                self.__max_size = max_size
+                self.__added = False
+
+        def __path(self, key):
+                return os.path.join(self.__root, key[:2], key)
+
+        def get(self, key):
+                """Return the result stored for 'key', or None if
+                there isn't one."""
+
+                path = self.__path(key)
+                try:
+                        with open(path, "rb") as fh:
+                                data = fh.read()
+                        os.utime(path)
+                except EnvironmentError:
+                        return None
+                return data
+
+        def put(self, key, data):
+                """Store the result 'data' for 'key'."""
+
+                dirname = os.path.dirname(self.__path(key))
+                try:
+                        if not os.path.exists(dirname):
+                                os.makedirs(dirname)
+                        fd, tmp = tempfile.mkstemp(dir=dirname,
+                            prefix=key + ".")
+                except EnvironmentError as e:
+                        if e.errno in (errno.EACCES, errno.EPERM, errno.EROFS,
+                            errno.ENOSPC):
+                                return
+                        raise
+
+                try:
+                        with os.fdopen(fd, "wb") as fh:
+                                fh.write(data)
+                        portable.rename(tmp, self.__path(key))
+                except EnvironmentError:
+                        try:
+                                os.unlink(tmp)
+                        except EnvironmentError:
+                                pass
+                        return
+                self.__added = True
+
+        def prune(self):
+                """Remove the least recently used entries until the cache is
+                within its size limit.  To avoid examining the whole cache
+                every time it's used, this is only done if entries have been
+                added and the cache hasn't been checked recently."""
+
+                if not self.__added:
+                        return
+                self.__added = False
+
+                stamp = os.path.join(self.__root, _PRUNE_STAMP)
+                try:
+                        if time.time() - os.stat(stamp).st_mtime < \
+                            PRUNE_INTERVAL:
+                                return
+                except EnvironmentError:
+                        pass
+                try:
+                        with open(stamp, "w"):
+                                pass
+                except EnvironmentError:
+                        return
+
+                entries = []
+                total = 0
+                for dirpath, dirnames, filenames in os.walk(self.__root):
+                        if dirpath == self.__root:
+                                continue
+                        for name in filenames:
+                                path = os.path.join(dirpath, name)
+                                try:
+                                        st = os.stat(path)
+                                except EnvironmentError:
+                                        continue
+                                entries.append((st.st_mtime, st.st_size, path))
+                                total += st.st_size
+
+                if total <= self.__max_size:
+                        return
+                entries.sort()
+                for mtime, size, path in entries:
+                        try:
+                                os.unlink(path)
+                        except EnvironmentError:
+                                continue
+                        total -= size
+                        if total <= self.__max_size:
+                                break
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -462,13 +462,19 @@ msat_add_clause(msat_solver *self, PyObject *args)
 	Py_RETURN_NONE;
 }
 
+/*
+ * Solve, optionally assuming that the literals in the list 'assume' hold.
+ * Failing to find a solution under assumptions doesn't add anything to the
+ * solver, so it can be used again with different assumptions; otherwise the
+ * solver must be reset after a failure.
+ */
 static PyObject *
 msat_solve(msat_solver *self, PyObject *args, PyObject *keywds)
 {
 	int *as;
 	int *as_top;
 	int n;
-	PyObject *assume;
+	PyObject *assume = NULL;
 	lbool ret;
 	int limit;
 
@@ -481,13 +487,18 @@ msat_solve(msat_solver *self, PyObject *args, PyObject *keywds)
 	&assume, &limit))
 		return (NULL);
 
-	if ((as = msat_unpack_integers(assume, &n)) == NULL)
+	if (assume == NULL) {
+		as = NULL;
+		n = 0;
+	} else if ((as = msat_unpack_integers(assume, &n)) == NULL) {
 		return (NULL);
+	}
 
 	if (n > 0) {
 		as_top = &(as[n]);
 	} else {
-		dec_refcntptr(as);
+		if (as != NULL)
+			dec_refcntptr(as);
 		as = NULL;
 		as_top = NULL;
 	}
@@ -500,7 +511,8 @@ msat_solve(msat_solver *self, PyObject *args, PyObject *keywds)
 	if (ret)
 		Py_RETURN_TRUE;
 	else {
-		self->msat_needs_reset = 1;
+		if (n == 0)
+			self->msat_needs_reset = 1;
 		Py_RETURN_FALSE;
 	}
 }
@@ -522,6 +534,45 @@ msat_dereference(msat_solver *self, PyObject *args)
 	Py_RETURN_FALSE;
 }
 
+/*
+ * Return a list of the (one-based) variables that are true in the solution
+ * found by the last successful solve, so that the caller doesn't have to
+ * dereference each variable in turn.
+ */
+/*ARGSUSED*/
+static PyObject *
+msat_get_true_variables(msat_solver *self, PyObject *args)
+{
+	PyObject *list;
+	PyObject *v;
+	int *model;
+	int i;
+	int n;
+
+	if (self->msat_needs_reset)
+		RETURN_NEEDS_RESET;
+
+	model = veci_begin(&self->msat_instance->model);
+	n = veci_size(&self->msat_instance->model);
+
+	if ((list = PyList_New(0)) == NULL)
+		return (NULL);
+
+	for (i = 0; i < n; i++) {
+		if (model[i] != l_True)
+			continue;
+		if ((v = PyLong_FromLong(i + 1)) == NULL ||
+		    PyList_Append(list, v) != 0) {
+			Py_XDECREF(v);
+			Py_DECREF(list);
+			return (NULL);
+		}
+		Py_DECREF(v);
+	}
+
+	return (list);
+}
+
 /*
  * Should we provide enough Python to allow the use of a higher level function
  * to build clauses, or should we just leave that to the caller?
@@ -550,6 +601,10 @@ PyMethodDef msat_methods[] = {
 		METH_VARARGS,
 		"Retrieve literal value in solution, if available after solve "
 		"attempt."},
+	{ "get_true_variables", (PyCFunction) msat_get_true_variables,
+		METH_NOARGS,
+		"Return the list of variables that are true in the solution, "
+		"numbered from one."},
 	{ NULL, NULL, 0, NULL}
 };
 
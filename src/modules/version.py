@@ -29,6 +29,8 @@ import datetime
 import time
 import weakref
 
+from operator import attrgetter
+
 from six.moves import zip
 
 CONSTRAINT_NONE = 0
@@ -249,6 +251,19 @@ class MatchingDotSequence(DotSequence):
 class IllegalVersion(VersionError):
         """Used to indicate that the specified version string is not valid."""
 
+
+# The components and keys of the most recently parsed versions, by version and
+# build string.
+_parsed = {}
+PARSED_MAX = 65536
+
+# Stands in for a missing branch in keys; it sorts before any DotSequence.
+_NO_SEQ = []
+
+def _make_key(release, branch, timestr):
+        return (release, branch or _NO_SEQ, timestr or "")
+
+
 class Version(object):
         """Version format is release[,build_release]-branch:datetime, which we
         decompose into three DotSequences and a date string.  Time
@@ -258,9 +273,29 @@ class Version(object):
         v2 is a later release or branch.  The build_release DotSequence records
         the system on which the package binaries were constructed."""
 
-        __slots__ = ["release", "branch", "build_release", "timestr"]
+        __slots__ = ["_release", "_branch", "build_release", "_timestr",
+            "_key"]
 
         def __init__(self, version_string, build_string=None):
+                # Catalogs repeat the same versions over and over, in each of
+                # their parts and for each publisher, so versions are only
+                # parsed once; this also means that their components are
+                # shared.
+                parsed = _parsed.get((version_string, build_string))
+                if parsed is None:
+                        parsed = self._parse(version_string, build_string)
+                        if len(_parsed) >= PARSED_MAX:
+                                _parsed.clear()
+                        _parsed[(version_string, build_string)] = parsed
+                self._release, self._branch, self.build_release, \
+                    self._timestr, self._key = parsed
+
+        @staticmethod
+        def _parse(version_string, build_string):
+                """Returns a tuple of the release, branch, build release and
+                time string of 'version_string' and the key used to compare
+                versions with them."""
+
                 # XXX If illegally formatted, raise exception.
 
                 if not version_string:
@@ -306,19 +341,17 @@ class Version(object):
                 # begins here.
                 #
                 try:
-                        self.release = DotSequence(version_string[:buildidx])
+                        release = DotSequence(version_string[:buildidx])
 
                         if branch is not None:
-                                self.branch = DotSequence(branch)
-                        else:
-                                self.branch = None
+                                branch = DotSequence(branch)
 
                         if build is not None:
-                                self.build_release = DotSequence(build)
+                                build_release = DotSequence(build)
                         else:
                                 if build_string is None:
                                         build_string = "5.11"
-                                self.build_release = DotSequence(build_string)
+                                build_release = DotSequence(build_string)
 
                 except IllegalDotSequence as e:
                         raise IllegalVersion("Bad Version: {0}".format(e))
@@ -345,9 +378,39 @@ class Version(object):
                         except ValueError:
                                 raise IllegalVersion("Time must be ISO8601 format.")
 
-                        self.timestr = timestr
-                else:
-                        self.timestr = None
+                return (release, branch, build_release, timestr,
+                    _make_key(release, branch, timestr))
+
+        # The components of a version are properties so that its key can be
+        # reset when they are changed; reading them is as fast as reading the
+        # slots that hold them.
+        def __set_release(self, release):
+                self._release = release
+                self._key = None
+
+        def __set_branch(self, branch):
+                self._branch = branch
+                self._key = None
+
+        def __set_timestr(self, timestr):
+                self._timestr = timestr
+                self._key = None
+
+        release = property(attrgetter("_release"), __set_release)
+        branch = property(attrgetter("_branch"), __set_branch)
+        timestr = property(attrgetter("_timestr"), __set_timestr)
+
+        def sort_key(self):
+                """Returns a key which orders versions as the comparison
+                operators do, so that sorting a large number of versions, or
+                comparing them repeatedly, needs no Python-level comparison
+                of their components."""
+
+                key = self._key
+                if key is None:
+                        key = self._key = _make_key(self._release,
+                            self._branch, self._timestr)
+                return key
 
         @staticmethod
         def getstate(obj, je_state=None):
@@ -408,22 +471,14 @@ class Version(object):
         def __ne__(self, other):
                 if not isinstance(other, Version):
                         return True
-
-                if self.release == other.release and \
-                    self.branch == other.branch and \
-                    self.timestr == other.timestr:
-                        return False
-                return True
+                return (self._key or self.sort_key()) != \
+                    (other._key or other.sort_key())
 
         def __eq__(self, other):
                 if not isinstance(other, Version):
                         return False
-
-                if self.release == other.release and \
-                    self.branch == other.branch and \
-                    self.timestr == other.timestr:
-                        return True
-                return False
+                return (self._key or self.sort_key()) == \
+                    (other._key or other.sort_key())
 
         def __lt__(self, other):
                 """Returns True if 'self' comes before 'other', and vice versa.
@@ -434,29 +489,8 @@ class Version(object):
                 """
                 if not isinstance(other, Version):
                         return False
-
-                if self.release < other.release:
-                        return True
-                if self.release != other.release:
-                        return False
-
-                if self.branch != other.branch:
-                        if self.branch is None and other.branch:
-                                return True
-                        if self.branch and other.branch is None:
-                                return False
-                        if self.branch < other.branch:
-                                return True
-                        return False
-
-                if self.timestr != other.timestr:
-                        if self.timestr is None and other.timestr:
-                                return True
-                        if self.timestr and other.timestr is None:
-                                return False
-                        if self.timestr < other.timestr:
-                                return True
-                return False
+                return (self._key or self.sort_key()) < \
+                    (other._key or other.sort_key())
 
         def __gt__(self, other):
                 """Returns True if 'self' comes after 'other', and vice versa.
@@ -467,29 +501,8 @@ class Version(object):
                 """
                 if not isinstance(other, Version):
                         return True
-
-                if self.release > other.release:
-                        return True
-                if self.release != other.release:
-                        return False
-
-                if self.branch != other.branch:
-                        if self.branch and other.branch is None:
-                                return True
-                        if self.branch is None and other.branch:
-                                return False
-                        if self.branch > other.branch:
-                                return True
-                        return False
-
-                if self.timestr != other.timestr:
-                        if self.timestr and other.timestr is None:
-                                return True
-                        if self.timestr is None and other.timestr:
-                                return False
-                        if self.timestr > other.timestr:
-                                return True
-                return False
+                return (self._key or self.sort_key()) > \
+                    (other._key or other.sort_key())
 
         def __le__(self, other):
                 return not self > other
@@ -501,10 +514,10 @@ class Version(object):
                 # If a timestamp is present, it's enough to hash on, and is
                 # nicely unique.  If not, use release and branch, which are
                 # not very unique.
-                if self.timestr:
-                        return hash(self.timestr)
+                if self._timestr:
+                        return hash(self._timestr)
                 else:
-                        return hash((self.release, self.branch))
+                        return hash((self._release, self._branch))
 
         def is_successor(self, other, constraint):
                 """Evaluate true if self is a successor version to other.
@@ -44,9 +44,13 @@ import pkg.actions as actions
 import pkg.client.api as api
 import pkg.client.api_errors as api_errors
 import pkg.client.progress as progress
+import pkg.fmri as fmri
 import pkg.manifest as manifest
 import pkg.misc as misc
+import pkg.publish.depcache as depcache
 import pkg.publish.dependencies as dependencies
+import pkg.publish.pathindex as pathindex
+import pkg.server.repository as sr
 from pkg.misc import msg, emsg, PipeError
 from pkg.client.pkgdefs import EXIT_OK, EXIT_OOPS, EXIT_BADOPT
 
@@ -94,10 +98,12 @@ Usage:
         pkgdepend [options] command [cmd_options] [operands]
 
 Subcommands:
-        pkgdepend generate [-IMm] -d dir [-d dir] [-D name=value] [-k path]
-            manifest_file
+        pkgdepend generate [-IMm] [-c cache_dir] -d dir [-d dir]
+            [-D name=value] [-j jobs] [-k path] manifest_file
         pkgdepend resolve [-EmoSv] [-d output_dir]
-            [-e external_package_file]... [-s suffix] manifest_file ...
+            [-e external_package_file]... [-i index_file] [-s suffix]
+            manifest_file ...
+        pkgdepend index [-s repo_dir] index_file
 
 Options:
         -R dir
@@ -111,7 +117,7 @@ def generate(args):
         """Produce a list of file dependencies from a manfiest and a proto
         area."""
         try:
-                opts, pargs = getopt.getopt(args, "d:D:Ik:Mm?",
+                opts, pargs = getopt.getopt(args, "c:d:D:Ij:k:Mm?",
                     ["help"])
         except getopt.GetoptError as e:
                 usage(_("illegal global option -- {0}").format(e.opt))
@@ -125,9 +131,13 @@ def generate(args):
         platform_paths = []
         dyn_tok_conv = {}
         proto_dirs = []
+        jobs = 1
+        cache = None
 
         for opt, arg in opts:
-                if opt == "-d":
+                if opt == "-c":
+                        cache = depcache.DependencyCache(os.path.abspath(arg))
+                elif opt == "-d":
                         if not os.path.isdir(arg):
                                 usage(_("The proto directory {0} could not be "
                                     "found.".format(arg)), retcode=EXIT_BADOPT)
@@ -144,6 +154,14 @@ def generate(args):
                             dyn_tok_val)
                 elif opt == "-I":
                         remove_internal_deps = False
+                elif opt == "-j":
+                        try:
+                                jobs = int(arg)
+                                if jobs < 1:
+                                        raise ValueError(jobs)
+                        except ValueError:
+                                usage(_("-j takes a positive integer, not "
+                                    "{0}").format(arg))
                 elif opt == "-k":
                         run_paths.append(arg)
                 elif opt == "-m":
@@ -180,7 +198,8 @@ def generate(args):
 
         try:
                 ds, es, ws, ms, pkg_attrs = dependencies.list_implicit_deps(manf,
-                    proto_dirs, dyn_tok_conv, run_paths, remove_internal_deps)
+                    proto_dirs, dyn_tok_conv, run_paths, remove_internal_deps,
+                    jobs=jobs, cache=cache)
         except (actions.MalformedActionError, actions.UnknownActionError) as e:
                 error(_("Could not parse manifest {manifest} because of the "
                     "following line:\n{line}").format(manifest=manf,
@@ -190,6 +209,9 @@ def generate(args):
                 error(e)
                 return EXIT_OOPS
 
+        if cache:
+                cache.prune()
+
         if echo_manf:
                 fh = open(manf, "r")
                 for l in fh:
@@ -213,6 +235,59 @@ def generate(args):
                 retcode = EXIT_OOPS
         return retcode
 
+def __get_api_inst(img_dir):
+        """Return an ImageInterface for the image at 'img_dir', or the default
+        image if that's None.  Errors are reported and None is returned if
+        there's no usable image.  Because building an ImageInterface
+        permanently changes the cwd for python, callers must resolve any
+        relative paths they were given first."""
+
+        provided_image_dir = True
+        pkg_image_used = False
+        if img_dir == None:
+                orig_cwd = None
+                try:
+                        orig_cwd = os.getcwd()
+                except OSError:
+                        # May be unreadable by user or have other problem.
+                        pass
+
+                img_dir, provided_image_dir = api.get_default_image_root(
+                    orig_cwd=orig_cwd)
+                if os.environ.get("PKG_IMAGE"):
+                        # It's assumed that this has been checked by the above
+                        # function call and hasn't been removed from the
+                        # environment.
+                        pkg_image_used = True
+
+        if not img_dir:
+                error(_("Could not find image.  Use the -R option or set "
+                    "$PKG_IMAGE to the\nlocation of an image."))
+                return None
+
+        try:
+                return api.ImageInterface(img_dir, CLIENT_API_VERSION,
+                    progress.QuietProgressTracker(), None, PKG_CLIENT_NAME,
+                    exact_match=provided_image_dir)
+        except api_errors.ImageNotFoundException as e:
+                if e.user_specified:
+                        if pkg_image_used:
+                                error(_("No image rooted at '{0}' "
+                                    "(set by $PKG_IMAGE)").format(e.user_dir))
+                        else:
+                                error(_("No image rooted at '{0}'").format(
+                                    e.user_dir))
+                else:
+                        error(_("No image found."))
+                return None
+        except api_errors.PermissionsException as e:
+                error(e)
+                return None
+        except api_errors.ImageFormatUpdateNeeded as e:
+                # This should be a very rare error case.
+                format_update_error(e)
+                return None
+
 def resolve(args, img_dir):
         """Take a list of manifests and resolve any file dependencies, first
         against the other published manifests and then against what is installed
@@ -225,8 +300,9 @@ def resolve(args, img_dir):
         use_system_to_resolve = True
         constraint_files = []
         extra_external_info = False
+        index_file = None
         try:
-                opts, pargs = getopt.getopt(args, "d:e:Emos:Sv")
+                opts, pargs = getopt.getopt(args, "d:e:Ei:mos:Sv")
         except getopt.GetoptError as e:
                 usage(_("illegal global option -- {0}").format(e.opt))
         for opt, arg in opts:
@@ -236,6 +312,8 @@ def resolve(args, img_dir):
                         constraint_files.append(arg)
                 elif opt == "-E":
                         extra_external_info = True
+                elif opt == "-i":
+                        index_file = arg
                 elif opt == "-m":
                         echo_manifest = True
                 elif opt == "-o":
@@ -249,6 +327,8 @@ def resolve(args, img_dir):
 
         if (out_dir or suffix) and output_to_screen:
                 usage(_("-o cannot be used with -d or -s"))
+        if index_file and not use_system_to_resolve:
+                usage(_("-i cannot be used with -S"))
 
         manifest_paths = [os.path.abspath(fp) for fp in pargs]
 
@@ -263,29 +343,6 @@ def resolve(args, img_dir):
                         usage(_("The output directory {0} is not a directory.").format(
                             out_dir), retcode=EXIT_BADOPT)
 
-        provided_image_dir = True
-        pkg_image_used = False
-        if img_dir == None:
-                orig_cwd = None
-                try:
-                        orig_cwd = os.getcwd()
-                except OSError:
-                        # May be unreadable by user or have other problem.
-                        pass
-
-                img_dir, provided_image_dir = api.get_default_image_root(
-                    orig_cwd=orig_cwd)
-                if os.environ.get("PKG_IMAGE"):
-                        # It's assumed that this has been checked by the above
-                        # function call and hasn't been removed from the
-                        # environment.
-                        pkg_image_used = True
-
-        if not img_dir:
-                error(_("Could not find image.  Use the -R option or set "
-                    "$PKG_IMAGE to the\nlocation of an image."))
-                return EXIT_OOPS
-
         system_patterns = misc.EmptyI
         if constraint_files:
                 system_patterns = []
@@ -311,36 +368,26 @@ def resolve(args, img_dir):
         elif use_system_to_resolve:
                 system_patterns = ["*"]
 
-        # Becuase building an ImageInterface permanently changes the cwd for
-        # python, it's necessary to do this step after resolving the paths to
-        # the manifests.
-        try:
-                api_inst = api.ImageInterface(img_dir, CLIENT_API_VERSION,
-                    progress.QuietProgressTracker(), None, PKG_CLIENT_NAME,
-                    exact_match=provided_image_dir)
-        except api_errors.ImageNotFoundException as e:
-                if e.user_specified:
-                        if pkg_image_used:
-                                error(_("No image rooted at '{0}' "
-                                    "(set by $PKG_IMAGE)").format(e.user_dir))
-                        else:
-                                error(_("No image rooted at '{0}'").format(
-                                    e.user_dir))
-                else:
-                        error(_("No image found."))
-                return EXIT_OOPS
-        except api_errors.PermissionsException as e:
-                error(e)
-                return EXIT_OOPS
-        except api_errors.ImageFormatUpdateNeeded as e:
-                # This should be a very rare error case.
-                format_update_error(e)
-                return EXIT_OOPS
+        index = None
+        api_inst = None
+        if index_file:
+                try:
+                        index = pathindex.load(index_file)
+                except EnvironmentError as e:
+                        error(api_errors._convert_error(e), cmd="resolve")
+                        return EXIT_OOPS
+                except dependencies.DependencyError as e:
+                        error(e, cmd="resolve")
+                        return EXIT_OOPS
+        else:
+                api_inst = __get_api_inst(img_dir)
+                if api_inst is None:
+                        return EXIT_OOPS
 
         try:
                 pkg_deps, errs, warnings, unused_fmris, external_deps = \
                     dependencies.resolve_deps(manifest_paths, api_inst,
-                        system_patterns, prune_attrs=not verbose)
+                        system_patterns, prune_attrs=not verbose, index=index)
         except (actions.MalformedActionError, actions.UnknownActionError) as e:
                 error(_("Could not parse one or more manifests because of "
                     "the following line:\n{0}").format(e.actionstr))
@@ -384,6 +431,76 @@ def resolve(args, img_dir):
                 emsg(w)
         return ret_code
 
+def index(args, img_dir):
+        """Write an index of the paths delivered by the packages installed in
+        the image, or by the newest packages in a repository, for use by
+        resolve."""
+
+        repo_dir = None
+        try:
+                opts, pargs = getopt.getopt(args, "s:")
+        except getopt.GetoptError as e:
+                usage(_("illegal index option -- {0}").format(e.opt),
+                    cmd="index")
+        for opt, arg in opts:
+                if opt == "-s":
+                        repo_dir = arg
+
+        if len(pargs) != 1:
+                usage(_("a single index file must be specified"), cmd="index")
+        if repo_dir and img_dir:
+                usage(_("-s cannot be used with -R"), cmd="index")
+        index_file = os.path.abspath(pargs[0])
+
+        if repo_dir:
+                try:
+                        repo = sr.Repository(root=os.path.abspath(repo_dir),
+                            read_only=True)
+                except sr.RepositoryError as e:
+                        error(e, cmd="index")
+                        return EXIT_OOPS
+
+                def gen_packages():
+                        stems = set()
+                        for pub in sorted(repo.publishers):
+                                for pfmri in repo.get_catalog(pub).fmris(
+                                    last=True, ordered=True):
+                                        if pfmri.pkg_name in stems:
+                                                continue
+                                        stems.add(pfmri.pkg_name)
+                                        mfst = manifest.Manifest(pfmri)
+                                        mfst.set_content(
+                                            pathname=repo.manifest(pfmri))
+                                        yield pfmri, mfst
+        else:
+                api_inst = __get_api_inst(img_dir)
+                if api_inst is None:
+                        return EXIT_OOPS
+
+                def gen_packages():
+                        for (pub, stem, ver), summ, cats, states, attrs in \
+                            api_inst.get_pkg_list(
+                            api.ImageInterface.LIST_INSTALLED):
+                                pfmri = fmri.PkgFmri(publisher=pub, name=stem,
+                                    version=ver)
+                                yield pfmri, api_inst.get_manifest(pfmri,
+                                    all_variants=True)
+
+        try:
+                pathindex.build(index_file, gen_packages())
+        except (actions.MalformedActionError, actions.UnknownActionError) as e:
+                error(_("Could not parse one or more manifests because of "
+                    "the following line:\n{0}").format(e.actionstr),
+                    cmd="index")
+                return EXIT_OOPS
+        except sr.RepositoryError as e:
+                error(e, cmd="index")
+                return EXIT_OOPS
+        except EnvironmentError as e:
+                error(api_errors._convert_error(e), cmd="index")
+                return EXIT_OOPS
+        return EXIT_OK
+
 def __resolve_echo_line(l):
         """Given a line from a manifest, determines whether that line should
         be repeated in the output file if echo manifest has been set."""
@@ -583,6 +700,8 @@ def main_func():
                 return generate(pargs)
         elif subcommand == "resolve":
                 return resolve(pargs, img_dir)
+        elif subcommand == "index":
+                return index(pargs, img_dir)
         else:
                 usage(_("unknown subcommand '{0}'").format(subcommand))
 
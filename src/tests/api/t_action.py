@@ -262,6 +262,57 @@ Incorrect attribute list.
                 self.assertEqual(a.must_accept, True)
                 self.assertEqual(a.must_display, False)
 
+        def test_action_fromstrs(self):
+                """Test that the actions of a whole manifest are parsed,
+                grouped and excluded as fromstr() and Manifest would."""
+
+                content = """\
+# A comment.
+set name=pkg.fmri value=pkg://test/foo@1.0 \\
+    value=bar
+  dir path=usr mode=0755 owner=root group=bin
+
+file abc123 path=usr/bin/foo mode=0755 owner=root group=bin \\
+  variant.arch=sparc
+set name=authority value=test\r
+dir path=etc mode=0755 owner=root group=sys opensolaris.zone=global
+bogus path=foo
+dir path="usr
+"""
+                for c in (content, content.encode("utf-8"),
+                    bytearray(content.encode("utf-8"))):
+                        acts, bytype, errors = action.fromstrs(c)
+                        self.assertEqual([str(a) for a in acts], [
+                            str(action.fromstr(a)) for a in (
+                            "set name=pkg.fmri value=pkg://test/foo@1.0 "
+                                "value=bar",
+                            "dir path=usr mode=0755 owner=root group=bin",
+                            "file abc123 path=usr/bin/foo mode=0755 "
+                                "owner=root group=bin variant.arch=sparc",
+                            "set name=publisher value=test",
+                            "dir path=etc mode=0755 owner=root group=sys "
+                                "opensolaris.zone=global "
+                                "variant.opensolaris.zone=global")])
+                        self.assertEqual(acts[2].hash, "abc123")
+                        self.assertEqual(sorted(bytype), ["dir", "file",
+                            "set"])
+                        self.assertEqual(bytype["dir"], [acts[1], acts[4]])
+                        self.assertEqual([(l, type(e)) for l, e in errors],
+                            [(10, action.UnknownActionError),
+                            (11, action.MalformedActionError)])
+
+                # Exclusions are given each action and the publisher.
+                seen = []
+                def exclude(a, publisher=None):
+                        seen.append(publisher)
+                        return a.attrs.get("variant.arch", "i386") == "i386"
+                acts, bytype, errors = action.fromstrs(content,
+                    excludes=[exclude, exclude], publisher="test")
+                self.assertEqual([a.name for a in acts],
+                    ["set", "dir", "set", "dir"])
+                self.assertEqual(set(seen), set(["test"]))
+                self.assertTrue("file" not in bytype)
+
         def __assert_action_str(self, astr, expected, expattrs):
                 """Private helper function for action stringification
                 testing."""
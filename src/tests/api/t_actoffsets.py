@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.client.actoffsets as actoffsets
+
+
+class TestActionOffsets(pkg5unittest.Pkg5TestCase):
+
+        entries = [
+            ("dir", "usr", 20, 3),
+            ("dir", "usr/bin", 140, 1),
+            ("file", "usr/bin/ls", 190, 1),
+            ("file", "usr/bin/l s", 240, 2),
+            ("group", "bin", 330, 1),
+            ("link", "usr/bin/é", 360, 4),
+            ("user", "root", 500, 1),
+        ]
+
+        def __write(self, entries, timestamp="1234"):
+                pth = os.path.join(self.test_root, "actions.offsets")
+                with open(pth, "wb") as fh:
+                        actoffsets.write(fh, timestamp, entries)
+                return pth
+
+        def test_lookup(self):
+                """Verify that every entry written can be found and that
+                absent entries aren't."""
+
+                idx = actoffsets.ActionOffsets(self.__write(
+                    reversed(self.entries)))
+                self.assertEqual(idx.version, actoffsets.VERSION)
+                self.assertEqual(idx.timestamp, "1234")
+                self.assertEqual(len(idx), len(self.entries))
+
+                for name, key, offset, cnt in self.entries:
+                        self.assertEqual(idx.get((name, key)), (offset, cnt))
+                        self.assertEqual(idx[(name, key)], (offset, cnt))
+                        self.assertTrue((name, key) in idx)
+
+                for name, key in (("dir", "us"), ("dir", "usr/bi"),
+                    ("file", "usr"), ("aaa", "usr"), ("zzz", "root"),
+                    ("user", "rootx")):
+                        self.assertEqual(idx.get((name, key)), None)
+                        self.assertEqual(idx.get((name, key), -1), -1)
+                        self.assertRaises(KeyError, idx.__getitem__,
+                            (name, key))
+
+                self.assertEqual(sorted(idx), sorted(self.entries))
+                idx.close()
+                self.assertEqual(idx.get(("dir", "usr")), None)
+
+        def test_empty(self):
+                """Verify that empty and unknown indices have no entries."""
+
+                idx = actoffsets.ActionOffsets(self.__write([]))
+                self.assertEqual(len(idx), 0)
+                self.assertEqual(list(idx), [])
+                self.assertEqual(idx.get(("dir", "usr")), None)
+                idx.close()
+
+                pth = os.path.join(self.test_root, "actions.offsets")
+                with open(pth, "w") as fh:
+                        fh.write("VERSION 2\n1234\ndir 20 3 usr\n")
+                idx = actoffsets.ActionOffsets(pth)
+                self.assertEqual(idx.version, "VERSION 2")
+                self.assertEqual(len(idx), 0)
+                self.assertEqual(idx.get(("dir", "usr")), None)
+                idx.close()
+
+        def test_truncated(self):
+                """Verify that an index which doesn't hold all of its records
+                and strings is treated as being of an unknown version, so that
+                it is recreated, rather than being used."""
+
+                pth = self.__write(self.entries)
+                with open(pth, "rb") as fh:
+                        data = fh.read()
+                hdr_len = len("{0}\n1234\n".format(actoffsets.VERSION))
+                for end in (len(data) - 5, len(data) // 2, hdr_len + 3,
+                    hdr_len):
+                        with open(pth, "wb") as fh:
+                                fh.write(data[:end])
+                        idx = actoffsets.ActionOffsets(pth)
+                        self.assertEqual(idx.version, None)
+                        self.assertEqual(idx.timestamp, "1234")
+                        self.assertEqual(len(idx), 0)
+                        self.assertEqual(idx.get(("user", "root")), None)
+                        self.assertEqual(list(idx), [])
+                        idx.close()
+
+                # Neither is one with data after its string table.
+                with open(pth, "wb") as fh:
+                        fh.write(data + b"x")
+                idx = actoffsets.ActionOffsets(pth)
+                self.assertEqual(idx.version, None)
+                idx.close()
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.actions as actions
+import pkg.publish.depcache as depcache
+
+from pkg.portable import PD_LOCAL_PATH
+
+
+def _analyze(*args, **kwargs):
+        pass
+
+
+def _analyze_other(*args, **kwargs):
+        pass
+
+
+class TestDependencyCache(pkg5unittest.Pkg5TestCase):
+
+        def __make_action(self, content, **attrs):
+                path = os.path.join(self.test_root, "proto", "usr/bin/foo")
+                if not os.path.exists(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                with open(path, "w") as fh:
+                        fh.write(content)
+                a = actions.fromstr("file NOHASH path=usr/bin/foo mode=0755 "
+                    "owner=root group=bin")
+                a.attrs.update(attrs)
+                a.attrs[PD_LOCAL_PATH] = path
+                return a
+
+        def test_key(self):
+                """Verify that the key changes with each of the inputs to the
+                analysis, and that it's None for files that can't be read."""
+
+                cache = depcache.DependencyCache(
+                    os.path.join(self.test_root, "cache"))
+                a = self.__make_action("#!/usr/bin/sh\n")
+                args = (_analyze, a, {"variant.arch": ["i386"]}, {}, [])
+                key = cache.get_key(*args)
+                self.assertEqual(key, cache.get_key(*args))
+
+                keys = set([key])
+                keys.add(cache.get_key(_analyze_other, *args[1:]))
+                keys.add(cache.get_key(_analyze, a,
+                    {"variant.arch": ["i386", "sparc"]}, {}, []))
+                keys.add(cache.get_key(_analyze, a, args[2],
+                    {"$PLATFORM": ["i86pc"]}, []))
+                keys.add(cache.get_key(_analyze, a, args[2], {},
+                    ["/opt/lib"]))
+                keys.add(cache.get_key(_analyze,
+                    self.__make_action("#!/usr/bin/sh\n", mode="0555"),
+                    *args[2:]))
+                keys.add(cache.get_key(_analyze,
+                    self.__make_action("#!/usr/bin/ksh\n"), *args[2:]))
+                self.assertEqual(len(keys), 7)
+
+                os.unlink(a.attrs[PD_LOCAL_PATH])
+                self.assertEqual(cache.get_key(*args), None)
+
+        def test_get_put(self):
+                """Verify that stored entries are returned and that missing
+                ones aren't."""
+
+                root = os.path.join(self.test_root, "cache")
+                cache = depcache.DependencyCache(root)
+                key = cache.get_key(_analyze,
+                    self.__make_action("#!/usr/bin/sh\n"), {}, {}, [])
+                self.assertEqual(cache.get(key), None)
+                cache.put(key, b"result")
+                self.assertEqual(cache.get(key), b"result")
+                self.assertEqual(depcache.DependencyCache(root).get(key),
+                    b"result")
+
+        def test_prune(self):
+                """Verify that the least recently used entries are removed once
+                the cache exceeds its size limit."""
+
+                root = os.path.join(self.test_root, "cache")
+                cache = depcache.DependencyCache(root, max_size=250)
+                keys = ["{0:02x}{1}".format(i, "0" * 62) for i in range(5)]
+                for i, key in enumerate(keys):
+                        cache.put(key, b"x" * 100)
+                        path = os.path.join(root, key[:2], key)
+                        os.utime(path, (1000 + i, 1000 + i))
+
+                # Using an entry makes it the most recently used one.
+                self.assertEqual(cache.get(keys[0]), b"x" * 100)
+
+                cache.prune()
+                self.assertEqual([k for k in keys if cache.get(k)],
+                    [keys[0], keys[4]])
+
+                # The size isn't checked again until the interval has passed.
+                for key in keys:
+                        cache.put(key, b"x" * 100)
+                cache.prune()
+                self.assertEqual(len([k for k in keys if cache.get(k)]), 5)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -47,6 +47,7 @@ import pkg.flavor.script as scr
 import pkg.flavor.smf_manifest as smf
 import pkg.fmri as fmri
 import pkg.portable as portable
+import pkg.publish.depcache as depcache
 import pkg.publish.dependencies as dependencies
 import pkg.updatelog as updatelog
 
@@ -1959,6 +1960,37 @@ file NOHASH group=sys mode=0755 owner=root path={runpath_mod_test_path}
                 mi.make_package()
                 str(mi)
 
+        def test_python_analyzer(self):
+                """Check that a PythonAnalyzer analyzes files in turn and
+                recovers if its process exits."""
+
+                good = os.path.join(self.proto_dir, "good.py")
+                bad = os.path.join(self.proto_dir, "bad.py")
+                self.make_proto_text_file("good.py", "import os\n")
+                self.make_proto_text_file("bad.py", "def f(:\n")
+
+                analyzer = py.PythonAnalyzer(*sys.version_info[0:2])
+                try:
+                        for i in range(2):
+                                out = analyzer.analyze("usr/lib", good, [])
+                                self.assertEqual(len(out), 1)
+                                self.assertTrue(out[0].startswith("DEP "))
+                                self.assertTrue("os.py" in out[0])
+                                out = analyzer.analyze("usr/lib", bad, [])
+                                self.assertEqual(len(out), 1)
+                                self.assertTrue(
+                                    out[0].startswith("ERR SYNTAX "))
+
+                        proc = analyzer._PythonAnalyzer__proc
+                        proc.kill()
+                        proc.wait()
+                        self.assertRaises(py.PythonSubprocessError,
+                            analyzer.analyze, "usr/lib", good, [])
+                        out = analyzer.analyze("usr/lib", good, [])
+                        self.assertEqual(len(out), 1)
+                finally:
+                        analyzer.close()
+
         def test_multi_proto_dirs(self):
                 """Check that analysis works correctly when multiple proto_dirs
                 are given."""
@@ -2814,6 +2846,92 @@ file NOHASH group=sys mode=0755 owner=root path={runpath_mod_test_path}
                                 "proto_dir with symlinked proto_dir: {0} vs. {1}"
                                .format(a, b))
 
+        def test_parallel_results(self):
+                """Check that the results of analyzing files in other
+                processes are passed back, rather than the files being
+                analyzed again in this process, and that results which can't
+                be are reported."""
+
+                other_path = "usr/bin/other_script"
+                t_path = self.make_manifest(self.ext_script_manf +
+                    "file NOHASH group=bin mode=0755 owner=root "
+                    "path={0}\n".format(other_path))
+                self.make_proto_text_file(self.paths["script_path"],
+                    self.script_text)
+                self.make_proto_text_file(other_path, self.script_text)
+
+                serial = dependencies.list_implicit_deps(t_path,
+                    [self.proto_dir], {}, [], convert=False)
+                d = serial[0][0]
+                data = dependencies._dump_result(([d], [], {}), d.action,
+                    d.pkg_vars)
+                self.assertNotEqual(data, None)
+                res = dependencies._load_result(data, d.action, d.pkg_vars)
+                self.assertTrue(res[0][0].action is d.action)
+
+                parent = os.getpid()
+                reanalyzed = []
+                analyze_file = dependencies._analyze_file
+
+                def _analyze_file(func, action, *args):
+                        if os.getpid() == parent:
+                                reanalyzed.append(action.attrs["path"])
+                        return analyze_file(func, action, *args)
+
+                dependencies._analyze_file = _analyze_file
+                try:
+                        parallel = dependencies.list_implicit_deps(t_path,
+                            [self.proto_dir], {}, [], convert=False, jobs=2)
+                finally:
+                        dependencies._analyze_file = analyze_file
+                self.assertEqual(reanalyzed, [])
+                self.assertEqual(parallel[2], [])
+                self.assertEqual(len(parallel[0]), 2)
+                self.assertEqual([str(d) for d in serial[0]],
+                    [str(d) for d in parallel[0]])
+
+                # Results which can't be passed back are reported, and the
+                # files analyzed again.
+                dump_result = dependencies._dump_result
+                dependencies._dump_result = lambda *args: None
+                try:
+                        parallel = dependencies.list_implicit_deps(t_path,
+                            [self.proto_dir], {}, [], convert=False, jobs=2)
+                finally:
+                        dependencies._dump_result = dump_result
+                self.assertEqual(sorted(w.path for w in parallel[2]),
+                    sorted([self.paths["script_path"], other_path]))
+                for w in parallel[2]:
+                        self.assertTrue(isinstance(w,
+                            dependencies.ParallelAnalysisWarning))
+                self.assertEqual([str(d) for d in serial[0]],
+                    [str(d) for d in parallel[0]])
+
+        def test_cache_python(self):
+                """Check that the results of analyzing python scripts aren't
+                cached, as they depend on the python installed on the host,
+                while those of other scripts are."""
+
+                py_path = "usr/bin/py_script"
+                t_path = self.make_manifest(self.ext_script_manf +
+                    "file NOHASH group=bin mode=0755 owner=root "
+                    "path={0}\n".format(py_path))
+                self.make_proto_text_file(self.paths["script_path"],
+                    self.script_text)
+                self.make_proto_text_file(py_path, "#!/usr/bin/python3\n")
+
+                cache_dir = os.path.join(self.test_root, "depcache")
+                cache = depcache.DependencyCache(cache_dir)
+                dependencies.list_implicit_deps(t_path, [self.proto_dir], {},
+                    [], convert=False, cache=cache)
+                entries = [
+                    f
+                    for d in os.listdir(cache_dir)
+                    if os.path.isdir(os.path.join(cache_dir, d))
+                    for f in os.listdir(os.path.join(cache_dir, d))
+                ]
+                self.assertEqual(len(entries), 1)
+
 
 if __name__ == "__main__":
         unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.catalog as catalog
+import pkg.client.depgraph as depgraph
+import pkg.client.pkgdefs as pkgdefs
+import pkg.facet as facet
+import pkg.fmri as fmri
+import pkg.manifest as manifest
+import pkg.variant as variant
+
+
+class TestDependencyGraph(pkg5unittest.Pkg5TestCase):
+
+        foo10 = """\
+set name=pkg.fmri value=pkg://test/foo@1.0,5.11-0:20260101T000000Z
+set name=variant.arch value=i386 value=sparc
+set name=pkg.obsolete value=true variant.arch=sparc
+depend fmri=bar@1.0 type=require
+depend fmri=baz@1.0 type=require variant.arch=i386
+depend fmri=bar@1.0 fmri=baz@1.0 type=require-any facet.doc=true
+file 1234 path=usr/bin/foo mode=0755 owner=root group=bin
+"""
+
+        bar10 = """\
+set name=pkg.fmri value=pkg://test/bar@1.0,5.11-0:20260101T000000Z
+set name=pkg.summary value="Bar"
+"""
+
+        baz10 = """\
+set name=pkg.fmri value=pkg://test/baz@1.0,5.11-0:20260101T000000Z
+set name=pkg.summary value="Baz"
+"""
+
+        def __make_catalog(self):
+                # Only packages from version 1 sources are known to have all
+                # of their dependency information in the catalog.
+                cat = catalog.Catalog(meta_root=self.test_root, sign=False)
+                v1 = { "states": [pkgdefs.PKG_STATE_V1] }
+                for content, mdata in ((self.foo10, v1), (self.bar10, v1),
+                    (self.baz10, None)):
+                        m = manifest.Manifest()
+                        m.set_content(content)
+                        cat.add_package(fmri.PkgFmri(m["pkg.fmri"]),
+                            manifest=m, metadata=mdata)
+                cat.finalize()
+                cat.save()
+                return cat
+
+        def test_graph(self):
+                """Verify that the graph provides the same actions and variants
+                as the catalog it was built from."""
+
+                cat = self.__make_catalog()
+                path = os.path.join(self.test_root, depgraph.FILENAME)
+                depgraph.build(cat, path)
+                graph = depgraph.load(cat, path)
+                self.assertTrue(graph is not None)
+
+                for arch, doc in (("i386", True), ("sparc", False)):
+                        excludes = [
+                            variant.Variants({
+                                "variant.arch": arch}).allow_action,
+                            facet.Facets({"facet.doc": doc}).allow_action,
+                        ]
+                        for f in cat.fmris():
+                                if f.pkg_name == "baz":
+                                        continue
+                                expected = sorted(str(a)
+                                    for a in cat.get_entry_actions(f,
+                                    [cat.DEPENDENCY], excludes=excludes))
+                                self.assertEqual(expected, sorted(str(a)
+                                    for a in graph.get_actions(f, excludes)))
+                                self.assertEqual(
+                                    dict(cat.get_entry_all_variants(f)),
+                                    graph.get_variants(f))
+
+                for f in (fmri.PkgFmri("pkg://test/foo@2.0,5.11-0"),
+                    fmri.PkgFmri("pkg://test/baz@1.0,5.11-0:"
+                    "20260101T000000Z")):
+                        self.assertEqual(graph.get_actions(f, []), None)
+                        self.assertEqual(graph.get_variants(f), None)
+
+        def test_stale(self):
+                """Verify that the graph is ignored once the catalog changes or
+                if it can't be read."""
+
+                cat = self.__make_catalog()
+                path = os.path.join(self.test_root, depgraph.FILENAME)
+                depgraph.build(cat, path)
+
+                m = manifest.Manifest()
+                m.set_content(self.foo10.replace("foo@1.0", "foo@1.1"))
+                cat.add_package(fmri.PkgFmri(m["pkg.fmri"]), manifest=m)
+                cat.finalize()
+                cat.save()
+                self.assertEqual(depgraph.load(cat, path), None)
+
+                depgraph.build(cat, path)
+                self.assertTrue(depgraph.load(cat, path) is not None)
+
+                with open(path, "w") as fh:
+                        fh.write("{")
+                self.assertEqual(depgraph.load(cat, path), None)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
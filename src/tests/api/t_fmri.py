@@ -74,6 +74,20 @@ class TestFMRI(pkg5unittest.Pkg5TestCase):
         def testfmricmp3(self):
                 self.assertTrue(self.n5.__gt__(self.n3))
 
+        def testfmrisortkey(self):
+                """Verify that FMRIs sorted by their keys are in the order the
+                comparison operators give."""
+
+                fs = [getattr(self, "n{0:d}".format(i)) for i in range(1, 12)]
+                for a in fs:
+                        for b in fs:
+                                self.assertEqual(a < b,
+                                    a.sort_key() < b.sort_key())
+                                self.assertEqual(a > b,
+                                    a.sort_key() > b.sort_key())
+                self.assertEqual(sorted(fs),
+                    sorted(fs, key=fmri.PkgFmri.sort_key))
+
         def testfmrisuccessor1(self):
                 self.assertTrue(self.n8.is_successor(self.n7))
 
@@ -40,6 +40,7 @@ import unittest
 import pkg
 import pkg.client.api_errors as apx
 import pkg.client.history as history
+import pkg.client.historylog as historylog
 import pkg.misc as misc
 import pkg.portable as portable
 
@@ -455,6 +456,139 @@ class TestHistory(pkg5unittest.Pkg5TestCase):
                 self.assertEqual(stat.S_IMODE(os.stat(entry).st_mode),
                                  misc.PKG_FILE_MODE)
 
+        def test_14_log(self):
+                """Verify that history entries load the same from the log of
+                entries as from their XML files, that entries are added to the
+                log as they're loaded, and that a damaged log is ignored."""
+
+                root_dir = tempfile.mkdtemp(dir=self.test_root)
+                h = history.History(root_dir=root_dir)
+                h.client_name = "pkg-test"
+                for op_name in ("install", "update", "uninstall"):
+                        h.log_operation_start(op_name)
+                        h.operation_start_state = self.__ip_before
+                        h.operation_end_state = self.__ip_after
+                        h.operation_errors.extend(self.__errors)
+                        h.log_operation_end()
+
+                # Only the XML files are in the history directory.
+                entries = sorted(os.listdir(h.path))
+                self.assertEqual(len(entries), 3)
+                for entry in entries:
+                        self.assertTrue(entry.endswith(".xml"))
+
+                def load(log=None):
+                        loaded = []
+                        for entry in entries:
+                                he = history.History(root_dir=root_dir,
+                                    filename=entry, log=log)
+                                loaded.append((he.client_name,
+                                    he.client_version, he.client_args,
+                                    he.operation_name, he.operation_username,
+                                    he.operation_start_time,
+                                    he.operation_end_time,
+                                    he.operation_result,
+                                    he.operation_start_state,
+                                    he.operation_end_state,
+                                    he.operation_errors))
+                        return loaded
+
+                expected = load()
+                self.assertEqual(expected[1][3], "update")
+                self.assertEqual(expected[1][10], self.__errors)
+
+                # Entries are added to the log as they're written.
+                log = historylog.HistoryLog(root_dir)
+                for entry in entries:
+                        self.assertTrue(entry in log)
+                self.assertEqual(load(log), expected)
+                log.close()
+
+                # Entries of existing history are added as they're loaded.
+                log.remove()
+                log = historylog.HistoryLog(root_dir)
+                self.assertFalse(entries[0] in log)
+                self.assertEqual(load(log), expected)
+                log.close()
+                log = historylog.HistoryLog(root_dir)
+                for entry in entries:
+                        self.assertTrue(entry in log)
+                self.assertEqual(load(log), expected)
+                log.close()
+
+                # Damaged records and an incomplete index entry are ignored.
+                lpath = os.path.join(root_dir, historylog.LOG_NAME)
+                size = os.stat(lpath).st_size
+                with open(lpath, "r+b") as f:
+                        f.write(b"\0" * size)
+                with open(os.path.join(root_dir, historylog.INDEX_NAME),
+                    "ab") as f:
+                        f.write(b"garbage")
+                log = historylog.HistoryLog(root_dir)
+                self.assertEqual(load(log), expected)
+                log.close()
+
+                # A purge removes the log, so that the entry recording the
+                # purge, which may reuse the name of an earlier one, is the
+                # only one in it.
+                h.purge()
+                entry, = os.listdir(h.path)
+                log = historylog.HistoryLog(root_dir)
+                self.assertTrue(entry in log)
+                he = history.History(root_dir=root_dir, filename=entry,
+                    log=log)
+                self.assertEqual(he.operation_name, "purge-history")
+                log.close()
+                self.assertEqual(os.path.getsize(os.path.join(root_dir,
+                    historylog.INDEX_NAME)), historylog._ENTRY.size)
+
+        def test_15_log_migration(self):
+                """Verify that the entries of a long existing history are all
+                added to the log as they're loaded, without the index being
+                read again for each of them."""
+
+                root_dir = tempfile.mkdtemp(dir=self.test_root)
+                h = history.History(root_dir=root_dir)
+                h.client_name = "pkg-test"
+                h.log_operation_start("install")
+                h.operation_start_state = self.__ip_before
+                h.operation_end_state = self.__ip_after
+                h.log_operation_end()
+                entry, = os.listdir(h.path)
+                historylog.HistoryLog(root_dir).remove()
+
+                entries = [entry]
+                for i in range(2999):
+                        name = "20260101T{0:06d}Z-01.xml".format(i)
+                        shutil.copy(os.path.join(h.path, entry),
+                            os.path.join(h.path, name))
+                        entries.append(name)
+
+                log = historylog.HistoryLog(root_dir)
+                loads = []
+                load_index = log._HistoryLog__load_index
+
+                def _load_index():
+                        loads.append(True)
+                        load_index()
+
+                log._HistoryLog__load_index = _load_index
+                for name in entries:
+                        he = history.History(root_dir=root_dir,
+                            filename=name, log=log)
+                        self.assertEqual(he.operation_name, "install")
+                log.close()
+                self.assertEqual(len(loads), 1)
+
+                log = historylog.HistoryLog(root_dir)
+                for name in entries:
+                        self.assertTrue(name in log)
+                        self.assertEqual(log.get(name)["operations"][0][
+                            "attrs"]["name"], "install")
+                log.close()
+                self.assertEqual(os.path.getsize(os.path.join(root_dir,
+                    historylog.INDEX_NAME)),
+                    len(entries) * historylog._ENTRY.size)
 
 if __name__ == "__main__":
         unittest.main()
@@ -42,6 +42,7 @@ import pkg.client.api_errors as api_errors
 import pkg.digest as digest
 import pkg.fmri as fmri
 import pkg.manifest as manifest
+import pkg.manifestpack as manifestpack
 import pkg.misc as misc
 import pkg.portable as portable
 import pkg.facet as facet
@@ -346,6 +347,44 @@ link path=usr/lib/amd64/libjpeg.so target=libjpeg.so.62.0.0
                         self.assertEqual(d[0].attrs["target"], "old")
                         self.assertEqual(d[1].attrs["target"], "new")
 
+        def test_diffs11(self):
+                """ ASSERT: differences are ordered as actions compare """
+
+                self.m1.set_content("""
+                    dir path=usr owner=root group=bin mode=0755
+                    user username=b uid=100 group=other
+                    driver name=foo alias=old
+                    driver name=clone alias=old
+                    hardlink path=usr/y target=z
+                    """)
+                self.m2.set_content("""
+                    dir path=usr/b owner=root group=bin mode=0755
+                    dir path=usr/a owner=root group=bin mode=0755
+                    group groupname=c gid=200
+                    group groupname=d
+                    user username=a uid=5 group=other
+                    user username=b uid=100 group=sys
+                    driver name=foo alias=new
+                    driver name=clone alias=new
+                    driver name=bar
+                    hardlink path=usr/x target=z
+                    """)
+
+                for d, key in ((self.m2.difference(self.m1), 1),
+                    (self.m1.difference(self.m2), 0)):
+                        added, changed, removed = d
+                        for l, idx, rev in ((added, 1, False),
+                            (changed, 1, False), (removed, 0, True)):
+                                acts = [p[idx] for p in l]
+                                self.assertEqual(acts,
+                                    sorted(acts, reverse=rev))
+                                self.assertEqual(acts, sorted(acts,
+                                    key=lambda a: a.sort_key(),
+                                    reverse=rev))
+                        self.assertEqual(len(changed), 3)
+                        self.assertEqual(changed[1][key].attrs["name"],
+                            "clone")
+
 
         def test_dups1(self):
                 """ Test the duplicate search.  /bin shouldn't show up, since
@@ -598,6 +637,78 @@ dir owner=root path=fm group=bin mode=0755 facet.multi=true \\
                 m1.clear_cache(cache_dir)
                 self.assertTrue(not os.path.exists(cache_dir))
 
+        def test_pack(self):
+                """Verify that the caches are stored in a pack when one is
+                given, and that caches stored in the cache directory are moved
+                into it."""
+
+                pack_dir = tempfile.mkdtemp(dir=self.test_root)
+                pack = manifestpack.ManifestPack(pack_dir)
+
+                # Caches that were stored in the cache directory are moved.
+                manifest.FactoredManifest("foo-content@1.0", self.cache_dir,
+                    pathname=self.foo_content_p5m)
+                self.assertTrue(os.path.isfile(os.path.join(self.cache_dir,
+                    "manifest.dircache")))
+                m1 = manifest.FactoredManifest("foo-content@1.0",
+                    self.cache_dir, pathname=self.foo_content_p5m, pack=pack)
+                self.assertTrue(not os.path.exists(self.cache_dir))
+                self.assertTrue(pack.has("foo-content@1.0"))
+                self.assertEqual(len(list(m1.gen_actions_by_type("dir"))), 8)
+                self.assertTrue(not m1.loaded)
+
+                # Caches of new manifests are only stored in the pack.
+                contents = """\
+                    set name=pkg.fmri value=pkg:/bar@1
+                    set name=variant.foo value=one value=two
+                    dir path=one group=sys owner=root variant.foo=one
+                    dir path=two group=sys owner=root variant.foo=two
+                """
+                cache_dir = os.path.join(self.test_root, "bar")
+                mpath = os.path.join(self.test_root, "bar.p5m")
+                manifest.FactoredManifest("bar@1", cache_dir,
+                    contents=contents, pathname=mpath, pack=pack)
+                self.assertTrue(os.path.isfile(mpath))
+                self.assertTrue(not os.path.exists(cache_dir))
+
+                pack = manifestpack.ManifestPack(pack_dir)
+                v = variant.Variants({"variant.foo":"one"})
+                m1 = manifest.FactoredManifest("bar@1", cache_dir,
+                    excludes=[v.allow_action, lambda x, publisher: True],
+                    pathname=mpath, pack=pack)
+                self.assertEqual(
+                    [a.attrs["path"] for a in m1.gen_actions_by_type("dir")],
+                    ["one"])
+                self.assertEqual(list(m1.gen_actions_by_type("file")), [])
+                self.assertEqual(m1["pkg.fmri"], "pkg:/bar@1")
+                self.assertEqual(m1.get_directories(misc.EmptyI), ["one"])
+                self.assertTrue(not m1.loaded)
+
+        def test_pack_line_boundaries(self):
+                """Verify that attribute values containing characters which
+                str.splitlines() treats as line boundaries load the same from
+                a pack as from the manifest."""
+
+                pack_dir = tempfile.mkdtemp(dir=self.test_root)
+                contents = (
+                    "set name=pkg.fmri value=pkg:/bar@1\n"
+                    "set name=pkg.description value=\"a b\x85c\"\n"
+                    "dir path=\"d\x0cir\u2028one\" group=sys owner=root\n"
+                    "dir path=two group=sys owner=root\n")
+                cache_dir = os.path.join(self.test_root, "bar")
+                mpath = os.path.join(self.test_root, "bar.p5m")
+                manifest.FactoredManifest("bar@1", cache_dir,
+                    contents=contents, pathname=mpath,
+                    pack=manifestpack.ManifestPack(pack_dir))
+
+                m1 = manifest.FactoredManifest("bar@1", cache_dir,
+                    pathname=mpath, pack=manifestpack.ManifestPack(pack_dir))
+                self.assertEqual(m1["pkg.description"], "a b\x85c")
+                self.assertEqual(
+                    [a.attrs["path"] for a in m1.gen_actions_by_type("dir")],
+                    ["d\x0cir\u2028one", "two"])
+                self.assertTrue(not m1.loaded)
+
 
 if __name__ == "__main__":
         unittest.main()
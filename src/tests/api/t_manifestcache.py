@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.client.manifestcache as manifestcache
+import pkg.manifest as manifest
+
+from pkg.misc import EmptyI
+
+
+class TestManifestCache(pkg5unittest.Pkg5TestCase):
+
+        def __manifest(self, name, size):
+                m = manifest.Manifest()
+                m.pathname = os.path.join(self.test_root, name)
+                with open(m.pathname, "w") as fh:
+                        fh.write("#" * (size - 1) + "\n")
+                return m
+
+        def __loader(self, m, loads):
+                def load():
+                        loads.append(m)
+                        return m
+                return load
+
+        def test_lru(self):
+                """Verify that manifests are loaded once and that the least
+                recently used ones are evicted to stay within the size
+                bound."""
+
+                cache = manifestcache.ManifestCache(max_size=3000)
+                ms = [self.__manifest(str(i), 1000) for i in range(4)]
+                loads = []
+                for i in (0, 1, 2, 0, 1, 2):
+                        self.assertTrue(cache.get(i, EmptyI,
+                            self.__loader(ms[i], loads)) is ms[i])
+                self.assertEqual(loads, ms[:3])
+                self.assertEqual((cache.hits, cache.misses), (3, 3))
+                self.assertEqual(cache.size, 3000)
+
+                # 0 is used again, so 1 is the least recently used one.
+                cache.get(0, EmptyI, self.__loader(ms[0], loads))
+                cache.get(3, EmptyI, self.__loader(ms[3], loads))
+                self.assertEqual((len(cache), cache.evictions), (3, 1))
+                del loads[:]
+                for i in (0, 2, 3, 1):
+                        cache.get(i, EmptyI, self.__loader(ms[i], loads))
+                self.assertEqual(loads, [ms[1]])
+
+                # Manifests bigger than the cache are never cached.
+                big = self.__manifest("big", 4000)
+                for i in range(2):
+                        cache.get("big", EmptyI, self.__loader(big, loads))
+                self.assertEqual(loads, [ms[1], big, big])
+
+                cache.discard(lambda k: k in (0, 1))
+                self.assertEqual((len(cache), cache.size), (2, 2000))
+                cache.clear()
+                self.assertEqual((len(cache), cache.size), (0, 0))
+
+        def test_excludes(self):
+                """Verify that a manifest whose exclusions were changed after
+                it was cached is loaded again."""
+
+                cache = manifestcache.ManifestCache()
+                m = self.__manifest("m", 100)
+                loads = []
+                cache.get("m", EmptyI, self.__loader(m, loads))
+                m.excludes = [lambda a: True, lambda a: True]
+                cache.get("m", EmptyI, self.__loader(m, loads))
+                self.assertEqual((len(loads), cache.hits), (2, 0))
+
+        def test_memory(self):
+                """Verify that the cache is emptied and the load retried when
+                loading a manifest runs out of memory."""
+
+                cache = manifestcache.ManifestCache()
+                m = self.__manifest("m", 100)
+                cache.get("m", EmptyI, lambda: m)
+                attempts = []
+                def load():
+                        attempts.append(len(cache))
+                        if len(attempts) == 1:
+                                raise MemoryError()
+                        return m
+                cache.get("n", EmptyI, load)
+                self.assertEqual(attempts, [1, 0])
+                self.assertEqual(len(cache), 1)
+
+                def fail():
+                        raise MemoryError()
+                self.assertRaises(MemoryError, cache.get, "o", EmptyI, fail)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.fmri as fmri
+import pkg.manifestpack as manifestpack
+
+
+class TestManifestPack(pkg5unittest.Pkg5TestCase):
+
+        foo = fmri.PkgFmri("pkg://test/foo@1.0,5.11-0:20260101T000000Z")
+        bar = fmri.PkgFmri("pkg://test/bar@1.0,5.11-0:20260101T000000Z")
+
+        def setUp(self):
+                pkg5unittest.Pkg5TestCase.setUp(self)
+                self.pack_dir = os.path.join(self.test_root, "pack")
+
+        def test_put_get(self):
+                """Verify that stored caches are returned, by this and other
+                ManifestPack objects, and that replaced and removed ones
+                aren't."""
+
+                pack = manifestpack.ManifestPack(self.pack_dir)
+                self.assertTrue(not pack.has(self.foo))
+                self.assertEqual(pack.get(self.foo, "manifest.dir"), None)
+
+                pack.put(self.foo, [("manifest.dir", "dir path=usr\n"),
+                    ("manifest.dircache", "")])
+                other = manifestpack.ManifestPack(self.pack_dir)
+                for p in (pack, other):
+                        self.assertTrue(p.has(self.foo))
+                        self.assertTrue(p.has(
+                            "foo@1.0,5.11-0:20260101T000000Z"))
+                        self.assertEqual(p.get(self.foo, "manifest.dir"),
+                            "dir path=usr\n")
+                        self.assertEqual(p.get(self.foo, "manifest.dircache"),
+                            "")
+                        self.assertEqual(p.get(self.foo, "manifest.file"),
+                            None)
+
+                # Caches stored through one object are seen by the other.
+                other.put(self.bar, [("manifest.dir", "dir path=opt\n")])
+                self.assertEqual(pack.get(self.bar, "manifest.dir"),
+                    "dir path=opt\n")
+
+                pack.put(self.foo, [("manifest.dir", "dir path=etc\n")])
+                pack.remove(self.bar)
+                for p in (pack, manifestpack.ManifestPack(self.pack_dir)):
+                        self.assertEqual(p.get(self.foo, "manifest.dir"),
+                            "dir path=etc\n")
+                        self.assertTrue(not p.has(self.bar))
+
+        def test_index(self):
+                """Verify that the pack is read from its index and any records
+                written after it, and that an incomplete record at the end of
+                the pack is ignored."""
+
+                pack = manifestpack.ManifestPack(self.pack_dir)
+                pack.put(self.foo, [("manifest.dir", "dir path=usr\n")])
+                pack.flush()
+                idx_path = os.path.join(self.pack_dir, "manifest.pack.idx")
+                self.assertTrue(os.path.isfile(idx_path))
+                pack.put(self.bar, [("manifest.dir", "dir path=opt\n")])
+
+                with open(os.path.join(self.pack_dir, "manifest.pack"),
+                    "ab") as f:
+                        f.write(b"\x10\x00\x00\x00\x00\x00")
+                pack = manifestpack.ManifestPack(self.pack_dir)
+                self.assertEqual(pack.get(self.foo, "manifest.dir"),
+                    "dir path=usr\n")
+                self.assertEqual(pack.get(self.bar, "manifest.dir"),
+                    "dir path=opt\n")
+
+                # The incomplete record is replaced by the next one written.
+                pack.put(self.foo, [("manifest.dir", "dir path=etc\n")])
+                self.assertEqual(manifestpack.ManifestPack(self.pack_dir).get(
+                    self.foo, "manifest.dir"), "dir path=etc\n")
+
+                # An index that doesn't match the pack is ignored.
+                with open(idx_path, "w") as f:
+                        f.write("{}")
+                pack = manifestpack.ManifestPack(self.pack_dir)
+                self.assertEqual(pack.get(self.bar, "manifest.dir"),
+                    "dir path=opt\n")
+
+        def test_compact(self):
+                """Verify that the pack is rewritten without replaced records
+                once they take up most of it."""
+
+                pack = manifestpack.ManifestPack(self.pack_dir)
+                path = os.path.join(self.pack_dir, "manifest.pack")
+                content = "x" * (manifestpack.COMPACT_MIN // 2)
+                pack.put(self.bar, [("manifest.dir", "dir path=opt\n")])
+                for i in range(4):
+                        pack.put(self.foo, [("manifest.dir", content)])
+                size = os.path.getsize(path)
+                pack.flush()
+                self.assertTrue(os.path.getsize(path) < size // 3)
+                for p in (pack, manifestpack.ManifestPack(self.pack_dir)):
+                        self.assertEqual(p.get(self.foo, "manifest.dir"),
+                            content)
+                        self.assertEqual(p.get(self.bar, "manifest.dir"),
+                            "dir path=opt\n")
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.fmri as fmri
+import pkg.manifest as manifest
+import pkg.publish.pathindex as pathindex
+
+
+class TestPathIndex(pkg5unittest.Pkg5TestCase):
+
+        foo10 = """\
+set name=pkg.fmri value=pkg://test/foo@1.0,5.11-0:20260101T000000Z
+set name=variant.arch value=i386 value=sparc
+file NOHASH path=usr/bin/foo mode=0755 owner=root group=bin
+file NOHASH path=usr/lib/libfoo.so.1 mode=0755 owner=root group=bin variant.arch=i386
+link path=usr/lib/libfoo.so target=libfoo.so.1
+"""
+
+        bar10 = """\
+set name=pkg.fmri value=pkg://test/system/bar@1.0,5.11-0:20260101T000000Z
+file NOHASH path=usr/bin/foo mode=0755 owner=root group=bin
+hardlink path=usr/bin/bar target=foo
+"""
+
+        def __make_index(self):
+                pkgs = []
+                for content in (self.foo10, self.bar10):
+                        m = manifest.Manifest()
+                        m.set_content(content)
+                        pkgs.append((fmri.PkgFmri(m["pkg.fmri"]), m))
+                path = os.path.join(self.test_root, "index")
+                pathindex.build(path, pkgs)
+                return pathindex.load(path)
+
+        def test_lookup(self):
+                """Verify that the files and links delivered at each path are
+                found with their variants."""
+
+                idx = self.__make_index()
+                self.assertEqual([str(f) for f, vs in idx.packages], [
+                    "pkg://test/foo@1.0,5.11-0:20260101T000000Z",
+                    "pkg://test/system/bar@1.0,5.11-0:20260101T000000Z"])
+                self.assertEqual(idx.packages[0][1],
+                    {"variant.arch": set(["i386", "sparc"])})
+
+                self.assertEqual(idx.lookup("usr/bin/foo"),
+                    [(0, {}, None), (1, {}, None)])
+                self.assertEqual(idx.lookup("usr/lib/libfoo.so.1"),
+                    [(0, {"variant.arch": set(["i386"])}, None)])
+                self.assertEqual(idx.lookup("usr/lib/libfoo.so"),
+                    [(0, {}, "libfoo.so.1")])
+                self.assertEqual(idx.lookup("usr/bin/bar"), [(1, {}, "foo")])
+                for p in ("usr/bin", "usr/bin/fo", "usr/bin/fooo", "", "zzz"):
+                        self.assertEqual(idx.lookup(p), [])
+                idx.close()
+
+        def test_match(self):
+                """Verify that packages are matched as pkg list would match
+                them, and that patterns which can't be parsed are returned
+                with those which don't match."""
+
+                idx = self.__make_index()
+                for pats, expected, unmatched in (
+                    (["*"], [0, 1], []),
+                    (["bar"], [1], []),
+                    (["pkg:/bar"], [], ["pkg:/bar"]),
+                    (["pkg:/system/bar", "baz"], [1], ["baz"]),
+                    (["pkg://test/foo@1.0"], [0], []),
+                    (["pkg://other/foo"], [], ["pkg://other/foo"]),
+                    (["foo@2.0"], [], ["foo@2.0"]),
+                    (["foo@1.*", "sys*/*"], [0, 1], []),
+                    (["foo@@"], [], ["foo@@"]),
+                    (["foo@1.0@@", "bar"], [1], ["foo@1.0@@"]),
+                ):
+                        self.assertEqual(idx.match(pats),
+                            (expected, unmatched))
+                idx.close()
+
+        def test_invalid(self):
+                """Verify that files which aren't path indexes are rejected."""
+
+                path = os.path.join(self.test_root, "index")
+                for content in (b"", b"pkgdepix", b"x" * 100):
+                        with open(path, "wb") as fh:
+                                fh.write(content)
+                        self.assertRaises(pathindex.InvalidPathIndex,
+                            pathindex.load, path)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
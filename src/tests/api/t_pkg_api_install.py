@@ -31,10 +31,13 @@ if __name__ == "__main__":
 import pkg5unittest
 
 import os
+import threading
 import time
 import sys
 import unittest
 import pkg.client.api_errors as api_errors
+import pkg.client.imageplan as imageplan
+import pkg.client.pkgdefs as pkgdefs
 import pkg.client.progress as progress
 import pkg.client.publisher as publisher
 import pkg.fmri as fmri
@@ -1190,6 +1193,132 @@ class TestPkgApiInstall(pkg5unittest.SingleDepotTestCase):
                 assert not os.path.exists(mdir), \
                     "manifest directory '{0}' exists!".format(mdir)
 
+        @staticmethod
+        def __prefetch_threads():
+                return [
+                    t for t in threading.enumerate()
+                    if t.name == "manifest-prefetch"
+                ]
+
+        def test_prefetch_manifests(self):
+                """Verify that the manifests the solver expects to need are
+                retrieved while it runs, and are neither retrieved nor
+                touched again when the plan is evaluated."""
+
+                plist = self.pkgsend_bulk(self.rurl, (self.foo10, self.foo11,
+                    self.horse))
+                api_obj = self.image_create(self.rurl)
+                self.__do_install(api_obj, ["foo@1.0", "horse@1.0"])
+
+                api_obj.reset()
+                transport = api_obj.img.transport
+                prefetch_manifests = transport.prefetch_manifests
+                touch_manifest = transport.touch_manifest
+                prefetched = []
+                touched = []
+
+                def _prefetch_manifests(fetchlist, *args, **kwargs):
+                        prefetched.extend(str(f) for f, intent in fetchlist)
+                        return prefetch_manifests(fetchlist, *args, **kwargs)
+
+                def _touch_manifest(pfmri, *args, **kwargs):
+                        touched.append(str(pfmri))
+                        return touch_manifest(pfmri, *args, **kwargs)
+
+                transport.prefetch_manifests = _prefetch_manifests
+                transport.touch_manifest = _touch_manifest
+                for pd in api_obj.gen_plan_update():
+                        continue
+
+                new = [fmri.PkgFmri(plist[1]), fmri.PkgFmri(plist[3])]
+                self.assertEqual(sorted(prefetched),
+                    sorted(str(f) for f in new))
+                for pfmri in new:
+                        self.assertTrue(os.path.exists(
+                            self.get_img_manifest_path(pfmri)))
+                        self.assertTrue(str(pfmri) not in touched)
+                self.assertEqual(self.__prefetch_threads(), [])
+
+                api_obj.prepare()
+                api_obj.execute_plan()
+                self.pkg("list foo@1.1 horse@2.0")
+
+        def test_prefetch_stop(self):
+                """Verify that the background retrieval of manifests ends
+                when it's stopped, when the operation is canceled, and when
+                the solver fails."""
+
+                plist = self.pkgsend_bulk(self.rurl, (self.foo10, self.foo11,
+                    self.horse))
+                api_obj = self.image_create(self.rurl)
+                img = api_obj.img
+                changes = [(None, fmri.PkgFmri(p)) for p in plist]
+                calls = []
+                started = threading.Event()
+                release = threading.Event()
+                canceled = []
+
+                def check_cancel():
+                        if canceled:
+                                raise api_errors.CanceledException()
+
+                def prefetch_manifests(fetchlist, ccancel=None, **kwargs):
+                        calls.append(fetchlist)
+                        started.set()
+                        release.wait(10)
+                        ccancel()
+
+                img.transport.prefetch_manifests = prefetch_manifests
+
+                def make_plan():
+                        del calls[:]
+                        started.clear()
+                        ip = imageplan.ImagePlan(img, pkgdefs.API_OP_UPDATE,
+                            progress.NullProgressTracker(), check_cancel)
+                        ip.PREFETCH_BATCH = 1
+                        return ip
+
+                # Stopping the retrieval waits for the batch in progress and
+                # retrieves no more.
+                ip = make_plan()
+                release.clear()
+                ip._ImagePlan__start_prefetch(changes)
+                self.assertTrue(started.wait(10))
+                stopper = threading.Thread(target=ip.stop_prefetch)
+                stopper.start()
+                while not ip._ImagePlan__prefetch_stop.is_set():
+                        time.sleep(0.01)
+                release.set()
+                stopper.join()
+                self.assertEqual(len(calls), 1)
+                self.assertEqual(self.__prefetch_threads(), [])
+
+                # Canceling the operation ends the retrieval.
+                ip = make_plan()
+                canceled.append(True)
+                ip._ImagePlan__start_prefetch(changes)
+                self.assertTrue(started.wait(10))
+                for t in self.__prefetch_threads():
+                        t.join(10)
+                self.assertEqual(len(calls), 1)
+                self.assertEqual(self.__prefetch_threads(), [])
+                ip.stop_prefetch()
+                del canceled[:]
+
+                # A solver which fails in any way stops the retrieval.
+                def solver_cb(ignore_inst_parent_deps):
+                        ip._ImagePlan__start_prefetch(changes)
+                        started.wait(10)
+                        threading.Timer(0.5, release.set).start()
+                        raise KeyboardInterrupt()
+
+                ip = make_plan()
+                release.clear()
+                self.assertRaises(KeyboardInterrupt,
+                    ip._ImagePlan__run_solver, solver_cb)
+                self.assertEqual(len(calls), 1)
+                self.assertEqual(self.__prefetch_threads(), [])
+
 
 class TestActionExecutionErrors(pkg5unittest.SingleDepotTestCase):
         """This set of tests is intended to verify that the client API will
@@ -38,6 +38,7 @@ import pkg.lint.engine as engine
 import pkg.lint.log as log
 import pkg.fmri as fmri
 import pkg.manifest
+import pkg.resultcache as resultcache
 
 from pkg.lint.engine import lint_fmri_successor
 from pkg.lint.base import linted, DuplicateLintedAttrException
@@ -2367,6 +2368,36 @@ class TestLintEngine(pkg5unittest.Pkg5TestCase):
                             lint_logger.messages))
                         lint_logger.close()
 
+        def test_parallel_lint_checks(self):
+                """Ensure that linting in several processes, or with a result
+                cache, reports the same messages as a serial lint run."""
+
+                paths = self.make_misc_files(broken_manifests)
+                paths.sort()
+                cache_dir = os.path.join(self.test_root, "results")
+
+                def lint(jobs=1, cache=None):
+                        lint_logger = TestLogFormatter()
+                        lint_engine = engine.LintEngine(lint_logger,
+                            config_file=os.path.join(self.test_root,
+                            "pkglintrc"), use_tracker=False)
+                        manifests = read_manifests(paths, lint_logger)
+                        lint_engine.setup(lint_manifests=manifests)
+                        lint_engine.execute(jobs=jobs, cache=cache)
+                        lint_engine.teardown()
+                        return sorted(lint_logger.messages)
+
+                expected = lint()
+                self.assertTrue(expected)
+                self.assertEqualDiff(expected, lint(jobs=4))
+
+                # The first run fills the cache and the second uses it.
+                self.assertEqualDiff(expected,
+                    lint(cache=resultcache.ResultCache(cache_dir)))
+                self.assertTrue(os.listdir(cache_dir))
+                self.assertEqualDiff(expected,
+                    lint(jobs=2, cache=resultcache.ResultCache(cache_dir)))
+
 
 class TestLintEngineDepot(pkg5unittest.ManyDepotTestCase):
         """Tests that exercise reference vs. lint repository checks
@@ -2926,6 +2957,9 @@ license usr/foo/file license="Foo"
                 self.assertFalse(os.path.exists(
                     os.path.join(self.cache_dir, "ref_image")),
                     "ref image dir existed!")
+                self.assertFalse(os.path.exists(
+                    os.path.join(self.cache_dir, "ref_index")),
+                    "ref index dir existed!")
                 lint_engine.teardown(clear_cache=True)
                 self.assertFalse(os.path.exists(self.cache_dir),
                     "Cache dir was not torn down as expected")
@@ -3448,7 +3482,7 @@ set name=info.classification value=org.opensolaris.category.2008:System/Core
                 # test that we raise an exception when no reference repo is
                 # configured, but that searches for a non-existent package from
                 # the lint manifests do still return None.
-                shutil.rmtree(os.path.join(self.cache_dir, "ref_image"))
+                shutil.rmtree(os.path.join(self.cache_dir, "ref_index"))
                 lint_engine = engine.LintEngine(lint_logger, use_tracker=False,
                     config_file=rcfile)
                 lint_engine.setup(cache=self.cache_dir,
@@ -3458,6 +3492,54 @@ set name=info.classification value=org.opensolaris.category.2008:System/Core
                 self.assertRaises(base.LintException, lint_engine.get_manifest,
                     "example/package", reference=True)
 
+        def test_ref_index(self):
+                """Check that the reference index is reused by later sessions,
+                that it sees packages published since it was created, and that
+                the manifests it holds aren't retrieved again."""
+
+                paths = self.make_misc_files(self.get_manifest_data)
+                rcfile = os.path.join(self.test_root, "pkglintrc")
+                lint_mf = os.path.join(self.test_root, "get-manifest-lint.mf")
+                ret, oldref_fmri = self.pkgsend(self.ref_uri,
+                    "publish {0}".format(os.path.join(self.test_root,
+                    "get-manifest-oldref.mf")))
+
+                lint_logger = TestLogFormatter()
+                manifests = read_manifests([lint_mf], lint_logger)
+                index_dir = os.path.join(self.cache_dir, "ref_index")
+
+                def check_latest(ref_uris, expected):
+                        lint_engine = engine.LintEngine(lint_logger,
+                            use_tracker=False, config_file=rcfile)
+                        lint_engine.setup(cache=self.cache_dir,
+                            ref_uris=ref_uris, lint_manifests=manifests)
+                        mf = lint_engine.get_manifest("check/parent",
+                            search_type=lint_engine.LATEST_SUCCESSOR,
+                            reference=True)
+                        self.assertEqual(str(mf.fmri), expected)
+                        lint_engine.teardown()
+
+                check_latest([self.ref_uri], oldref_fmri)
+                self.assertTrue(os.path.isdir(index_dir))
+                self.assertFalse(os.path.exists(
+                    os.path.join(self.cache_dir, "ref_image")))
+
+                # The repository is remembered by the index.
+                ret, ref_fmri = self.pkgsend(self.ref_uri,
+                    "publish {0}".format(os.path.join(self.test_root,
+                    "get-manifest-ref.mf")))
+                check_latest([], ref_fmri)
+
+                # Stored manifests are used even once the repository stops
+                # serving them, and the remains of an interrupted write are
+                # ignored.
+                with open(os.path.join(index_dir, "manifests"), "ab") as fh:
+                        fh.write(b"\x10\x00\x00\x00partial")
+                self.dcs[1].stop()
+                self.dcs[1].set_disable_ops(["manifest/0"])
+                self.dcs[1].start()
+                check_latest([], ref_fmri)
+
 
 class TestLintEngineInternals(pkg5unittest.Pkg5TestCase):
 
@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import json
+import os
+import unittest
+
+import pkg.client.profiler as profiler
+
+from pkg.client.debugvalues import DebugValues
+
+
+class TestProfiler(pkg5unittest.Pkg5TestCase):
+
+        def setUp(self):
+                pkg5unittest.Pkg5TestCase.setUp(self)
+                profiler.reset()
+
+        def tearDown(self):
+                DebugValues.pop("profile", None)
+                profiler.reset()
+                pkg5unittest.Pkg5TestCase.tearDown(self)
+
+        @profiler.traced()
+        def __traced(self, n):
+                profiler.count("calls")
+                profiler.count("items", n)
+                return n
+
+        def test_disabled(self):
+                """Verify that nothing is recorded unless profiling has been
+                enabled."""
+
+                with profiler.span("outer") as s:
+                        self.assertEqual(s, None)
+                        profiler.count("items")
+                self.assertEqual(self.__traced(3), 3)
+
+                path = os.path.join(self.test_root, "trace.json")
+                profiler.save(path)
+                with open(path) as fh:
+                        trace = json.load(fh)
+                self.assertEqual([
+                    ev for ev in trace["traceEvents"] if ev["ph"] != "M"
+                ], [])
+
+        def test_trace(self):
+                """Verify that nested spans are recorded with their counters,
+                including those of the spans within them."""
+
+                path = os.path.join(self.test_root, "trace.json")
+                DebugValues.set_value("profile", path)
+
+                with profiler.span("outer", packages=2) as s:
+                        s.count("items")
+                        self.assertEqual(self.__traced(3), 3)
+                        self.assertEqual(self.__traced(4), 4)
+                profiler.save(path)
+
+                with open(path) as fh:
+                        trace = json.load(fh)
+                events = dict(
+                    (ev["name"], ev)
+                    for ev in trace["traceEvents"]
+                    if ev["ph"] == "X"
+                )
+                inner = events.pop("TestProfiler.__traced")
+                outer = events.pop("outer")
+                self.assertEqual(events, {})
+                self.assertEqual(inner["args"], { "calls": 1, "items": 4 })
+                self.assertEqual(outer["args"],
+                    { "calls": 2, "items": 8, "packages": 2 })
+                self.assertTrue(outer["ts"] <= inner["ts"])
+                self.assertTrue(inner["ts"] + inner["dur"] <=
+                    outer["ts"] + outer["dur"])
+                self.assertEqual(inner["tid"], outer["tid"])
+                self.assertTrue(any(
+                    ev["ph"] == "M" and ev["name"] == "process_name"
+                    for ev in trace["traceEvents"]
+                ))
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
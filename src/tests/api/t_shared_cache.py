@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import fcntl
+import hashlib
+import os
+import time
+import unittest
+
+import pkg.client.transport.sharedcache as sharedcache
+import pkg.misc as misc
+
+
+class TestSharedCache(pkg5unittest.Pkg5TestCase):
+
+        def setUp(self):
+                pkg5unittest.Pkg5TestCase.setUp(self)
+                self.root = os.path.join(self.test_root, "shared")
+                self.src_dir = os.path.join(self.test_root, "src")
+                os.makedirs(self.src_dir)
+
+        def __make_file(self, data):
+                data = misc.force_bytes(data)
+                hashval = hashlib.sha1(data).hexdigest()
+                path = os.path.join(self.src_dir, hashval)
+                with open(path, "wb") as f:
+                        f.write(data)
+                return hashval, path
+
+        def __read(self, path):
+                with open(path, "rb") as f:
+                        return f.read()
+
+        def test_add_get(self):
+                """Verify that files are copied into and out of the cache, and
+                that the caches of other processes see them."""
+
+                cache = sharedcache.SharedCache(self.root)
+                hashval, src = self.__make_file("content")
+                dest = os.path.join(self.test_root, "dest")
+                self.assertFalse(cache.get(hashval, dest))
+                self.assertFalse(os.path.exists(dest))
+
+                self.assertTrue(cache.add(hashval, src))
+                self.assertFalse(cache.add(hashval, src))
+                # The source is copied, not moved or linked.
+                self.assertTrue(os.path.exists(src))
+                path = cache.lookup(hashval)
+                self.assertNotEqual(os.stat(path).st_ino, os.stat(src).st_ino)
+                self.assertEqual(os.listdir(os.path.join(self.root,
+                    sharedcache.INCOMING_DIR)), [])
+
+                other = sharedcache.SharedCache(self.root)
+                self.assertTrue(other.get(hashval, dest))
+                self.assertEqual(self.__read(dest), b"content")
+                self.assertNotEqual(os.stat(dest).st_ino, os.stat(path).st_ino)
+
+                # A source which has gone away isn't added.
+                hashval, src = self.__make_file("gone")
+                os.unlink(src)
+                self.assertFalse(cache.add(hashval, src))
+                self.assertEqual(cache.lookup(hashval), None)
+
+        def test_evict(self):
+                """Verify that files which haven't been used recently are
+                removed first, once the cache is larger than its size limit
+                or they are older than its age limit."""
+
+                cache = sharedcache.SharedCache(self.root, max_size=25,
+                    max_age=3600)
+                now = time.time()
+                hashes = []
+                for i in range(4):
+                        hashval, src = self.__make_file(str(i) * 10)
+                        cache.add(hashval, src)
+                        mtime = now - 100 * (4 - i)
+                        os.utime(cache.lookup(hashval), (mtime, mtime))
+                        hashes.append(hashval)
+
+                # Using the oldest file makes it the most recent.
+                self.assertTrue(cache.get(hashes[0],
+                    os.path.join(self.test_root, "dest")))
+                self.assertEqual(cache.evict(), 2)
+                self.assertEqual(
+                    [bool(cache.lookup(h)) for h in hashes],
+                    [True, False, False, True])
+
+                old = now - 7200
+                os.utime(cache.lookup(hashes[3]), (old, old))
+                self.assertEqual(cache.evict(), 1)
+                self.assertEqual(cache.lookup(hashes[3]), None)
+                self.assertTrue(cache.lookup(hashes[0]))
+
+                # Only one process evicts files at a time.
+                cache.max_age = 0
+                fd = os.open(os.path.join(self.root, sharedcache.LOCK_NAME),
+                    os.O_RDWR)
+                try:
+                        # Locks are per-process, so take it in a child.
+                        pid = os.fork()
+                        if pid == 0:
+                                fcntl.lockf(fd, fcntl.LOCK_EX)
+                                time.sleep(2)
+                                os._exit(0)
+                        time.sleep(0.5)
+                        self.assertEqual(cache.evict(), 0)
+                        os.waitpid(pid, 0)
+                finally:
+                        os.close(fd)
+                self.assertEqual(cache.evict(), 1)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -41,6 +41,40 @@ class TestSolver(pkg5unittest.Pkg5TestCase):
         def test_solution(self):
                 cnf_test(working_test_case.splitlines())
 
+        def test_assumptions(self):
+                """Verify that solving under assumptions leaves the solver
+                usable whether or not a solution is found, and that the true
+                variables can be retrieved in one call."""
+
+                s = solver.msat_solver()
+                # Exactly one of 1, 2 and 3; 4 or 5, but not 4 with 1.
+                for cl in ([1, 2, 3], [-1, -2], [-1, -3], [-2, -3], [4, 5],
+                    [-4, -1]):
+                        self.assertTrue(s.add_clause(cl) is not False)
+
+                def check():
+                        true_vars = s.get_true_variables()
+                        self.assertEqual(true_vars, [
+                            i + 1
+                            for i in range(s.get_variables())
+                            if s.dereference(i)
+                        ])
+                        return set(true_vars)
+
+                self.assertTrue(s.solve([-1, -2]))
+                self.assertTrue(3 in check())
+                self.assertFalse(s.solve([-1, -2, -3]))
+                self.assertTrue(s.solve([-2, -3]))
+                self.assertTrue(set([1, 5]) <= check())
+                self.assertTrue(s.solve())
+                check()
+
+                # Without assumptions, failure still requires a reset.
+                for cl in ([-1], [-2], [-3]):
+                        s.add_clause(cl)
+                self.assertFalse(s.solve([]))
+                self.assertRaises(RuntimeError, s.get_true_variables)
+
 def cnf_test(lines):
         s = solver.msat_solver()
         
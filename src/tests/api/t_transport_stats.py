@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import json
+import os
+import time
+import unittest
+
+import pkg.client.publisher as publisher
+import pkg.client.transport.stats as stats
+
+
+class TestRepoStats(pkg5unittest.Pkg5TestCase):
+
+        def setUp(self):
+                pkg5unittest.Pkg5TestCase.setUp(self)
+                self.fast = publisher.TransportRepoURI(
+                    "http://fast.example.com")
+                self.slow = publisher.TransportRepoURI(
+                    "http://slow.example.com")
+
+        def __use(self, chooser, ruri, latency, nbytes, seconds, errors=0):
+                rs = chooser[ruri.key()]
+                for i in range(10):
+                        rs.record_tx()
+                        rs.record_progress(nbytes, seconds)
+                        rs.record_response(latency)
+                for i in range(errors):
+                        rs.record_tx()
+                        rs.record_error(decayable=True)
+                return rs
+
+        def test_moving_averages(self):
+                """Verify that the speed, latency and error rate of a
+                repository follow its recent requests, and survive a reset
+                between operations."""
+
+                chooser = stats.RepoChooser()
+                chooser.get_repostats([self.fast], [self.fast])
+                rs = chooser[self.fast.key()]
+                self.assertEqual(rs.speed, 0)
+                self.assertEqual(rs.latency, 0)
+                self.assertEqual(rs.error_rate, 0)
+
+                self.__use(chooser, self.fast, 0.01, 10000, 0.1)
+                self.assertAlmostEqual(rs.speed, 100000)
+                self.assertAlmostEqual(rs.latency, 0.01)
+
+                # Newer samples count for more than older ones.
+                rs.record_response(1.0)
+                self.assertTrue(0.2 < rs.latency < 0.3)
+                rs.record_error()
+                rs.record_error()
+                rate = rs.error_rate
+                self.assertTrue(0.4 < rate < 0.5)
+                rs.record_response(0.01)
+                self.assertTrue(rs.error_rate < rate)
+
+                rs.reset()
+                self.assertEqual(rs.bytes_xfr, 0)
+                self.assertAlmostEqual(rs.speed, 100000)
+                self.assertTrue(rs.error_rate > 0)
+
+        def test_quality(self):
+                """Verify that a repository which is much slower to respond,
+                or has recently failed, is ranked below the others even if it
+                was configured first."""
+
+                for errors in (0, 4):
+                        chooser = stats.RepoChooser()
+                        origins = [self.slow, self.fast]
+                        chooser.get_repostats(origins, origins)
+                        if errors:
+                                self.__use(chooser, self.slow, 0.01, 10000,
+                                    0.1, errors=errors)
+                        else:
+                                self.__use(chooser, self.slow, 2.0, 10000,
+                                    0.1)
+                        self.__use(chooser, self.fast, 0.01, 10000, 0.1)
+                        for i in range(5):
+                                rslist = chooser.get_repostats(origins,
+                                    origins)
+                                self.assertEqual(rslist[0][1], self.fast)
+
+        def test_save_load(self):
+                """Verify that statistics saved by one RepoChooser are used
+                by another, that old error rates decay, and that stale or
+                invalid files are ignored."""
+
+                path = os.path.join(self.test_root, "cache", "stats.json")
+                chooser = stats.RepoChooser()
+                origins = [self.slow, self.fast]
+                chooser.get_repostats(origins, origins)
+                self.__use(chooser, self.slow, 2.0, 10000, 0.1, errors=2)
+                self.__use(chooser, self.fast, 0.01, 20000, 0.1)
+                slow_rate = chooser[self.slow.key()].error_rate
+                chooser.save(path)
+
+                chooser = stats.RepoChooser()
+                chooser.load(path)
+                chooser.get_repostats(origins, origins)
+                rs = chooser[self.slow.key()]
+                self.assertFalse(rs.used)
+                self.assertAlmostEqual(rs.latency, 2.0, places=3)
+                self.assertAlmostEqual(rs.error_rate, slow_rate, places=3)
+                rs = chooser[self.fast.key()]
+                self.assertAlmostEqual(rs.speed, 200000)
+                for i in range(5):
+                        rslist = chooser.get_repostats(origins, origins)
+                        self.assertEqual(rslist[0][1], self.fast)
+
+                # Statistics for repositories that weren't used are kept.
+                chooser.save(path)
+                with open(path) as f:
+                        saved = json.load(f)
+                self.assertEqual(sorted(saved["repos"]),
+                    [self.fast.uri.rstrip("/"), self.slow.uri.rstrip("/")])
+
+                # Error rates decay with the age of the statistics, and old
+                # statistics are discarded.
+                now = time.time()
+                saved["repos"][self.slow.uri.rstrip("/")]["time"] = \
+                    now - stats.ERROR_HALF_LIFE
+                saved["repos"][self.fast.uri.rstrip("/")]["time"] = \
+                    now - stats.SAVED_STATS_MAX_AGE - 1
+                with open(path, "w") as f:
+                        json.dump(saved, f)
+                chooser = stats.RepoChooser()
+                chooser.load(path)
+                chooser.get_repostats(origins, origins)
+                self.assertAlmostEqual(chooser[self.slow.key()].error_rate,
+                    slow_rate / 2, places=3)
+                self.assertEqual(chooser[self.fast.key()].speed, 0)
+
+                for content in ("", "{", "[]", '{"repos": {"x": 1}}'):
+                        with open(path, "w") as f:
+                                f.write(content)
+                        chooser = stats.RepoChooser()
+                        chooser.load(path)
+                        chooser.get_repostats(origins, origins)
+                        self.assertEqual(chooser[self.slow.key()].latency, 0)
+
+        def test_versions(self):
+                """Verify that the versions returned by a repository are
+                saved with its statistics, and are only used by a later
+                process until they expire."""
+
+                path = os.path.join(self.test_root, "cache", "stats.json")
+                vers = {"pkg-server": "bd3a2ab", "versions": "0",
+                    "manifest": "0 1"}
+                chooser = stats.RepoChooser()
+                chooser.get_repostats([self.fast], [self.fast])
+                rs = chooser[self.fast.key()]
+                self.assertEqual(rs.versions, None)
+                rs.record_tx()
+                rs.record_versions(vers)
+                self.assertEqual(rs.versions, vers)
+                # Callers may change the dictionary they are given.
+                rs.versions["manifest"] = [1, 0]
+                self.assertEqual(rs.versions, vers)
+                chooser.save(path)
+
+                chooser = stats.RepoChooser()
+                chooser.load(path)
+                chooser.get_repostats([self.fast], [self.fast])
+                self.assertEqual(chooser[self.fast.key()].versions, vers)
+
+                with open(path) as f:
+                        saved = json.load(f)
+                state = saved["repos"][self.fast.uri.rstrip("/")]
+                state["versions_time"] = time.time() - stats.VERSIONS_TTL - 1
+                with open(path, "w") as f:
+                        json.dump(saved, f)
+                chooser = stats.RepoChooser()
+                chooser.load(path)
+                chooser.get_repostats([self.fast], [self.fast])
+                self.assertEqual(chooser[self.fast.key()].versions, None)
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+from . import testutils
+if __name__ == "__main__":
+        testutils.setup_environment("../../../proto")
+import pkg5unittest
+
+import os
+import unittest
+
+import pkg.client.verifycache as verifycache
+
+
+class TestVerifyCache(pkg5unittest.Pkg5TestCase):
+
+        def __make_file(self, name, content):
+                pth = os.path.join(self.test_root, name)
+                with open(pth, "w") as fh:
+                        fh.write(content)
+                return pth
+
+        def test_lookup(self):
+                """Verify that recorded results survive being saved and are
+                only used while the hash and the file's stat are unchanged."""
+
+                cpath = os.path.join(self.test_root, "cache", "verify.cache")
+                a = self.__make_file("a", "a")
+                b = self.__make_file("b c", "b")
+
+                vc = verifycache.VerifyCache(cpath)
+                self.assertFalse(vc.lookup("a", os.lstat(a), "1"))
+                vc.add("a", os.lstat(a), "1")
+                vc.add("b c", os.lstat(b), "2")
+                vc.save()
+
+                vc = verifycache.VerifyCache(cpath)
+                self.assertTrue(vc.lookup("a", os.lstat(a), "1"))
+                self.assertTrue(vc.lookup("b c", os.lstat(b), "2"))
+                self.assertFalse(vc.lookup("a", os.lstat(a), "2"))
+                self.assertFalse(vc.lookup("b c", os.lstat(a), "2"))
+
+                # Any change to the file invalidates its entry.
+                with open(a, "a") as fh:
+                        fh.write("a")
+                self.assertFalse(vc.lookup("a", os.lstat(a), "1"))
+
+                vc.discard("b c")
+                self.assertFalse(vc.lookup("b c", os.lstat(b), "2"))
+                vc.save()
+                vc = verifycache.VerifyCache(cpath)
+                self.assertFalse(vc.lookup("b c", os.lstat(b), "2"))
+
+        def test_merge(self):
+                """Verify that changes made to one instance of the cache can be
+                applied to another."""
+
+                cpath = os.path.join(self.test_root, "verify.cache")
+                a = self.__make_file("a", "a")
+                b = self.__make_file("b", "b")
+
+                vc = verifycache.VerifyCache(cpath)
+                vc.add("b", os.lstat(b), "2")
+                vc.save()
+
+                other = verifycache.VerifyCache(cpath)
+                other.load()
+                other.add("a", os.lstat(a), "1")
+                other.discard("b")
+
+                vc.merge(other.pop_updates())
+                self.assertEqual(other.pop_updates(), {})
+                self.assertTrue(vc.lookup("a", os.lstat(a), "1"))
+                self.assertFalse(vc.lookup("b", os.lstat(b), "2"))
+                vc.save()
+
+                vc = verifycache.VerifyCache(cpath)
+                self.assertTrue(vc.lookup("a", os.lstat(a), "1"))
+                self.assertFalse(vc.lookup("b", os.lstat(b), "2"))
+
+        def test_bad_cache(self):
+                """Verify that unknown versions and damaged entries are
+                ignored."""
+
+                cpath = self.__make_file("verify.cache",
+                    "VERSION 0\n1 1 1 1 1 a\n")
+                a = self.__make_file("a", "a")
+                vc = verifycache.VerifyCache(cpath)
+                vc.load()
+                self.assertFalse(vc.lookup("a", os.lstat(a), "1"))
+
+                st = os.lstat(a)
+                with open(cpath, "w") as fh:
+                        fh.write("{0}\n1 x 1 1 1 b\n1 {1:d} {2:d} {3:d} "
+                            "{4:d} a\n".format(verifycache.VERSION,
+                            st.st_size, st.st_mtime_ns, st.st_ctime_ns,
+                            st.st_ino))
+                vc = verifycache.VerifyCache(cpath)
+                self.assertTrue(vc.lookup("a", st, "1"))
+                self.assertFalse(vc.lookup("b", st, "1"))
+
+
+if __name__ == "__main__":
+        unittest.main()
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
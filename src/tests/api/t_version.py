@@ -343,6 +343,31 @@ class TestVersion(pkg5unittest.Pkg5TestCase):
                 self.v1.set_timestamp(d)
                 self.assertTrue(self.v1.get_timestamp() == d)
 
+        def testversionsortkey(self):
+                """Verify that versions sorted by their keys are in the order
+                the comparison operators give, and that changing a version
+                changes its key but not those of versions parsed from the same
+                string."""
+
+                vs = [getattr(self, "v{0:d}".format(i)) for i in range(1, 19)]
+                for a in vs:
+                        for b in vs:
+                                self.assertEqual(a < b,
+                                    a.sort_key() < b.sort_key())
+                                self.assertEqual(a == b,
+                                    a.sort_key() == b.sort_key())
+                self.assertEqual(sorted(vs),
+                    sorted(vs, key=version.Version.sort_key))
+
+                v = version.Version("5.11-0.72:20070921T211008Z", "0.5.11")
+                self.assertEqual(v, self.v12)
+                v.timestr = None
+                self.assertTrue(v < self.v12)
+                self.assertEqual(self.v12.timestr, "20070921T211008Z")
+                v.branch = version.DotSequence("0.73")
+                self.assertTrue(v > self.v13)
+                self.assertEqual(str(v), "5.11,0.5.11-0.73")
+
         def testsplit(self):
                 """Verify that split() works as expected."""
 
@@ -818,6 +818,49 @@ class TestPkgInstallBasics(pkg5unittest.SingleDepotTestCase):
                 self.dc.stop()
                 self.dc.set_address(None)
 
+        def test_parallel_execute(self):
+                """Verify that files installed and updated by a pool of threads
+                are installed correctly, and that the image property to
+                disable doing so is honoured."""
+
+                files = dict(
+                    ("tmp/par/f{0:d}".format(i), "content {0:d}".format(i))
+                    for i in range(100)
+                )
+                self.make_misc_files(files)
+
+                def gen_pkg(ver):
+                        lines = ["open par@{0},5.11-0".format(ver),
+                            "add dir mode=0755 owner=root group=bin path=par"]
+                        for i, f in enumerate(sorted(files)):
+                                # Spread the files across directories that are
+                                # not delivered by the package and vary their
+                                # content between versions.
+                                src = f if ver == "1.0" or i % 2 else \
+                                    sorted(files)[(i + 1) % len(files)]
+                                lines.append("add file {0} mode=0644 "
+                                    "owner=root group=bin path=par/d{1:d}/"
+                                    "f{2:d}".format(src, i % 7, i))
+                        lines.append("close")
+                        return "\n".join(lines)
+
+                self.pkgsend_bulk(self.rurl, (gen_pkg("1.0"), gen_pkg("1.1")))
+                self.image_create(self.rurl)
+
+                par = "-D parallel-execute=1 "
+                env = {"PKG_CLIENT_WORKERS": "4"}
+                self.pkg(par + "install par@1.0", env_arg=env)
+                self.pkg("verify par")
+                self.file_contains("par/d1/f1", "content 1")
+                self.pkg(par + "update par@1.1", env_arg=env)
+                self.pkg("verify par")
+                self.file_contains("par/d0/f0", "content 1")
+                self.pkg("uninstall par")
+
+                self.pkg("set-property parallel-execute False")
+                self.pkg(par + "install par@1.1", env_arg=env)
+                self.pkg("verify par")
+
         def test_image_upgrade(self):
                 """ Send package bar@1.1, dependent on foo@1.2.  Install
                 or exact-install bar@1.0.  List all packages.  Upgrade image.
@@ -11285,6 +11328,74 @@ adm
                 else:
                         self.file_contains("etc/pam.conf", "zigit")
 
+        def test_parallel_conflicts_install(self):
+                """Verify that conflicting actions are found and reported the
+                same way, and in the same order, when the checks are spread
+                across worker processes."""
+
+                self.image_create(self.rurl)
+
+                par = "-D parallel-conflict-check=1 "
+                env = {"PKG_CLIENT_WORKERS": "3"}
+
+                cmd = "install dupfilesp1 dupfilesp2@0 dupotherfilesp1 " \
+                    "dupotherfilesp2@0 massivedupdir*"
+                self.pkg(cmd, exit=1)
+                expected = self.errout
+                self.pkg(par + cmd, env_arg=env, exit=1)
+                self.assertEqualDiff(expected, self.errout)
+
+                self.pkg(par + "install dupfilesp1 dupotherfilesp1",
+                    env_arg=env)
+                self.pkg(par + "install dupfilesp2@0", env_arg=env, exit=1)
+                self.pkg(par + "install implicitdirs2", env_arg=env)
+
+                # Fixups for broken images must still be proposed.
+                self.pkg("-D broken-conflicting-action-handling=1 install "
+                    "dupfilesp2@0")
+                self.pkg(par + "update", env_arg=env)
+                self.pkg("verify")
+
+        def test_incremental_fast_lookups(self):
+                """Verify that the installed actions database maintained
+                incrementally after each operation matches one built from
+                scratch."""
+
+                self.image_create(self.rurl)
+
+                def check():
+                        img = self.get_img_api_obj().img
+                        cdir = os.path.join(img.imgdir, "cache")
+                        def load():
+                                res = {}
+                                for fname in ("actions.stripped",
+                                    "actions.offsets", "keys.conflicting"):
+                                        with open(os.path.join(cdir,
+                                            fname), "rb") as f:
+                                                lines = f.readlines()
+                                        # Skip the timestamps.
+                                        if fname != "keys.conflicting":
+                                                del lines[1]
+                                        res[fname] = lines
+                                return res
+                        expected = load()
+                        img._create_fast_lookups()
+                        self.assertEqualDiff(expected, load())
+                        self.assertTrue(not os.path.exists(os.path.join(cdir,
+                            "actions.stripped.prev")))
+
+                self.pkg("install dupfilesp1 dupotherfilesp1 implicitdirs2")
+                check()
+                self.pkg("-D broken-conflicting-action-handling=1 install "
+                    "dupfilesp2@0 dupotherfilesp2@0")
+                check()
+                self.pkg("uninstall implicitdirs2")
+                check()
+                self.pkg("update dupfilesp2")
+                check()
+                self.pkg("uninstall dupotherfilesp1 dupfilesp1")
+                check()
+
         def test_mismatch_overlay_files_install(self):
                 """Test overlay attributes mismatch."""
 
@@ -604,6 +604,89 @@ class TestPkgVerify(pkg5unittest.SingleDepotTestCase):
                 self.assertTrue(fmri_entry["file: usr/bin/bobcat"][0]["msg_level"]
                     == "error")
 
+        def test_verify_jobs(self):
+                """Ensure that verifying file contents in worker processes
+                gives the same results as verifying them in the client."""
+
+                self.pkgsend_bulk(self.rurl, (self.bar10, self.bla10))
+                self.image_create(self.rurl)
+                self.pkg("install foo bar bla")
+
+                # Test invalid option values.
+                self.pkg_verify("-j 0", exit=2)
+                self.pkg_verify("-j many", exit=2)
+
+                self.pkg_verify("-j 1")
+                self.pkg_verify("-j 4")
+
+                # Damage files in each of the packages.
+                for path in ("etc/bronze1", "usr/bin/ls",
+                    "opt/mybin/test_perm"):
+                        with open(os.path.join(self.get_img_path(), path),
+                            "a") as fh:
+                                fh.write("damage")
+                portable.remove(os.path.join(self.get_img_path(), "usr",
+                    "bin", "bobcat"))
+
+                self.pkg_verify("-v -j 1", exit=1)
+                expected = self.output
+                self.pkg_verify("-v -j 4", exit=1)
+                self.assertEqualDiff(expected, self.output)
+
+                # Files found to be damaged by the workers should be repaired.
+                self.pkg("fix -j 4")
+                self.pkg_verify("-j 4")
+
+        def test_verify_cache(self):
+                """Ensure that file contents are only hashed again when the
+                verification cache shows them to have changed or --deep is
+                used."""
+
+                self.image_create(self.rurl)
+                self.pkg("install foo")
+
+                # Installing the files should have recorded them.
+                cpath = os.path.join(self.get_img_path(), "var", "pkg",
+                    "cache", "verify.cache")
+                with open(cpath) as fh:
+                        entries = dict(
+                            (l.rstrip("\n").split(" ", 5)[5], l)
+                            for l in fh.readlines()[1:]
+                        )
+                self.assertTrue("usr/bin/ls" in entries)
+                self.pkg_verify("foo")
+                self.pkg_verify("--deep foo")
+
+                # A file which has been modified since it was recorded is
+                # hashed again.
+                fpath = os.path.join(self.get_img_path(), "usr", "bin", "ls")
+                with open(fpath, "r+b") as fh:
+                        fh.write(b"\0")
+                self.pkg_verify("foo", exit=1)
+                self.pkg("fix foo")
+                self.pkg_verify("foo")
+
+                # The cache is trusted for files that appear unchanged, which
+                # is simulated here by recording the damaged file's stat.
+                with open(fpath, "r+b") as fh:
+                        fh.write(b"\0")
+                st = os.lstat(fpath)
+                with open(cpath) as fh:
+                        lines = fh.readlines()
+                with open(cpath, "w") as fh:
+                        for l in lines:
+                                f = l.rstrip("\n").split(" ", 5)
+                                if f[-1] == "usr/bin/ls":
+                                        l = "{0} {1:d} {2:d} {3:d} {4:d} " \
+                                            "{5}\n".format(f[0], st.st_size,
+                                            st.st_mtime_ns, st.st_ctime_ns,
+                                            st.st_ino, f[5])
+                                fh.write(l)
+                self.pkg_verify("foo")
+                self.pkg_verify("--deep foo", exit=1)
+                self.pkg("fix --deep foo")
+                self.pkg_verify("--deep foo")
+
         def test_unpackaged(self):
                 """Test unpackaged option."""
 
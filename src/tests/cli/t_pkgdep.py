@@ -1419,6 +1419,10 @@ SYMBOL_SCOPE {
                 tp = self.make_manifest(self.test_manf_1)
                 self.pkgdepend_generate("-d {0} {1}".format(proto, tp),
                     su_wrap=True, exit=1)
+                self.pkgdepend_generate("-j 0 -d {0} {1}".format(proto, tp),
+                    exit=2)
+                self.pkgdepend_generate("-j foo -d {0} {1}".format(proto, tp),
+                    exit=2)
 
         def test_output(self):
                 """Check that the output is in the format expected."""
@@ -1498,6 +1502,56 @@ SYMBOL_SCOPE {
 
                 portable.remove(tp)
 
+        def test_parallel_output(self):
+                """Check that analyzing files in parallel produces the same
+                output as analyzing them one at a time."""
+
+                tp = self.make_manifest(self.test_manf_1)
+                fp = "usr/lib/python{0}/vendor-packages/pkg/client/indexer.py".format(
+                    py_ver_default)
+                self.make_proto_text_file(fp, self.python_text)
+                self.make_elf([], "usr/xpg4/lib/libcurses.so.1")
+
+                self.pkgdepend_generate("-m -d {0} {1}".format(
+                    self.test_proto_dir, tp))
+                serial = self.output
+                for jobs in (2, 4):
+                        self.pkgdepend_generate("-m -j {0:d} -d {1} {2}".format(
+                            jobs, self.test_proto_dir, tp))
+                        self.assertEqualDiff(serial, self.output)
+                        self.check_res("", self.errout)
+
+        def test_cache_output(self):
+                """Check that results taken from the dependency analysis cache
+                are the same as those produced by analyzing the files."""
+
+                tp = self.make_manifest(self.test_manf_1)
+                fp = "usr/lib/python{0}/vendor-packages/pkg/client/indexer.py".format(
+                    py_ver_default)
+                self.make_proto_text_file(fp, self.python_text)
+                self.make_elf([], "usr/xpg4/lib/libcurses.so.1")
+                cache_dir = os.path.join(self.test_root, "depcache")
+
+                self.pkgdepend_generate("-m -d {0} {1}".format(
+                    self.test_proto_dir, tp))
+                expected = self.output
+                for jobs in (1, 1, 2):
+                        self.pkgdepend_generate("-m -c {0} -j {1:d} -d {2} "
+                            "{3}".format(cache_dir, jobs, self.test_proto_dir,
+                            tp))
+                        self.assertEqualDiff(expected, self.output)
+                        self.check_res("", self.errout)
+                self.assertTrue(os.listdir(cache_dir))
+
+                # A changed file must be analyzed again.
+                self.make_elf(["/opt/lib"], "usr/xpg4/lib/libcurses.so.1")
+                self.pkgdepend_generate("-m -d {0} {1}".format(
+                    self.test_proto_dir, tp))
+                expected = self.output
+                self.pkgdepend_generate("-m -c {0} -d {1} {2}".format(
+                    cache_dir, self.test_proto_dir, tp))
+                self.assertEqualDiff(expected, self.output)
+
         def test_resolve_screen_out(self):
                 """Check that the results printed to screen are what is
                 expected."""
@@ -1927,6 +1981,42 @@ SYMBOL_SCOPE {
                 self.pkgdepend_resolve("-o -S {0} {1}".format(m1_path, m2_path),
                     exit=1)
 
+        def test_path_index(self):
+                """Test that resolving against a path index built from the
+                image or a repository gives the same results as resolving
+                against the image."""
+
+                self.make_misc_files(["tmp/foo"])
+                self.pkgsend_bulk(self.rurl, self.inst_pkg)
+                api_obj = self.get_img_api_obj()
+                api_obj.refresh(immediate=True)
+                self._api_install(api_obj, ["example2_pkg"])
+
+                m1_path = self.make_manifest(self.multi_deps)
+                m2_path = self.make_manifest(self.misc_manf)
+                ext_path = self.make_manifest("example2_pkg\nnosuch_pkg\n")
+                img_index = os.path.join(self.test_root, "img.idx")
+                repo_index = os.path.join(self.test_root, "repo.idx")
+
+                self.pkgdepend_index(img_index)
+                self.pkgdepend_index("-s {0} {1}".format(
+                    self.dc.get_repodir(), repo_index))
+
+                for opts in ("-o", "-o -E -e {0}".format(ext_path)):
+                        self.pkgdepend_resolve("{0} {1} {2}".format(opts,
+                            m1_path, m2_path))
+                        expected = self.output
+                        for idx in (img_index, repo_index):
+                                self.pkgdepend_resolve("{0} -i {1} {2} "
+                                    "{3}".format(opts, idx, m1_path, m2_path))
+                                self.assertEqualDiff(expected, self.output)
+
+                self.pkgdepend_resolve("-o -S -i {0} {1}".format(img_index,
+                    m1_path), exit=2)
+                self.pkgdepend_index("", exit=2)
+                self.pkgdepend_resolve("-o -i {0} {1}".format(m2_path,
+                    m1_path), exit=1)
+
         def test_bug_15843(self):
                 """Test that multiple proto_dirs work as expected."""
 
@@ -235,7 +235,8 @@ pkglint.exclude = pkg.lint.pkglint_action.PkgActionChecker.linted \
         def test_2_badopts(self):
                 """Tests that we exit with an error on wrong or missing args"""
 
-                for opt in ["-x", "--asdf", "-c test_bad_opts -l zappo://cats"]:
+                for opt in ["-x", "--asdf", "-c test_bad_opts -l zappo://cats",
+                    "-j 0", "-j x"]:
                         ret, output, err = self.pkglint(opt, exit=2)
 
         def test_3_list(self):
@@ -571,7 +572,7 @@ dir group=sys mode=0755 owner=root path=etc
 
                 # now sufficiently corrupt the cache, such that we couldn't
                 # use the provided cache dir
-                for name in ["lint_image", "ref_image"]:
+                for name in ["lint_image", "ref_image", "ref_index"]:
                         cache = tempfile.mkdtemp("pkglint-cache", "",
                             self.test_root)
                         path = os.path.join(cache, name)
@@ -629,6 +630,14 @@ dir group=sys mode=0755 owner=root path=etc
                         self.pkglint(cmd)
                         shutil.rmtree(self.cache_dir)
 
+        def __ref_index_config(self):
+                """Return the configuration of the reference index in our
+                cache directory."""
+
+                with open(os.path.join(self.cache_dir, "ref_index",
+                    "config")) as fh:
+                        return fh.read()
+
         def test_6_multiple_repos(self):
                 """Checks that pkglint can accept multiple ref and lint
                 repositories. Actually it is to test multiple publishers can be
@@ -645,10 +654,9 @@ dir group=sys mode=0755 owner=root path=etc
                 # not provided, pkglint will assume the repo uri is the origin...
                 self.pkglint("-c {0} -r {1} -r {2} -r {3} {4}".format(
                     self.cache_dir, self.ref_uri, durl3, durl5, mpath1))
-                self.pkg("-R {0}/ref_image publisher".format(self.cache_dir))
-                self.assertTrue("opensolaris.org" in self.output and
-                    "test" in self.output and durl3 in self.output and
-                    durl5 in self.output)
+                config = self.__ref_index_config()
+                self.assertTrue("opensolaris.org" in config and
+                    "test" in config and durl3 in config and durl5 in config)
                 self.pkglint("-c {0} -l {1} -l {2} -l {3}".format(
                     self.cache_dir, self.ref_uri, durl3, durl5))
                 self.pkg("-R {0}/lint_image publisher".format(self.cache_dir))
@@ -665,8 +673,7 @@ dir group=sys mode=0755 owner=root path=etc
                 self.dcs[3].refresh()
                 self.pkglint("-c {0} -r {1} -r {2} {3}".format(
                     self.cache_dir, self.ref_uri, durl3, mpath1))
-                self.pkg("-R {0}/ref_image publisher | grep {1}".format(
-                    self.cache_dir, durl3))
+                self.assertTrue(durl3 in self.__ref_index_config())
                 self.pkglint("-c {0} -l {1} -l {2}".format(
                     self.cache_dir, self.ref_uri, durl3))
                 self.pkg("-R {0}/lint_image publisher | grep {1}".format(
@@ -680,10 +687,10 @@ dir group=sys mode=0755 owner=root path=etc
                 self.dcs[3].refresh()
                 self.pkglint("-c {0} -r {1} -r {2} {3}".format(
                     self.cache_dir, self.ref_uri, durl3, mpath1))
-                self.pkg("-R {0}/ref_image publisher".format(self.cache_dir))
-                self.assertTrue("opensolaris.org" in self.output and
-                    "test" in self.output and "second-pub" in self.output and
-                    "third-pub" in self.output)
+                config = self.__ref_index_config()
+                self.assertTrue("opensolaris.org" in config and
+                    "test" in config and "second-pub" in config and
+                    "third-pub" in config)
                 self.pkglint("-c {0} -l {1} -l {2}".format(
                     self.cache_dir, self.ref_uri, durl3))
                 self.pkg("-R {0}/lint_image publisher".format(self.cache_dir))
@@ -714,9 +721,9 @@ dir group=sys mode=0755 owner=root path=etc
                 # ref/lint repositories will work.
                 self.pkglint("-c {0} -r {1} -r {2} {3}".format(
                     self.cache_dir, self.ref_uri, self.lint_uri, mpath1))
-                self.pkg("-R {0}/ref_image publisher".format(self.cache_dir))
-                self.assertTrue(self.ref_uri in self.output,
-                    self.lint_uri in self.output)
+                config = self.__ref_index_config()
+                self.assertTrue(self.ref_uri in config and
+                    self.lint_uri in config)
                 self.pkglint("-c {0} -l {1} -l {2}".format(
                     self.cache_dir, self.ref_uri, self.lint_uri))
                 self.pkg("-R {0}/lint_image publisher".format(self.cache_dir))
@@ -736,8 +743,7 @@ dir group=sys mode=0755 owner=root path=etc
                 self.dcs[5].refresh()
                 self.pkglint("-c {0} -r {1} -r {2} {3}".format(
                     self.cache_dir, durl3, durl5, mpath1))
-                self.pkg("-R {0}/ref_image publisher".format(self.cache_dir))
-                self.assertTrue(self.output.count(durl5) == 1)
+                self.assertTrue(self.__ref_index_config().count(durl5) == 1)
                 self.pkglint("-c {0} -l {1} -l {2}".format(
                     self.cache_dir, durl3, durl5))
                 self.pkg("-R {0}/lint_image publisher".format(self.cache_dir))
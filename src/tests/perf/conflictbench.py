@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+#
+# conflictbench - benchmark conflicting action checking
+#
+# Builds the stripped action cache of a synthetic image (2500 packages
+# delivering 200 actions each), then times checking an update of a fifth of
+# those packages for conflicts in this process and with an increasing number
+# of worker processes, or with the numbers of workers given as arguments.
+#
+
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import mmap
+import multiprocessing
+import operator
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pkg.actions as actions
+import pkg.client.actoffsets as actoffsets
+import pkg.client.imageplan as imageplan
+import pkg.fmri as fmri
+
+from pkg.client.imageplan import ImagePlan
+
+NPKGS = 2500
+NACTS = 200
+NUPDATE = NPKGS // 5
+
+
+def gen_actions(pkgnum, ver):
+        """Generate the actions delivered by version 'ver' of package
+        'pkgnum'; a few files move between packages between versions."""
+
+        d = "usr/share/pkg{0:d}".format(pkgnum)
+        yield actions.fromstr("dir group=bin mode=0755 owner=root "
+            "path=usr/share")
+        yield actions.fromstr("dir group=bin mode=0755 owner=root "
+            "path={0}".format(d))
+        yield actions.fromstr("link path={0}/latest target=v{1}".format(d,
+            ver))
+        for i in range(NACTS - 3):
+                owner = pkgnum
+                if ver == 2 and i == 0:
+                        owner = (pkgnum + 1) % NPKGS
+                yield actions.fromstr("file {0:040x} group=bin mode=0644 "
+                    "owner=root path=usr/share/pkg{1:d}/f{2:d}".format(
+                    pkgnum * NACTS + i + ver, owner, i))
+
+
+def pfmri(pkgnum, ver):
+        return fmri.PkgFmri("pkg://bench/pkg{0:d}@{1:d},5.11-0:"
+            "20260101T000000Z".format(pkgnum, ver))
+
+
+def build_cache(root):
+        """Write actions.stripped and actions.offsets for the synthetic image
+        to 'root' and return their paths."""
+
+        ents = []
+        for p in range(NPKGS):
+                f = pfmri(p, 1)
+                for a in gen_actions(p, 1):
+                        a.strip()
+                        ents.append((a.name, a.attrs[a.key_attr], str(f),
+                            str(a)))
+        ents.sort()
+
+        sp = os.path.join(root, "actions.stripped")
+        op = os.path.join(root, "actions.offsets")
+        offsets = []
+        with open(sp, "wb") as sf:
+                sf.write(b"VERSION 1\n0\n")
+                off = sf.tell()
+                for (name, key), grp in itertools.groupby(ents,
+                    operator.itemgetter(0, 1)):
+                        lines = [
+                            "{0} {1}\n".format(f, a).encode("utf-8")
+                            for n, k, f, a in grp
+                        ]
+                        offsets.append((name, key, off, len(lines)))
+                        sf.writelines(lines)
+                        off += sum(len(l) for l in lines)
+        with open(op, "wb") as of:
+                actoffsets.write(of, "0", offsets)
+        return sp, op, len(ents)
+
+
+def seed_groups():
+        """Seed the 'new' and 'old' dictionaries for each namespace group the
+        way ImagePlan.__find_all_conflicts() does for the update."""
+
+        def nskey(c):
+                ns = c.namespace_group
+                if ns is None:
+                        return -1
+                elif ns == "path":
+                        return 20
+                return ns
+
+        types = sorted(actions.types.values(), key=nskey)
+        groups = []
+        for ns, classes in itertools.groupby(types,
+            operator.attrgetter("namespace_group")):
+                classes = list(classes)
+                if all(not c.globally_identical for c in classes):
+                        continue
+                names = set(c.name for c in classes)
+                new, old = {}, {}
+                for p in range(NUPDATE):
+                        for d, ver in ((new, 2), (old, 1)):
+                                f = pfmri(p, ver)
+                                for a in gen_actions(p, ver):
+                                        if a.name not in names:
+                                                continue
+                                        d.setdefault(a.attrs[a.key_attr],
+                                            []).append((a, f))
+                groups.append((ns, classes, new, old))
+        return groups
+
+
+def check(groups, workers):
+        """Check 'groups' for conflicts using 'workers' processes and return
+        the sorted verdicts."""
+
+        tasks = [
+            (idx, part, workers)
+            for idx in range(len(groups))
+            for part in range(workers)
+        ]
+        if workers == 1:
+                res = [ImagePlan._check_conflict_partition(t) for t in tasks]
+        else:
+                pool = multiprocessing.get_context("fork").Pool(workers)
+                try:
+                        res = pool.map(ImagePlan._check_conflict_partition,
+                            tasks)
+                finally:
+                        pool.terminate()
+                        pool.join()
+        return sorted(
+            (idx // workers, v[:4])
+            for idx, r in enumerate(res)
+            for v in r
+        )
+
+
+if __name__ == "__main__":
+        root = tempfile.mkdtemp()
+        try:
+                print("building stripped action cache")
+                sp, op, nacts = build_cache(root)
+                print("{0:>20d}  installed actions".format(nacts))
+
+                groups = seed_groups()
+                nkeys = sum(len(new) + len(old) for ns, c, new, old in groups)
+                print("{0:>20d}  keys to check".format(nkeys))
+
+                gone = set(str(pfmri(p, 1)) for p in range(NUPDATE))
+                changing = set(str(pfmri(p, 2)) for p in range(NUPDATE))
+                with open(sp, "rb") as sf:
+                        msf = mmap.mmap(sf.fileno(), 0,
+                            access=mmap.ACCESS_READ)
+                imageplan._conflict_state = (groups,
+                    actoffsets.ActionOffsets(op), msf, gone, changing)
+
+                print("conflict checking")
+                expected = None
+                if len(sys.argv) > 1:
+                        counts = [int(a) for a in sys.argv[1:]]
+                else:
+                        ncpu = os.cpu_count() or 1
+                        counts = [
+                            n for n in sorted(set((1, 2, 4, 8, ncpu)))
+                            if n <= ncpu
+                        ]
+                for workers in counts:
+                        try:
+                                start = time.time()
+                                res = check(groups, workers)
+                                t = time.time() - start
+                        except KeyboardInterrupt:
+                                sys.exit(0)
+                        if expected is None:
+                                expected = res
+                        assert res == expected
+                        print("{0:>20f}  {1:>3d} workers  {2:>8d} keys/sec  "
+                            "{3:d} conflicts".format(t, workers,
+                            int(nkeys // t), len(res)))
+        finally:
+                shutil.rmtree(root)
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+#
+# CDDL HEADER START
+#
+# The contents of this file are subject to the terms of the
+# Common Development and Distribution License (the "License").
+# You may not use this file except in compliance with the License.
+#
+# You can obtain a copy of the license at usr/src/OPENSOLARIS.LICENSE
+# or http://www.opensolaris.org/os/licensing.
+# See the License for the specific language governing permissions
+# and limitations under the License.
+#
+# When distributing Covered Code, include this CDDL HEADER in each
+# file and include the License file at usr/src/OPENSOLARIS.LICENSE.
+# If applicable, add the following below this CDDL HEADER, with the
+# fields enclosed by brackets "[]" replaced with your own identifying
+# information: Portions Copyright [yyyy] [name of copyright owner]
+#
+# CDDL HEADER END
+#
+
+#
+# Copyright 2026 OmniOS Community Edition (OmniOSce) Association.
+#
+
+#
+# diffbench - benchmark Manifest.difference()
+#
+# Usage: diffbench.py [origin destination ...]
+#
+# Each pair of arguments names the manifests of two versions of a package,
+# such as those in /var/pkg/publisher/<pub>/pkg/<stem>/ of an image which
+# has been updated; the differences between all of them are computed as a
+# plan updating all of the packages would.  Without arguments, a synthetic
+# package of about 20000 actions is used.
+#
+
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import timeit
+
+from operator import itemgetter
+
+import pkg.manifest as manifest
+
+
+def reference_difference(self, origin, origin_exclude=(), self_exclude=(),
+    pkgplan=None, cmp_policy=None):
+        """Manifest.difference() as it was before actions were sorted by
+        their sort_key(), for comparison."""
+
+        def hashify(v):
+                if type(v) is not list:
+                        return v
+                return tuple(v)
+
+        def dictify(mf, excludes):
+                for a in mf.gen_actions(excludes=excludes):
+                        if (a.name == "link" or
+                            a.name == "hardlink") and \
+                            a.attrs.get("mediator"):
+                                akey = (a.name, tuple([
+                                    a.attrs[a.key_attr],
+                                    a.attrs.get("mediator-version"),
+                                    a.attrs.get("mediator-implementation")
+                                ]))
+                        else:
+                                akey = (a.name, hashify(a.attrs.get(
+                                    a.key_attr, id(a))))
+                        yield (akey, a)
+
+        sdict = dict(dictify(self, self_exclude))
+        odict = dict(dictify(origin, origin_exclude))
+
+        sset = set(sdict)
+        oset = set(odict)
+
+        added = [(None, sdict[i]) for i in sset - oset]
+        removed = [(odict[i], None) for i in oset - sset]
+        changed = [
+            (odict[i], sdict[i])
+            for i in oset & sset
+            if odict[i].different(sdict[i], pkgplan=pkgplan,
+                cmp_policy=cmp_policy)
+        ]
+
+        removed.sort(key=itemgetter(0), reverse=True)
+        added.sort(key=itemgetter(1))
+        changed.sort(key=itemgetter(1))
+
+        return manifest.ManifestDifference(added, changed, removed)
+
+
+def synthetic(ver):
+        lines = ["set name=pkg.fmri value=pkg://test/big@{0:d}".format(ver)]
+        for i in range(300):
+                lines.append("dir group=bin mode=0755 owner=root "
+                    "path=usr/share/d{0:d}".format(i))
+        for i in range(18000):
+                # Every third file changes between versions.
+                h = "{0:040x}".format(i * 3 + (ver if i % 3 == 0 else 0))
+                lines.append("file {0} chash={0} group=bin mode=0444 "
+                    "owner=root path=usr/share/d{1:d}/f{2:d} "
+                    "pkg.size={2:d}".format(h, i % 300, i))
+        for i in range(2000):
+                lines.append("link path=usr/bin/l{0:d} "
+                    "target=../share/d{1:d}".format(i, i % 300))
+        for i in range(200):
+                lines.append("depend fmri=pkg:/dep{0:d}@{1:d} "
+                    "type=require".format(i, ver))
+        return "\n".join(lines)
+
+
+def load(content=None, pathname=None):
+        m = manifest.Manifest()
+        m.set_content(content=content, pathname=pathname)
+        return m
+
+
+if __name__ == "__main__":
+        args = sys.argv[1:]
+        if len(args) % 2:
+                print("usage: diffbench.py [origin destination ...]",
+                    file=sys.stderr)
+                sys.exit(2)
+        if args:
+                pairs = [
+                    (load(pathname=o), load(pathname=d))
+                    for o, d in zip(args[::2], args[1::2])
+                ]
+        else:
+                pairs = [(load(synthetic(1)), load(synthetic(2)))]
+
+        nacts = sum(len(o.actions) + len(d.actions) for o, d in pairs)
+        nchanges = 0
+        for o, d in pairs:
+                old = reference_difference(d, o)
+                new = d.difference(o)
+                # The results must be the same, other than the order of
+                # actions which sort equally, such as groups with the same
+                # gid.
+                for lold, lnew in zip(old, new):
+                        assert set((id(a), id(b)) for a, b in lold) == \
+                            set((id(a), id(b)) for a, b in lnew)
+                        assert [(b or a).sort_key() for a, b in lold] == \
+                            [(b or a).sort_key() for a, b in lnew]
+                nchanges += sum(len(l) for l in new)
+        print("{0:d} packages, {1:d} actions, {2:d} changes".format(
+            len(pairs), nacts, nchanges))
+
+        n = 5
+        try:
+                for title, func in (
+                    ("difference - reference", reference_difference),
+                    ("difference", manifest.Manifest.difference)):
+                        print(title)
+                        for i in (1, 2, 3):
+                                t = timeit.Timer(lambda: [func(d, o)
+                                    for o, d in pairs]).timeit(n)
+                                print("{0:>20f} {1:>8d} actions/sec".format(
+                                    t, int((n * nacts) // t)))
+        except KeyboardInterrupt:
+                sys.exit(0)
+
+# Vim hints
+# vim:ts=8:sw=8:et:fdm=marker
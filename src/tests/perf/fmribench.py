@@ -34,6 +34,7 @@ from __future__ import print_function
 
 import pkg.fmri as fmri
 import pkg.version as version
+import resource
 import time
 import timeit
 import sys
@@ -97,6 +98,54 @@ f1 = version.Version("5.11-0.72", "0.5.11")""",
         """hash(f1)"""
         ],
 
+        [ "version create (repeated)", 100000,
+        """import pkg.version as version""",
+        """v = version.Version("5.11-0.72:20070921T203926Z", "0.5.11")"""
+        ],
+
+        [ "version create (different)", 100000,
+        """import pkg.version as version
+import itertools
+n = itertools.count()""",
+        """v = version.Version("0.5.11,5.11-0.{0:d}".format(next(n)))"""
+        ],
+
+        [ "version sort (1000 versions)", 1000,
+        """import pkg.version as version
+import random
+vs = [version.Version("0.5.{0:d},5.11-0.{1:d}:20070921T2039{2:02d}Z".format(
+    i % 10, i % 151, i % 60)) for i in range(1000)]
+random.shuffle(vs)""",
+        """sorted(vs)"""
+        ],
+
+        [ "version sort by key (1000 versions)", 1000,
+        """import pkg.version as version
+import random
+vs = [version.Version("0.5.{0:d},5.11-0.{1:d}:20070921T2039{2:02d}Z".format(
+    i % 10, i % 151, i % 60)) for i in range(1000)]
+random.shuffle(vs)""",
+        """sorted(vs, key=version.Version.sort_key)"""
+        ],
+
+        [ "fmri sort (1000 fmris)", 1000,
+        """import pkg.fmri as fmri
+import random
+fs = [fmri.PkgFmri("pkg://origin/SUNW{0:d}@0.5.{1:d},5.11-0.{2:d}".format(
+    i % 7, i % 10, i % 151)) for i in range(1000)]
+random.shuffle(fs)""",
+        """sorted(fs)"""
+        ],
+
+        [ "fmri sort by key (1000 fmris)", 1000,
+        """import pkg.fmri as fmri
+import random
+fs = [fmri.PkgFmri("pkg://origin/SUNW{0:d}@0.5.{1:d},5.11-0.{2:d}".format(
+    i % 7, i % 10, i % 151)) for i in range(1000)]
+random.shuffle(fs)""",
+        """sorted(fs, key=fmri.PkgFmri.sort_key)"""
+        ],
+
         [ "fmri create (string)", 50000,
         """import pkg.fmri as fmri""",
         """f = fmri.PkgFmri("pkg://origin/SUNWxwssu@0.5.11,5.11-0.72:20070921T203926Z")"""
@@ -257,5 +306,9 @@ if __name__ == "__main__":
                         print("#\n{0:40}  <Test Failed>".format(bname))
                         raise
 
+        # ru_maxrss is in kilobytes.
+        print("# maximum resident set size: {0:d}k".format(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
 # Vim hints
 # vim:ts=8:sw=8:et:fdm=marker
@@ -110,6 +110,17 @@ mf = manifest.Manifest()
 mf.set_content(m)
 """
 
+        # The same manifest repeated to the size of a large package, with
+        # variant exclusions like those applied by the client.
+        setup2 = setup1 + """
+import pkg.actions as actions
+import pkg.facet as facet
+import pkg.variant as variant
+big = m * 700
+excludes = [variant.Variants({"variant.opensolaris.zone": "nonglobal"}).allow_action,
+    facet.Facets().allow_action]
+"""
+
         n = 1000
         
         str1="""
@@ -121,7 +132,34 @@ for act in mf.gen_actions(attr_match={ "mode": "0444" }):
         continue
 """
 
+        # Parsing a line at a time, as Manifest.set_content() did before
+        # actions.fromstrs().
+        str3="""
+mf = manifest.Manifest()
+for l in big.splitlines():
+        l = l.lstrip()
+        if not l or l[0] == "#":
+                continue
+        mf.add_action(actions.fromstr(l), excludes)
+"""
+        str4="""
+mf = manifest.Manifest()
+mf.set_content(big, excludes=excludes)
+"""
+        bign = 10
+        bigacts = 60 * 700
+
         try:
+                print("manifest parsing - per line")
+                for i in (1, 2, 3):
+                        t = timeit.Timer(str3, setup2).timeit(bign)
+                        print("{0:>20f} {1:>8d} actions/sec".format(t,
+                            int((bign * bigacts) // t)))
+                print("manifest parsing - fromstrs")
+                for i in (1, 2, 3):
+                        t = timeit.Timer(str4, setup2).timeit(bign)
+                        print("{0:>20f} {1:>8d} actions/sec".format(t,
+                            int((bign * bigacts) // t)))
                 print("manifest gen_actions")
                 for i in (1, 2, 3):
                         t = timeit.Timer(str1, setup1).timeit(n)
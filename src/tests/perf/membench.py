@@ -35,6 +35,7 @@ import pkg.fmri as fmri
 import pkg.version as version
 import sys
 import os
+import time
 import pkg.misc as misc
 
 def dotseq(num):
@@ -55,14 +56,32 @@ def mfmri(num):
 def mfmri_different(num):
         return fmri.PkgFmri("pkg:/SUNWttf-google-{0:d}@0.5.11,5.11-0.{1:d}:{2:0=8d}T233516Z".format(num, num, num)) 
 
+def mfmri_catalog(num):
+        # As a catalog has them: a few hundred stems with a few hundred
+        # versions each, the same versions recurring across stems.
+        return fmri.PkgFmri(name="SUNWttf-google-{0:d}".format(num % 500),
+            publisher="omnios",
+            version="0.5.11,5.11-0.{0:d}:20090816T233516Z".format(num % 300))
+
+def usage():
+        """Return the virtual memory size and resident set size of this
+        process in bytes, or None if they can't be determined."""
+
+        psinfo = misc.ProcFS.psinfo()
+        if psinfo is None:
+                return None, None
+        return psinfo.pr_size * 1024, psinfo.pr_rssize * 1024
+
 collection = []
-funcs = [dotseq, dotseq_different, vers, vers_different, mfmri, mfmri_different]
+funcs = [dotseq, dotseq_different, vers, vers_different, mfmri, mfmri_different,
+    mfmri_catalog]
 
 for func in funcs:
         print("#", func.__name__)
         pid = os.fork()
         if pid == 0:
-                startusage = misc.__getvmusage()
+                startvm, startrss = usage()
+                start = time.time()
                 n = 0
                 # Generate a good sized series of valid YYYYMMDD strings
                 for y in range(1, 10000):
@@ -70,10 +89,17 @@ for func in funcs:
                                 for d in range(1, 2):
                                         n += 1
                                         collection.append(func(int("{0:0=4d}{1:0=2d}{2:0=2d}".format(y, m, d))))
-                endusage = misc.__getvmusage()
+                t = time.time() - start
+                endvm, endrss = usage()
 
-                est = (endusage - startusage) // n
-                print(func.__name__, "{0:d} rounds, estimated memory per object: {1:d} bytes".format(n, est))
+                print(func.__name__, "{0:d} rounds, {1:.2f}s, {2:d}/sec".format(
+                    n, t, int(n // t)))
+                if startvm is None:
+                        print(func.__name__, "memory usage unavailable")
+                        sys.exit(0)
+                print(func.__name__, "estimated memory per object: {0:d} "
+                    "bytes virtual, {1:d} bytes resident".format(
+                    (endvm - startvm) // n, (endrss - startrss) // n))
                 sys.exit(0)
         else:
                 os.wait()
@@ -2634,6 +2634,16 @@ class CliTestCase(Pkg5TestCase):
                 return self.cmdline_run(cmdline, comment=comment, exit=exit,
                     su_wrap=su_wrap, env_arg=env_arg)
 
+        def pkgdepend_index(self, args, exit=0, comment="", su_wrap=False,
+            env_arg=None):
+                ops = ""
+                if "-R" not in args and "-s" not in args:
+                        ops = "-R {0}".format(self.get_img_path())
+                cmdline = sys.executable + " " + os.path.join(g_pkg_path,
+                    "usr/bin/pkgdepend {0} index {1}".format(ops, args))
+                return self.cmdline_run(cmdline, comment=comment, exit=exit,
+                    su_wrap=su_wrap, env_arg=env_arg)
+
         def pkgdepend_generate(self, args, exit=0, comment="", su_wrap=False,
             env_arg=None):
                 cmdline = sys.executable + " " + os.path.join(g_pkg_path,
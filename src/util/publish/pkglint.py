@@ -46,6 +46,7 @@ import pkg.lint.log as log
 import pkg.fmri as fmri
 import pkg.manifest
 import pkg.misc as misc
+import pkg.resultcache as resultcache
 import pkg.client.api_errors as apx
 import pkg.client.transport.exception as tx
 
@@ -71,9 +72,9 @@ def main_func():
 
         usage = \
             _("\n"
-            "        %prog [-b build_no] [-c cache_dir] [-f file]\n"
-            "            [-l uri ...] [-p regexp] [-r uri ...] [-v]\n"
-            "            [-e extension_path ...]\n"
+            "        %prog [-b build_no] [-c cache_dir] [-C result_cache_dir]\n"
+            "            [-f file] [-j jobs] [-l uri ...] [-p regexp]\n"
+            "            [-r uri ...] [-v] [-e extension_path ...]\n"
             "            manifest ...\n"
             "        %prog -L")
         parser = OptionParser(usage=usage)
@@ -82,8 +83,12 @@ def main_func():
             help=_("build to use from lint and reference repositories"))
         parser.add_option("-c", dest="cache", metavar="dir",
             help=_("directory to use as a repository cache"))
+        parser.add_option("-C", dest="result_cache", metavar="dir",
+            help=_("directory to use as a cache of lint results"))
         parser.add_option("-f", dest="config", metavar="file",
             help=_("specify an alternative pkglintrc file"))
+        parser.add_option("-j", dest="jobs", metavar="jobs", type="int",
+            default=1, help=_("number of processes to lint manifests with"))
         parser.add_option("-l", dest="lint_uris", metavar="uri",
             action="append", help=_("lint repository URI"))
         parser.add_option("-L", dest="list_checks",
@@ -100,6 +105,10 @@ def main_func():
 
         opts, args = parser.parse_args(sys.argv[1:])
 
+        if opts.jobs < 1:
+                parser.error(_("-j takes a positive integer, not {0}").format(
+                    opts.jobs))
+
         # without a cache option, we can't access repositories, so expect
         # local manifests.
         if not (opts.cache or opts.list_checks) and not args:
@@ -158,7 +167,11 @@ def main_func():
 
                 msg(_("Starting lint run..."))
 
-                lint_engine.execute()
+                result_cache = None
+                if opts.result_cache:
+                        result_cache = resultcache.ResultCache(
+                            os.path.abspath(opts.result_cache))
+                lint_engine.execute(jobs=opts.jobs, cache=result_cache)
                 lint_engine.teardown()
                 lint_logger.close()
 